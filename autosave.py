@@ -0,0 +1,81 @@
+"""
+编辑窗口自动保存策略
+- 防抖：停止输入 debounce 秒后保存；debounce 随输入节奏与文档大小自适应：
+  以平均按键间隔的 PAUSE_FACTOR 倍视为“停顿”，文档越大保存越贵、间隔越长，限定在 [MIN_DEBOUNCE, MAX_DEBOUNCE]
+- 最大陈旧时间：第一次未保存修改后最迟 MAX_STALENESS 秒必须保存，持续输入也不例外
+- flush()：失去焦点、隐藏窗口、退出程序时立即保存
+计时由共用调度器完成，到期后经 dispatch（主程序中为 root.after(0, ...)）回到 Tk 线程执行保存。
+"""
+
+import threading
+import time
+
+MIN_DEBOUNCE = 2.0
+MAX_DEBOUNCE = 15.0
+MAX_STALENESS = 30.0
+PAUSE_FACTOR = 4.0
+# 超过该字符数后 debounce 按比例放大
+LARGE_DOC_CHARS = 20000
+# 按键间隔的指数移动平均系数；超过 MAX_DEBOUNCE 的间隔视为重新开始输入，不计入
+RATE_ALPHA = 0.2
+SLACK = 1.0
+
+
+class AutoSaver:
+    def __init__(self, scheduler, name, save, dispatch=None, clock=time.monotonic):
+        self.scheduler = scheduler
+        self.name = name
+        self.save = save
+        self.dispatch = dispatch or (lambda f: f())
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._dirty_since = None
+        self._last_edit = None
+        self._avg_gap = None
+        self._size = 0
+
+    @property
+    def dirty(self):
+        return self._dirty_since is not None
+
+    def debounce(self):
+        """当前的防抖时长（秒）"""
+        base = MIN_DEBOUNCE if self._avg_gap is None else self._avg_gap * PAUSE_FACTOR
+        base = max(base, MIN_DEBOUNCE)
+        if self._size > LARGE_DOC_CHARS:
+            base *= self._size / LARGE_DOC_CHARS
+        return min(base, MAX_DEBOUNCE)
+
+    def touch(self, size=0):
+        """内容有修改（Tk 线程调用）"""
+        now = self.clock()
+        with self._lock:
+            if self._last_edit is not None:
+                gap = now - self._last_edit
+                if gap < MAX_DEBOUNCE:
+                    self._avg_gap = gap if self._avg_gap is None else \
+                        self._avg_gap + RATE_ALPHA * (gap - self._avg_gap)
+            self._last_edit = now
+            self._size = size
+            if self._dirty_since is None:
+                self._dirty_since = now
+            due = min(now + self.debounce(), self._dirty_since + MAX_STALENESS)
+        self.scheduler.schedule(self.name, due - now, lambda: self.dispatch(self._fire), slack=SLACK)
+
+    def flush(self):
+        """有未保存修改时立即保存（Tk 线程调用）"""
+        if self.dirty:
+            self.scheduler.cancel(self.name)
+            self._fire()
+
+    def cancel(self):
+        self.scheduler.cancel(self.name)
+        with self._lock:
+            self._dirty_since = None
+
+    def _fire(self):
+        with self._lock:
+            if self._dirty_since is None:
+                return
+            self._dirty_since = None
+        self.save()
@@ -1,48 +1,117 @@
 """
-AutoSyncManager - 定时检查并自动同步 SafeDraft 数据库
+AutoSyncManager - 由本地修改驱动的自动同步
+数据库写入时（StorageManager 观察者回调）记录修改时间，并在共用调度器上重新排定同步任务：
+- 最后一次修改后安静 sync_quiet_seconds 秒再同步，连续编辑合并为一次
+- 两次同步至少间隔 sync_min_interval_minutes 分钟
+- 有未同步修改时最迟 sync_interval_minutes 分钟同步一次；没有修改通知时也按该间隔做一次 MD5 检查
+- 只在活跃时间段内同步，时间段外等待到开始时间
+sync_config.json 按文件修改时间缓存，未变化时不重新读取。
 """
 
 import os
 import threading
 import time
 import json
+from datetime import datetime, timedelta
+
+from scheduler import get_scheduler
+from sync_engine import SyncEngine
+from sync_backends import get_backend_name, is_config_complete
+from sync_targets import MultiTargetSync, load_targets, load_sync_records, target_key
+
+DEFAULT_CONFIG = {
+    "auto_sync_enabled": False,
+    "sync_interval_minutes": 10,
+    "sync_min_interval_minutes": 1,
+    "sync_quiet_seconds": 30,
+    "active_time_start": "09:00",
+    "active_time_end": "22:00"
+}
+
+# 自动同步关闭或未配置时的等待上限（秒）；配置保存后会立即 wake()，这里只是兜底
+IDLE_WAIT_SECONDS = 300
+
+# 调度器中的任务名
+JOB_NAME = "autosync"
+# 允许同步时间推迟的秒数，便于与其它定时任务合并唤醒
+SYNC_SLACK_SECONDS = 5
+IDLE_SLACK_SECONDS = 60
 
 
 class AutoSyncManager:
-    def __init__(self, db, on_sync_complete=None):
+    def __init__(self, db, on_sync_complete=None, scheduler=None):
         self.db = db
         self.base_path = db.base_path
+        self.config_path = os.path.join(self.base_path, "sync_config.json")
         self.running = False
-        self._thread = None
+        self.scheduler = scheduler or get_scheduler()
         self._on_sync_complete = on_sync_complete  # 成功回调(success_msg)
+        self._engine = None  # 正在执行的同步引擎，stop() 时取消
+        self._syncing = False
+
+        self._lock = threading.Lock()
+        self._config_cache = None  # ((mtime_ns, size), config)
+        # 调度状态（time.monotonic() 时间）
+        self._change_seq = 0        # 修改通知计数
+        self._dirty_since = None    # 首个未同步修改的时间
+        self._last_change = None    # 最近一次修改的时间
+        self._last_sync = None      # 最近一次同步尝试结束的时间
+        self._last_check = time.monotonic()
+        # (db.change_marker(), MD5)：文件没有再被写过时复用，不必合并增量、读全文
+        self._md5_cache = None
 
     def start(self):
         if self.running:
             return
         self.running = True
-        self._thread = threading.Thread(target=self._loop, daemon=True)
-        self._thread.start()
+        self.db.add_observer(self.notify_change)
+        self.wake()
 
     def stop(self):
-        self.running = False
+        self.db.remove_observer(self.notify_change)
+        with self._lock:
+            self.running = False
+        self.scheduler.cancel(JOB_NAME)
+        engine = self._engine
+        if engine:
+            engine.cancel()
+
+    def notify_change(self):
+        """本地数据库有写入（观察者回调，可能在任意线程调用，只记录时间，重新排定在调度线程中进行）"""
+        with self._lock:
+            now = time.monotonic()
+            self._change_seq += 1
+            self._last_change = now
+            if self._dirty_since is None:
+                self._dirty_since = now
+        self.wake()
+
+    def wake(self):
+        """配置变更或有新修改后立即重新计算下次同步时间"""
+        if self.running:
+            self.scheduler.schedule(JOB_NAME, 0, self._reschedule)
 
     # --- 配置读写 ---
 
     def _load_config(self):
-        """读取 sync_config.json，返回字典，文件不存在则返回默认值"""
-        config_path = os.path.join(self.base_path, "sync_config.json")
-        if os.path.exists(config_path):
-            try:
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                pass
-        return {
-            "auto_sync_enabled": False,
-            "sync_interval_minutes": 10,
-            "active_time_start": "09:00",
-            "active_time_end": "22:00"
-        }
+        """读取 sync_config.json（按修改时间缓存），文件不存在则返回默认值"""
+        try:
+            st = os.stat(self.config_path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return dict(DEFAULT_CONFIG)
+
+        cache = self._config_cache
+        if cache and cache[0] == stamp:
+            return cache[1]
+        config = dict(DEFAULT_CONFIG)
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                config.update(json.load(f))
+        except:
+            pass
+        self._config_cache = (stamp, config)
+        return config
 
     # --- 时间段判断 ---
 
@@ -71,28 +140,36 @@ class AutoSyncManager:
             # 跨午夜，如 22:00-06:00
             return now_minutes >= start_minutes or now_minutes <= end_minutes
 
-    # --- 远端 MD5 获取（通过 readdir） ---
-
-    def _get_remote_md5(self, server_ip, remote_path):
-        """SSH 连接远端目录，查找 safedraft_*.md5 文件名提取 hash，无则返回空字符串"""
+    def _seconds_until_active(self, config):
+        """距离下一个活跃时间段开始的秒数（当前已在时间段内返回 0）"""
+        if self._is_within_active_time(config):
+            return 0
         try:
-            ssh = self.db._get_ssh_client(server_ip)
-            sftp = ssh.open_sftp()
-            try:
-                base = remote_path.rstrip('/')
-                for fname in sftp.listdir(base):
-                    if fname.startswith("safedraft_") and fname.endswith(".md5"):
-                        ssh.close()
-                        return fname[len("safedraft_"):-len(".md5")]
-            finally:
-                sftp.close()
-                ssh.close()
-        except:
-            pass
-        return ""
+            start_h, start_m = map(int, config.get("active_time_start", "").split(":"))
+        except (ValueError, IndexError):
+            return 0
+        now = datetime.now()
+        start = now.replace(hour=start_h, minute=start_m, second=0, microsecond=0)
+        if start <= now:
+            start += timedelta(days=1)
+        return (start - now).total_seconds()
 
     # --- 核心同步检查 ---
 
+    def _current_md5(self):
+        """
+        本地数据库的 MD5。calculate_db_md5 要先合并全部草稿增量再读全文，
+        只在文件自上次计算后被写过（修改标记变化）、即确实可能要同步时才调用
+        """
+        marker = self.db.change_marker()
+        cache = self._md5_cache
+        if marker is not None and cache and cache[0] == marker:
+            return cache[1]
+        md5 = self.db.calculate_db_md5()
+        # 合并增量会写文件，取计算之后的标记
+        self._md5_cache = (self.db.change_marker(), md5)
+        return md5
+
     def _check_and_sync(self):
         """对比本地与远端 MD5，不一致则执行上传合并"""
         try:
@@ -105,32 +182,46 @@ class AutoSyncManager:
             if self.db.get_setting("ssh_enabled", "0") != "1":
                 return
 
+            # 配置了多个目标时按目标各自的间隔与同步记录判断
+            targets = load_targets(self.db)
+            if len(targets) > 1:
+                self._sync_targets(targets, config)
+                return
+
             server_ip = self.db.get_setting("ssh_ip", "")
             remote_path = self.db.get_setting("ssh_path", "")
-            if not server_ip or not remote_path:
+            if not is_config_complete(get_backend_name(self.db), server_ip, remote_path):
                 return
 
-            # 3. 计算当前本地 DB 的 MD5（实时计算）
-            current_md5 = self.db.calculate_db_md5()
+            # 3. 当前本地 DB 的 MD5（文件没有修改时用缓存，不合并增量）
+            current_md5 = self._current_md5()
 
             # 4. 获取本地状态文件中记录的 hash（上次成功同步后的值）
             local_recorded_md5 = self.db.get_local_md5()
 
-            # 5. 从远端目录 readdir 取 hash
-            remote_md5 = self._get_remote_md5(server_ip, remote_path)
-
-            # 6. 判断是否需要同步：
+            # 5. 判断是否需要同步：
             #    只有本地有未同步的更新时才上传（current_md5 != local_recorded_md5）
+            #    本地没有未同步的更新时无需连接远端
             if current_md5 == local_recorded_md5:
-                # 本地没有未同步的更新，远端有新数据时由 sync_upload_merge 处理
                 return
 
-            # 远端没有数据或远端数据与本地相同，无需上传
-            if not remote_md5 or remote_md5 == current_md5:
-                return
+            # 6. 连接远端，从目录 readdir 取 hash；同一连接继续用于上传合并
+            engine = SyncEngine(self.db, server_ip, remote_path)
+            self._engine = engine
+            try:
+                engine.connect()
+                remote_md5 = engine.read_remote_md5()
+
+                # 远端没有数据或远端数据与本地相同，无需上传
+                if not remote_md5 or remote_md5 == current_md5:
+                    return
+
+                # 7. 需要上传合并
+                engine.upload_merge()
+            finally:
+                engine.close()
+                self._engine = None
 
-            # 7. 需要上传合并
-            self.db.sync_upload_merge(server_ip, remote_path)
             # 同步成功后触发回调
             if self._on_sync_complete:
                 self._on_sync_complete("自动同步完成")
@@ -139,30 +230,111 @@ class AutoSyncManager:
             # 后台任务，异常静默
             pass
 
-    # --- 主循环 ---
-
-    def _loop(self):
-        while self.running:
-            config = self._load_config()
-
-            # 检查自动同步开关
-            if not config.get("auto_sync_enabled", False):
-                time.sleep(60)
-                continue
-
-            # 检查 ssh_enabled
-            if self.db.get_setting("ssh_enabled", "0") != "1":
-                time.sleep(60)
+    def _sync_targets(self, targets, config):
+        """多目标：只同步到了各自间隔、且上次同步后本地又有修改的目标（并行执行）"""
+        records = load_sync_records(self.base_path)
+        now = time.time()
+
+        # 未单独设置间隔的目标（含主目标）按全局检查间隔，与 _max_interval_minutes 一致
+        default_interval = config.get("sync_interval_minutes", 10)
+        due = []
+        for t in targets:
+            record = records.get(target_key(t), {})
+            interval = t.get("interval_minutes") or default_interval
+            if now - record.get("attempted_at", 0) < interval * 60:
                 continue
+            due.append((t, record))
+        if not due:
+            return
+        # 有目标到期后才计算 MD5
+        current_md5 = self._current_md5()
+        due = [t for t, record in due if record.get("md5") != current_md5]
+        if not due:
+            return
 
-            # 检查时间范围
-            if not self._is_within_active_time(config):
-                time.sleep(60)
-                continue
+        multi = MultiTargetSync(self.db, due)
+        self._engine = multi
+        try:
+            multi.upload_merge()
+        finally:
+            self._engine = None
+
+        if self._on_sync_complete:
+            self._on_sync_complete("自动同步完成")
+
+    # --- 到期计算 ---
+
+    def _max_interval_minutes(self, config):
+        """最长同步间隔：取全局检查间隔与各目标间隔中的最小值"""
+        interval = config.get("sync_interval_minutes", 10)
+        for t in config.get("targets") or []:
+            if isinstance(t, dict) and t.get("enabled", True) and t.get("interval_minutes"):
+                interval = min(interval, t["interval_minutes"])
+        return interval
+
+    def _seconds_until_due(self, config, ssh_enabled, now):
+        """距离下次同步的秒数，<= 0 表示现在同步；None 表示无需调度（自动同步或服务器同步未开启）。
+        调用方持有 self._lock"""
+        if not config.get("auto_sync_enabled", False) or not ssh_enabled:
+            return None
+
+        wait_active = self._seconds_until_active(config)
+        if wait_active > 0:
+            return wait_active
+
+        max_interval = self._max_interval_minutes(config) * 60
+        if self._dirty_since is None:
+            due = self._last_check + max_interval
+        else:
+            due = min(self._last_change + config.get("sync_quiet_seconds", 30),
+                      self._dirty_since + max_interval)
+        if self._last_sync is not None:
+            due = max(due, self._last_sync + config.get("sync_min_interval_minutes", 1) * 60)
+        return due - now
+
+    # --- 调度 ---
+
+    def _reschedule(self):
+        """按当前配置与修改状态排定下一次同步（在调度线程中执行）"""
+        config = self._load_config()
+        ssh_enabled = self.db.get_setting("ssh_enabled", "0") == "1"
+        with self._lock:
+            if not self.running or self._syncing:
+                # 同步结束后会重新排定
+                return
+            delay = self._seconds_until_due(config, ssh_enabled, time.monotonic())
+        if delay is None:
+            self.scheduler.schedule(JOB_NAME, IDLE_WAIT_SECONDS, self._reschedule, slack=IDLE_SLACK_SECONDS)
+        else:
+            self.scheduler.schedule(JOB_NAME, min(delay, IDLE_WAIT_SECONDS), self._run_due,
+                                    slack=SYNC_SLACK_SECONDS, blocking=True)
+
+    def _run_due(self):
+        """到期任务（在单独线程中执行）：再次确认到期后检查并同步"""
+        config = self._load_config()
+        ssh_enabled = self.db.get_setting("ssh_enabled", "0") == "1"
+        with self._lock:
+            if not self.running or self._syncing:
+                return
+            delay = self._seconds_until_due(config, ssh_enabled, time.monotonic())
+            if delay is not None and delay <= 0:
+                self._syncing = True
+                seq_before = self._change_seq
+        if delay is None or delay > 0:
+            self._reschedule()
+            return
 
-            # 执行检查和同步
+        # 执行检查和同步（不持有锁，期间的修改通知照常记录）
+        try:
             self._check_and_sync()
-
-            # 按配置的间隔休眠
-            interval = config.get("sync_interval_minutes", 10)
-            time.sleep(interval * 60)
+        finally:
+            with self._lock:
+                self._syncing = False
+                now = time.monotonic()
+                self._last_sync = self._last_check = now
+                if self._change_seq == seq_before:
+                    self._dirty_since = None
+                else:
+                    # 同步期间又有修改（含合并远端数据产生的写入），按新的修改重新计时
+                    self._dirty_since = self._last_change
+        self._reschedule()
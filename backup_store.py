@@ -0,0 +1,452 @@
+"""
+BackupStore - 远端数据库的去重备份仓库
+强制推送前的远端 safedraft.db 按内容定义分块（FastCDC）存入 backups/chunks/，
+每次备份只写入新增的块和一份清单 backups/manifests/<id>.json，相邻备份共享绝大部分存储。
+支持保留策略（最近 N 份 + 每日 + 每周）、回收无引用的块，以及从清单恢复。
+- 清单记录分块方式（chunker）；不同分块方式切出的块边界不同、互不去重，
+  因此已有备份的仓库沿用最新清单的分块方式，只有新仓库使用 CHUNKER_VERSION
+- 备份期间在 manifests/ 下放一个 <id>.pending 标记，回收块时跳过比最早的进行中标记更新的块，
+  避免删掉其它设备正在写入、尚未被清单引用的块
+- 代价：分块需要读取远端整个数据库（与数据库大小成正比，不再是远端的一次重命名）；
+  强制推送时下载的内容同时作为块级增量上传的基准，不会再下载第二次
+
+命令行:
+    python backup_store.py list
+    python backup_store.py restore <备份ID> [输出文件]
+    python backup_store.py prune
+"""
+
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+BACKUP_DIR = "backups"
+CHUNKS_DIR = "chunks"
+MANIFESTS_DIR = "manifests"
+MANIFEST_VERSION = 1
+PENDING_SUFFIX = ".pending"
+# 进行中标记超过该秒数视为中断遗留，回收时删除
+PENDING_EXPIRE_SECONDS = 24 * 3600
+
+# 分块方式：1 逐字节滚动判断（早期版本）；2 每次滚动两个字节（见 _cut_point）
+CHUNKER_V1 = 1
+CHUNKER_V2 = 2
+CHUNKER_VERSION = CHUNKER_V2
+
+# 分块大小（字节）：最小 / 期望 / 最大
+CHUNK_MIN = 8 * 1024
+CHUNK_AVG = 32 * 1024
+CHUNK_MAX = 128 * 1024
+# 每次从源文件读取的字节数
+READ_SIZE = 1024 * 1024
+
+# 默认保留策略，可通过设置 backup_keep_last / backup_keep_daily / backup_keep_weekly 修改
+DEFAULT_KEEP_LAST = 5
+DEFAULT_KEEP_DAILY = 7
+DEFAULT_KEEP_WEEKLY = 4
+
+_MASK64 = (1 << 64) - 1
+# Gear 表：固定种子生成，保证不同机器切出的块边界一致
+_rng = random.Random(0x5afed4af7)
+GEAR = tuple(_rng.getrandbits(64) for _ in range(256))
+del _rng
+
+
+def _gear2():
+    """GEAR2[pair]：两个字节 b0 b1 按本机字节序读成 uint16，依次滚入指纹的增量 (GEAR[b0] << 1) + GEAR[b1]"""
+    shifted = [g << 1 for g in GEAR]
+    if sys.byteorder == "little":  # pair = b0 | b1 << 8
+        return tuple((shifted[b0] + g1) & _MASK64 for g1 in GEAR for b0 in range(256))
+    return tuple((s0 + g1) & _MASK64 for s0 in shifted for g1 in GEAR)
+
+
+GEAR2 = _gear2()
+
+
+def _high_mask(bits):
+    # 左移滚动哈希的高位受最近 64 字节影响，取高位做判断
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+_AVG_BITS = CHUNK_AVG.bit_length() - 1
+# 归一化分块：未到期望大小时用更严格的掩码，超过后放宽，使块大小集中在期望值附近
+MASK_S1 = _high_mask(_AVG_BITS + 2)
+MASK_L1 = _high_mask(_AVG_BITS - 2)
+# 每两个字节才判断一次时，掩码各少一位，期望块长不变
+MASK_S = _high_mask(_AVG_BITS + 1)
+MASK_L = _high_mask(_AVG_BITS - 3)
+
+
+def _next_bit(mask):
+    # 掩码下面一位，满足切分条件时用它决定切在这两个字节之间还是之后
+    return (~mask & _MASK64) + 1 >> 1
+
+
+def _cut_point_v1(buf, start, end):
+    """CHUNKER_V1：返回 buf[start:end] 中第一个块的长度"""
+    n = end - start
+    if n <= CHUNK_MIN:
+        return n
+    limit = start + min(n, CHUNK_MAX)
+    normal = start + min(n, CHUNK_AVG)
+    gear = GEAR
+    fp = 0
+    i = start + CHUNK_MIN
+    while i < normal:
+        fp = ((fp << 1) + gear[buf[i]]) & _MASK64
+        i += 1
+        if not fp & MASK_S1:
+            return i - start
+    while i < limit:
+        fp = ((fp << 1) + gear[buf[i]]) & _MASK64
+        i += 1
+        if not fp & MASK_L1:
+            return i - start
+    return limit - start
+
+
+def _cut_point(buf, start, end):
+    """
+    CHUNKER_V2：返回 buf[start:end] 中第一个块的长度。
+    纯 Python 循环是分块的瓶颈，按 uint16 读取、每次滚动两个字节，循环次数与判断次数都减半
+    （分块吞吐约为逐字节时的 1.5 倍，见 benchmarks/bench_sync.py 的输出）。
+    只在两个字节之后判断时，边界总在距块首偶数字节处，插入奇数个字节后再也对不齐；
+    因此满足条件时再由指纹的下一位决定切在两个字节之间还是之后，块长的奇偶随内容变化
+    """
+    n = end - start
+    if n <= CHUNK_MIN:
+        return n
+    limit = start + min(n, CHUNK_MAX)
+    normal = start + min(n, CHUNK_AVG)
+    gear2 = GEAR2
+    view = memoryview(buf)
+    fp = 0
+    i = start + CHUNK_MIN
+    for stop, mask in ((normal, MASK_S), (limit, MASK_L)):
+        stop = i + (stop - i) // 2 * 2
+        for k, pair in enumerate(view[i:stop].cast("H"), 1):
+            fp = ((fp << 2) + gear2[pair]) & _MASK64
+            if not fp & mask:
+                return i + 2 * k - start - (1 if fp & _next_bit(mask) else 0)
+        i = stop
+    return limit - start
+
+
+_CUT_POINTS = {CHUNKER_V1: _cut_point_v1, CHUNKER_V2: _cut_point}
+
+
+def iter_chunks(fileobj, chunker=CHUNKER_VERSION):
+    """按内容定义边界切分文件流，逐块返回 bytes；chunker 为分块方式版本"""
+    cut_point = _CUT_POINTS[chunker]
+    buf = b""
+    pos = 0
+    eof = False
+    while True:
+        if not eof and len(buf) - pos < CHUNK_MAX:
+            data = fileobj.read(READ_SIZE)
+            if data:
+                buf = buf[pos:] + data
+                pos = 0
+                continue
+            eof = True
+        if pos >= len(buf):
+            return
+        size = cut_point(buf, pos, len(buf))
+        yield buf[pos:pos + size]
+        pos += size
+
+
+def select_retained(backup_ids, keep_last=DEFAULT_KEEP_LAST, keep_daily=DEFAULT_KEEP_DAILY,
+                    keep_weekly=DEFAULT_KEEP_WEEKLY):
+    """
+    按保留策略返回需要保留的备份 ID 集合（ID 格式 YYYYMMDD_HHMMSS）
+    - 最近 keep_last 份
+    - 最近 keep_daily 个有备份的日期，每天保留最新一份
+    - 最近 keep_weekly 个有备份的周，每周保留最新一份
+    """
+    ordered = sorted(backup_ids, reverse=True)
+    keep = set(ordered[:keep_last])
+
+    days, weeks = [], []
+    for bid in ordered:
+        try:
+            ts = datetime.strptime(bid, "%Y%m%d_%H%M%S")
+        except ValueError:
+            keep.add(bid)  # 无法识别的 ID 不做删除
+            continue
+        day = ts.date()
+        week = ts.isocalendar()[:2]
+        if day not in days and len(days) < keep_daily:
+            days.append(day)
+            keep.add(bid)
+        if week not in weeks and len(weeks) < keep_weekly:
+            weeks.append(week)
+            keep.add(bid)
+    return keep
+
+
+class BackupStore:
+    def __init__(self, backend, remote_base):
+        """backend: sync_backends 中的后端实例（已连接）；remote_base: 远端同步目录"""
+        self.backend = backend
+        self.root = f"{remote_base.rstrip('/')}/{BACKUP_DIR}"
+        self.chunks_dir = f"{self.root}/{CHUNKS_DIR}"
+        self.manifests_dir = f"{self.root}/{MANIFESTS_DIR}"
+
+    def _ensure_dirs(self):
+        for d in (self.root, self.chunks_dir, self.manifests_dir):
+            self.backend.mkdir(d)
+
+    def _listdir(self, path):
+        try:
+            return self.backend.listdir(path)
+        except IOError:
+            return []
+
+    def _put_atomic(self, data, path):
+        """先写临时文件再替换，避免中断后留下内容不完整的块或清单"""
+        tmp = path + ".tmp"
+        self.backend.put_stream(io.BytesIO(data), tmp, total=len(data))
+        self.backend.replace(tmp, path)
+
+    # --- 备份 ---
+
+    def list_backups(self):
+        """返回全部备份 ID，按时间升序"""
+        return sorted(name[:-len(".json")] for name in self._listdir(self.manifests_dir)
+                      if name.endswith(".json"))
+
+    def store_chunker(self):
+        """仓库使用的分块方式：沿用最新清单的（早期清单没有该字段，为 CHUNKER_V1），空仓库用 CHUNKER_VERSION"""
+        backups = self.list_backups()
+        if not backups:
+            return CHUNKER_VERSION
+        try:
+            chunker = self.load_manifest(backups[-1]).get("chunker", CHUNKER_V1)
+        except:
+            return CHUNKER_VERSION
+        return chunker if chunker in _CUT_POINTS else CHUNKER_VERSION
+
+    def create_backup(self, fileobj, backup_id=None):
+        """切分 fileobj 并写入新块与清单，返回清单字典"""
+        self._ensure_dirs()
+        if backup_id is None:
+            backup_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        pending = f"{self.manifests_dir}/{backup_id}{PENDING_SUFFIX}"
+        self._put_atomic(b"", pending)
+        try:
+            return self._write_backup(fileobj, backup_id)
+        finally:
+            try:
+                self.backend.remove(pending)
+            except IOError:
+                pass
+
+    def _write_backup(self, fileobj, backup_id):
+        chunker = self.store_chunker()
+        existing = set(self._listdir(self.chunks_dir))
+
+        whole = hashlib.sha256()
+        chunks = []
+        size = 0
+        new_chunks = 0
+        new_bytes = 0
+        for data in iter_chunks(fileobj, chunker):
+            whole.update(data)
+            digest = hashlib.sha256(data).hexdigest()
+            chunks.append([digest, len(data)])
+            size += len(data)
+            if digest not in existing:
+                self._put_atomic(data, f"{self.chunks_dir}/{digest}")
+                existing.add(digest)
+                new_chunks += 1
+                new_bytes += len(data)
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "id": backup_id,
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "chunker": chunker,
+            "size": size,
+            "sha256": whole.hexdigest(),
+            "chunks": chunks,
+            "new_chunks": new_chunks,
+            "new_bytes": new_bytes,
+        }
+        manifest_path = f"{self.manifests_dir}/{backup_id}.json"
+        self._put_atomic(json.dumps(manifest).encode("utf-8"), manifest_path)
+        # 沿用的旧块可能在开始备份之前就已无引用，被其它设备同时回收；清单引用到缺失的块时作废本次备份
+        missing = {digest for digest, _ in chunks} - set(self._listdir(self.chunks_dir))
+        if missing:
+            try:
+                self.backend.remove(manifest_path)
+            except IOError:
+                pass
+            raise IOError(f"备份期间有 {len(missing)} 个块被回收，本次备份作废")
+        return manifest
+
+    def load_manifest(self, backup_id):
+        buf = io.BytesIO()
+        self.backend.get_stream(f"{self.manifests_dir}/{backup_id}.json", buf)
+        return json.loads(buf.getvalue().decode("utf-8"))
+
+    # --- 恢复 ---
+
+    def restore(self, backup_id, out):
+        """按清单拼接块写入 out（文件对象），校验整体 SHA-256，返回写入字节数"""
+        manifest = self.load_manifest(backup_id)
+        whole = hashlib.sha256()
+        written = 0
+        for digest, length in manifest["chunks"]:
+            buf = io.BytesIO()
+            self.backend.get_stream(f"{self.chunks_dir}/{digest}", buf)
+            data = buf.getvalue()
+            if len(data) != length or hashlib.sha256(data).hexdigest() != digest:
+                raise IOError(f"备份块已损坏: {digest}")
+            whole.update(data)
+            out.write(data)
+            written += length
+        if whole.hexdigest() != manifest["sha256"]:
+            raise IOError(f"备份 {backup_id} 校验失败")
+        return written
+
+    def restore_to_file(self, backup_id, path):
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                self.restore(backup_id, f)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    # --- 保留策略与回收 ---
+
+    def apply_retention(self, keep_last=DEFAULT_KEEP_LAST, keep_daily=DEFAULT_KEEP_DAILY,
+                        keep_weekly=DEFAULT_KEEP_WEEKLY):
+        """删除策略之外的清单，返回被删除的备份 ID 列表"""
+        backups = self.list_backups()
+        keep = select_retained(backups, keep_last, keep_daily, keep_weekly)
+        removed = []
+        for bid in backups:
+            if bid not in keep:
+                try:
+                    self.backend.remove(f"{self.manifests_dir}/{bid}.json")
+                    removed.append(bid)
+                except IOError:
+                    pass
+        return removed
+
+    def _oldest_pending(self):
+        """进行中备份标记中最早的修改时间（远端时钟），没有时为 None；过期的标记顺带删除"""
+        oldest = None
+        for name in self._listdir(self.manifests_dir):
+            if not name.endswith(PENDING_SUFFIX):
+                continue
+            path = f"{self.manifests_dir}/{name}"
+            try:
+                mtime = self.backend.mtime(path)
+                if time.time() - mtime > PENDING_EXPIRE_SECONDS:
+                    self.backend.remove(path)  # 中断的备份遗留的标记
+                    continue
+            except IOError:
+                continue
+            oldest = mtime if oldest is None else min(oldest, mtime)
+        return oldest
+
+    def gc(self):
+        """
+        删除不被任何清单引用的块（含中断留下的 .tmp），返回 (删除块数, 释放字节数)。
+        有进行中的备份时，不删除在最早的进行中标记之后写入的块（它们可能马上会被该备份的清单引用）
+        """
+        # 依次列出块、进行中标记、清单：列出的块若属于某次备份，该备份的标记在此之前已写入，
+        # 读标记时要么还在（按时间跳过），要么已结束（结束前已写好清单，读清单时能看到引用）
+        names = self._listdir(self.chunks_dir)
+        oldest_pending = self._oldest_pending()
+        referenced = set()
+        for bid in self.list_backups():
+            manifest = self.load_manifest(bid)
+            referenced.update(digest for digest, _ in manifest["chunks"])
+
+        count = 0
+        freed = 0
+        for name in names:
+            if name in referenced:
+                continue
+            path = f"{self.chunks_dir}/{name}"
+            try:
+                if oldest_pending is not None and self.backend.mtime(path) >= oldest_pending:
+                    continue
+                size = self.backend.stat(path)
+                self.backend.remove(path)
+            except IOError:
+                continue
+            count += 1
+            freed += size or 0
+        return count, freed
+
+    def prune(self, keep_last=DEFAULT_KEEP_LAST, keep_daily=DEFAULT_KEEP_DAILY,
+              keep_weekly=DEFAULT_KEEP_WEEKLY):
+        removed = self.apply_retention(keep_last, keep_daily, keep_weekly)
+        count, freed = self.gc()
+        return removed, count, freed
+
+
+def retention_from_settings(db):
+    """从设置读取保留策略 (keep_last, keep_daily, keep_weekly)"""
+    def _int(key, default):
+        try:
+            return max(0, int(db.get_setting(key, str(default))))
+        except (TypeError, ValueError):
+            return default
+    return (_int("backup_keep_last", DEFAULT_KEEP_LAST),
+            _int("backup_keep_daily", DEFAULT_KEEP_DAILY),
+            _int("backup_keep_weekly", DEFAULT_KEEP_WEEKLY))
+
+
+def main(argv=None):
+    import argparse
+    from storage import StorageManager
+    from sync_backends import create_backend
+
+    parser = argparse.ArgumentParser(description="SafeDraft 远端备份管理")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="列出远端备份")
+    p_restore = sub.add_parser("restore", help="恢复指定备份到本地文件")
+    p_restore.add_argument("backup_id")
+    p_restore.add_argument("output", nargs="?", default=None,
+                           help="输出文件，默认为数据目录下的 safedraft.restored_<ID>.db")
+    sub.add_parser("prune", help="按保留策略清理备份并回收无引用的块")
+    args = parser.parse_args(argv)
+
+    db = StorageManager()
+    server_ip = db.get_setting("ssh_ip", "")
+    remote_path = db.get_setting("ssh_path", "")
+    backend = create_backend(db, server_ip)
+    backend.connect()
+    try:
+        store = BackupStore(backend, remote_path)
+        if args.cmd == "list":
+            for bid in store.list_backups():
+                m = store.load_manifest(bid)
+                print(f"{bid}  {m['size']:>12} 字节  {len(m['chunks'])} 块  新增 {m.get('new_bytes', 0)} 字节")
+        elif args.cmd == "restore":
+            output = args.output or os.path.join(db.base_path, f"safedraft.restored_{args.backup_id}.db")
+            store.restore_to_file(args.backup_id, output)
+            print(f"已恢复到 {output}")
+        elif args.cmd == "prune":
+            removed, count, freed = store.prune(*retention_from_settings(db))
+            print(f"删除备份 {len(removed)} 份，回收块 {count} 个，共 {freed} 字节")
+    finally:
+        backend.close()
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
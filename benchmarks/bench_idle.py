@@ -0,0 +1,101 @@
+"""
+后台定时唤醒基准测试
+对比旧的“每个组件一个定时线程”模型与统一调度器在相同时长内的唤醒次数、新建线程数与 CPU 时间：
+- idle:    程序空闲（窗口监听每秒轮询、自动同步每 60 秒检查）
+- editing: 在笔记中持续输入（每次按键重新开始 2 秒防抖保存）
+
+用法:
+    python benchmarks/bench_idle.py
+    python benchmarks/bench_idle.py --seconds 30 --keystroke-ms 150
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from scheduler import Scheduler
+from autosync import IDLE_WAIT_SECONDS
+
+
+def _legacy(seconds, keystroke_s):
+    """旧模型：窗口监听线程每秒醒来，自动同步线程每 60 秒醒来，笔记每次按键新建一个 Timer 线程"""
+    stop = threading.Event()
+    wakeups = [0]
+    threads = [0]
+
+    def _sleeper(interval):
+        while not stop.wait(interval):
+            wakeups[0] += 1
+
+    for interval in (1.0, 60.0):
+        threading.Thread(target=_sleeper, args=(interval,), daemon=True).start()
+        threads[0] += 1
+
+    timer = None
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        if keystroke_s:
+            if timer:
+                timer.cancel()
+            timer = threading.Timer(2.0, lambda: None)
+            timer.start()
+            threads[0] += 1
+            wakeups[0] += 1  # 被取消的 Timer 线程也会醒来一次后退出
+        time.sleep(keystroke_s or seconds)
+    stop.set()
+    if timer:
+        timer.cancel()
+    return wakeups[0], threads[0]
+
+
+def _unified(seconds, keystroke_s):
+    """统一调度：窗口监听由焦点事件驱动，自动同步空闲时按 IDLE_WAIT_SECONDS 兜底检查，笔记保存为命名防抖任务"""
+    sched = Scheduler()
+    sched.start()
+    sched.schedule("autosync", IDLE_WAIT_SECONDS, lambda: None, slack=60)
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        if keystroke_s:
+            sched.schedule("notebook.save", 2.0, lambda: None, slack=0.5)
+        time.sleep(keystroke_s or seconds)
+    stats = sched.stats()
+    sched.stop()
+    return stats["wakeups"], 1
+
+
+def run(seconds=10.0, keystroke_ms=200):
+    results = []
+    for scenario, keystroke_s in (("idle", 0), ("editing", keystroke_ms / 1000.0)):
+        for model, func in (("legacy", _legacy), ("unified", _unified)):
+            cpu = time.process_time()
+            wakeups, threads = func(seconds, keystroke_s)
+            results.append({
+                "scenario": scenario,
+                "model": model,
+                "wakeups": wakeups,
+                "threads": threads,
+                "cpu_ms": round((time.process_time() - cpu) * 1000, 2),
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SafeDraft 后台定时唤醒基准测试")
+    parser.add_argument("--seconds", type=float, default=10.0, help="每个场景的时长")
+    parser.add_argument("--keystroke-ms", type=float, default=200, help="editing 场景的按键间隔")
+    args = parser.parse_args(argv)
+
+    print(f"{'场景':<8} {'模型':<8} {'唤醒次数':>8} {'线程数':>6} {'CPU ms':>8}")
+    for r in run(args.seconds, args.keystroke_ms):
+        print(f"{r['scenario']:<8} {r['model']:<8} {r['wakeups']:>8} {r['threads']:>6} {r['cpu_ms']:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
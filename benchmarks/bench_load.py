@@ -0,0 +1,135 @@
+"""
+大文档加载基准测试
+在真实的 tk.Text（wrap="word"、undo=True，与主编辑区相同）中载入 1 / 10 / 50 MB 文本，比较：
+- direct: 一次性 delete + insert（旧做法），首屏显示要等全部插入与布局完成
+- bulk:   BulkLoader 分块加载，首屏插入后立即显示，其余在空闲时插入
+输出首屏显示耗时（time-to-first-paint）、全部加载完成耗时，以及加载期间事件循环的最长停顿。
+需要图形界面（DISPLAY）。
+
+用法:
+    python benchmarks/bench_load.py
+    python benchmarks/bench_load.py --sizes-mb 1,10
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import tkinter as tk
+
+from bulk_loader import BulkLoader
+
+DEFAULT_SIZES_MB = (1, 10, 50)
+# 事件循环停顿探针的间隔（毫秒）
+PROBE_MS = 10
+
+
+def make_text(size_mb, seed=1):
+    """生成中英文混合、长短行交错的文本"""
+    rng = random.Random(seed)
+    words = ["草稿", "SafeDraft", "保存", "lorem", "ipsum", "同步", "编辑器", "window", "的", "hello"]
+    lines = []
+    total = 0
+    target = size_mb * 1024 * 1024
+    while total < target:
+        line = " ".join(rng.choice(words) for _ in range(rng.randint(2, 40)))
+        lines.append(line)
+        total += len(line.encode("utf-8")) + 1
+    return "\n".join(lines)
+
+
+def _new_text(root):
+    text = tk.Text(root, undo=True, wrap="word", width=100, height=40)
+    text.pack(fill="both", expand=True)
+    root.update()
+    return text
+
+
+def _pump_until(root, done, probe):
+    """运行事件循环直到 done() 为真，同时记录相邻两次探针之间的最长间隔"""
+    last = [time.perf_counter()]
+    worst = [0.0]
+
+    def _probe():
+        now = time.perf_counter()
+        worst[0] = max(worst[0], now - last[0])
+        last[0] = now
+        probe[0] = root.after(PROBE_MS, _probe)
+
+    probe[0] = root.after(PROBE_MS, _probe)
+    while not done():
+        root.update()
+    root.after_cancel(probe[0])
+    return worst[0]
+
+
+def _direct(root, content):
+    widget = _new_text(root)
+    start = time.perf_counter()
+    widget.delete("1.0", "end")
+    widget.insert("1.0", content)
+    widget.update_idletasks()
+    first_paint = time.perf_counter() - start
+    widget.destroy()
+    # 一次性插入期间事件循环完全停顿
+    return first_paint, first_paint, first_paint
+
+
+def _bulk(root, content):
+    widget = _new_text(root)
+    finished = []
+    loader = BulkLoader(widget, content, on_done=lambda: finished.append(time.perf_counter()))
+    start = time.perf_counter()
+    loader.start()
+    stall = _pump_until(root, lambda: finished, [None])
+    total = finished[0] - start
+    widget.destroy()
+    return loader.stats["first_paint"], total, max(stall, loader.stats["first_paint"])
+
+
+def run(sizes_mb=DEFAULT_SIZES_MB):
+    root = tk.Tk()
+    root.geometry("900x700")
+    results = []
+    try:
+        for size in sizes_mb:
+            content = make_text(size)
+            for mode, func in (("direct", _direct), ("bulk", _bulk)):
+                first_paint, total, stall = func(root, content)
+                results.append({
+                    "size_mb": size,
+                    "mode": mode,
+                    "first_paint_ms": round(first_paint * 1000, 1),
+                    "total_ms": round(total * 1000, 1),
+                    "max_stall_ms": round(stall * 1000, 1),
+                })
+    finally:
+        root.destroy()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SafeDraft 大文档加载基准测试")
+    parser.add_argument("--sizes-mb", default=",".join(str(n) for n in DEFAULT_SIZES_MB), help="文档大小（MB），逗号分隔")
+    args = parser.parse_args(argv)
+
+    sizes = [int(x) for x in args.sizes_mb.split(",") if x.strip()]
+    try:
+        results = run(sizes)
+    except tk.TclError as e:
+        print(f"无法创建窗口（需要图形界面）: {e}")
+        return 1
+    print(f"{'大小 MB':>8} {'方式':<8} {'首屏 ms':>10} {'完成 ms':>10} {'最长停顿 ms':>12}")
+    for r in results:
+        print(f"{r['size_mb']:>8} {r['mode']:<8} {r['first_paint_ms']:>10} {r['total_ms']:>10} {r['max_stall_ms']:>12}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,107 @@
+"""
+窗口触发规则匹配基准测试
+随机生成数千条标题/进程/正则/通配规则，比较编译后的 RuleMatcher 与逐条子串检查的单次匹配耗时。
+
+用法:
+    python benchmarks/bench_rules.py
+    python benchmarks/bench_rules.py --rules 1000,5000 --windows 2000
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from rule_matcher import RuleMatcher
+
+DEFAULT_RULE_COUNTS = (100, 1000, 5000)
+
+
+def _word(rng, n):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(n))
+
+
+def make_rules(count, rng):
+    """按 title / process 各占大头、少量正则与通配的比例生成规则"""
+    rules = {'title': [], 'process': [], 'regex': [], 'glob': []}
+    for i in range(count):
+        kind = i % 10
+        if kind < 5:
+            rules['title'].append(_word(rng, rng.randint(4, 10)))
+        elif kind < 9:
+            rules['process'].append(_word(rng, rng.randint(4, 8)) + ".exe")
+        elif i % 20 == 9:
+            rules['regex'].append(_word(rng, 3) + r"\d+" + _word(rng, 2))
+        else:
+            rules['glob'].append("*" + _word(rng, 4) + "*.exe")
+    return rules
+
+
+def make_windows(count, rng):
+    return [(" - ".join(_word(rng, rng.randint(3, 9)) for _ in range(4)), _word(rng, 6) + ".exe")
+            for _ in range(count)]
+
+
+def naive_match(rules, title, proc_name):
+    """reload_rules 编译前的逐条匹配方式（只覆盖 title / process）"""
+    for p_rule in rules['process']:
+        clean_rule = p_rule.replace(".exe", "")
+        if clean_rule in proc_name:
+            return "process", clean_rule
+    for t_rule in rules['title']:
+        if t_rule in title:
+            return "title", t_rule
+    return None
+
+
+def run(rule_counts=DEFAULT_RULE_COUNTS, windows=1000, seed=1):
+    rng = random.Random(seed)
+    results = []
+    samples = make_windows(windows, rng)
+    for count in rule_counts:
+        rules = make_rules(count, rng)
+
+        t = time.perf_counter()
+        matcher = RuleMatcher(rules)
+        compile_s = time.perf_counter() - t
+
+        t = time.perf_counter()
+        compiled_hits = sum(1 for title, proc in samples if matcher.match(title, proc))
+        compiled_s = time.perf_counter() - t
+
+        t = time.perf_counter()
+        naive_hits = sum(1 for title, proc in samples if naive_match(rules, title, proc))
+        naive_s = time.perf_counter() - t
+
+        results.append({
+            "rules": count,
+            "compile_ms": round(compile_s * 1000, 3),
+            "compiled_us": round(compiled_s / windows * 1e6, 3),
+            "naive_us": round(naive_s / windows * 1e6, 3),
+            "compiled_hits": compiled_hits,
+            "naive_hits": naive_hits,
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SafeDraft 触发规则匹配基准测试")
+    parser.add_argument("--rules", default=",".join(str(n) for n in DEFAULT_RULE_COUNTS), help="规则条数，逗号分隔")
+    parser.add_argument("--windows", type=int, default=1000, help="参与匹配的窗口数")
+    args = parser.parse_args(argv)
+
+    counts = [int(x) for x in args.rules.split(",") if x.strip()]
+    print(f"{'规则数':>8} {'编译 ms':>10} {'编译后 µs/次':>14} {'逐条 µs/次':>12}")
+    for r in run(counts, args.windows):
+        print(f"{r['rules']:>8} {r['compile_ms']:>10} {r['compiled_us']:>14} {r['naive_us']:>12}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,586 @@
+"""
+同步基准测试
+在本机回环地址启动进程内 paramiko SFTP 服务器，经可模拟延迟/带宽的转发链路，
+对 1k / 10k / 100k 行的数据库分别执行 sync_upload_merge、sync_download_merge、force_push_overwrite，
+输出各阶段耗时与传输字节数，以及强制推送前备份远端数据库所用内容定义分块的吞吐。
+
+用法:
+    python benchmarks/bench_sync.py
+    python benchmarks/bench_sync.py --sizes 1000,10000 --latency-ms 40 --bandwidth-kbps 2048
+    python benchmarks/bench_sync.py --json result.json
+    python benchmarks/bench_sync.py --baseline result.json --tolerance 0.25   # 比基线慢 25% 以上时退出码为 1
+"""
+
+import argparse
+import errno
+import heapq
+import io
+import json
+import os
+import random
+import shlex
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import paramiko
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from backup_store import iter_chunks
+from storage import StorageManager
+from sync_engine import PHASES
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+# incremental_upload: 远端与本地一致后本地新增少量草稿再上传合并（增量上传的典型场景）
+OPERATIONS = ("force_push", "upload_merge", "download_merge", "incremental_upload")
+INCREMENTAL_NEW_ROWS = 10
+BENCH_USER = "bench"
+BENCH_PASSWORD = "bench"
+# 分块吞吐测试的数据量（随机字节，相当于不可压缩的数据库页）
+CHUNK_BENCH_BYTES = 8 * 1024 * 1024
+
+
+# --- 进程内 SFTP 服务器 ---
+
+class _BenchServer(paramiko.ServerInterface):
+    def __init__(self, root):
+        self.root = root
+
+    def check_auth_password(self, username, password):
+        if username == BENCH_USER and password == BENCH_PASSWORD:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        """只执行 python3 命令（增量上传助手），参数中的远端绝对路径映射到 root 下"""
+        try:
+            argv = shlex.split(command.decode("utf-8"))
+        except ValueError:
+            return False
+        if len(argv) < 3 or argv[:2] != ["python3", "-c"]:
+            return False
+        args = [os.path.join(self.root, a.lstrip("/")) if a.startswith("/") else a for a in argv[3:]]
+        argv = [sys.executable, "-c", argv[2]] + args
+        threading.Thread(target=self._run_exec, args=(channel, argv), daemon=True).start()
+        return True
+
+    @staticmethod
+    def _run_exec(channel, argv):
+        try:
+            proc = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            channel.sendall_stderr(str(e).encode("utf-8"))
+            channel.send_exit_status(127)
+            channel.close()
+            return
+
+        def _feed():
+            try:
+                while True:
+                    data = channel.recv(65536)
+                    if not data:
+                        break
+                    proc.stdin.write(data)
+            except OSError:
+                pass
+            finally:
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+
+        feeder = threading.Thread(target=_feed, daemon=True)
+        feeder.start()
+        out = proc.stdout.read()
+        err = proc.stderr.read()
+        status = proc.wait()
+        feeder.join(1)
+        try:
+            channel.sendall(out)
+            channel.sendall_stderr(err)
+            channel.send_exit_status(status)
+        finally:
+            channel.close()
+
+
+class _SFTPHandle(paramiko.SFTPHandle):
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        return paramiko.SFTP_OK
+
+
+class _DirSFTPServer(paramiko.SFTPServerInterface):
+    """把 SFTP 路径映射到本地目录 root 下"""
+
+    root = None
+
+    def _local(self, path):
+        return os.path.join(self.root, self.canonicalize(path).lstrip("/"))
+
+    def canonicalize(self, path):
+        return os.path.normpath("/" + path.replace("\\", "/")).replace("\\", "/")
+
+    def list_folder(self, path):
+        local = self._local(path)
+        try:
+            out = []
+            for name in os.listdir(local):
+                attr = paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(local, name)))
+                attr.filename = name
+                out.append(attr)
+            return out
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        local = self._local(path)
+        try:
+            fd = os.open(local, flags | getattr(os, "O_BINARY", 0), 0o644)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+        try:
+            f = os.fdopen(fd, mode)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        handle = _SFTPHandle(flags)
+        handle.filename = local
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self._local(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        new = self._local(newpath)
+        if os.path.exists(new):
+            return paramiko.SFTPServer.convert_errno(errno.EEXIST)
+        try:
+            os.rename(self._local(oldpath), new)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        try:
+            os.replace(self._local(oldpath), self._local(newpath))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._local(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def chattr(self, path, attr):
+        return paramiko.SFTP_OK
+
+
+# --- 链路模拟（延迟 + 带宽） ---
+
+class _Pipe(threading.Thread):
+    """单向转发：数据按带宽串行“发送”，再经过固定单程延迟后送达，可流水线"""
+
+    def __init__(self, src, dst, latency, bytes_per_sec):
+        super().__init__(daemon=True)
+        self.src = src
+        self.dst = dst
+        self.latency = latency
+        self.bytes_per_sec = bytes_per_sec
+        self.bytes = 0
+        self._queue = []
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._closed = False
+
+    def run(self):
+        sender = threading.Thread(target=self._deliver, daemon=True)
+        sender.start()
+        link_free = time.monotonic()
+        try:
+            while True:
+                data = self.src.recv(65536)
+                if not data:
+                    break
+                now = time.monotonic()
+                start = max(now, link_free)
+                link_free = start + (len(data) / self.bytes_per_sec if self.bytes_per_sec else 0)
+                with self._cond:
+                    self._seq += 1
+                    heapq.heappush(self._queue, (link_free + self.latency, self._seq, data))
+                    self._cond.notify()
+        except OSError:
+            pass
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        sender.join()
+        try:
+            self.dst.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    def _deliver(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                due, _, data = self._queue[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._queue)
+            try:
+                self.dst.sendall(data)
+                self.bytes += len(data)
+            except OSError:
+                return
+
+
+class ShapedLink:
+    """TCP 转发：客户端连接 port，流量经延迟/带宽模拟后转发到 target_port"""
+
+    def __init__(self, target_port, latency_ms=0, bandwidth_kbps=0):
+        self.target_port = target_port
+        self.latency = latency_ms / 1000.0
+        self.bytes_per_sec = bandwidth_kbps * 1024
+        self.pipes = []
+        self._listener = socket.socket()
+        self._listener.bind(("127.0.0.1", 0))
+        self._listener.listen(8)
+        self.port = self._listener.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            upstream = socket.create_connection(("127.0.0.1", self.target_port))
+            for s in (client, upstream):
+                s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            up = _Pipe(client, upstream, self.latency, self.bytes_per_sec)
+            down = _Pipe(upstream, client, self.latency, self.bytes_per_sec)
+            self.pipes += [up, down]
+            up.start()
+            down.start()
+
+    def close(self):
+        try:
+            self._listener.close()
+        except OSError:
+            pass
+
+
+class BenchSFTPServer:
+    """在回环地址监听的 SFTP 服务器，每个连接一个 Transport"""
+
+    def __init__(self, root):
+        self.root = root
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self._listener = socket.socket()
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(("127.0.0.1", 0))
+        self._listener.listen(8)
+        self.port = self._listener.getsockname()[1]
+        self._transports = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        handler = type("_RootedSFTPServer", (_DirSFTPServer,), {"root": self.root})
+        while True:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+            # 与 OpenSSH 服务端一致关闭 Nagle，否则小包往返会叠加 40ms 延迟确认
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            t = paramiko.Transport(conn)
+            t.add_server_key(self.host_key)
+            t.set_subsystem_handler("sftp", paramiko.SFTPServer, handler)
+            t.start_server(server=_BenchServer(self.root))
+            self._transports.append(t)
+
+    def close(self):
+        try:
+            self._listener.close()
+        except OSError:
+            pass
+        for t in self._transports:
+            t.close()
+
+
+# --- 数据准备 ---
+
+class BenchStorage(StorageManager):
+    """数据目录与 SSH 目标都指向基准环境的 StorageManager"""
+
+    def __init__(self, base_path, port):
+        self._bench_base = base_path
+        self._bench_port = port
+        super().__init__()
+
+    def get_real_executable_path(self):
+        return self._bench_base
+
+    def _get_ssh_client(self, ip_input):
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        ssh.connect("127.0.0.1", port=self._bench_port, username=BENCH_USER, password=BENCH_PASSWORD,
+                    timeout=10, allow_agent=False, look_for_keys=False)
+        ssh.get_transport().sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return ssh
+
+
+def populate(db, rows, tag, overlap=0.5):
+    """写入 rows 条草稿（约 1/10 数量的笔记），前 overlap 比例与其它端相同以触发合并去重"""
+    now = datetime.now()
+    shared = int(rows * overlap)
+    drafts = []
+    for i in range(rows):
+        key = f"shared-{i}" if i < shared else f"{tag}-{i}"
+        ts = (now - timedelta(seconds=rows - i)).strftime("%Y-%m-%d %H:%M:%S")
+        drafts.append((f"draft {key} " + "lorem ipsum " * 20, ts, ts))
+    notes = []
+    for i in range(rows // 10):
+        ts = now.strftime("%Y-%m-%d %H:%M:%S")
+        notes.append((str(uuid.uuid4()), None, f"note {tag} {i}", "content " * 50, 0, ts, None))
+    with db.lock:
+        db.cursor.executemany(
+            'INSERT INTO drafts (content, created_at, last_updated_at) VALUES (?, ?, ?)', drafts)
+        db.cursor.executemany(
+            'INSERT INTO notes (uuid, folder_uuid, title, content, is_deleted, updated_at, source_draft_id) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', notes)
+        db.conn.commit()
+
+
+class PhaseRecorder:
+    """通过 on_progress 回调记录各阶段耗时与传输字节数"""
+
+    def __init__(self):
+        self.marks = []
+        self.bytes = {}
+
+    def __call__(self, phase, done, total):
+        now = time.perf_counter()
+        if not self.marks or self.marks[-1][0] != phase:
+            self.marks.append((phase, now))
+        self.bytes[phase] = max(self.bytes.get(phase, 0), done)
+
+    def result(self, end):
+        times = {}
+        for i, (phase, start) in enumerate(self.marks):
+            stop = self.marks[i + 1][1] if i + 1 < len(self.marks) else end
+            times[phase] = times.get(phase, 0.0) + stop - start
+        return times
+
+
+def run_case(rows, op, latency_ms, bandwidth_kbps, work_dir):
+    """准备远端与本地数据库，执行一次同步操作，返回结果字典"""
+    remote_dir = os.path.join(work_dir, "remote")
+    local_dir = os.path.join(work_dir, "local")
+    seed_dir = os.path.join(work_dir, "seed")
+    for d in (remote_dir, local_dir, seed_dir):
+        os.makedirs(d, exist_ok=True)
+
+    server = BenchSFTPServer(remote_dir)
+    link = ShapedLink(server.port, latency_ms, bandwidth_kbps)
+    try:
+        local = BenchStorage(local_dir, link.port)
+        populate(local, rows, "local")
+
+        if op == "incremental_upload":
+            # 远端即上次同步后的本地库，随后本地新增少量草稿
+            with local.lock:
+                local.conn.commit()
+            shutil.copy(local.db_path, os.path.join(remote_dir, "safedraft.db"))
+            for i in range(INCREMENTAL_NEW_ROWS):
+                local.save_content_forced(f"new draft {i} " + "lorem ipsum " * 20)
+        else:
+            # 远端预置数据库：合并操作需要合并对象，强制推送需要备份对象
+            seed = BenchStorage(seed_dir, link.port)
+            populate(seed, rows, "remote")
+            seed.close()
+            shutil.copy(os.path.join(seed_dir, "safedraft.db"), os.path.join(remote_dir, "safedraft.db"))
+        local_size = os.path.getsize(local.db_path)
+
+        recorder = PhaseRecorder()
+        method = {
+            "force_push": local.force_push_overwrite,
+            "upload_merge": local.sync_upload_merge,
+            "download_merge": local.sync_download_merge,
+            "incremental_upload": local.sync_upload_merge,
+        }[op]
+
+        start = time.perf_counter()
+        method(f"{BENCH_USER}@127.0.0.1", "/", on_progress=recorder)
+        end = time.perf_counter()
+        local.close()
+
+        wire_up = sum(p.bytes for p in link.pipes[0::2])
+        wire_down = sum(p.bytes for p in link.pipes[1::2])
+        return {
+            "rows": rows,
+            "op": op,
+            "total_s": end - start,
+            "phases_s": recorder.result(end),
+            "db_bytes": local_size,
+            "bytes_down": recorder.bytes.get("fetch", 0) + recorder.bytes.get("backup", 0),
+            "bytes_up": recorder.bytes.get("upload", 0),
+            "wire_up": wire_up,
+            "wire_down": wire_down,
+        }
+    finally:
+        link.close()
+        server.close()
+
+
+def run(sizes=DEFAULT_SIZES, ops=OPERATIONS, latency_ms=0, bandwidth_kbps=0, repeat=1):
+    results = []
+    for rows in sizes:
+        for op in ops:
+            best = None
+            for _ in range(repeat):
+                work_dir = tempfile.mkdtemp(prefix="safedraft_bench_")
+                try:
+                    r = run_case(rows, op, latency_ms, bandwidth_kbps, work_dir)
+                finally:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+                if best is None or r["total_s"] < best["total_s"]:
+                    best = r
+            results.append(best)
+    return results
+
+
+def chunk_throughput(size=CHUNK_BENCH_BYTES, repeat=1):
+    """backup_store.iter_chunks 的分块吞吐（MB/s），取最快一次"""
+    data = random.Random(0).randbytes(size)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in iter_chunks(io.BytesIO(data)):
+            pass
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return size / (1024 * 1024) / best
+
+
+def _fmt_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024.0
+
+
+def print_report(results, file=sys.stdout):
+    header = f"{'rows':>7} {'op':<18} {'total':>8} " + " ".join(f"{p:>8}" for p in PHASES) + \
+             f" {'down':>9} {'up':>9} {'wire':>9}"
+    print(header, file=file)
+    print("-" * len(header), file=file)
+    for r in results:
+        phases = " ".join(f"{r['phases_s'].get(p, 0):8.3f}" for p in PHASES)
+        wire = _fmt_bytes(r["wire_up"] + r["wire_down"])
+        print(f"{r['rows']:>7} {r['op']:<18} {r['total_s']:8.3f} {phases} "
+              f"{_fmt_bytes(r['bytes_down']):>9} {_fmt_bytes(r['bytes_up']):>9} {wire:>9}", file=file)
+
+
+def compare(results, baseline, tolerance):
+    """与基线对比，返回变慢超过 tolerance 的 (rows, op, 基线耗时, 当前耗时) 列表"""
+    base = {(r["rows"], r["op"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        b = base.get((r["rows"], r["op"]))
+        if b and r["total_s"] > b["total_s"] * (1 + tolerance):
+            regressions.append((r["rows"], r["op"], b["total_s"], r["total_s"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SafeDraft 同步基准测试")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="行数列表，逗号分隔")
+    parser.add_argument("--ops", default=",".join(OPERATIONS), help="操作列表，逗号分隔")
+    parser.add_argument("--latency-ms", type=float, default=0, help="单程延迟（毫秒）")
+    parser.add_argument("--bandwidth-kbps", type=float, default=0, help="单向带宽（KB/s），0 表示不限")
+    parser.add_argument("--repeat", type=int, default=1, help="每组重复次数，取最快一次")
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与此前 --json 输出的基线对比")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许比基线慢的比例")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    ops = [o.strip() for o in args.ops.split(",") if o.strip()]
+    for o in ops:
+        if o not in OPERATIONS:
+            parser.error(f"未知操作: {o}")
+
+    print(f"latency={args.latency_ms}ms bandwidth={args.bandwidth_kbps or '不限'}KB/s repeat={args.repeat}")
+    results = run(sizes, ops, args.latency_ms, args.bandwidth_kbps, max(1, args.repeat))
+    print_report(results)
+    chunk_mb_s = chunk_throughput(repeat=max(1, args.repeat))
+    print(f"分块吞吐: {chunk_mb_s:.1f} MB/s（{_fmt_bytes(CHUNK_BENCH_BYTES)} 随机数据）")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"latency_ms": args.latency_ms, "bandwidth_kbps": args.bandwidth_kbps,
+                       "chunk_mb_s": chunk_mb_s, "results": results}, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for rows, op, before, after in regressions:
+            print(f"[回归] {rows} 行 {op}: {before:.3f}s -> {after:.3f}s")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
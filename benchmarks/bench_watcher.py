@@ -0,0 +1,115 @@
+"""
+前台窗口监听基准测试
+回放一段焦点切换轨迹，分别用事件后端（ScriptedBackend 模拟系统焦点事件）和轮询后端驱动
+WindowWatcher，统计从焦点切换到触发回调的延迟。无需桌面环境，可在 Linux CI 上运行。
+
+轨迹文件为 JSON 列表，每项 {"delay": 秒, "title": ..., "process": ..., "self": false}。
+
+用法:
+    python benchmarks/bench_watcher.py
+    python benchmarks/bench_watcher.py --trace trace.json --poll-interval 1.0
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from watcher import WindowWatcher
+from watcher_backends import ForegroundInfo, PollingBackend, ScriptedBackend
+
+RULES = {'title': ['chatgpt'], 'process': ['wechat']}
+
+
+class _Rules:
+    """只提供 WindowWatcher 需要的规则与设置接口"""
+
+    def get_enabled_rules(self):
+        return {k: list(v) for k, v in RULES.items()}
+
+    def get_setting(self, key, default=None):
+        return default
+
+
+def default_trace(switches=10, delay=0.3):
+    """在命中规则的窗口与无关窗口之间交替切换"""
+    trace = []
+    targets = [("chatgpt - chrome", "chrome.exe"), ("聊天", "wechat.exe")]
+    for i in range(switches):
+        title, proc = targets[i % 2]
+        trace.append((delay, ForegroundInfo(title, proc, False)))
+        trace.append((delay, ForegroundInfo("desktop", "explorer.exe", False)))
+    return trace
+
+
+def load_trace(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    return [(float(it.get("delay", 0)),
+             ForegroundInfo(it.get("title", "").lower(), it.get("process", "").lower(), bool(it.get("self"))))
+            for it in items]
+
+
+def _latencies(switch_times, fired_times):
+    """每次触发对应其之前最近的一次焦点切换"""
+    result = []
+    for fired in fired_times:
+        before = [t for t in switch_times if t <= fired]
+        if before:
+            result.append(fired - before[-1])
+    return result
+
+
+def replay(trace, mode="event", poll_interval=1.0):
+    fired = []
+    watcher = WindowWatcher(_Rules(), lambda rule_type, value: fired.append(time.perf_counter()))
+
+    if mode == "event":
+        backend = ScriptedBackend(trace)
+        watcher.backend = backend
+        watcher.start()
+        backend.done.wait()
+        switch_times = [t for t, _ in backend.emitted]
+    else:
+        current = [ForegroundInfo("", "", False)]
+        switch_times = []
+        watcher.backend = PollingBackend(interval=poll_interval, query=lambda: current[0])
+        watcher.start()
+        for delay, info in trace:
+            time.sleep(delay)
+            current[0] = info
+            switch_times.append(time.perf_counter())
+        time.sleep(poll_interval)  # 等最后一次轮询
+    watcher.stop()
+
+    lat = sorted(_latencies(switch_times, fired))
+    return {
+        "mode": mode,
+        "switches": len(trace),
+        "triggers": len(fired),
+        "p50_ms": round(lat[len(lat) // 2] * 1000, 3) if lat else None,
+        "max_ms": round(lat[-1] * 1000, 3) if lat else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SafeDraft 前台窗口监听基准测试")
+    parser.add_argument("--trace", default=None, help="焦点切换轨迹 JSON 文件")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="轮询后端间隔（秒）")
+    args = parser.parse_args(argv)
+
+    trace = load_trace(args.trace) if args.trace else default_trace()
+    for mode in ("event", "polling"):
+        r = replay(trace, mode, args.poll_interval)
+        print(f"{r['mode']:<8} 切换 {r['switches']:>3} 次  触发 {r['triggers']:>3} 次  "
+              f"延迟 p50 {r['p50_ms']} ms  max {r['max_ms']} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,145 @@
+"""
+大文档分块加载
+几 MB 的文本一次性 insert 到 wrap="word"、undo=True 的 Text 中会让界面卡住数秒。
+超过 LARGE_DOC_CHARS 的文本改为：
+- 加载期间关闭自动换行与撤销记录，控件设为只读，避免与用户输入交错
+- 先插入首屏 FIRST_CHUNK_CHARS 并立即刷新显示，其余按 CHUNK_CHARS 在 Tk 空闲时逐块插入，块之间处理界面事件
+- 全部插入后恢复原有选项并清空撤销栈（加载过程不可撤销，旧的撤销记录位置已失效）
+stats 记录首屏显示耗时（first_paint）、总耗时与块数，供 benchmarks/bench_load.py 使用。
+"""
+
+import time
+
+LARGE_DOC_CHARS = 512 * 1024
+FIRST_CHUNK_CHARS = 32 * 1024
+CHUNK_CHARS = 256 * 1024
+# 加载期间临时修改的选项
+_BULK_OPTIONS = {"wrap": "none", "undo": False, "state": "disabled"}
+_MARK = "bulk_load"
+
+
+def is_large(text):
+    return len(text) > LARGE_DOC_CHARS
+
+
+def iter_chunks(text, first=FIRST_CHUNK_CHARS, size=CHUNK_CHARS):
+    """按块切分文本，尽量在换行处断开（整行插入时 Tk 的行索引更新最省）"""
+    start, limit = 0, first
+    while start < len(text):
+        end = start + limit
+        if end < len(text):
+            cut = text.rfind("\n", start, end)
+            if cut >= 0:
+                end = cut + 1
+        yield text[start:end]
+        start, limit = end, size
+
+
+class BulkLoader:
+    def __init__(self, widget, text, index="1.0", replace=True, on_done=None, clock=time.perf_counter):
+        """
+        widget: tk.Text
+        index: 插入位置；replace=True 时先清空控件并从开头插入
+        on_done: 全部插入并恢复选项后在 Tk 线程调用（cancel() 后不调用）
+        """
+        self.widget = widget
+        self.text = text
+        self.index = index
+        self.replace = replace
+        self.on_done = on_done
+        self.clock = clock
+        self.stats = {"chars": len(text), "chunks": 0, "first_paint": None, "total": None}
+        self._chunks = None
+        self._saved = None
+        self._after_id = None
+        self._start = None
+
+    @property
+    def active(self):
+        return self._chunks is not None
+
+    def start(self):
+        self._start = self.clock()
+        self._saved = {opt: self.widget.cget(opt) for opt in _BULK_OPTIONS}
+        self.widget.config(**_BULK_OPTIONS)
+        self._chunks = iter_chunks(self.text)
+        self._write(self._begin)
+        self.widget.see(_MARK)
+        # 立即刷新显示，首屏内容不用等后续分块
+        self.widget.update_idletasks()
+        self.stats["first_paint"] = self.clock() - self._start
+        self._schedule()
+
+    def cancel(self):
+        """停止加载（已插入的部分保留），恢复控件选项"""
+        if not self.active:
+            return
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        self._restore()
+
+    def _begin(self):
+        if self.replace:
+            self.widget.delete("1.0", "end")
+            self.index = "1.0"
+        self.widget.mark_set(_MARK, self.index)
+        self.widget.mark_gravity(_MARK, "right")
+        return self._insert_next()
+
+    def _write(self, func):
+        # 控件在加载期间只读，写入时临时打开
+        self.widget.config(state="normal")
+        try:
+            return func()
+        finally:
+            self.widget.config(state="disabled")
+
+    def _insert_next(self):
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        self.widget.insert(_MARK, chunk)
+        self.stats["chunks"] += 1
+        return True
+
+    def _schedule(self):
+        # after_idle 中登记的空闲任务要到下一轮空闲才执行，期间会先处理界面事件
+        self._after_id = self.widget.after_idle(self._step)
+
+    def _step(self):
+        self._after_id = None
+        if self._write(self._insert_next):
+            self._schedule()
+            return
+        self._restore()
+        self.widget.edit_reset()
+        self.stats["total"] = self.clock() - self._start
+        if self.on_done:
+            self.on_done()
+
+    def _restore(self):
+        self._chunks = None
+        self.widget.mark_unset(_MARK)
+        self.widget.config(**self._saved)
+
+
+def load_text(widget, text, on_done=None):
+    """
+    用 text 替换控件内容（只读控件也可）。小文本直接插入并同步调用 on_done，返回 None；
+    大文本分块加载，返回 BulkLoader，加载完成后调用 on_done。
+    """
+    if is_large(text):
+        loader = BulkLoader(widget, text, on_done=on_done)
+        loader.start()
+        return loader
+    disabled = str(widget.cget("state")) == "disabled"
+    if disabled:
+        widget.config(state="normal")
+    widget.delete("1.0", "end")
+    widget.insert("1.0", text)
+    if disabled:
+        widget.config(state="disabled")
+    if on_done:
+        on_done()
+    return None
@@ -0,0 +1,323 @@
+"""
+块级增量上传（rsync 风格）
+远端保存 safedraft.db 的块签名（弱校验 adler32 + 强校验 md5），客户端用滚动校验和在本地快照中
+查找与远端相同的块，只发送“复制第 i 块”指令与未匹配的原始字节；远端由经 SSH exec 运行的
+小助手（HELPER_SOURCE，仅依赖 python3 标准库）重建文件、校验 MD5 后原子替换。
+上传量与改动大小成正比，而不是与数据库大小成正比。
+
+数据格式（整数均为大端）：
+  签名: b"SDSIG1" | block_size u32 | file_size u64 | mtime_ns u64 | file_md5 16B | 每个完整块 (adler32 u32, md5 16B)
+  增量: b"SDDELTA1" | block_size u32 | basis_md5 16B | target_size u64 | target_md5 16B
+        之后为指令序列: b"C" start u32 count u32 | b"L" len u32 数据 | b"E"
+"""
+
+import hashlib
+import shlex
+import struct
+import zlib
+
+SIG_MAGIC = b"SDSIG1"
+SIG_HEADER = struct.Struct(">6sIQQ16s")
+SIG_ENTRY = struct.Struct(">I16s")
+DELTA_MAGIC = b"SDDELTA1"
+DELTA_HEADER = struct.Struct(">8sI16sQ16s")
+
+# SQLite 默认页大小，页内修改不会移动其它页，块与页对齐时匹配率最高
+DEFAULT_BLOCK_SIZE = 4096
+# 签名条目数上限，超过时放大块大小（保持签名在约 1MB 以内）
+MAX_SIG_BLOCKS = 1 << 16
+# 单条原始数据指令的最大长度
+MAX_LITERAL = 1024 * 1024
+# 逐字节滚动查找的总字节预算：SQLite 的修改都是页对齐的，对齐位置即可命中；
+# 预算用于处理少量错位插入，用完后只在块边界上查找，避免纯 Python 逐字节扫描整个大文件
+ROLL_BUDGET = 1024 * 1024
+
+_ADLER_MOD = 65521
+
+
+def choose_block_size(size):
+    block = DEFAULT_BLOCK_SIZE
+    while size // block > MAX_SIG_BLOCKS:
+        block *= 2
+    return block
+
+
+# --- 签名 ---
+
+def compute_signature(data, block_size, mtime_ns=0):
+    """计算 data（bytes）的签名，返回签名 bytes"""
+    view = memoryview(data)
+    out = [SIG_HEADER.pack(SIG_MAGIC, block_size, len(data), mtime_ns, hashlib.md5(view).digest())]
+    for off in range(0, len(data) - block_size + 1, block_size):
+        block = view[off:off + block_size]
+        out.append(SIG_ENTRY.pack(zlib.adler32(block), hashlib.md5(block).digest()))
+    return b"".join(out)
+
+
+def parse_signature(sig):
+    """返回 (block_size, file_size, file_md5, {adler32: [(md5, index), ...]})"""
+    magic, block_size, file_size, _, file_md5 = SIG_HEADER.unpack_from(sig, 0)
+    if magic != SIG_MAGIC:
+        raise ValueError("签名格式错误")
+    table = {}
+    off = SIG_HEADER.size
+    idx = 0
+    while off + SIG_ENTRY.size <= len(sig):
+        weak, strong = SIG_ENTRY.unpack_from(sig, off)
+        table.setdefault(weak, []).append((strong, idx))
+        off += SIG_ENTRY.size
+        idx += 1
+    return block_size, file_size, file_md5, table
+
+
+# --- 增量 ---
+
+class DeltaStats:
+    def __init__(self):
+        self.copied_blocks = 0
+        self.literal_bytes = 0
+        self.delta_bytes = 0
+
+    def __repr__(self):
+        return (f"DeltaStats(copied_blocks={self.copied_blocks}, literal_bytes={self.literal_bytes}, "
+                f"delta_bytes={self.delta_bytes})")
+
+
+def compute_delta(data, sig):
+    """对照远端签名，为目标 data（bytes）生成增量流，返回 (delta bytes, DeltaStats)"""
+    block_size, _, basis_md5, table = parse_signature(sig)
+    view = memoryview(data)
+    n = len(data)
+    out = [DELTA_HEADER.pack(DELTA_MAGIC, block_size, basis_md5, n, hashlib.md5(view).digest())]
+    stats = DeltaStats()
+    pending = [None, 0]  # 待合并的连续复制 [起始块, 块数]
+
+    def flush_copy():
+        if pending[1]:
+            out.append(b"C" + struct.pack(">II", pending[0], pending[1]))
+            stats.copied_blocks += pending[1]
+            pending[1] = 0
+
+    def emit_literal(start, end):
+        if end <= start:
+            return
+        flush_copy()
+        for off in range(start, end, MAX_LITERAL):
+            chunk = view[off:min(end, off + MAX_LITERAL)]
+            out.append(b"L" + struct.pack(">I", len(chunk)))
+            out.append(bytes(chunk))
+        stats.literal_bytes += end - start
+
+    i = 0
+    lit_start = 0
+    rolled = 0
+    weak = None
+    a = b = 0
+    while i + block_size <= n:
+        if weak is None:
+            weak = zlib.adler32(view[i:i + block_size])
+            a, b = weak & 0xffff, weak >> 16
+        cands = table.get(weak)
+        if cands:
+            strong = hashlib.md5(view[i:i + block_size]).digest()
+            match = next((idx for s, idx in cands if s == strong), None)
+            if match is not None:
+                emit_literal(lit_start, i)
+                if pending[1] and pending[0] + pending[1] == match:
+                    pending[1] += 1
+                else:
+                    flush_copy()
+                    pending[0], pending[1] = match, 1
+                i += block_size
+                lit_start = i
+                weak = None
+                continue
+
+        if rolled < ROLL_BUDGET and i + block_size < n:
+            # 滚动 adler32：移出 data[i]，移入 data[i + block_size]
+            out_byte = data[i]
+            in_byte = data[i + block_size]
+            a = (a - out_byte + in_byte) % _ADLER_MOD
+            b = (b - block_size * out_byte + a - 1) % _ADLER_MOD
+            weak = (b << 16) | a
+            i += 1
+            rolled += 1
+        else:
+            i += block_size
+            weak = None
+
+    emit_literal(lit_start, n)
+    flush_copy()
+    out.append(b"E")
+    delta = b"".join(out)
+    stats.delta_bytes = len(delta)
+    return delta, stats
+
+
+# --- 远端助手 ---
+
+# 在远端以 python3 -c 运行，只依赖标准库。
+#   sig <path> <block_size>                         输出签名（按 size + mtime 缓存在 <path>.sig）
+#   apply <basis> <tmp> <final> <sig_block_size>    从 stdin 读取增量，重建到 tmp，校验后替换 final 并刷新签名缓存
+#   md5 <path> <length>                             输出文件前 length 字节的 MD5（hex），供整文件续传校验
+HELPER_SOURCE = r'''
+import hashlib, os, struct, sys, zlib
+SIG_HEADER = struct.Struct(">6sIQQ16s")
+SIG_ENTRY = struct.Struct(">I16s")
+DELTA_HEADER = struct.Struct(">8sI16sQ16s")
+
+def md5_file(path):
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.digest()
+
+def md5_prefix(path, length):
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        while length > 0:
+            chunk = f.read(min(1 << 20, length))
+            if not chunk:
+                raise IOError("file shorter than length")
+            h.update(chunk)
+            length -= len(chunk)
+    return h.hexdigest()
+
+def build_sig(path, bs):
+    st = os.stat(path)
+    h = hashlib.md5()
+    entries = []
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(bs)
+            if not block:
+                break
+            h.update(block)
+            if len(block) == bs:
+                entries.append(SIG_ENTRY.pack(zlib.adler32(block), hashlib.md5(block).digest()))
+    return SIG_HEADER.pack(b"SDSIG1", bs, st.st_size, st.st_mtime_ns, h.digest()) + b"".join(entries)
+
+def cached_sig(path, bs):
+    st = os.stat(path)
+    try:
+        with open(path + ".sig", "rb") as f:
+            sig = f.read()
+        magic, cbs, size, mtime, _ = SIG_HEADER.unpack_from(sig, 0)
+        if magic == b"SDSIG1" and cbs == bs and size == st.st_size and mtime == st.st_mtime_ns:
+            return sig
+    except (OSError, struct.error):
+        pass
+    sig = build_sig(path, bs)
+    write_sig(path, sig)
+    return sig
+
+def write_sig(path, sig):
+    try:
+        with open(path + ".sig.tmp", "wb") as f:
+            f.write(sig)
+        os.replace(path + ".sig.tmp", path + ".sig")
+    except OSError:
+        pass
+
+def read_exact(stream, n):
+    data = stream.read(n)
+    if len(data) != n:
+        raise IOError("delta stream truncated")
+    return data
+
+def apply(basis, tmp, final, sig_bs):
+    inp = sys.stdin.buffer
+    magic, bs, basis_md5, size, target_md5 = DELTA_HEADER.unpack(read_exact(inp, DELTA_HEADER.size))
+    if magic != b"SDDELTA1":
+        raise IOError("bad delta header")
+    if md5_file(basis) != basis_md5:
+        raise IOError("basis changed")
+    h = hashlib.md5()
+    written = 0
+    try:
+        with open(basis, "rb") as src, open(tmp, "wb") as dst:
+            while True:
+                op = read_exact(inp, 1)
+                if op == b"E":
+                    break
+                if op == b"C":
+                    start, count = struct.unpack(">II", read_exact(inp, 8))
+                    src.seek(start * bs)
+                    for _ in range(count):
+                        block = src.read(bs)
+                        if len(block) != bs:
+                            raise IOError("copy beyond basis")
+                        dst.write(block)
+                        h.update(block)
+                        written += bs
+                elif op == b"L":
+                    (length,) = struct.unpack(">I", read_exact(inp, 4))
+                    data = read_exact(inp, length)
+                    dst.write(data)
+                    h.update(data)
+                    written += length
+                else:
+                    raise IOError("bad op")
+            dst.flush()
+            os.fsync(dst.fileno())
+        if written != size or h.digest() != target_md5:
+            raise IOError("result mismatch")
+        os.replace(tmp, final)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    write_sig(final, build_sig(final, sig_bs))
+    sys.stdout.write("OK %s\n" % h.hexdigest())
+
+def main():
+    cmd = sys.argv[1]
+    if cmd == "sig":
+        sys.stdout.buffer.write(cached_sig(sys.argv[2], int(sys.argv[3])))
+    elif cmd == "apply":
+        apply(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]))
+    elif cmd == "md5":
+        sys.stdout.write("OK %s\n" % md5_prefix(sys.argv[2], int(sys.argv[3])))
+    else:
+        raise SystemExit("unknown command")
+
+main()
+'''
+
+
+def helper_command(*args, python="python3"):
+    """生成在远端执行助手的 shell 命令"""
+    return " ".join([python, "-c", shlex.quote(HELPER_SOURCE)] + [shlex.quote(str(a)) for a in args])
+
+
+class DeltaUploadError(Exception):
+    """增量上传不可用或失败，调用方应回退为整文件上传"""
+    pass
+
+
+def fetch_signature(backend, remote_file, block_size):
+    """由远端助手返回 remote_file 的签名（远端有缓存时直接读取）"""
+    status, out, err = backend.exec_command(helper_command("sig", remote_file, block_size))
+    if status != 0 or not out.startswith(SIG_MAGIC):
+        raise DeltaUploadError(f"远端签名失败: {err.decode('utf-8', 'replace').strip()[-200:]}")
+    return out
+
+
+def remote_md5(backend, remote_file, length):
+    """由远端助手计算 remote_file 前 length 字节的 MD5（hex），不必把文件读回本地"""
+    status, out, err = backend.exec_command(helper_command("md5", remote_file, length))
+    if status != 0 or not out.startswith(b"OK"):
+        raise DeltaUploadError(f"远端校验失败: {err.decode('utf-8', 'replace').strip()[-200:]}")
+    return out.split()[1].decode("ascii")
+
+
+def apply_remote(backend, delta, remote_file, tmp_file, sig_block_size, callback=None):
+    """把增量流发送给远端助手，重建 tmp_file 后替换 remote_file，并以 sig_block_size 刷新签名缓存"""
+    cmd = helper_command("apply", remote_file, tmp_file, remote_file, sig_block_size)
+    status, out, err = backend.exec_command(cmd, stdin_data=delta, callback=callback)
+    if status != 0 or not out.startswith(b"OK"):
+        raise DeltaUploadError(f"远端重建失败: {err.decode('utf-8', 'replace').strip()[-200:]}")
+    return out.split()[1].decode("ascii")
@@ -0,0 +1,345 @@
+"""
+编辑日志：崩溃安全的追加写日志
+自动保存每 15 秒才写一次 drafts，期间的输入先以紧凑的编辑操作追加到每个编辑窗口自己的日志文件：
+- 编辑器直接提供编辑操作时用 record_edit() 原样记录 (位置, 删除长度, 插入文本)；
+  只有全文时 record() 与上一次内容做前后缀比较得到操作；操作都先写入进程内缓冲区
+- 首次写入后 FSYNC_DELAY 秒由共用调度器统一 flush + fsync，连续输入共享一次 fsync
+- 内容写入 drafts 后记一条基准（草稿 id + 全文，或只记草稿 id 与长度的引用）并截断日志；
+  超过 MAX_JOURNAL_BYTES 时压缩为一条全文快照
+每个日志有同名的 .lock 文件，日志打开期间以独占锁持有（进程退出或崩溃时系统自动释放）；
+下次启动时 recover_journals() 只回放能取得锁的日志（即已没有进程持有），把未写入 drafts 的内容补存。
+
+记录格式: crc32(4) | 长度(4) | 类型(1) | 负载，crc 覆盖类型与负载，末尾不完整或校验失败的记录被丢弃。
+  B 基准: 草稿 id(int64，-1 表示无) + 全文，内容已写入 drafts
+  R 引用: 草稿 id(int64) + 全文长度(uint64)，基准内容从 drafts 读取，长度不符时其后的编辑无法回放
+  S 快照: 同 B，但内容尚未写入 drafts（压缩或无法得到编辑操作时写入）
+  E 编辑: 位置(uint32) + 删除长度(uint32) + 插入文本
+"""
+
+import os
+import struct
+import threading
+import zlib
+
+from scheduler import get_scheduler
+from single_instance import lock_file, unlock_file
+
+JOURNAL_DIR = "journal"
+JOURNAL_SUFFIX = ".journal"
+LOCK_SUFFIX = ".lock"
+# 首次未落盘写入到 fsync 的最长时间（秒）
+FSYNC_DELAY = 0.5
+MAX_JOURNAL_BYTES = 512 * 1024
+
+_HEADER = struct.Struct("<II")
+_BASE = struct.Struct("<q")
+_EDIT = struct.Struct("<II")
+_REF = struct.Struct("<qQ")
+
+_counter = 0
+_counter_lock = threading.Lock()
+
+
+def _common_prefix(a, b):
+    """公共前缀长度；二分比较切片，由 C 层 memcmp 完成逐字符比较"""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix(a, b, limit):
+    lo, hi = 0, limit
+    la, lb = len(a), len(b)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[la - mid:la - lo] == b[lb - mid:lb - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def diff(old, new):
+    """返回把 old 变成 new 的单个替换操作 (位置, 删除长度, 插入文本)"""
+    prefix = _common_prefix(old, new)
+    suffix = _common_suffix(old, new, min(len(old), len(new)) - prefix)
+    return prefix, len(old) - prefix - suffix, new[prefix:len(new) - suffix]
+
+
+def _pack(kind, payload):
+    body = kind + payload
+    return _HEADER.pack(zlib.crc32(body), len(body)) + body
+
+
+def _base_record(draft_id, content, kind=b"B"):
+    return _pack(kind, _BASE.pack(-1 if draft_id is None else draft_id) + content.encode("utf-8"))
+
+
+def _snapshot_record(draft_id, content):
+    return _base_record(draft_id, content, b"S")
+
+
+def _ref_record(draft_id, length):
+    return _pack(b"R", _REF.pack(draft_id, length))
+
+
+def _edit_record(pos, deleted, text):
+    return _pack(b"E", _EDIT.pack(pos, deleted) + text.encode("utf-8"))
+
+
+def read_journal(path, load_draft=None):
+    """解析日志，返回 (draft_id, 内容, 基准之后的编辑数)；没有有效基准时返回 None。
+    load_draft(draft_id) 返回草稿当前内容，用于解析 R 引用基准"""
+    with open(path, "rb") as f:
+        data = f.read()
+    state = None
+    offset = 0
+    while offset + _HEADER.size <= len(data):
+        crc, length = _HEADER.unpack_from(data, offset)
+        body = data[offset + _HEADER.size:offset + _HEADER.size + length]
+        if length < 1 or len(body) < length or zlib.crc32(body) != crc:
+            break  # 崩溃时写了一半的尾部记录
+        offset += _HEADER.size + length
+        kind, payload = body[:1], body[1:]
+        if kind in (b"B", b"S"):
+            (draft_id,) = _BASE.unpack_from(payload)
+            # 快照代表未保存的内容，与编辑一样需要回放
+            edits = 0 if kind == b"B" else (state[2] if state else 0) + 1
+            state = [None if draft_id < 0 else draft_id, payload[_BASE.size:].decode("utf-8"), edits]
+        elif kind == b"R":
+            draft_id, length = _REF.unpack_from(payload)
+            content = load_draft(draft_id) if load_draft else None
+            state = [draft_id, content, 0] if content is not None and len(content) == length else None
+        elif kind == b"E" and state is not None:
+            pos, deleted = _EDIT.unpack_from(payload)
+            text = payload[_EDIT.size:].decode("utf-8")
+            content = state[1]
+            state[1] = content[:pos] + text + content[pos + deleted:]
+            state[2] += 1
+    return tuple(state) if state else None
+
+
+class EditJournal:
+    """单个编辑窗口的日志。record() / record_edit() 在 Tk 线程调用，fsync 在调度线程中进行"""
+
+    def __init__(self, base_path, scheduler=None, draft_id=None, content=""):
+        global _counter
+        with _counter_lock:
+            _counter += 1
+            seq = _counter
+        self.dir = os.path.join(base_path, JOURNAL_DIR)
+        os.makedirs(self.dir, exist_ok=True)
+        name = f"{os.getpid()}-{seq}"
+        self.path = os.path.join(self.dir, name + JOURNAL_SUFFIX)
+        # 先取得日志锁再写日志，recover_journals 不会回放仍在使用的日志
+        self._owner = _try_lock(os.path.join(self.dir, name + LOCK_SUFFIX))
+        self.scheduler = scheduler or get_scheduler()
+        self._job = ("journal.fsync", self.path)
+
+        self._lock = threading.Lock()       # 保护缓冲区写入与文件替换
+        self._sync_lock = threading.Lock()  # fsync 与文件替换互斥
+        self._file = None
+        self._size = 0
+        self._base_size = 0
+        self._sync_pending = False
+        self.draft_id = draft_id
+        self.content = content
+        self._rewrite(_base_record(draft_id, content))
+
+    def record(self, content, draft_id=None):
+        """记录编辑后的全文（只写入与上次内容的差异）"""
+        if draft_id != self.draft_id or self.content is None:
+            self.snapshot(draft_id, content)
+            return
+        if content == self.content:
+            return
+        pos, deleted, text = diff(self.content, content)
+        self.content = content
+        self._append(_edit_record(pos, deleted, text), lambda: content)
+
+    def record_edit(self, pos, deleted, text, draft_id, get_content):
+        """记录一次编辑操作；不维护全文，压缩日志时才通过 get_content() 取全文"""
+        if draft_id != self.draft_id:
+            self.snapshot(draft_id, get_content())
+            return
+        self.content = None
+        self._append(_edit_record(pos, deleted, text), get_content)
+
+    def snapshot(self, draft_id, content):
+        """追加一条未保存内容的全文快照（无法得到编辑操作时使用）"""
+        self.draft_id = draft_id
+        self.content = content
+        self._append(_snapshot_record(draft_id, content), lambda: content)
+
+    def _append(self, rec, get_content):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(rec)
+            self._size += len(rec)
+            # 大文档的快照本身可能超过上限，按快照大小放宽，避免每次编辑都重写全文
+            rotate = self._size > max(MAX_JOURNAL_BYTES, 2 * self._base_size)
+        if rotate:
+            # 日志过长：压缩为一条快照（内容仍未保存，回放时需要恢复）
+            content = get_content()
+            self.content = content
+            self._rewrite(_snapshot_record(self.draft_id, content))
+        else:
+            self._schedule_sync()
+
+    def commit(self, draft_id, content):
+        """内容已写入 drafts（或重新开始编辑）：以新的基准替换日志"""
+        self.draft_id = draft_id
+        self.content = content
+        self._rewrite(_base_record(draft_id, content))
+
+    def mark_saved(self, draft_id, length):
+        """内容已写入 drafts：以草稿引用替换日志，不重写全文"""
+        self.draft_id = draft_id
+        self.content = None
+        self._rewrite(_ref_record(draft_id, length))
+
+    def sync(self):
+        """把缓冲区写入磁盘并 fsync"""
+        with self._sync_lock:
+            with self._lock:
+                self._sync_pending = False
+                f = self._file
+                if f is None:
+                    return
+                f.flush()
+            try:
+                os.fsync(f.fileno())
+            except (OSError, ValueError):
+                pass
+
+    def close(self, remove=False):
+        """关闭日志；remove=True 表示内容已安全写入 drafts，删除日志文件"""
+        self.scheduler.cancel(self._job)
+        with self._sync_lock:
+            with self._lock:
+                f, self._file = self._file, None
+            if f is not None:
+                try:
+                    f.flush()
+                    if not remove:
+                        os.fsync(f.fileno())
+                finally:
+                    f.close()
+        if remove:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        self._release_owner()
+
+    def _release_owner(self):
+        owner, self._owner = self._owner, None
+        if owner is not None:
+            _release_lock(owner)
+
+    def _schedule_sync(self):
+        # 不替换已排定的 fsync，持续输入时最迟 FSYNC_DELAY 秒落盘一次
+        with self._lock:
+            if self._sync_pending:
+                return
+            self._sync_pending = True
+        self.scheduler.schedule(self._job, FSYNC_DELAY, self.sync)
+
+    def _rewrite(self, record):
+        """写临时文件后原子替换日志"""
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        with self._sync_lock:
+            with self._lock:
+                old = self._file
+                if old is not None:
+                    old.close()
+                os.replace(tmp, self.path)
+                self._file = open(self.path, "ab")
+                self._size = self._base_size = len(record)
+                self._sync_pending = False
+        self.scheduler.cancel(self._job)
+
+
+def _try_lock(lock_path):
+    """取得日志锁，返回打开的锁文件；已被持有或无法创建时返回 None"""
+    try:
+        f = open(lock_path, "a+b")
+    except OSError:
+        return None
+    try:
+        lock_file(f)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _release_lock(f):
+    """释放并删除日志锁文件"""
+    try:
+        unlock_file(f)
+    except OSError:
+        pass
+    f.close()
+    try:
+        os.remove(f.name)
+    except OSError:
+        pass
+
+
+def recover_journals(db):
+    """回放已没有进程持有的日志，把未写入 drafts 的内容补存，返回恢复的草稿数"""
+    journal_dir = os.path.join(db.base_path, JOURNAL_DIR)
+    if not os.path.isdir(journal_dir):
+        return 0
+    recovered = 0
+    for name in sorted(os.listdir(journal_dir)):
+        path = os.path.join(journal_dir, name)
+        for suffix in (JOURNAL_SUFFIX, JOURNAL_SUFFIX + ".tmp", LOCK_SUFFIX):
+            if name.endswith(suffix):
+                stem = name[:-len(suffix)]
+                break
+        else:
+            continue
+        # 仍被运行中的编辑窗口（本进程或其它进程）持有的日志不动
+        owner = _try_lock(os.path.join(journal_dir, stem + LOCK_SUFFIX))
+        if owner is None:
+            continue
+        try:
+            if suffix == JOURNAL_SUFFIX:
+                recovered += _replay(db, path)
+            elif suffix != LOCK_SUFFIX:
+                os.remove(path)  # 重写日志时遗留的临时文件
+        except:
+            pass
+        finally:
+            _release_lock(owner)
+    return recovered
+
+
+def _replay(db, path):
+    """回放一个日志并删除，返回恢复的草稿数（0 或 1）"""
+    recovered = 0
+    state = read_journal(path, db.get_draft_content)
+    if state:
+        draft_id, content, edits = state
+        if edits and content.strip():
+            existing = db.get_draft_content(draft_id) if draft_id is not None else None
+            if existing is None:
+                db.save_content(content, None)
+                recovered = 1
+            elif existing != content:
+                db.save_content(content, draft_id)
+                recovered = 1
+    os.remove(path)
+    return recovered
@@ -0,0 +1,105 @@
+"""
+列表搜索（历史归档、笔记列表）
+- 防抖：输入停止 SEARCH_DEBOUNCE 秒后才查询，连续输入只查最后一次
+- 查询在共用调度器的阻塞任务（独立线程）中读取数据库，新的请求使进行中的旧查询作废
+- 新关键词只是在上一次关键词后追加字符时，直接在上一次的完整结果中收窄，不再扫描数据库
+- 结果分批经 dispatch（root.after(0, ...)）回到 Tk 线程，列表边读取边显示
+"""
+
+import threading
+
+SEARCH_DEBOUNCE = 0.15
+SEARCH_SLACK = 0.05
+# 在内存中收窄时每批回传的行数
+NARROW_BATCH_ROWS = 500
+
+
+class ListSearcher:
+    def __init__(self, scheduler, name, fetch, match, on_batch, dispatch=None, delay=SEARCH_DEBOUNCE):
+        """
+        fetch(keyword): 在后台线程调用，返回分批的结果行（可迭代的行列表）
+        match(row, keyword): 行是否匹配关键词，用于在上一次结果中收窄，须与 fetch 的规则一致
+        on_batch(rows, first, done): 在 Tk 线程调用；first 表示新一轮结果的第一批（应先清空列表），
+                                     done 表示本轮结果已全部送达（rows 为空）
+        """
+        self.scheduler = scheduler
+        self.name = name
+        self.fetch = fetch
+        self.match = match
+        self.on_batch = on_batch
+        self.dispatch = dispatch or (lambda f: f())
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._cache = None  # 上一次完成的查询 (关键词, 全部结果)
+        self._last_keyword = None
+
+    def request(self, keyword, immediate=False):
+        """请求搜索；immediate=True 时不防抖（如数据变化后的刷新）"""
+        if not immediate and keyword == self._last_keyword:
+            return  # 关键词没变（如方向键），结果相同
+        self._last_keyword = keyword
+        with self._lock:
+            self._generation += 1
+            gen = self._generation
+        self.scheduler.schedule(self.name, 0 if immediate else self.delay,
+                                lambda: self._run(gen, keyword), slack=SEARCH_SLACK, blocking=True)
+
+    def reset(self):
+        """数据已变化，之后的查询不再使用缓存的结果"""
+        with self._lock:
+            self._cache = None
+        self._last_keyword = None
+
+    def cancel(self):
+        """取消排队中与进行中的查询"""
+        with self._lock:
+            self._generation += 1
+        self._last_keyword = None
+        self.scheduler.cancel(self.name)
+
+    def _current(self, gen):
+        return gen == self._generation
+
+    def _run(self, gen, keyword):
+        with self._lock:
+            if not self._current(gen):
+                return
+            cache = self._cache
+        if cache is not None and keyword.startswith(cache[0]):
+            rows = cache[1]
+            batches = (rows[i:i + NARROW_BATCH_ROWS] for i in range(0, len(rows), NARROW_BATCH_ROWS))
+            narrow = keyword != cache[0]
+        else:
+            batches = self.fetch(keyword)
+            narrow = False
+
+        found = []
+        first = True
+        try:
+            for batch in batches:
+                if not self._current(gen):
+                    return
+                if narrow:
+                    batch = [row for row in batch if self.match(row, keyword)]
+                if not batch:
+                    continue
+                found.extend(batch)
+                self._emit(gen, batch, first, False)
+                first = False
+        except:
+            return  # 数据库被替换等情况，放弃本次查询
+        with self._lock:
+            if not self._current(gen):
+                return
+            self._cache = (keyword, found)
+        self._emit(gen, [], first, True)
+
+    def _emit(self, gen, rows, first, done):
+        def _deliver():
+            if self._current(gen):
+                self.on_batch(rows, first, done)
+        try:
+            self.dispatch(_deliver)
+        except:
+            pass  # 窗口已关闭
@@ -1,20 +1,32 @@
+# 最先导入：以此时刻作为启动计时的起点
+from startup_trace import timeline
+import sys
+
+if __name__ == "__main__":
+    # 已有实例在运行时把命令转发过去后直接退出，不再导入 Tk、打开数据库
+    from single_instance import acquire_or_forward
+    with timeline.phase("single_instance"):
+        instance_guard = acquire_or_forward(sys.argv[1:])
+
 import tkinter as tk
 from tkinter import ttk, messagebox
 import threading
 import time
-import sys
 import os
-import psutil
-from pynput import keyboard
 
 # 项目内模块
+# 首屏之前只导入编辑器需要的模块；同步、托盘、窗口监视、全局热键与各子窗口在用到时或首屏显示后才导入
 from storage import StorageManager
-from watcher import WindowWatcher
-from utils import ThemeManager, StartupManager, get_icon_image, DEFAULT_FONT_SIZE, TextSearchBar
-from windows import HistoryWindow, SettingsDialog
-from notebook import NotebookWindow
-from sticky import StickyManagerWindow
-from autosync import AutoSyncManager
+from utils import ThemeManager, get_icon_image, get_icon_photo, DEFAULT_FONT_SIZE, TextSearchBar
+from scheduler import get_scheduler
+from journal import EditJournal, recover_journals
+from autosave import AutoSaver
+from text_tracker import TextChangeTracker
+from bulk_loader import BulkLoader, is_large
+from sync_backends import get_backend_name, is_config_complete
+from single_instance import CMD_NEW, CMD_NOTEBOOK, CMD_SHOW, command_from_argv
+
+timeline.add("imports", timeline.t0)
 
 import ctypes  # <--- 新增导入 1
 
@@ -27,6 +39,7 @@ class GlobalHotKeys:
 
     def start(self):
         if self.listener: return
+        from pynput import keyboard
         self.listener = keyboard.GlobalHotKeys({
             '<ctrl>+`': self.on_activate
         })
@@ -41,7 +54,19 @@ class GlobalHotKeys:
             self.listener = None
 
 
+# 自动置顶的时长（秒），以及允许推迟以合并唤醒的秒数
+AUTO_TOPMOST_SECONDS = 120
+AUTO_TOPMOST_SLACK = 5
+# 主窗口首屏显示后多久启动后台组件（毫秒）
+SERVICES_START_DELAY_MS = 200
+# 后台组件启动后多久写入启动计时记录（等托盘线程完成初始化）
+STARTUP_LOG_DELAY_MS = 1000
+
+
 class SafeDraftApp:
+    # 所有打开的编辑窗口（主窗口与 open_new_window 打开的窗口），退出时逐个保存
+    editors = []
+
     # [修复1] 恢复 existing_db 参数，确保多窗口共享同一个数据库连接
     def __init__(self, root, existing_db=None, is_main_window=True):
         self.root = root
@@ -51,7 +76,8 @@ class SafeDraftApp:
         if existing_db:
             self.db = existing_db
         else:
-            self.db = StorageManager()
+            with timeline.phase("storage"):
+                self.db = StorageManager()
 
         # 加载配置
         try:
@@ -63,8 +89,9 @@ class SafeDraftApp:
         self.root.title("SafeDraft" if is_main_window else "SafeDraft (New)")
         self.root.geometry("630x600")
 
-        # 图标
-        self.load_icon()
+        # 图标：主窗口的图标随后台组件一起在首屏之后加载（需要导入 PIL）
+        if not is_main_window:
+            self.load_icon()
 
         # 2. 主题初始化
         self.theme_manager = ThemeManager()
@@ -72,34 +99,46 @@ class SafeDraftApp:
         self.colors = self.theme_manager.get_theme(self.current_theme_name)
         self.root.configure(bg=self.colors["bg"])
 
-        # 初始化置顶定时器变量
-        self.topmost_timer = None
+        # 定时任务统一交给共用调度器，任务名按窗口区分
+        self.scheduler = get_scheduler()
+        self.autosaver = AutoSaver(self.scheduler, ("autosave", id(self)), self.perform_auto_save,
+                                   dispatch=lambda f: self.root.after(0, f))
+        self._topmost_job = ("topmost", id(self))
 
         # 3. UI 构建
-        self.setup_ui()
+        with timeline.phase("setup_ui"):
+            self.setup_ui()
 
         # 4. 逻辑组件
+        self.watcher = None
+        self.hotkeys = None
+        self.auto_sync = None
+        self._services_started = False
         if self.is_main_window:
-            self.watcher = WindowWatcher(self.db, self.on_trigger)
-            self.watcher.start()
-            self.hotkeys = GlobalHotKeys(self)
-            self.auto_sync = AutoSyncManager(self.db, on_sync_complete=lambda msg: self.root.after(0, lambda: self.show_toast(msg)))
-            self.auto_sync.start()
-
-            self.setup_tray()
+            # 窗口监视、全局热键、自动同步与托盘不影响首屏，显示后再导入并启动
+            self.root.after(SERVICES_START_DELAY_MS, self.start_services)
+            self.root.after_idle(lambda: timeline.mark("first_idle"))
 
             alpha = float(self.db.get_setting("window_alpha", "1.0"))
             self.root.attributes("-alpha", alpha)
 
             self.root.protocol("WM_DELETE_WINDOW", self.on_close_window)
         else:
-            self.watcher = None
             # [修复2] 子窗口使用安全的关闭方法，防止定时器崩溃
             self.root.protocol("WM_DELETE_WINDOW", self.on_sub_window_close)
 
         # 5. 加载初始数据
         self.current_draft_id = None
-        self.last_content = ""
+
+        # 编辑日志：先回放上次崩溃遗留的日志，再为本窗口开启新日志
+        if self.is_main_window:
+            with timeline.phase("journal.recover"):
+                recovered = recover_journals(self.db)
+            if recovered:
+                self.root.after(500, lambda: self.show_toast(f"已从编辑日志恢复 {recovered} 份未保存的草稿"))
+        with timeline.phase("journal.open"):
+            self.journal = EditJournal(self.db.base_path, scheduler=self.scheduler)
+        SafeDraftApp.editors.append(self)
 
         # --- 核心修改点：取消启动时的自动填充 ---
         # 原逻辑：仅主窗口自动加载历史，新建窗口保持空白
@@ -107,22 +146,54 @@ class SafeDraftApp:
         # if self.is_main_window:
         #     self.load_latest_draft()
 
-        # 6. 事件绑定 & 自动保存定时器
-        self.auto_save_timer = None
+        # 6. 事件绑定
         self.text_area.bind("<Control-s>", self.on_ctrl_s)
-        self.text_area.bind("<<Modified>>", self.on_text_change)
+        # 代理编辑区的 insert/delete，按键时只记录编辑操作，保存时才读取全文
+        with timeline.phase("tracker"):
+            self.tracker = TextChangeTracker(self.text_area, self.on_text_edit)
+        self._saved_version = self.tracker.version
+        # 上次保存以来的编辑操作，自动保存时作为增量写入；出现无法得到操作的修改时为 None
+        self._pending_ops = []
+        # 进行中的大文档分块加载
+        self._loader = None
+        self.text_area.bind("<<Paste>>", self.on_paste)
+        # 焦点离开编辑区（切到其它程序或按钮）时立即保存
+        self.text_area.bind("<FocusOut>", lambda e: self.autosaver.flush())
 
         self.db.add_observer(self.on_db_update)
 
     def load_icon(self):
         try:
-            from PIL import ImageTk
-            pil_img = get_icon_image()
-            self.tk_icon = ImageTk.PhotoImage(pil_img)
+            self.tk_icon = get_icon_photo(self.root)
             self.root.iconphoto(True, self.tk_icon)
         except Exception as e:
             print(f"Icon load fail: {e}")
 
+    def start_services(self):
+        """启动主窗口的后台组件；首屏显示后自动调用，打开设置时若尚未启动则立即启动"""
+        if self._services_started or not self.is_main_window:
+            return
+        self._services_started = True
+        from watcher import WindowWatcher
+        from autosync import AutoSyncManager
+
+        with timeline.phase("icon"):
+            self.load_icon()
+        with timeline.phase("watcher"):
+            self.watcher = WindowWatcher(self.db, self.on_trigger)
+            self.watcher.start()
+        with timeline.phase("hotkeys"):
+            try:
+                self.hotkeys = GlobalHotKeys(self)
+            except Exception as e:
+                print(f"Hotkey init fail: {e}")
+        with timeline.phase("auto_sync"):
+            self.auto_sync = AutoSyncManager(self.db, on_sync_complete=lambda msg: self.root.after(0, lambda: self.show_toast(msg)))
+            self.auto_sync.start()
+
+        self.setup_tray()
+        self.root.after(STARTUP_LOG_DELAY_MS, lambda: timeline.finish(self.db.base_path))
+
     def setup_ui(self):
         self.toolbar = tk.Frame(self.root, height=40)
         self.toolbar.pack(fill="x", padx=5, pady=5)
@@ -204,11 +275,18 @@ class SafeDraftApp:
             return
         ip = self.db.get_setting("ssh_ip", "")
         path = self.db.get_setting("ssh_path", "")
-        if not ip or not path:
+        if not is_config_complete(get_backend_name(self.db), ip, path):
             messagebox.showerror("配置缺失", "请先在设置中填写服务器 IP 和路径。")
             return
+        from sync_targets import MultiTargetSync, load_targets
+        targets = load_targets(self.db)
+        if len(targets) > 1:
+            if messagebox.askyesno("确认", f"将合并本地和 {len(targets)} 个同步目标的数据（自动去重），然后同步到所有目标。\n确定继续吗？"):
+                self._run_async_sync("upload_merge", ip, path, "上传成功（已合并去重）",
+                                     engine=MultiTargetSync(self.db, targets))
+            return
         if messagebox.askyesno("确认", "将合并本地和服务器数据（自动去重），然后同步到服务器。\n确定继续吗？"):
-            self._run_async_sync(self.db.sync_upload_merge, ip, path, "上传成功（已合并去重）")
+            self._run_async_sync("upload_merge", ip, path, "上传成功（已合并去重）")
 
     def manual_download(self):
         if self.db.get_setting("ssh_enabled", "0") != "1":
@@ -216,24 +294,40 @@ class SafeDraftApp:
             return
         ip = self.db.get_setting("ssh_ip", "")
         path = self.db.get_setting("ssh_path", "")
+        from sync_targets import MultiTargetSync, load_targets
+        targets = load_targets(self.db)
+        if len(targets) > 1:
+            if messagebox.askyesno("确认", f"将下载 {len(targets)} 个同步目标的数据并与本地合并（自动去重）。\n确定继续吗？"):
+                self._run_async_sync("download_merge", ip, path, "下载成功（已合并去重）",
+                                     engine=MultiTargetSync(self.db, targets))
+            return
         if messagebox.askyesno("确认", "将下载服务器数据并与本地合并（自动去重）。\n确定继续吗？"):
-            self._run_async_sync(self.db.sync_download_merge, ip, path, "下载成功（已合并去重）")
+            self._run_async_sync("download_merge", ip, path, "下载成功（已合并去重）")
+
+    def _run_async_sync(self, mode, ip, path, success_msg, engine=None):
+        """在后台线程执行同步，mode 为 SyncEngine 的流程名（upload_merge / download_merge / force_push）。
+        engine 为 None 时按 ip / path 创建 SyncEngine，多目标同步时传入 MultiTargetSync"""
+        from sync_engine import SyncEngine, SyncCancelled
+        from windows import SyncProgressWindow
+        if engine is None:
+            engine = SyncEngine(self.db, ip, path)
+        progress = SyncProgressWindow(self.root, self.colors, "服务器同步", engine.cancel)
+        engine._on_progress = lambda phase, done, total: self.root.after(
+            0, lambda: progress.update_progress(phase, done, total))
 
-    def _run_async_sync(self, func, ip, path, success_msg):
         def _worker():
             try:
-                func(ip, path)
-                self.root.after(0, lambda: messagebox.showinfo("成功", success_msg))
+                getattr(engine, mode)()
+                self.root.after(0, lambda: (progress.close(), messagebox.showinfo("成功", success_msg)))
+            except SyncCancelled:
+                self.root.after(0, lambda: (progress.close(), messagebox.showinfo("已取消", "同步已取消")))
             except Exception as e:
                 err = str(e)
-                self.root.after(0, lambda: messagebox.showerror("同步失败", f"错误详情:\n{err}"))
+                self.root.after(0, lambda: (progress.close(), messagebox.showerror("同步失败", f"错误详情:\n{err}")))
 
         threading.Thread(target=_worker, daemon=True).start()
 
     def setup_tray(self):
-        import pystray
-        from PIL import Image
-
         def quit_app(icon, item):
             icon.stop()
             self.root.after(0, self.exit_app)
@@ -241,13 +335,18 @@ class SafeDraftApp:
         def show_app(icon, item):
             self.root.after(0, self.show_main_window)
 
-        image = get_icon_image()
-        menu = pystray.Menu(
-            pystray.MenuItem("显示", show_app, default=True),
-            pystray.MenuItem("退出", quit_app)
-        )
-        self.tray_icon = pystray.Icon("SafeDraft", image, "SafeDraft", menu)
-        threading.Thread(target=self.tray_icon.run, daemon=True).start()
+        def run_tray():
+            # pystray 的导入与图标创建也放在托盘线程中，不占用界面线程
+            with timeline.phase("tray"):
+                import pystray
+                menu = pystray.Menu(
+                    pystray.MenuItem("显示", show_app, default=True),
+                    pystray.MenuItem("退出", quit_app)
+                )
+                self.tray_icon = pystray.Icon("SafeDraft", get_icon_image(), "SafeDraft", menu)
+            self.tray_icon.run()
+
+        threading.Thread(target=run_tray, name="tray", daemon=True).start()
 
     def on_close_window(self):
         action = self.db.get_setting("exit_action", "ask")
@@ -265,10 +364,14 @@ class SafeDraftApp:
 
     # [修复2] 子窗口关闭逻辑：取消定时器，防止崩溃
     def on_sub_window_close(self):
-        if self.auto_save_timer:
-            self.root.after_cancel(self.auto_save_timer)
-            # 可选：关闭前立即执行一次保存
-            self.perform_auto_save()
+        # 关闭前立即保存未保存的修改
+        self._cancel_load()
+        self.autosaver.flush()
+        self.autosaver.cancel()
+        self.scheduler.cancel(self._topmost_job)
+        if self in SafeDraftApp.editors:
+            SafeDraftApp.editors.remove(self)
+        self.journal.close(remove=True)
         self.root.destroy()
 
     def show_main_window(self):
@@ -283,6 +386,7 @@ class SafeDraftApp:
         self.root.focus_force()
 
     def hide_main_window(self):
+        self.autosaver.flush()
         self.root.withdraw()
 
     def toggle_main_window(self):
@@ -297,8 +401,21 @@ class SafeDraftApp:
     def exit_app(self):
         if self.watcher: self.watcher.stop()
         if self.hotkeys: self.hotkeys.stop()
-        if hasattr(self, 'auto_sync'): self.auto_sync.stop()
+        if self.auto_sync: self.auto_sync.stop()
         if hasattr(self, 'tray_icon'): self.tray_icon.stop()
+        # 所有编辑窗口立即保存；保存失败的输入仍留在日志中，下次启动时回放
+        for editor in list(SafeDraftApp.editors):
+            try:
+                editor._cancel_load()
+                editor.autosaver.flush()
+            except:
+                pass
+            editor.journal.close()
+        try:
+            self.db.consolidate_deltas()
+        except:
+            pass
+        self.scheduler.stop()
         self.db.close()
         self.root.quit()
         sys.exit()
@@ -316,11 +433,10 @@ class SafeDraftApp:
         self.root.attributes('-topmost', True)
         self.btn_top.config(text="📌 锁定(2m)", bg="#4a90e2", fg="white")
 
-        if self.topmost_timer: self.root.after_cancel(self.topmost_timer)
-        self.topmost_timer = self.root.after(120000, self._cancel_topmost)
+        self.scheduler.schedule(self._topmost_job, AUTO_TOPMOST_SECONDS,
+                                lambda: self.root.after(0, self._cancel_topmost), slack=AUTO_TOPMOST_SLACK)
 
     def _cancel_topmost(self):
-        self.topmost_timer = None
         self.root.attributes('-topmost', False)
         bg_color = self.colors.get("bg_btn_default", "#f0f0f0")
         self.btn_top.config(text="📌 临时置顶", bg=bg_color, fg=self.colors["fg"])
@@ -329,9 +445,7 @@ class SafeDraftApp:
         is_currently_top = self.root.attributes("-topmost")
 
         # 清理现有的定时器，防止冲突
-        if self.topmost_timer:
-            self.root.after_cancel(self.topmost_timer)
-            self.topmost_timer = None
+        self.scheduler.cancel(self._topmost_job)
 
         if is_currently_top:
             self.root.attributes("-topmost", False)
@@ -355,17 +469,68 @@ class SafeDraftApp:
             self.scrollbar.grid()
         self.scrollbar.set(first, last)
 
-    def on_text_change(self, event):
-        if self.text_area.edit_modified():
-            content = self.text_area.get("1.0", "end-1c")
-            if content != self.last_content:
-                self.last_content = content
-                if self.auto_save_timer:
-                    self.root.after_cancel(self.auto_save_timer)
-                self.auto_save_timer = self.root.after(15000, self.perform_auto_save)
-            self.text_area.edit_modified(False)
+    def _get_content(self):
+        return self.text_area.get("1.0", "end-1c")
+
+    def on_text_edit(self, op):
+        """编辑区内容被修改；op 为 (位置, 删除长度, 插入文本)，撤销/重做等无法得到操作时为 None"""
+        if op is None:
+            self._pending_ops = None
+        elif self._pending_ops is not None:
+            self._pending_ops.append(op)
+        if self._loader is not None:
+            return  # 分块加载中，完成后统一记录日志
+        if op is None:
+            self.journal.snapshot(self.current_draft_id, self._get_content())
+        else:
+            self.journal.record_edit(*op, self.current_draft_id, self._get_content)
+        self.autosaver.touch(self.tracker.length)
+
+    def _load_text(self, text, on_done=None, index="1.0", replace=True):
+        """把文本放入编辑区；超过 LARGE_DOC_CHARS 时分块加载（期间编辑区只读），完成后调用 on_done"""
+        self._cancel_load()
+        if not is_large(text):
+            if replace:
+                self.text_area.delete("1.0", "end")
+            self.text_area.insert(index, text)
+            if on_done: on_done()
+            return
+
+        def finished():
+            self._loader = None
+            self.journal.snapshot(self.current_draft_id, self._get_content())
+            self.autosaver.touch(self.tracker.length)
+            if on_done: on_done()
+
+        self._loader = BulkLoader(self.text_area, text, index=index, replace=replace, on_done=finished)
+        self._loader.start()
+
+    def _cancel_load(self):
+        """中止分块加载，已插入的部分按普通修改记录"""
+        if self._loader is None:
+            return
+        self._loader.cancel()
+        self._loader = None
+        self.journal.snapshot(self.current_draft_id, self._get_content())
+        self.autosaver.touch(self.tracker.length)
+
+    def on_paste(self, event):
+        """大段粘贴改为分块插入，普通粘贴交给 Tk 默认处理"""
+        try:
+            text = self.text_area.clipboard_get()
+        except tk.TclError:
+            return
+        if not is_large(text) or self._loader is not None:
+            return
+        try:
+            self.text_area.delete("sel.first", "sel.last")
+        except tk.TclError:
+            pass
+        self._load_text(text, index="insert", replace=False)
+        return "break"
 
     def on_ctrl_s(self, event):
+        if self._loader is not None: return "break"
         content = self.text_area.get("1.0", "end-1c")
         if content.strip():
             self.db.save_snapshot(content)
@@ -377,23 +542,41 @@ class SafeDraftApp:
         # 增加安全检查，防止窗口销毁后调用报错
         try:
             if not self.root.winfo_exists(): return
-            content = self.text_area.get("1.0", "end-1c")
-            if not content.strip(): return
+            if self._loader is not None: return  # 加载完成前内容不完整
+            version = self.tracker.version
+            if version == self._saved_version: return
+            # 空白内容不保存；在 Tk 中查找非空白字符，不复制全文
+            if not self.text_area.search(r"\S", "1.0", "end-1c", regexp=True): return
+            ops, length = self._pending_ops, self.tracker.length
+            if self.current_draft_id is not None and ops is not None:
+                # 已有草稿：只追加本次的编辑操作
+                base_length = length - sum(len(text) - deleted for _, deleted, text in ops)
+                if self.db.save_delta(self.current_draft_id, ops, base_length):
+                    self._pending_ops = []
+                    self._saved_version = version
+                    self.journal.mark_saved(self.current_draft_id, length)
+                    return
+            content = self._get_content()
             new_id = self.db.save_content(content, self.current_draft_id)
             if new_id:
                 self.current_draft_id = new_id
+                self._pending_ops = []
+                self._saved_version = version
+                self.journal.commit(new_id, content)
         except:
             pass
-        finally:
-            self.auto_save_timer = None
 
     def manual_save(self):
+        if self._loader is not None: return
         content = self.text_area.get("1.0", "end-1c")
         if content.strip():
             self.db.save_snapshot(content)
             self.text_area.delete("1.0", "end")
             self.current_draft_id = None
-            self.last_content = ""
+            self._saved_version = self.tracker.version
+            self._pending_ops = []
+            self.journal.commit(None, "")
+            self.autosaver.cancel()
             success_color = self.colors.get("btn_save_success", "#4caf50")
             self.flash_button(self.btn_save, "✅ 已归档", "💾 保存", success_color)
 
@@ -402,9 +585,14 @@ class SafeDraftApp:
         if history:
             latest = history[0]
             self.current_draft_id = latest[0]
-            self.text_area.delete("1.0", "end")
-            self.text_area.insert("1.0", latest[1])
-            self.last_content = latest[1]
+
+            def loaded():
+                self._saved_version = self.tracker.version
+                self._pending_ops = []
+                self.journal.commit(self.current_draft_id, latest[1])
+                self.autosaver.cancel()
+
+            self._load_text(latest[1], loaded)
 
     def on_db_update(self):
         # 不在此更新状态文件，状态文件只在成功上传/下载后更新
@@ -465,12 +653,22 @@ class SafeDraftApp:
         win.after(duration - 500, lambda: fade_out(win))
 
     def restore_draft(self, content):
-        self.text_area.delete("1.0", "end")
-        self.text_area.insert("1.0", content)
-        self.current_draft_id = None
-        self.perform_auto_save()
+        def loaded():
+            self.current_draft_id = None
+            self.perform_auto_save()
+
+        self._load_text(content, loaded)
         self.show_main_window()
 
+    def handle_command(self, command):
+        """执行启动命令（命令行参数或再次启动时转发来的，见 single_instance）"""
+        if command == CMD_NEW:
+            self.open_new_window()
+        elif command == CMD_NOTEBOOK:
+            self.open_notebook()
+        else:
+            self.show_main_window()
+
     def open_new_window(self):
         new_root = tk.Toplevel(self.root)
         # [修复1] 传递 existing_db=self.db，确保新窗口复用连接
@@ -478,15 +676,21 @@ class SafeDraftApp:
         new_root.app = app
 
     def open_history(self):
+        from windows import HistoryWindow
         win = HistoryWindow(self.root, self.db, self.restore_draft, self.colors)
 
     def open_notebook(self):
+        from notebook import NotebookWindow
         win = NotebookWindow(self.root, self.db, self.colors)
 
     def open_sticky_manager(self):
+        from sticky import StickyManagerWindow
         win = StickyManagerWindow(self.root, self.db, self.colors)
 
     def open_settings(self):
+        from windows import SettingsDialog
+        # 设置窗口需要窗口监视器（修改触发规则后重新加载）
+        self.start_services()
         win = SettingsDialog(self.root, self.db, self.watcher, self)
 
     def apply_theme_colors(self):
@@ -542,6 +746,14 @@ if __name__ == "__main__":
         print(f"Failed to set AppUserModelID: {e}")
     # --- 新增代码块 END ---
 
-    root = tk.Tk()
-    app = SafeDraftApp(root)
+    with timeline.phase("tk_init"):
+        root = tk.Tk()
+    with timeline.phase("app_init"):
+        app = SafeDraftApp(root)
+    if instance_guard is not None:
+        # 监听线程收到的命令切回 Tk 线程执行
+        instance_guard.serve(lambda command: root.after(0, lambda: app.handle_command(command)))
+    command = command_from_argv(sys.argv[1:])
+    if command != CMD_SHOW:
+        root.after(0, lambda: app.handle_command(command))
     root.mainloop()
\ No newline at end of file
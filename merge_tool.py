@@ -0,0 +1,41 @@
+"""
+离线合并多台设备的数据库
+
+命令行:
+    python merge_tool.py a.db b.db c.db                 合并到程序数据目录下的 safedraft.db
+    python merge_tool.py --into merged.db a.db b.db     合并到指定数据库（不存在则新建）
+"""
+
+import argparse
+import os
+import sys
+
+from storage import StorageManager
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SafeDraft 多数据库合并")
+    parser.add_argument("sources", nargs="+", help="要合并进来的数据库文件")
+    parser.add_argument("--into", default=None, help="目标数据库，默认为程序数据目录下的 safedraft.db")
+    args = parser.parse_args(argv)
+
+    missing = [p for p in args.sources if not os.path.exists(p)]
+    if missing:
+        print("文件不存在: " + ", ".join(missing), file=sys.stderr)
+        return 1
+
+    db = StorageManager(os.path.abspath(args.into)) if args.into else StorageManager()
+    try:
+        if os.path.abspath(db.db_path) in {os.path.abspath(p) for p in args.sources}:
+            print("目标数据库不能同时作为来源", file=sys.stderr)
+            return 1
+        stats = db.merge_many(args.sources)
+    finally:
+        db.close()
+    print(f"已合并 {stats['sources']} 个数据库到 {db.db_path}：写入 {stats['changes']} 行，"
+          f"去重删除 {stats['deduplicated']} 条草稿")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,11 +1,17 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 from datetime import datetime
-from PIL import ImageTk
-import threading
 
 # 导入工具
-from utils import get_icon_image, DEFAULT_FONT_SIZE, TextSearchBar
+from utils import get_icon_photo, DEFAULT_FONT_SIZE, TextSearchBar
+from scheduler import get_scheduler
+from bulk_loader import load_text
+from list_search import ListSearcher
+from storage import like_contains
+
+# 笔记防抖保存时长与允许推迟的秒数
+SAVE_DELAY = 2.0
+SAVE_SLACK = 0.5
 
 
 class NotebookWindow(tk.Toplevel):
@@ -20,7 +26,13 @@ class NotebookWindow(tk.Toplevel):
         self.current_folder_uuid = None  # None 表示"所有笔记"
         self.current_note_uuid = None
         self.is_dirty = False  # 内容是否有变更未保存
-        self.save_timer = None
+        self.scheduler = get_scheduler()
+        self._save_job = ("notebook.save", id(self))
+        self._loader = None  # 进行中的大笔记分块加载
+        self.searcher = ListSearcher(self.scheduler, ("notebook.search", id(self)),
+                                     fetch=self._fetch_notes, match=self._note_match,
+                                     on_batch=self._on_notes_batch,
+                                     dispatch=lambda f: self.after(0, f))
 
         try:
             self.font_size = int(self.db.get_setting("font_size", str(DEFAULT_FONT_SIZE)))
@@ -38,8 +50,7 @@ class NotebookWindow(tk.Toplevel):
 
     def load_icon(self):
         try:
-            pil_img = get_icon_image()
-            self.tk_icon = ImageTk.PhotoImage(pil_img)
+            self.tk_icon = get_icon_photo(self)
             self.iconphoto(True, self.tk_icon)
         except:
             pass
@@ -206,6 +217,9 @@ class NotebookWindow(tk.Toplevel):
         # ------------------
 
         if not enable and not is_trash:
+            if self._loader is not None:
+                self._loader.cancel()
+                self._loader = None
             self.entry_title.delete(0, "end")
             self.text_content.delete("1.0", "end")
             self.current_note_uuid = None
@@ -372,20 +386,34 @@ class NotebookWindow(tk.Toplevel):
     # --- 笔记列表逻辑 ---
 
     def load_notes_list(self):
-        self.list_notes.delete(0, "end")
-        self.note_uuid_map = []
-
+        # 同步刷新（切换文件夹、增删笔记后），作废进行中的搜索与缓存的结果
+        self.searcher.cancel()
+        self.searcher.reset()
         keyword = self.entry_search.get().strip()
+        notes = [row for rows in self._fetch_notes(keyword) for row in rows]
+        self._on_notes_batch(notes, True, False)
 
+    def _fetch_notes(self, keyword):
+        """分批返回当前文件夹中匹配的笔记（搜索时在后台线程调用）"""
         # --- 分支逻辑：是否是回收站 ---
         if self.current_folder_uuid == "TRASH_BIN":
             notes = self.db.get_deleted_notes()
             # 如果有搜索词，简单过滤一下
             if keyword:
-                notes = [n for n in notes if keyword.lower() in (n[1] + n[2]).lower()]
-        else:
-            notes = self.db.get_notes(self.current_folder_uuid, keyword)
-        # ---------------------------
+                notes = [n for n in notes if self._note_match(n, keyword)]
+            return [notes]
+        return self.db.iter_notes(self.current_folder_uuid, keyword)
+
+    @staticmethod
+    def _note_match(row, keyword):
+        return like_contains(row[1], keyword) or like_contains(row[2], keyword)
+
+    def _on_notes_batch(self, notes, first, done):
+        if not self.winfo_exists(): return
+        if first:
+            self.list_notes.delete(0, "end")
+            self.note_uuid_map = []
+            self.toggle_editor(False)
 
         for uuid, title, content, updated_at in notes:
             display_title = title if title else "无标题"
@@ -400,10 +428,9 @@ class NotebookWindow(tk.Toplevel):
             self.list_notes.insert("end", f"{prefix}{display_title}  ({time_str})")
             self.note_uuid_map.append(uuid)
 
-        self.toggle_editor(False)
-
     def on_search(self, event):
-        self.load_notes_list()
+        # 防抖后在后台查询，结果分批送回 _on_notes_batch
+        self.searcher.request(self.entry_search.get().strip())
 
     def add_note(self):
         if not self.current_folder_uuid:
@@ -445,10 +472,14 @@ class NotebookWindow(tk.Toplevel):
             self.entry_title.delete(0, "end")
             self.entry_title.insert(0, data[2] if data[2] else "")
 
-            self.text_content.delete("1.0", "end")
-            self.text_content.insert("1.0", data[3] if data[3] else "")
+            if self._loader is not None:
+                self._loader.cancel()
             self.is_dirty = False
             self.lbl_status.config(text="已同步")
+            self._loader = load_text(self.text_content, data[3] if data[3] else "", self._on_note_loaded)
+
+    def _on_note_loaded(self):
+        self._loader = None
 
     # --- 编辑与保存逻辑 ---
 
@@ -460,11 +491,9 @@ class NotebookWindow(tk.Toplevel):
         self.is_dirty = True
         self.lbl_status.config(text="未保存...", fg="#e67e22")
 
-        # 防抖保存 (2秒)
-        if self.save_timer:
-            self.save_timer.cancel()
-        self.save_timer = threading.Timer(2.0, self.save_current_note)
-        self.save_timer.start()
+        # 防抖保存 (2秒)，到期后切回 Tk 线程读取编辑器内容
+        self.scheduler.schedule(self._save_job, SAVE_DELAY, lambda: self.after(0, self.save_current_note),
+                                slack=SAVE_SLACK)
 
     def manual_save(self, event=None):
         self.flush_save()
@@ -472,14 +501,13 @@ class NotebookWindow(tk.Toplevel):
 
     def flush_save(self):
         """立即执行保存"""
-        if self.save_timer:
-            self.save_timer.cancel()
-            self.save_timer = None
+        self.scheduler.cancel(self._save_job)
         if self.is_dirty and self.current_note_uuid:
             self.save_current_note()
 
     def save_current_note(self):
         if not self.current_note_uuid: return
+        if self._loader is not None: return  # 笔记尚未加载完，不能保存不完整的内容
 
         title = self.entry_title.get().strip()
         content = self.text_content.get("1.0", "end-1c")
@@ -499,5 +527,9 @@ class NotebookWindow(tk.Toplevel):
         self.after(0, _update_ui)
 
     def on_close(self):
+        self.searcher.cancel()
+        if self._loader is not None:
+            self._loader.cancel()
+            self._loader = None
         self.flush_save()
         self.destroy()
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+窗口触发规则匹配
+reload_rules 时把启用的 triggers_v2 规则编译成 RuleMatcher，每次前台窗口变化只需：
+- 进程名关键词、标题关键词：各一个 Aho–Corasick 自动机，单次扫描字符串即可得到命中的规则
+- 正则规则（匹配窗口标题）、通配规则（匹配进程名）：各合并成一个交替正则，一次扫描排除不命中的窗口
+
+规则优先级与逐条检查时一致：进程名 > 通配 > 标题 > 正则，同类规则中先添加的优先。
+"""
+
+import fnmatch
+import re
+
+RULE_TITLE = "title"
+RULE_PROCESS = "process"
+RULE_REGEX = "regex"
+RULE_GLOB = "glob"
+
+RULE_TYPES = (RULE_TITLE, RULE_PROCESS, RULE_REGEX, RULE_GLOB)
+
+# 触发状态机使用的 key 前缀
+_KEY_PREFIX = {RULE_TITLE: "title", RULE_PROCESS: "proc", RULE_REGEX: "regex", RULE_GLOB: "glob"}
+
+_BACKREF = re.compile(r"\\[1-9]|\(\?P=")
+
+
+def normalize_rule(rule_type, value):
+    """规则值的归一化形式；进程规则去掉 .exe，与 psutil 进程名做子串匹配"""
+    if rule_type == RULE_PROCESS:
+        return value.replace(".exe", "")
+    return value
+
+
+def validate_rule(rule_type, value):
+    """校验规则值，无效时返回错误说明，有效时返回 None"""
+    if rule_type not in RULE_TYPES:
+        return f"未知规则类型: {rule_type}"
+    if not value:
+        return "规则不能为空"
+    if rule_type == RULE_REGEX:
+        try:
+            re.compile(value)
+        except re.error as e:
+            return f"正则表达式无效: {e}"
+    return None
+
+
+class AhoCorasick:
+    """多关键词子串匹配，返回命中关键词中编号最小的一个"""
+
+    def __init__(self, keywords):
+        self.goto = [{}]
+        self.fail = [0]
+        # 每个状态可命中的最小关键词编号（已沿失败链合并）
+        self.best = [None]
+
+        for idx, word in enumerate(keywords):
+            state = 0
+            for ch in word:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.best.append(None)
+                state = nxt
+            if self.best[state] is None or idx < self.best[state]:
+                self.best[state] = idx
+
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, nxt in self.goto[state].items():
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                fail_to = self.goto[f].get(ch, 0)
+                self.fail[nxt] = fail_to if fail_to != nxt else 0
+                inherited = self.best[self.fail[nxt]]
+                if inherited is not None and (self.best[nxt] is None or inherited < self.best[nxt]):
+                    self.best[nxt] = inherited
+                queue.append(nxt)
+
+    def search(self, text):
+        goto, fail, best = self.goto, self.fail, self.best
+        found = best[0]  # 空关键词匹配任何字符串
+        if found == 0:
+            return found
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            b = best[state]
+            if b is not None and (found is None or b < found):
+                found = b
+                if found == 0:
+                    break
+        return found
+
+
+class _AlternationMatcher:
+    """把多个正则合并成一个不带捕获组的交替正则作为闸门：绝大多数窗口不命中，一次扫描即可排除；
+    命中时再按顺序逐条确认编号最小的规则。标题与进程名已转成小写，只有含大写字母的正则才需忽略大小写"""
+
+    def __init__(self, patterns, full_match=False):
+        self.full_match = full_match
+        self.patterns = []
+        sources = []
+        mergeable = True
+        for p in patterns:
+            try:
+                wrapped = f"(?i:{p})" if p != p.lower() else p
+                self.patterns.append(re.compile(wrapped))
+                sources.append(wrapped)
+            except re.error:
+                # 自带 (?i) 等全局标志的正则不能嵌进分组，单独编译且不参与合并
+                try:
+                    self.patterns.append(re.compile(p, re.IGNORECASE))
+                    mergeable = False
+                except re.error:
+                    self.patterns.append(None)
+        self.gate = None
+        # 含反向引用的正则合并后组号会错位，此时不设闸门
+        if sources and mergeable and not any(_BACKREF.search(p) for p in sources):
+            try:
+                self.gate = re.compile("|".join(f"(?:{p})" for p in sources))
+            except re.error:
+                pass
+
+    def _hit(self, pattern, text):
+        return pattern.fullmatch(text) if self.full_match else pattern.search(text)
+
+    def search(self, text):
+        if self.gate is not None and not self._hit(self.gate, text):
+            return None
+        for i, p in enumerate(self.patterns):
+            if p is not None and self._hit(p, text):
+                return i
+        return None
+
+
+class RuleMatcher:
+    def __init__(self, rules):
+        """rules: {rule_type: [value, ...]}，即 StorageManager.get_enabled_rules() 的返回值"""
+        self.tables = {}
+        self.matchers = []
+        for rule_type in (RULE_PROCESS, RULE_GLOB, RULE_TITLE, RULE_REGEX):
+            values = []
+            for v in rules.get(rule_type, []):
+                v = normalize_rule(rule_type, v)
+                if v not in values:
+                    values.append(v)
+            if not values:
+                continue
+            # 预先算好每条规则回调用的 (rule_type, value, key)
+            self.tables[rule_type] = [(rule_type, v, f"{_KEY_PREFIX[rule_type]}:{v}") for v in values]
+            if rule_type in (RULE_PROCESS, RULE_TITLE):
+                matcher = AhoCorasick(values)
+            elif rule_type == RULE_GLOB:
+                matcher = _AlternationMatcher([fnmatch.translate(v) for v in values], full_match=True)
+            else:
+                matcher = _AlternationMatcher(values)
+            field = "title" if rule_type in (RULE_TITLE, RULE_REGEX) else "proc"
+            self.matchers.append((rule_type, field, matcher))
+
+    def __len__(self):
+        return sum(len(t) for t in self.tables.values())
+
+    def match(self, title, proc_name):
+        """返回第一条命中规则的 (rule_type, value, key)，未命中返回 None"""
+        fields = {"title": title or "", "proc": proc_name or ""}
+        for rule_type, field, matcher in self.matchers:
+            idx = matcher.search(fields[field])
+            if idx is not None:
+                return self.tables[rule_type][idx]
+        return None
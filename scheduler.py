@@ -0,0 +1,200 @@
+"""
+统一的后台定时调度
+全程序的延迟/周期任务（自动保存、便签保存、置顶到期、笔记防抖保存、自动同步、窗口轮询）
+都注册为命名任务，由同一个调度线程执行：
+- 时间轮：任务按截止时间落入 TICK 粒度的槽，线程只在最近的非空槽到期时醒来，没有任务时一直睡眠
+- 截止时间合并：任务可给出允许推迟的 slack，范围内已有槽时并入该槽，与其它任务同一次唤醒执行
+- 同名任务重新调度即替换旧任务（防抖），cancel(name) 取消
+- 任务在调度线程上执行，需操作 Tk 的任务自行用 widget.after(0, ...) 切回主线程；
+  blocking=True 的任务（如同步）放到单独线程执行，不阻塞其它定时任务
+- 开启启动追踪（SAFEDRAFT_TRACE）期间，任务执行时间计入 Chrome trace
+wakeups / runs 计数可通过 stats() 观察。
+"""
+
+import bisect
+import math
+import threading
+import time
+
+from startup_trace import timeline
+
+# 时间轮槽宽（秒）
+TICK = 0.05
+
+
+class _Job:
+    __slots__ = ("name", "func", "slot", "slack", "interval", "blocking", "cancelled")
+
+    def __init__(self, name, func, slack, interval, blocking):
+        self.name = name
+        self.func = func
+        self.slot = None
+        self.slack = slack
+        self.interval = interval
+        self.blocking = blocking
+        self.cancelled = False
+
+
+class Scheduler:
+    def __init__(self, tick=TICK, clock=time.monotonic):
+        self.tick = tick
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._jobs = {}      # name -> _Job
+        self._slots = {}     # 槽号 -> {name: _Job}
+        self._ticks = []     # 非空槽号（有序）
+        self._running = {}   # 已到期、正在执行的任务，执行期间被取消/替换时不再按间隔排入
+        self._sleep_until = None  # 调度线程当前睡到的槽号，None 表示无限期
+        self._thread = None
+        self.running = False
+        self.wakeups = 0
+        self.runs = 0
+
+    # --- 生命周期 ---
+
+    def start(self):
+        with self._cond:
+            if self.running:
+                return
+            self.running = True
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+
+    # --- 任务管理 ---
+
+    def schedule(self, name, delay, func, slack=0, interval=None, blocking=False):
+        """delay 秒后执行 func；slack 为允许推迟的秒数；interval 不为 None 时按该间隔重复执行"""
+        job = _Job(name, func, slack, interval, blocking)
+        with self._cond:
+            self._remove(name)
+            self._place(job, self.clock() + max(delay, 0))
+            # 新任务早于当前睡眠目标时才唤醒调度线程重新计算
+            if self._sleep_until is None or job.slot < self._sleep_until:
+                self._cond.notify_all()
+        return job
+
+    def cancel(self, name):
+        with self._cond:
+            self._remove(name)
+
+    def pending(self, name):
+        with self._cond:
+            return name in self._jobs
+
+    def stats(self):
+        with self._cond:
+            return {"wakeups": self.wakeups, "runs": self.runs, "jobs": len(self._jobs)}
+
+    # --- 时间轮（调用方持有 self._cond） ---
+
+    def _place(self, job, deadline):
+        lo = math.ceil(deadline / self.tick - 1e-9)
+        # slack 为 0 且截止时间不在槽边界上时 floor 会小于 ceil，至少取 lo 本身
+        hi = max(lo, math.floor((deadline + job.slack) / self.tick + 1e-9))
+        # slack 范围内已有非空槽（包括 lo 槽本身）时并入，合并唤醒
+        i = bisect.bisect_left(self._ticks, lo)
+        if i < len(self._ticks) and self._ticks[i] <= hi:
+            slot = self._ticks[i]
+        else:
+            slot = lo
+            bisect.insort(self._ticks, slot)
+            self._slots.setdefault(slot, {})
+        job.slot = slot
+        self._slots[slot][job.name] = job
+        self._jobs[job.name] = job
+
+    def _remove(self, name):
+        running = self._running.get(name)
+        if running is not None:
+            running.cancelled = True
+        job = self._jobs.pop(name, None)
+        if job is None:
+            return
+        job.cancelled = True
+        bucket = self._slots.get(job.slot)
+        if bucket is not None:
+            bucket.pop(name, None)
+            if not bucket:
+                del self._slots[job.slot]
+                self._ticks.remove(job.slot)
+
+    def _pop_due(self, now):
+        due = []
+        current = math.floor(now / self.tick + 1e-9)
+        while self._ticks and self._ticks[0] <= current:
+            slot = self._ticks.pop(0)
+            for job in self._slots.pop(slot).values():
+                del self._jobs[job.name]
+                due.append(job)
+        return due
+
+    # --- 调度线程 ---
+
+    def _loop(self):
+        with self._cond:
+            while self.running:
+                due = self._pop_due(self.clock())
+                if not due:
+                    if self._ticks:
+                        self._sleep_until = self._ticks[0]
+                        timeout = max(self._sleep_until * self.tick - self.clock(), 0)
+                    else:
+                        self._sleep_until, timeout = None, None
+                    self._cond.wait(timeout)
+                    self.wakeups += 1
+                    continue
+
+                self.runs += len(due)
+                for job in due:
+                    self._running[job.name] = job
+                self._cond.release()
+                try:
+                    for job in due:
+                        self._run(job)
+                finally:
+                    self._cond.acquire()
+
+                for job in due:
+                    self._running.pop(job.name, None)
+                    # 执行期间没有被同名任务替换或取消时，按间隔重新排入
+                    if job.interval is not None and not job.cancelled:
+                        self._place(job, self.clock() + job.interval)
+            self._sleep_until = None
+
+    def _run(self, job):
+        if job.blocking:
+            threading.Thread(target=self._call, args=(job,), daemon=True).start()
+        else:
+            self._call(job)
+
+    @staticmethod
+    def _call(job):
+        try:
+            if timeline.tracing:
+                # 任务名形如 ("autosave", id(窗口))，trace 中只显示类别
+                label = job.name[0] if isinstance(job.name, tuple) else job.name
+                with timeline.phase(str(label), cat="scheduler"):
+                    job.func()
+            else:
+                job.func()
+        except:
+            pass
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_scheduler():
+    """程序共用的调度器（首次调用时启动）"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Scheduler()
+            _default.start()
+        return _default
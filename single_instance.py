@@ -0,0 +1,197 @@
+"""
+单实例运行
+- 程序目录下的 safedraft.lock 由运行中的实例以独占锁持有（Windows 用 msvcrt，其它平台用 fcntl），进程退出或崩溃时系统自动释放
+- 运行中的实例在 127.0.0.1 的随机端口上监听，端口与随机口令写入 safedraft.ipc
+- 再次启动时取不到锁，就把命令（显示窗口 / 新建草稿 / 打开笔记）连同口令发给运行中的实例后立即退出，
+  不再创建数据库连接、窗口监视、自动同步、托盘与全局热键
+本模块只依赖标准库，在 main 导入 Tk 与数据库之前调用。
+"""
+
+import atexit
+import hmac
+import json
+import os
+import secrets
+import socket
+import sys
+import threading
+import time
+
+LOCK_NAME = "safedraft.lock"
+IPC_NAME = "safedraft.ipc"
+
+CMD_SHOW = "show"
+CMD_NEW = "new"
+CMD_NOTEBOOK = "notebook"
+COMMANDS = (CMD_SHOW, CMD_NEW, CMD_NOTEBOOK)
+# 命令行参数 -> 命令
+ARG_COMMANDS = {"--show": CMD_SHOW, "--new": CMD_NEW, "--notebook": CMD_NOTEBOOK}
+
+# 运行中的实例可能还在启动（已持有锁但尚未开始监听），转发命令时最多等待的秒数
+FORWARD_TIMEOUT = 5.0
+FORWARD_RETRY = 0.05
+# 单个连接的读写超时（秒）
+IO_TIMEOUT = 1.0
+MAX_MESSAGE = 256
+
+
+def app_base_path():
+    """与 StorageManager.get_real_executable_path 相同：打包后为程序所在目录，否则为源码目录"""
+    if getattr(sys, 'frozen', False) or "__compiled__" in globals():
+        return os.path.dirname(os.path.abspath(sys.argv[0]))
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def command_from_argv(argv):
+    """命令行参数中的第一个命令，没有时为显示窗口"""
+    for arg in argv:
+        if arg in ARG_COMMANDS:
+            return ARG_COMMANDS[arg]
+    return CMD_SHOW
+
+
+def lock_file(f):
+    """非阻塞地对文件加独占锁，已被其它进程（或本进程的其它句柄）持有时抛出 OSError"""
+    if sys.platform == "win32":
+        import msvcrt
+        # msvcrt 从当前位置开始加锁，固定锁住第一个字节
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def unlock_file(f):
+    if sys.platform == "win32":
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class InstanceGuard:
+    def __init__(self, base_path):
+        self.lock_path = os.path.join(base_path, LOCK_NAME)
+        self.ipc_path = os.path.join(base_path, IPC_NAME)
+        self.token = secrets.token_hex(16)
+        self._lock_file = None
+        self._server = None
+        self._thread = None
+        self._handler = None
+
+    def acquire(self):
+        """取得单实例锁；已有实例在运行时返回 False。无法创建锁文件时抛出 OSError"""
+        f = open(self.lock_path, "a+b")
+        try:
+            lock_file(f)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        return True
+
+    def serve(self, handler):
+        """开始接收其它启动转发来的命令；handler(command) 在监听线程上调用"""
+        self._handler = handler
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(("127.0.0.1", 0))
+        server.listen(8)
+        self._server = server
+        self._thread = threading.Thread(target=self._accept_loop, args=(server,), name="single-instance", daemon=True)
+        self._thread.start()
+
+        info = {"port": server.getsockname()[1], "token": self.token, "pid": os.getpid()}
+        tmp = self.ipc_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        os.replace(tmp, self.ipc_path)
+
+    def close(self):
+        """停止监听并释放锁（进程退出时也会由系统释放）"""
+        server, self._server = self._server, None
+        if server is not None:
+            try:
+                server.close()
+            except:
+                pass
+            try:
+                os.remove(self.ipc_path)
+            except OSError:
+                pass
+        f, self._lock_file = self._lock_file, None
+        if f is not None:
+            try:
+                unlock_file(f)
+            except OSError:
+                pass
+            f.close()
+
+    def _accept_loop(self, server):
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return  # 已关闭
+            try:
+                self._handle(conn)
+            except:
+                pass
+            finally:
+                conn.close()
+
+    def _handle(self, conn):
+        conn.settimeout(IO_TIMEOUT)
+        data = b""
+        while b"\n" not in data and len(data) < MAX_MESSAGE:
+            chunk = conn.recv(MAX_MESSAGE)
+            if not chunk:
+                break
+            data += chunk
+        token, _, command = data.split(b"\n", 1)[0].decode("utf-8", "replace").partition(" ")
+        if not hmac.compare_digest(token, self.token) or command not in COMMANDS:
+            conn.sendall(b"denied\n")
+            return
+        conn.sendall(b"ok\n")
+        self._handler(command)
+
+
+def send_command(base_path, command, timeout=FORWARD_TIMEOUT):
+    """把命令发给运行中的实例，成功返回 True；对方尚未开始监听时在 timeout 内重试"""
+    ipc_path = os.path.join(base_path, IPC_NAME)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with open(ipc_path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+            with socket.create_connection(("127.0.0.1", int(info["port"])), timeout=IO_TIMEOUT) as conn:
+                conn.sendall(f"{info['token']} {command}\n".encode("utf-8"))
+                if conn.recv(16).startswith(b"ok"):
+                    return True
+        except (OSError, ValueError, KeyError):
+            pass  # 对方还没写出 ipc 文件或尚未开始监听（也可能是上次遗留的文件）
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(FORWARD_RETRY)
+
+
+def acquire_or_forward(argv, base_path=None):
+    """
+    本进程成为唯一实例时返回 InstanceGuard（退出时自动释放）；
+    已有实例在运行时把命令转发过去并退出进程；无法创建锁文件时返回 None，照常启动
+    """
+    base_path = base_path or app_base_path()
+    guard = InstanceGuard(base_path)
+    try:
+        acquired = guard.acquire()
+    except OSError:
+        return None
+    if acquired:
+        atexit.register(guard.close)
+        return guard
+    if send_command(base_path, command_from_argv(argv)):
+        sys.exit(0)
+    print("SafeDraft 已在运行，但没有响应")
+    sys.exit(1)
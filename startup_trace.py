@@ -0,0 +1,249 @@
+"""
+启动阶段计时
+- 启动过程的各阶段（导入、Tk 初始化、数据库、界面、后台组件）用 timeline.phase(name) 记录单调时钟时间
+- 首屏之后调用 timeline.finish(base_path)，各阶段耗时追加到 startup.log（保留最近 LOG_KEEP 次），可在设置中查看；
+  能取得进程创建时间时（psutil）一并记录解释器启动前的耗时，Nuitka onefile 打包时还记录解包耗时
+- 设置环境变量 SAFEDRAFT_TRACE=1 时，从启动起持续记录 SAFEDRAFT_TRACE_SECONDS 秒（默认 10），
+  期间调度器任务也计入，结束后写出 Chrome trace-event JSON（startup_trace.json，用 chrome://tracing 或 Perfetto 打开）
+本模块只依赖标准库，导入 main 时最先导入，以其导入时刻作为计时起点。
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+LOG_NAME = "startup.log"
+TRACE_NAME = "startup_trace.json"
+# startup.log 保留的启动次数
+LOG_KEEP = 50
+TRACE_ENV = "SAFEDRAFT_TRACE"
+TRACE_SECONDS_ENV = "SAFEDRAFT_TRACE_SECONDS"
+DEFAULT_TRACE_SECONDS = 10
+# 记录的事件数上限，防止长时间追踪占用过多内存
+MAX_EVENTS = 200000
+
+CAT_STARTUP = "startup"
+
+
+def trace_seconds_from_env(environ=os.environ):
+    """未开启追踪时返回 None"""
+    if environ.get(TRACE_ENV, "") in ("", "0"):
+        return None
+    try:
+        return max(0.0, float(environ.get(TRACE_SECONDS_ENV, DEFAULT_TRACE_SECONDS)))
+    except ValueError:
+        return float(DEFAULT_TRACE_SECONDS)
+
+
+class _Phase:
+    __slots__ = ("timeline", "name", "cat", "start")
+
+    def __init__(self, timeline, name, cat):
+        self.timeline = timeline
+        self.name = name
+        self.cat = cat
+
+    def __enter__(self):
+        self.start = self.timeline.clock()
+        return self
+
+    def __exit__(self, *exc):
+        self.timeline.add(self.name, self.start, cat=self.cat)
+        return False
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class StartupTimeline:
+    def __init__(self, clock=time.monotonic, wall_clock=time.time, trace_seconds=None):
+        self.clock = clock
+        self.t0 = clock()
+        self.wall0 = wall_clock()
+        self.trace_seconds = trace_seconds
+        self.recording = True
+        self.finished = False
+        # (名称, 类别, 开始, 结束, 线程 id)；结束为 None 表示瞬时事件
+        self.events = []
+        self.threads = {}
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self):
+        """是否在输出 Chrome trace（此时调度器任务等也记录）"""
+        return self.recording and self.trace_seconds is not None
+
+    def phase(self, name, cat=CAT_STARTUP):
+        """with timeline.phase("setup_ui"): ...；停止记录后返回空操作"""
+        if not self.recording:
+            return _NULL_PHASE
+        return _Phase(self, name, cat)
+
+    def add(self, name, start, end=None, cat=CAT_STARTUP):
+        """记录一个从 start 到 end（默认现在）的阶段"""
+        if not self.recording:
+            return
+        if end is None:
+            end = self.clock()
+        self._append(name, cat, start, end)
+
+    def mark(self, name, cat=CAT_STARTUP):
+        """记录一个时间点"""
+        if self.recording:
+            self._append(name, cat, self.clock(), None)
+
+    def _append(self, name, cat, start, end):
+        thread = threading.current_thread()
+        with self._lock:
+            if len(self.events) >= MAX_EVENTS:
+                return
+            self.events.append((name, cat, start, end, thread.ident))
+            self.threads.setdefault(thread.ident, thread.name)
+
+    def phases(self):
+        """启动阶段 [(名称, 开始毫秒, 耗时毫秒)]，时间相对计时起点；瞬时事件耗时为 None"""
+        with self._lock:
+            events = [e for e in self.events if e[1] == CAT_STARTUP]
+        result = []
+        for name, _, start, end, _ in sorted(events, key=lambda e: e[2]):
+            dur = None if end is None else round((end - start) * 1000, 1)
+            result.append((name, round((start - self.t0) * 1000, 1), dur))
+        return result
+
+    # --- 启动完成 ---
+
+    def finish(self, base_path):
+        """首屏与后台组件启动后调用：写入 startup.log；开启追踪时到时写出 trace 并停止记录"""
+        if self.finished:
+            return
+        self.finished = True
+        self._add_process_phases()
+        try:
+            append_log(base_path, self.log_entry())
+        except:
+            pass
+        if self.trace_seconds is None:
+            self.recording = False
+            return
+        delay = max(0.0, self.t0 + self.trace_seconds - self.clock())
+        timer = threading.Timer(delay, self._finish_trace, args=(base_path,))
+        timer.daemon = True
+        timer.start()
+
+    def _finish_trace(self, base_path):
+        self.recording = False
+        try:
+            self.dump_trace(os.path.join(base_path, TRACE_NAME))
+        except:
+            pass
+
+    def log_entry(self):
+        elapsed = self.clock() - self.t0
+        return {
+            "time": datetime.fromtimestamp(self.wall0).strftime("%Y-%m-%d %H:%M:%S"),
+            "total_ms": round(elapsed * 1000, 1),
+            "phases": self.phases(),
+        }
+
+    def _add_process_phases(self):
+        """进程创建到计时起点之间（解释器启动、onefile 解包）的耗时，取不到时跳过"""
+        try:
+            import psutil
+            created = psutil.Process().create_time()
+        except:
+            return
+        # create_time 是墙钟时间，换算到单调时钟
+        to_clock = lambda wall: self.t0 + (wall - self.wall0)
+        self.add("process_start", to_clock(created), self.t0)
+        parent = os.environ.get("NUITKA_ONEFILE_PARENT")
+        if parent:
+            try:
+                parent_created = psutil.Process(int(parent)).create_time()
+                self.add("onefile_unpack", to_clock(parent_created), to_clock(created))
+            except:
+                pass
+
+    # --- Chrome trace ---
+
+    def trace_events(self):
+        """Chrome trace-event 格式的事件列表（时间单位微秒）"""
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+        origin = min([self.t0] + [e[2] for e in events])
+        pid = os.getpid()
+        out = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "SafeDraft"}}]
+        for tid, name in threads.items():
+            out.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        for name, cat, start, end, tid in events:
+            event = {"name": name, "cat": cat, "pid": pid, "tid": tid,
+                     "ts": round((start - origin) * 1e6, 1)}
+            if end is None:
+                event.update(ph="i", s="t")
+            else:
+                event.update(ph="X", dur=round((end - start) * 1e6, 1))
+            out.append(event)
+        return out
+
+    def dump_trace(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+# --- startup.log ---
+
+def append_log(base_path, entry, keep=LOG_KEEP):
+    """追加一次启动记录（每行一个 JSON），只保留最近 keep 次"""
+    path = os.path.join(base_path, LOG_NAME)
+    lines = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [line for line in f.read().splitlines() if line.strip()]
+    lines.append(json.dumps(entry, ensure_ascii=False))
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines[-keep:]) + "\n")
+    os.replace(tmp, path)
+
+
+def read_log(base_path):
+    """读取启动记录，最新的在前；损坏的行跳过"""
+    path = os.path.join(base_path, LOG_NAME)
+    entries = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    pass
+    except OSError:
+        return []
+    entries.reverse()
+    return entries
+
+
+def format_entry(entry):
+    """一次启动记录的文字时间线"""
+    lines = [f"{entry.get('time', '')}  启动至记录共 {entry.get('total_ms', 0):.0f} ms"]
+    for name, start, dur in entry.get("phases", []):
+        if dur is None:
+            lines.append(f"  {start:>9.1f} ms  ● {name}")
+        else:
+            lines.append(f"  {start:>9.1f} ms  {name:<18} {dur:>8.1f} ms")
+    return "\n".join(lines)
+
+
+timeline = StartupTimeline(trace_seconds=trace_seconds_from_env())
@@ -1,6 +1,12 @@
 import tkinter as tk
 from tkinter import colorchooser, messagebox
 from utils import STICKY_COLORS, TextSearchBar
+from scheduler import get_scheduler
+
+# 内容保存 / 位置保存的防抖时长与允许推迟的秒数
+SAVE_DELAY = 1.0
+GEOMETRY_DELAY = 0.5
+SAVE_SLACK = 0.5
 
 
 class StickyNoteWindow(tk.Toplevel):
@@ -14,7 +20,10 @@ class StickyNoteWindow(tk.Toplevel):
         self.uuid = uuid_val
         self.on_close_callback = on_close_callback
         self.create_new_callback = create_new_callback
-        self._save_timer = None
+        # 内容与位置分开防抖，互不覆盖
+        self.scheduler = get_scheduler()
+        self._save_job = ("sticky.save", uuid_val)
+        self._geometry_job = ("sticky.geometry", uuid_val)
 
         # 无边框窗口
         self.overrideredirect(True)
@@ -249,9 +258,7 @@ class StickyNoteWindow(tk.Toplevel):
             self.create_new_callback()
 
     def _on_text_change(self, event=None):
-        if self._save_timer:
-            self.after_cancel(self._save_timer)
-        self._save_timer = self.after(1000, self._save_data)
+        self.scheduler.schedule(self._save_job, SAVE_DELAY, lambda: self.after(0, self._save_data), slack=SAVE_SLACK)
 
     def _save_data(self):
         content = self.text_area.get("1.0", tk.END).strip()
@@ -267,9 +274,8 @@ class StickyNoteWindow(tk.Toplevel):
     def _on_configure(self, event):
         # 保存位置和大小
         if event.widget == self:
-            if self._save_timer:
-                self.after_cancel(self._save_timer)
-            self._save_timer = self.after(500, self._save_position)
+            self.scheduler.schedule(self._geometry_job, GEOMETRY_DELAY, lambda: self.after(0, self._save_position),
+                                    slack=SAVE_SLACK)
 
     def _save_position(self):
         self.db.update_sticky(
@@ -281,6 +287,8 @@ class StickyNoteWindow(tk.Toplevel):
         )
 
     def _on_close(self):
+        self.scheduler.cancel(self._save_job)
+        self.scheduler.cancel(self._geometry_job)
         self._save_data()
         self._save_position()
         if self.on_close_callback:
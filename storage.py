@@ -7,8 +7,14 @@ import time
 import shutil
 import hashlib
 import glob
+import io
+import socket
+import string
 from datetime import datetime, timedelta
-import paramiko
+from startup_trace import timeline
+from sync_backends import create_backend, get_backend_name, is_config_complete
+# sync_engine（连同 backup_store、delta_sync）与 remote_merge（导入时 exec 远端代理源码）只在同步时才导入，
+# 不在启动的关键路径上
 
 # 默认触发器配置
 DEFAULT_TRIGGERS = [
@@ -27,6 +33,52 @@ DEFAULT_TRIGGERS = [
     ("process", "dingtalk.exe", 0),
 ]
 
+# 远端数据库不超过该大小时直接在内存中反序列化合并，超过则回退为落盘临时文件
+MEMORY_MERGE_MAX_BYTES = 64 * 1024 * 1024
+
+# merge_many 每批 ATTACH 的数据库数（SQLite 默认最多同时附加 10 个）
+MERGE_ATTACH_BATCH = 8
+
+# 合并参与的表及列（drafts 按内容合并，不含 id）
+MERGE_COLUMNS = {
+    "folders": ("uuid", "name", "is_deleted", "updated_at"),
+    "notes": ("uuid", "folder_uuid", "title", "content", "is_deleted", "updated_at", "source_draft_id"),
+    "drafts": ("content", "created_at", "last_updated_at"),
+    "triggers_v2": ("rule_type", "value", "enabled"),
+    "stickynotes": ("uuid", "title", "content", "color", "is_topmost", "position_x", "position_y",
+                    "width", "height", "is_deleted", "created_at", "updated_at"),
+}
+
+# 草稿增量：自动保存只追加编辑操作，某草稿积累的增量条数或增量文本长度（相对全文）超过阈值时合并回 drafts
+DELTA_CONSOLIDATE_COUNT = 64
+DELTA_CONSOLIDATE_RATIO = 0.5
+
+# 历史/笔记列表搜索时每批读取的行数
+HISTORY_BATCH_ROWS = 200
+
+# SSH 通道接收窗口（paramiko 默认 2MB），调大后高延迟链路上的下载不再频繁等待窗口调整
+SFTP_WINDOW_SIZE = 16 * 1024 * 1024
+
+
+def like_contains(text, keyword):
+    """与 SQL 条件 LIKE like_pattern(keyword) ESCAPE '\\' 相同的包含判断：按字面匹配，只对 ASCII 字母忽略大小写"""
+    return keyword.translate(_ASCII_LOWER) in (text or "").translate(_ASCII_LOWER)
+
+
+def like_pattern(keyword):
+    """LIKE 的包含匹配参数；转义 % _ \\，使其按字面匹配（SQL 中须带 ESCAPE '\\'）"""
+    escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def _apply_deltas(content, ops):
+    for pos, deleted, text in ops:
+        content = content[:pos] + text + content[pos + deleted:]
+    return content
+
 
 class StorageManager:
     def __init__(self, db_name="safedraft.db"):
@@ -38,8 +90,10 @@ class StorageManager:
         # 初始化连接
         self.conn = None
         self.cursor = None
-        self.connect_db()
-        self._init_db()
+        with timeline.phase("db.connect"):
+            self.connect_db()
+        with timeline.phase("db.init"):
+            self._init_db()
 
         self._observers = []
 
@@ -73,6 +127,17 @@ class StorageManager:
                     created_at TIMESTAMP,
                     last_updated_at TIMESTAMP
                 )''')
+            # 草稿增量：(位置, 删除长度, 插入文本) 按 id 顺序作用于 drafts.content，length 为应用后的全文长度
+            self.cursor.execute('''CREATE TABLE IF NOT EXISTS draft_deltas (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    draft_id INTEGER,
+                    pos INTEGER,
+                    deleted INTEGER,
+                    text TEXT,
+                    length INTEGER,
+                    created_at TIMESTAMP
+                )''')
+            self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_draft_deltas_draft ON draft_deltas (draft_id, id)')
             self.cursor.execute('''CREATE TABLE IF NOT EXISTS triggers_v2 (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     rule_type TEXT, value TEXT, enabled INTEGER DEFAULT 0,
@@ -129,46 +194,59 @@ class StorageManager:
         else:
             username, hostname = None, ip_input
 
+        # paramiko 导入较慢（约 0.2 秒），只在第一次连接服务器时导入，不拖慢启动
+        import paramiko
+
         ssh = paramiko.SSHClient()
         ssh.load_system_host_keys()
         ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
         # 尝试连接（超时10秒）
         ssh.connect(hostname, username=username, timeout=10)
+
+        # 之后打开的 SFTP 通道使用更大的窗口
+        transport = ssh.get_transport()
+        if transport:
+            transport.default_window_size = SFTP_WINDOW_SIZE
+            # SFTP 小请求（open/close/rename）不等待 Nagle 合并
+            try:
+                transport.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except:
+                pass
         return ssh
 
     def sync_upload(self, server_ip, remote_path):
         """上传当前数据库到服务器"""
-        if not server_ip or not remote_path:
+        if not is_config_complete(get_backend_name(self), server_ip, remote_path):
             raise ValueError("配置不完整")
 
-        ssh = self._get_ssh_client(server_ip)
-        sftp = ssh.open_sftp()
+        backend = create_backend(self, server_ip)
+        backend.connect()
         try:
             remote_file = f"{remote_path.rstrip('/')}/safedraft.db"
             # 刷新本地缓存
             with self.lock:
+                self.consolidate_deltas_no_lock()
                 self.conn.commit()
 
-            sftp.put(self.db_path, remote_file)
+            backend.put_file(self.db_path, remote_file)
         finally:
-            sftp.close()
-            ssh.close()
+            backend.close()
 
     def sync_download(self, server_ip, remote_path):
         """从服务器下载数据库并覆盖本地"""
-        if not server_ip or not remote_path:
+        if not is_config_complete(get_backend_name(self), server_ip, remote_path):
             raise ValueError("配置不完整")
 
         tmp_path = self.db_path + ".tmp"
         bak_path = self.db_path + ".bak"
 
-        ssh = self._get_ssh_client(server_ip)
-        sftp = ssh.open_sftp()
+        backend = create_backend(self, server_ip)
+        backend.connect()
 
         try:
             remote_file = f"{remote_path.rstrip('/')}/safedraft.db"
-            sftp.get(remote_file, tmp_path)
+            backend.get_file(remote_file, tmp_path)
 
             # 覆盖逻辑
             with self.lock:
@@ -183,6 +261,9 @@ class StorageManager:
                     self.connect_db()
                     # 简单自检
                     self.cursor.execute("SELECT count(*) FROM settings")
+                    # 本地数据库已整体替换，远端合并的变更序号随之失效
+                    import remote_merge
+                    remote_merge.clear_state(self.base_path)
                 except Exception as e:
                     # 回滚
                     if self.conn: self.conn.close()
@@ -200,8 +281,7 @@ class StorageManager:
             raise e
         finally:
             if os.path.exists(tmp_path): os.remove(tmp_path)
-            sftp.close()
-            ssh.close()
+            backend.close()
 
         self._notify_observers()
 
@@ -219,9 +299,67 @@ class StorageManager:
 
         # 连接临时数据库
         other_conn = sqlite3.connect(other_db_path, check_same_thread=False)
+        self._merge_from_connection(other_conn)
+
+    def merge_database_bytes(self, data):
+        """将内存中的数据库镜像（bytes）合并到当前数据库，不落盘。
+        当前 Python 不支持 Connection.deserialize 时回退为临时文件。"""
+        if not data:
+            return
+
+        if not hasattr(sqlite3.Connection, "deserialize"):
+            tmp_path = self.db_path + ".remote_tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                self.merge_database(tmp_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    try:
+                        os.remove(tmp_path)
+                    except:
+                        pass
+            return
+
+        # WAL 格式的镜像无法在内存库中打开，改写文件头为回滚日志模式
+        if len(data) > 19 and data[18:20] == b'\x02\x02':
+            data = bytearray(data)
+            data[18:20] = b'\x01\x01'
+            data = bytes(data)
+
+        other_conn = sqlite3.connect(":memory:", check_same_thread=False)
+        other_conn.deserialize(data)
+        self._merge_from_connection(other_conn)
+
+    def _fetch_remote_db(self, backend, remote_file, callback=None, max_requests=None):
+        """通过同步后端下载远端数据库（SFTP 开启预取，max_requests 默认 SFTP_PREFETCH_REQUESTS）。
+        不超过 MEMORY_MERGE_MAX_BYTES 时流式读入内存，返回 (bytes, None)；
+        超过阈值时下载到临时文件，返回 (None, tmp_path)，调用方负责删除。
+        远端不存在时抛 FileNotFoundError。"""
+        if max_requests is None:
+            from sync_engine import SFTP_PREFETCH_REQUESTS
+            max_requests = SFTP_PREFETCH_REQUESTS
+        size = backend.stat(remote_file) or 0
+        if size > MEMORY_MERGE_MAX_BYTES or not hasattr(sqlite3.Connection, "deserialize"):
+            tmp_path = self.db_path + ".remote_tmp"
+            try:
+                backend.get_file(remote_file, tmp_path, callback=callback, max_requests=max_requests)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            return None, tmp_path
+
+        buf = io.BytesIO()
+        backend.get_stream(remote_file, buf, callback=callback, max_requests=max_requests)
+        return buf.getvalue(), None
+
+    def _merge_from_connection(self, other_conn):
+        """从已打开的数据库连接合并数据，结束后关闭该连接"""
         other_cur = other_conn.cursor()
 
         with self.lock:
+            self.consolidate_deltas_no_lock()
             try:
                 # 1. 合并 folders (按 uuid)
                 other_cur.execute('SELECT uuid, name, is_deleted, updated_at FROM folders')
@@ -263,24 +401,31 @@ class StorageManager:
                                             (uuid_val, folder_uuid, title, content, is_deleted, updated_at, source_draft_id))
 
                 # 3. 合并 drafts (按内容去重，保留 last_updated_at 最新)
+                # drafts.content 没有索引，先把本地内容读入字典，避免每行一次全表扫描
                 other_cur.execute('SELECT content, created_at, last_updated_at FROM drafts')
-                for row in other_cur.fetchall():
-                    content, created_at, last_updated_at = row
+                other_drafts = other_cur.fetchall()
+                local_drafts = {}
+                if other_drafts:
+                    self.cursor.execute('SELECT id, content, last_updated_at FROM drafts ORDER BY id')
+                    for local_id, content, local_updated in self.cursor.fetchall():
+                        local_drafts.setdefault(content, [local_id, local_updated])
+                for content, created_at, last_updated_at in other_drafts:
                     if not content or not content.strip():
                         continue
                     # 检查是否存在相同内容
-                    self.cursor.execute('SELECT id, last_updated_at FROM drafts WHERE content = ?', (content,))
-                    local_row = self.cursor.fetchone()
+                    local_row = local_drafts.get(content)
                     if local_row:
                         local_id, local_updated = local_row
                         if last_updated_at > (local_updated or ""):
                             # 远程更新，更新本地时间戳
                             self.cursor.execute('UPDATE drafts SET last_updated_at = ? WHERE id = ?',
                                                 (last_updated_at, local_id))
+                            local_row[1] = last_updated_at
                     else:
                         # 本地不存在该内容，插入
                         self.cursor.execute('INSERT INTO drafts (content, created_at, last_updated_at) VALUES (?, ?, ?)',
                                             (content, created_at, last_updated_at))
+                        local_drafts[content] = [self.cursor.lastrowid, last_updated_at]
 
                 # 4. 合并 triggers_v2 (按 rule_type + value 去重)
                 other_cur.execute('SELECT rule_type, value, enabled FROM triggers_v2')
@@ -342,158 +487,171 @@ class StorageManager:
         self.deduplicate_drafts()
         self._notify_observers()
 
-    def sync_upload_merge(self, server_ip, remote_path):
+    def merge_many(self, paths):
+        """
+        一次合并多个数据库（如多台设备导出的 safedraft.db），规则与 merge_database 相同，
+        但 ATTACH 全部来源后按表做一次集合运算：
+        - folders / notes / stickynotes: 跨所有来源与本地取 updated_at 最新者
+          （时间相同保留本地，其次是 paths 中靠前的来源）
+        - drafts: 按内容合并，created_at 取最早、last_updated_at 取最新
+        - triggers_v2: 按 (rule_type, value) 去重
+        去重与观察者通知只在最后执行一次。来源超过 MERGE_ATTACH_BATCH 个时分批附加。
+        返回 {"sources": 合并的来源数, "changes": 写入行数, "deduplicated": 去重删除的草稿数}
+        """
+        paths = [p for p in paths if os.path.exists(p)]
+        if not paths:
+            return {"sources": 0, "changes": 0, "deduplicated": 0}
+
+        with self.lock:
+            self.consolidate_deltas_no_lock()
+            self.conn.commit()
+            before = self.conn.total_changes
+            for i in range(0, len(paths), MERGE_ATTACH_BATCH):
+                self._merge_attached(paths[i:i + MERGE_ATTACH_BATCH])
+            changes = self.conn.total_changes - before
+
+        # deduplicate_drafts 结束时会通知观察者
+        deduplicated = self.deduplicate_drafts()
+        return {"sources": len(paths), "changes": changes, "deduplicated": deduplicated}
+
+    def _merge_attached(self, paths):
+        """附加一批数据库并合并（调用方持有 self.lock）"""
+        cur = self.cursor
+        aliases = []
+        try:
+            for i, path in enumerate(paths):
+                alias = f"merge_src{i}"
+                cur.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+                aliases.append(alias)
+
+            # 每张表的候选行：各来源 UNION ALL，src 为来源序号（缺少该表的旧版本数据库跳过）
+            for table, cols in MERGE_COLUMNS.items():
+                col_list = ", ".join(cols)
+                selects = []
+                for n, alias in enumerate(aliases, 1):
+                    cur.execute(f"SELECT 1 FROM {alias}.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+                    if cur.fetchone():
+                        selects.append(f"SELECT {col_list}, {n} AS src FROM {alias}.{table}")
+                if not selects:
+                    selects.append(f"SELECT {col_list}, 0 AS src FROM main.{table} WHERE 0")
+                cur.execute(f"CREATE TEMP TABLE merge_{table} AS " + " UNION ALL ".join(selects))
+
+            self._merge_newest_by_uuid("folders")
+            self._merge_newest_by_uuid("notes")
+
+            # drafts：每个非空内容一行
+            cur.execute("""CREATE TEMP TABLE merge_drafts_best AS
+                           SELECT content, MIN(created_at) AS created_at, MAX(last_updated_at) AS last_updated_at
+                           FROM temp.merge_drafts
+                           WHERE content IS NOT NULL AND TRIM(content, char(32, 9, 10, 11, 12, 13)) != ''
+                           GROUP BY content""")
+            cur.execute("CREATE INDEX temp.merge_drafts_best_content ON merge_drafts_best (content)")
+            cur.execute("""UPDATE main.drafts SET last_updated_at =
+                               (SELECT b.last_updated_at FROM temp.merge_drafts_best b WHERE b.content = drafts.content)
+                           WHERE content IN (SELECT content FROM temp.merge_drafts_best)
+                             AND COALESCE(last_updated_at, '') <
+                               (SELECT b.last_updated_at FROM temp.merge_drafts_best b WHERE b.content = drafts.content)""")
+            cur.execute("""INSERT INTO main.drafts (content, created_at, last_updated_at)
+                           SELECT content, created_at, last_updated_at FROM temp.merge_drafts_best
+                           WHERE content NOT IN (SELECT content FROM main.drafts WHERE content IS NOT NULL)""")
+
+            cur.execute("""INSERT OR IGNORE INTO main.triggers_v2 (rule_type, value, enabled)
+                           SELECT rule_type, value, enabled FROM temp.merge_triggers_v2 ORDER BY src""")
+
+            self._merge_stickynotes_attached()
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            for table in list(MERGE_COLUMNS) + ["drafts_best", "best", "sticky_new"]:
+                cur.execute(f"DROP TABLE IF EXISTS temp.merge_{table}")
+            self.conn.commit()
+            for alias in aliases:
+                cur.execute(f"DETACH DATABASE {alias}")
+
+    def _merge_newest_by_uuid(self, table, insert_new=True):
+        """为每个 uuid 选出来源中 updated_at 最新的一行（存入 temp.merge_best），
+        覆盖本地较旧的行；insert_new 为 True 时同时插入本地不存在的 uuid"""
+        cols = MERGE_COLUMNS[table]
+        col_list = ", ".join(cols)
+        self.cursor.execute("DROP TABLE IF EXISTS temp.merge_best")
+        self.cursor.execute(f"""CREATE TEMP TABLE merge_best AS
+                                SELECT {col_list} FROM (
+                                    SELECT {col_list}, ROW_NUMBER() OVER (
+                                        PARTITION BY uuid ORDER BY COALESCE(updated_at, '') DESC, src) AS rn
+                                    FROM temp.merge_{table}
+                                ) WHERE rn = 1""")
+        join = "LEFT JOIN" if insert_new else "JOIN"
+        self.cursor.execute(f"""INSERT OR REPLACE INTO main.{table} ({col_list})
+                                SELECT {", ".join("b." + c for c in cols)}
+                                FROM temp.merge_best b {join} main.{table} t ON t.uuid = b.uuid
+                                WHERE t.uuid IS NULL OR COALESCE(b.updated_at, '') > COALESCE(t.updated_at, '')""")
+
+    def _merge_stickynotes_attached(self):
+        """stickynotes：已有 uuid 取最新；新 uuid 再按 content 去重，同内容只保留 updated_at 最新的一条"""
+        cur = self.cursor
+        self._merge_newest_by_uuid("stickynotes", insert_new=False)
+        col_list = ", ".join(MERGE_COLUMNS["stickynotes"])
+
+        # 新 uuid：空内容全部保留，非空内容每个内容只取最新一条
+        cur.execute(f"""CREATE TEMP TABLE merge_sticky_new AS
+                        SELECT {col_list} FROM (
+                            SELECT {col_list}, ROW_NUMBER() OVER (
+                                PARTITION BY CASE WHEN content IS NULL OR content = '' THEN uuid ELSE content END
+                                ORDER BY COALESCE(updated_at, '') DESC, rowid) AS rn
+                            FROM temp.merge_best
+                            WHERE uuid NOT IN (SELECT uuid FROM main.stickynotes)
+                        ) WHERE rn = 1""")
+        # 本地内容相同但较旧的便签让位给新的
+        cur.execute("""DELETE FROM main.stickynotes
+                       WHERE content IS NOT NULL AND content != ''
+                         AND COALESCE(updated_at, '') <
+                             (SELECT COALESCE(n.updated_at, '') FROM temp.merge_sticky_new n
+                              WHERE n.content = stickynotes.content)""")
+        cur.execute(f"""INSERT INTO main.stickynotes ({col_list})
+                        SELECT {col_list} FROM temp.merge_sticky_new
+                        WHERE content IS NULL OR content = ''
+                           OR content NOT IN (SELECT content FROM main.stickynotes WHERE content IS NOT NULL)""")
+
+    def sync_upload_merge(self, server_ip, remote_path, on_progress=None):
         """
         智能上传：先下载服务器数据，合并后再上传
-        1. 下载服务器数据库到临时文件
+        1. 下载服务器数据库（小库读入内存，大库落盘临时文件）
         2. 将服务器数据合并到本地
         3. 推送合并后的本地数据库到服务器
+        各阶段实现见 SyncEngine.upload_merge
         """
-        if not server_ip or not remote_path:
+        if not is_config_complete(get_backend_name(self), server_ip, remote_path):
             raise ValueError("配置不完整")
+        from sync_engine import SyncEngine
+        return SyncEngine(self, server_ip, remote_path, on_progress).upload_merge()
 
-        tmp_path = self.db_path + ".remote_tmp"
-
-        ssh = self._get_ssh_client(server_ip)
-        sftp = ssh.open_sftp()
-
-        try:
-            remote_file = f"{remote_path.rstrip('/')}/safedraft.db"
-
-            # 1. 尝试下载服务器数据库
-            try:
-                sftp.get(remote_file, tmp_path)
-                server_has_data = True
-            except FileNotFoundError:
-                # 服务器上没有数据，跳过合并
-                server_has_data = False
-            except Exception as e:
-                # 其他错误（如文件不存在但不是 FileNotFoundError）
-                server_has_data = os.path.exists(tmp_path)
-
-            # 2. 如果服务器有数据，合并到本地
-            if server_has_data and os.path.exists(tmp_path):
-                self.merge_database(tmp_path)
-                os.remove(tmp_path)
-
-            # 3. 上传合并后的本地数据库
-            with self.lock:
-                self.conn.commit()
-
-            # 4. 更新本地 MD5 状态文件
-            md5_hash = self.update_md5_status()
-
-            sftp.put(self.db_path, remote_file)
-
-            # 5. 删除远程旧的 md5 状态文件
-            remote_base = remote_path.rstrip('/')
-            for fname in sftp.listdir(remote_base):
-                if fname.startswith("safedraft_") and fname.endswith(".md5"):
-                    try:
-                        sftp.remove(f"{remote_base}/{fname}")
-                    except:
-                        pass
-
-            # 6. 上传新的 md5 状态文件
-            local_status = os.path.join(self.base_path, f"safedraft_{md5_hash}.md5")
-            remote_md5 = f"{remote_base}/safedraft_{md5_hash}.md5"
-            sftp.put(local_status, remote_md5)
-
-        finally:
-            if os.path.exists(tmp_path):
-                try:
-                    os.remove(tmp_path)
-                except:
-                    pass
-            sftp.close()
-            ssh.close()
-
-    def sync_download_merge(self, server_ip, remote_path):
+    def sync_download_merge(self, server_ip, remote_path, on_progress=None):
         """
         智能下载：下载服务器数据，与本地合并
-        1. 下载服务器数据库到临时文件
+        1. 下载服务器数据库（小库读入内存，大库落盘临时文件）
         2. 将服务器数据合并到本地
         3. 通知观察者刷新 UI
         """
-        if not server_ip or not remote_path:
+        if not is_config_complete(get_backend_name(self), server_ip, remote_path):
             raise ValueError("配置不完整")
+        from sync_engine import SyncEngine
+        return SyncEngine(self, server_ip, remote_path, on_progress).download_merge()
 
-        tmp_path = self.db_path + ".remote_tmp"
-
-        ssh = self._get_ssh_client(server_ip)
-        sftp = ssh.open_sftp()
-
-        try:
-            remote_file = f"{remote_path.rstrip('/')}/safedraft.db"
-            sftp.get(remote_file, tmp_path)
-
-            # 合并服务器数据到本地
-            if os.path.exists(tmp_path):
-                self.merge_database(tmp_path)
-                os.remove(tmp_path)
-
-            # 合并后更新本地 md5 状态文件
-            self.update_md5_status()
-
-        except FileNotFoundError:
-            raise Exception("服务器上暂无同步数据")
-        finally:
-            if os.path.exists(tmp_path):
-                try:
-                    os.remove(tmp_path)
-                except:
-                    pass
-            sftp.close()
-            ssh.close()
-
-    def force_push_overwrite(self, server_ip, remote_path):
+    def force_push_overwrite(self, server_ip, remote_path, on_progress=None):
         """强制推送：用本地 DB 完全覆盖远程。
-        1. 远程现有 safedraft.db 备份为 safedraft.db.bak.YYYYMMDD_HHMMSS
+        1. 远程现有 safedraft.db 分块存入去重备份仓库 backups/（见 backup_store.py）；
+           需要下载整个远端数据库，耗时与数据库大小成正比，下载内容同时用作第 2 步增量上传的基准
         2. 上传本地 safedraft.db 覆盖远程
         3. 更新本地 MD5 状态文件
         4. 删除远程所有旧 safedraft_*.md5
         5. 上传新的 safedraft_{hash}.md5
         """
-        if not server_ip or not remote_path:
+        if not is_config_complete(get_backend_name(self), server_ip, remote_path):
             raise ValueError("配置不完整")
-
-        ssh = self._get_ssh_client(server_ip)
-        sftp = ssh.open_sftp()
-
-        try:
-            remote_base = remote_path.rstrip('/')
-            remote_file = f"{remote_base}/safedraft.db"
-
-            try:
-                sftp.stat(remote_file)
-                backup_name = f"safedraft.db.bak.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                remote_backup = f"{remote_base}/{backup_name}"
-                sftp.rename(remote_file, remote_backup)
-            except FileNotFoundError:
-                pass
-            except IOError:
-                pass
-
-            with self.lock:
-                self.conn.commit()
-            sftp.put(self.db_path, remote_file)
-
-            md5_hash = self.update_md5_status()
-
-            for fname in sftp.listdir(remote_base):
-                if fname.startswith("safedraft_") and fname.endswith(".md5"):
-                    try:
-                        sftp.remove(f"{remote_base}/{fname}")
-                    except Exception:
-                        pass
-
-            local_status = os.path.join(self.base_path, f"safedraft_{md5_hash}.md5")
-            remote_md5 = f"{remote_base}/safedraft_{md5_hash}.md5"
-            sftp.put(local_status, remote_md5)
-
-        finally:
-            sftp.close()
-            ssh.close()
+        from sync_engine import SyncEngine
+        return SyncEngine(self, server_ip, remote_path, on_progress).force_push()
 
     def add_observer(self, callback):
         if callback not in self._observers: self._observers.append(callback)
@@ -512,6 +670,7 @@ class StorageManager:
     def calculate_db_md5(self):
         """计算本地数据库文件的 MD5 值"""
         with self.lock:
+            self.consolidate_deltas_no_lock()
             self.conn.commit()
         md5 = hashlib.md5()
         with open(self.db_path, 'rb') as f:
@@ -519,9 +678,24 @@ class StorageManager:
                 md5.update(chunk)
         return md5.hexdigest()
 
-    def update_md5_status(self):
-        """计算 MD5，删除旧的 safedraft_*.md5，创建新的状态文件，返回 hash"""
-        md5_hash = self.calculate_db_md5()
+    def change_marker(self):
+        """
+        不读全文、不合并增量的修改标记：数据库文件头的修改计数（偏移 24，每次提交写事务加一）、文件大小与修改时间。
+        标记不变说明文件没有被写过，之前算出的 MD5 仍然有效；文件不存在时返回 None
+        """
+        try:
+            st = os.stat(self.db_path)
+            with open(self.db_path, 'rb') as f:
+                f.seek(24)
+                counter = f.read(4)
+        except OSError:
+            return None
+        return (counter, st.st_size, st.st_mtime_ns)
+
+    def update_md5_status(self, md5_hash=None):
+        """计算 MD5（或使用传入的 hash），删除旧的 safedraft_*.md5，创建新的状态文件，返回 hash"""
+        if md5_hash is None:
+            md5_hash = self.calculate_db_md5()
         # 删除旧的本地状态文件
         for old in glob.glob(os.path.join(self.base_path, "safedraft_*.md5")):
             try:
@@ -573,12 +747,83 @@ class StorageManager:
             else:
                 self.cursor.execute('UPDATE drafts SET content = ?, last_updated_at = ? WHERE id = ?',
                                     (content, now.isoformat(), draft_id))
+                # 全文已覆盖，之前的增量作废
+                self.cursor.execute('DELETE FROM draft_deltas WHERE draft_id = ?', (draft_id,))
 
             self.conn.commit()
 
         self._notify_observers()
         return new_draft_id
 
+    def save_delta(self, draft_id, ops, base_length):
+        """
+        把编辑操作 [(位置, 删除长度, 插入文本), ...] 追加为草稿的增量，写入量与编辑量成正比，
+        drafts 中的全文要等 consolidate 时才改写。base_length 为编辑前的全文长度，用于确认增量的基准；
+        草稿不存在或长度对不上（如同步后内容已被替换）时不写入并返回 False，调用方应改存全文。
+        """
+        if not ops: return True
+        now = datetime.now().isoformat()
+        with self.lock:
+            self.cursor.execute('SELECT length FROM draft_deltas WHERE draft_id = ? ORDER BY id DESC LIMIT 1',
+                                (draft_id,))
+            row = self.cursor.fetchone()
+            if row is None:
+                self.cursor.execute('SELECT length(content) FROM drafts WHERE id = ?', (draft_id,))
+                row = self.cursor.fetchone()
+            if row is None or row[0] != base_length:
+                return False
+
+            length = base_length
+            rows = []
+            for pos, deleted, text in ops:
+                length += len(text) - deleted
+                rows.append((draft_id, pos, deleted, text, length, now))
+            self.cursor.executemany(
+                'INSERT INTO draft_deltas (draft_id, pos, deleted, text, length, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                rows)
+
+            self.cursor.execute('SELECT count(*), total(length(text)) FROM draft_deltas WHERE draft_id = ?',
+                                (draft_id,))
+            count, delta_chars = self.cursor.fetchone()
+            if count >= DELTA_CONSOLIDATE_COUNT or delta_chars > length * DELTA_CONSOLIDATE_RATIO:
+                self.consolidate_deltas_no_lock(draft_id)
+            self.conn.commit()
+
+        self._notify_observers()
+        return True
+
+    def consolidate_deltas(self, draft_id=None):
+        """把增量合并回 drafts 全文（上传、合并、去重前以及退出时调用），返回合并的草稿数"""
+        with self.lock:
+            count = self.consolidate_deltas_no_lock(draft_id)
+            self.conn.commit()
+        return count
+
+    def consolidate_deltas_no_lock(self, draft_id=None):
+        pending = self._load_deltas_no_lock(draft_id)
+        for did, (ops, updated_at) in pending.items():
+            self.cursor.execute('SELECT content FROM drafts WHERE id = ?', (did,))
+            row = self.cursor.fetchone()
+            if row is not None:
+                self.cursor.execute('UPDATE drafts SET content = ?, last_updated_at = ? WHERE id = ?',
+                                    (_apply_deltas(row[0] or "", ops), updated_at, did))
+            self.cursor.execute('DELETE FROM draft_deltas WHERE draft_id = ?', (did,))
+        return len(pending)
+
+    def _load_deltas_no_lock(self, draft_id=None):
+        """{draft_id: ([(位置, 删除长度, 插入文本), ...], 最后修改时间)}"""
+        if draft_id is None:
+            self.cursor.execute('SELECT draft_id, pos, deleted, text, created_at FROM draft_deltas ORDER BY id')
+        else:
+            self.cursor.execute('SELECT draft_id, pos, deleted, text, created_at FROM draft_deltas '
+                                'WHERE draft_id = ? ORDER BY id', (draft_id,))
+        pending = {}
+        for did, pos, deleted, text, created_at in self.cursor.fetchall():
+            ops, _ = pending.get(did, ([], None))
+            ops.append((pos, deleted, text))
+            pending[did] = (ops, created_at)
+        return pending
+
     def save_content_forced(self, content):
         if not content.strip(): return
         now = datetime.now()
@@ -600,6 +845,7 @@ class StorageManager:
     def deduplicate_drafts(self):
         """按内容去重，保留 last_updated_at 最新的记录"""
         with self.lock:
+            self.consolidate_deltas_no_lock()
             # 按 content 分组，保留每组中 last_updated_at 最大的记录
             self.cursor.execute('''
                 DELETE FROM drafts
@@ -620,6 +866,7 @@ class StorageManager:
         严格大小写、不 strip；空白记录直接删除。
         返回删除条数。"""
         with self.lock:
+            self.consolidate_deltas_no_lock()
             self.cursor.execute('SELECT id, content FROM drafts ORDER BY id ASC')
             rows = self.cursor.fetchall()
 
@@ -661,23 +908,77 @@ class StorageManager:
         return deleted_count
 
     def get_history(self, keyword=None):
+        return [row for rows in self.iter_history(keyword, batch_size=None) for row in rows]
+
+    def iter_history(self, keyword=None, batch_size=HISTORY_BATCH_ROWS):
+        """按最后修改时间倒序分批返回草稿 [(id, content, created_at, last_updated_at), ...]，
+        供列表边读取边显示；batch_size 为 None 时一次返回全部"""
+        keywords = keyword.split() if keyword else []
         with self.lock:
-            if keyword:
-                # 支持多关键词空格分隔，所有关键词必须同时匹配（AND 逻辑）
-                keywords = keyword.split()
-                conditions = " AND ".join(["content LIKE ?" for _ in keywords])
-                params = [f"%{kw}%" for kw in keywords]
-                self.cursor.execute(
-                    f'SELECT id, content, created_at, last_updated_at FROM drafts WHERE {conditions} ORDER BY last_updated_at DESC',
-                    params)
-            else:
-                self.cursor.execute(
-                    'SELECT id, content, created_at, last_updated_at FROM drafts ORDER BY last_updated_at DESC')
-            return self.cursor.fetchall()
+            pending = self._load_deltas_no_lock()
+        order = "last_updated_at"
+        where = ""
+        params = []
+        if pending:
+            # 有增量的草稿以最后一条增量的时间排序
+            order = "COALESCE((SELECT max(created_at) FROM draft_deltas WHERE draft_id = drafts.id), last_updated_at)"
+        if keywords:
+            # 支持多关键词空格分隔，所有关键词必须同时匹配（AND 逻辑）
+            conditions = " AND ".join(["content LIKE ? ESCAPE '\\'" for _ in keywords])
+            params = [like_pattern(kw) for kw in keywords]
+            if pending:
+                # 有增量的草稿全文尚未更新，取出后在下面按最新内容过滤
+                conditions = f"({conditions}) OR id IN (SELECT draft_id FROM draft_deltas)"
+            where = f" WHERE {conditions}"
+        sql = f'SELECT id, content, created_at, last_updated_at FROM drafts{where} ORDER BY {order} DESC'
+
+        for rows in self._iter_query(sql, params, batch_size):
+            if pending:
+                result = []
+                for row in rows:
+                    if row[0] in pending:
+                        ops, updated_at = pending[row[0]]
+                        content = _apply_deltas(row[1] or "", ops)
+                        if not all(like_contains(content, kw) for kw in keywords):
+                            continue
+                        row = (row[0], content, row[2], updated_at)
+                    result.append(row)
+                rows = result
+            if rows:
+                yield rows
+
+    def _iter_query(self, sql, params=(), batch_size=None):
+        """分批读取查询结果；每批单独持锁，批与批之间其它线程可以读写数据库"""
+        cur = self.conn.cursor()
+        try:
+            with self.lock:
+                cur.execute(sql, tuple(params))
+                rows = cur.fetchall() if batch_size is None else cur.fetchmany(batch_size)
+            while rows:
+                yield rows
+                if batch_size is None:
+                    break
+                with self.lock:
+                    rows = cur.fetchmany(batch_size)
+        finally:
+            cur.close()
+
+    def get_draft_content(self, draft_id):
+        """返回草稿内容（含未合并的增量），不存在时返回 None"""
+        with self.lock:
+            self.cursor.execute('SELECT content FROM drafts WHERE id = ?', (draft_id,))
+            row = self.cursor.fetchone()
+            if not row:
+                return None
+            pending = self._load_deltas_no_lock(draft_id)
+            if draft_id in pending:
+                return _apply_deltas(row[0] or "", pending[draft_id][0])
+            return row[0]
 
     def delete_draft(self, draft_id):
         with self.lock:
             self.cursor.execute('DELETE FROM drafts WHERE id = ?', (draft_id,))
+            self.cursor.execute('DELETE FROM draft_deltas WHERE draft_id = ?', (draft_id,))
             self.conn.commit()
         self._notify_observers()
 
@@ -694,7 +995,8 @@ class StorageManager:
                 cur.execute('SELECT rule_type, value FROM triggers_v2 WHERE enabled = 1')
                 data = cur.fetchall()
                 rules = {'title': [], 'process': []}
-                for r, v in data: rules.setdefault(r, []).append(v.lower())
+                # 正则规则区分 \W / \w 等转义，保持原样（匹配时忽略大小写）
+                for r, v in data: rules.setdefault(r, []).append(v if r == 'regex' else v.lower())
                 return rules
             finally:
                 cur.close()
@@ -758,20 +1060,21 @@ class StorageManager:
         self._notify_observers()
 
     def get_notes(self, folder_uuid=None, keyword=None):
+        return [row for rows in self.iter_notes(folder_uuid, keyword, batch_size=None) for row in rows]
+
+    def iter_notes(self, folder_uuid=None, keyword=None, batch_size=HISTORY_BATCH_ROWS):
+        """分批返回未删除的笔记 [(uuid, title, content, updated_at), ...]，规则同 get_notes"""
         sql = 'SELECT uuid, title, content, updated_at FROM notes WHERE is_deleted = 0'
         params = []
         if folder_uuid:
             sql += ' AND folder_uuid = ?'
             params.append(folder_uuid)
         if keyword:
-            sql += ' AND (title LIKE ? OR content LIKE ?)'
-            params.append(f"%{keyword}%")
-            params.append(f"%{keyword}%")
+            sql += " AND (title LIKE ? ESCAPE '\\' OR content LIKE ? ESCAPE '\\')"
+            params.append(like_pattern(keyword))
+            params.append(like_pattern(keyword))
         sql += ' ORDER BY updated_at DESC'
-
-        with self.lock:
-            self.cursor.execute(sql, tuple(params))
-            return self.cursor.fetchall()
+        return self._iter_query(sql, params, batch_size)
 
     def get_note_detail(self, note_uuid):
         with self.lock:
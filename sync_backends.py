@@ -0,0 +1,302 @@
+"""
+同步后端 - SyncEngine 通过统一接口访问远端存储
+SftpBackend: 经 SSH/SFTP 访问服务器（默认）
+LocalDirBackend: 直接读写本地或已挂载的目录（NAS 共享、网盘同步文件夹等），无需 SSH
+"""
+
+import os
+import threading
+
+BACKEND_SFTP = "sftp"
+BACKEND_LOCAL = "local"
+
+BACKEND_LABELS = {
+    BACKEND_SFTP: "SFTP (SSH)",
+    BACKEND_LOCAL: "本地/挂载目录",
+}
+
+# 本地后端单次读写的块大小
+LOCAL_COPY_CHUNK = 1024 * 1024
+# 远端命令标准输入每次发送的字节数（兼顾进度回调频率）
+EXEC_SEND_CHUNK = 64 * 1024
+
+
+class SyncBackend:
+    """
+    远端存储接口。路径均为远端完整路径（由 SyncEngine 拼接）。
+    - stat(path) 返回文件大小，不存在时抛 FileNotFoundError
+    - mtime(path) 返回远端文件的修改时间（远端文件系统的时钟，秒）
+    - 传输回调 callback(done, total) 与 paramiko 一致，可在回调中抛异常中断传输
+    """
+
+    name = ""
+    requires_server = False  # 是否需要填写服务器地址
+    supports_exec = False    # 是否能在远端执行命令（增量上传助手需要）
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def listdir(self, path):
+        raise NotImplementedError
+
+    def stat(self, path):
+        raise NotImplementedError
+
+    def mtime(self, path):
+        raise NotImplementedError
+
+    def get_stream(self, path, fileobj, callback=None, max_requests=None):
+        """下载远端文件写入 fileobj"""
+        raise NotImplementedError
+
+    def get_file(self, path, local_path, callback=None, max_requests=None):
+        with open(local_path, 'wb') as f:
+            self.get_stream(path, f, callback=callback, max_requests=max_requests)
+
+    def put_stream(self, fileobj, path, callback=None, total=None):
+        """从 fileobj 读取并写入远端文件（覆盖）"""
+        raise NotImplementedError
+
+    def put_file(self, local_path, path, callback=None):
+        with open(local_path, 'rb') as f:
+            self.put_stream(f, path, callback=callback, total=os.path.getsize(local_path))
+
+    def open(self, path, mode='rb'):
+        """打开远端文件做随机读写（断点续传用）"""
+        raise NotImplementedError
+
+    def rename(self, src, dst):
+        raise NotImplementedError
+
+    def replace(self, src, dst):
+        """用 src 原子替换 dst"""
+        raise NotImplementedError
+
+    def remove(self, path):
+        raise NotImplementedError
+
+    def mkdir(self, path):
+        """创建目录，已存在时忽略"""
+        raise NotImplementedError
+
+    def exec_command(self, command, stdin_data=None, callback=None):
+        """在远端执行命令，stdin_data 写入其标准输入，返回 (exit_status, stdout bytes, stderr bytes)"""
+        raise NotImplementedError
+
+
+class SftpBackend(SyncBackend):
+    name = BACKEND_SFTP
+    requires_server = True
+    supports_exec = True
+
+    def __init__(self, db, server_ip, io_timeout=None):
+        self.db = db
+        self.server_ip = server_ip
+        self.io_timeout = io_timeout
+        self.ssh = None
+        self.sftp = None
+
+    def connect(self):
+        if self.sftp:
+            return
+        self.ssh = self.db._get_ssh_client(self.server_ip)
+        self.sftp = self.ssh.open_sftp()
+        if self.io_timeout:
+            try:
+                self.sftp.get_channel().settimeout(self.io_timeout)
+            except:
+                pass
+
+    def close(self):
+        if self.sftp:
+            try:
+                self.sftp.close()
+            except:
+                pass
+            self.sftp = None
+        if self.ssh:
+            try:
+                self.ssh.close()
+            except:
+                pass
+            self.ssh = None
+
+    def listdir(self, path):
+        return self.sftp.listdir(path)
+
+    def stat(self, path):
+        return self.sftp.stat(path).st_size
+
+    def mtime(self, path):
+        return self.sftp.stat(path).st_mtime
+
+    def get_stream(self, path, fileobj, callback=None, max_requests=None):
+        self.sftp.getfo(path, fileobj, callback=callback,
+                        max_concurrent_prefetch_requests=max_requests)
+
+    def get_file(self, path, local_path, callback=None, max_requests=None):
+        self.sftp.get(path, local_path, callback=callback,
+                      max_concurrent_prefetch_requests=max_requests)
+
+    def put_stream(self, fileobj, path, callback=None, total=None):
+        self.sftp.putfo(fileobj, path, file_size=total or 0, callback=callback)
+
+    def put_file(self, local_path, path, callback=None):
+        self.sftp.put(local_path, path, callback=callback)
+
+    def open(self, path, mode='rb'):
+        f = self.sftp.open(path, mode)
+        if any(c in mode for c in "wa+"):
+            # 写入不等待逐个确认，与 put() 一样流水线发送
+            f.set_pipelined(True)
+        return f
+
+    def rename(self, src, dst):
+        self.sftp.rename(src, dst)
+
+    def replace(self, src, dst):
+        """服务器不支持 posix-rename 扩展时先删除再重命名"""
+        try:
+            self.sftp.posix_rename(src, dst)
+        except IOError:
+            try:
+                self.sftp.remove(dst)
+            except IOError:
+                pass
+            self.sftp.rename(src, dst)
+
+    def remove(self, path):
+        self.sftp.remove(path)
+
+    def mkdir(self, path):
+        try:
+            self.sftp.stat(path)
+        except IOError:
+            self.sftp.mkdir(path)
+
+    def exec_command(self, command, stdin_data=None, callback=None):
+        chan = self.ssh.get_transport().open_session()
+        try:
+            if self.io_timeout:
+                chan.settimeout(self.io_timeout)
+            chan.exec_command(command)
+            # stdout 与 stderr 共用通道的流控窗口，只读一路时远端写满另一路后双方互相等待；
+            # 两路各用一个线程边发送标准输入边读取
+            readers = [_StreamReader(chan.makefile('rb')), _StreamReader(chan.makefile_stderr('rb'))]
+            if stdin_data:
+                total = len(stdin_data)
+                view = memoryview(stdin_data)
+                for off in range(0, total, EXEC_SEND_CHUNK):
+                    chan.sendall(view[off:off + EXEC_SEND_CHUNK])
+                    if callback:
+                        callback(min(total, off + EXEC_SEND_CHUNK), total)
+            chan.shutdown_write()
+            stdout, stderr = (r.result() for r in readers)
+            return chan.recv_exit_status(), stdout, stderr
+        finally:
+            chan.close()
+
+
+class _StreamReader(threading.Thread):
+    """在后台线程读完远端命令的一路输出，result() 等待读完并返回（读取出错时在调用方线程抛出）"""
+
+    def __init__(self, f):
+        super().__init__(name="exec-output", daemon=True)
+        self.f = f
+        self.data = b""
+        self.error = None
+        self.start()
+
+    def run(self):
+        try:
+            self.data = self.f.read()
+        except Exception as e:
+            self.error = e
+
+    def result(self):
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.data
+
+
+class LocalDirBackend(SyncBackend):
+    """远端目录即本机可访问的路径，所有操作直接走文件系统"""
+
+    name = BACKEND_LOCAL
+    requires_server = False
+
+    def connect(self):
+        pass
+
+    def listdir(self, path):
+        return os.listdir(path)
+
+    def stat(self, path):
+        return os.path.getsize(path)
+
+    def mtime(self, path):
+        return os.path.getmtime(path)
+
+    def get_stream(self, path, fileobj, callback=None, max_requests=None):
+        with open(path, 'rb') as src:
+            self._copy(src, fileobj, os.fstat(src.fileno()).st_size, callback)
+
+    def put_stream(self, fileobj, path, callback=None, total=None):
+        with open(path, 'wb') as dst:
+            self._copy(fileobj, dst, total or 0, callback)
+            dst.flush()
+            os.fsync(dst.fileno())
+
+    def open(self, path, mode='rb'):
+        return open(path, mode)
+
+    def rename(self, src, dst):
+        os.rename(src, dst)
+
+    def replace(self, src, dst):
+        os.replace(src, dst)
+
+    def remove(self, path):
+        os.remove(path)
+
+    def mkdir(self, path):
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def _copy(src, dst, total, callback):
+        done = 0
+        while True:
+            data = src.read(LOCAL_COPY_CHUNK)
+            if not data:
+                break
+            dst.write(data)
+            done += len(data)
+            if callback:
+                callback(done, total)
+
+
+def get_backend_name(db):
+    """读取设置 sync_backend，未知值按 SFTP 处理"""
+    name = db.get_setting("sync_backend", BACKEND_SFTP)
+    return name if name in BACKEND_LABELS else BACKEND_SFTP
+
+
+def is_config_complete(backend_name, server_ip, remote_path):
+    if not remote_path:
+        return False
+    if backend_name == BACKEND_LOCAL:
+        return True
+    return bool(server_ip)
+
+
+def create_backend(db, server_ip, name=None, io_timeout=None):
+    """按名称（默认读取设置）创建后端实例，不会立即连接"""
+    if name is None:
+        name = get_backend_name(db)
+    if name == BACKEND_LOCAL:
+        return LocalDirBackend()
+    return SftpBackend(db, server_ip, io_timeout=io_timeout)
@@ -0,0 +1,629 @@
+"""
+SyncEngine - 分阶段执行的同步引擎
+连接 -> 下载 -> 合并 -> 上传 -> 发布标记，支持进度回调、取消、限速与断点续传，
+手动同步（main.py）和 AutoSyncManager 共用同一套流程。
+远端存储通过 sync_backends 中的后端访问（SFTP 或本地/挂载目录）。
+"""
+
+import os
+import io
+import json
+import hashlib
+import threading
+import time
+
+from sync_backends import create_backend, is_config_complete
+from backup_store import BackupStore, retention_from_settings
+from delta_sync import (choose_block_size, compute_signature, compute_delta, fetch_signature,
+                        apply_remote, remote_md5)
+import remote_merge
+from remote_merge import RemoteMergeUnavailable
+
+# 同步阶段（按执行顺序）
+PHASES = ("connect", "backup", "fetch", "merge", "upload", "publish")
+
+PHASE_LABELS = {
+    "connect": "连接服务器",
+    "backup": "备份远端数据",
+    "fetch": "下载远端数据",
+    "merge": "合并数据",
+    "upload": "上传数据库",
+    "publish": "更新同步标记",
+}
+
+# 下载时并发预取的读请求数（paramiko 默认不限，这里限制以免占满慢速链路的内存）
+SFTP_PREFETCH_REQUESTS = 64
+
+# 传输过程中单次网络读写的超时（秒），避免网络中断时线程永久阻塞
+SFTP_IO_TIMEOUT = 30
+
+# 进度回调的最小间隔（秒），避免每个 32KB 数据块都刷新一次 UI
+PROGRESS_INTERVAL = 0.1
+
+# --- 断点续传 ---
+# 上传先写入远端临时文件，完成后原子重命名为 safedraft.db
+UPLOAD_TMP_SUFFIX = ".uploading"
+# 本地记录上传进度的状态文件（位于数据库同目录）
+UPLOAD_STATE_FILE = "sync_upload_state.json"
+# 每传输多少字节记录一次进度
+UPLOAD_CHECKPOINT_BYTES = 4 * 1024 * 1024
+# 续传校验时本地/读回远端计算 MD5 的单次读取字节数
+VERIFY_READ_CHUNK = 1024 * 1024
+# SFTP 单次写请求大小（与 paramiko 内部一致）
+WRITE_CHUNK = 32768
+
+# --- 块级增量上传 ---
+# 远端助手重建文件时使用的临时文件（与整文件续传的临时文件分开，互不覆盖）
+DELTA_TMP_SUFFIX = ".delta"
+# 增量流超过整文件大小的该比例时直接整文件上传
+DELTA_MAX_RATIO = 0.7
+
+
+# 多个目标并行上传时共用状态文件，读改写需加锁
+_UPLOAD_STATE_LOCK = threading.Lock()
+
+
+def _file_md5(path, length):
+    """本地文件前 length 字节的 MD5（hex）"""
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        while length > 0:
+            data = f.read(min(VERIFY_READ_CHUNK, length))
+            if not data:
+                break
+            h.update(data)
+            length -= len(data)
+    return h.hexdigest()
+
+
+class BandwidthLimiter:
+    """按累计字节数限速：在传输回调中调用 throttle(done)，传输超前时休眠"""
+
+    def __init__(self, bytes_per_sec):
+        self.bytes_per_sec = bytes_per_sec
+        self.reset()
+
+    def reset(self, base=0):
+        self._start = time.monotonic()
+        self._base = base
+
+    def throttle(self, done):
+        if not self.bytes_per_sec:
+            return
+        expected = (done - self._base) / self.bytes_per_sec
+        elapsed = time.monotonic() - self._start
+        if expected > elapsed:
+            time.sleep(expected - elapsed)
+
+
+class SyncCancelled(Exception):
+    """同步被用户取消"""
+    pass
+
+
+class SyncEngine:
+    def __init__(self, db, server_ip, remote_path, on_progress=None, bandwidth_kbps=None, backend=None):
+        """
+        db: StorageManager 实例
+        backend: SyncBackend 实例，None 时按设置 sync_backend 创建
+        on_progress: 进度回调 on_progress(phase, done, total)，
+                     done/total 为当前阶段已传输/总字节数（非传输阶段均为 0）
+        bandwidth_kbps: 传输带宽上限（KB/s），None 时读取设置 sync_bandwidth_kbps，0 表示不限
+        """
+        self.db = db
+        self.server_ip = server_ip
+        self.remote_path = remote_path
+        self.remote_base = remote_path.rstrip('/') if remote_path else ""
+        self.remote_file = f"{self.remote_base}/safedraft.db"
+        self.target_key = f"{server_ip}|{self.remote_file}"
+        self._on_progress = on_progress
+
+        self._cancel_event = threading.Event()
+        self._last_report = 0.0
+
+        if bandwidth_kbps is None:
+            try:
+                bandwidth_kbps = int(db.get_setting("sync_bandwidth_kbps", "0") or 0)
+            except (TypeError, ValueError):
+                bandwidth_kbps = 0
+        self.limiter = BandwidthLimiter(max(0, bandwidth_kbps) * 1024)
+
+        if backend is None:
+            backend = create_backend(db, server_ip, io_timeout=SFTP_IO_TIMEOUT)
+        self.backend = backend
+        self._connected = False
+        self.phase = None
+
+        # 统计信息：各阶段耗时（秒）与传输字节数
+        self.phase_times = {}
+        self.bytes_down = 0
+        self.bytes_up = 0
+        self.uploaded_md5 = None
+
+        # 本次流程中下载到的远端数据库 (bytes, tmp_path)，作为增量上传的基准
+        self._basis = (None, None)
+        self.delta_enabled = db.get_setting("sync_delta_upload", "1") == "1"
+        self.delta_stats = None  # 增量上传成功时为 DeltaStats
+        # 远端合并代理：只交换变化的行，远端无 python3 时回退为整文件流程
+        self.remote_merge_enabled = db.get_setting("sync_remote_merge", "0") == "1"
+        self.remote_merged = False  # 本次智能上传是否由远端代理完成
+
+    # --- 取消与进度 ---
+
+    def cancel(self):
+        """请求取消，在下一个阶段开始前或传输途中生效（上传可在下次续传）"""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def _enter_phase(self, phase):
+        if self.cancelled:
+            raise SyncCancelled("同步已取消")
+        self.phase = phase
+        self._report(0, 0, force=True)
+
+    def _report(self, done, total, force=False):
+        if not self._on_progress:
+            return
+        now = time.monotonic()
+        if not force and done < total and now - self._last_report < PROGRESS_INTERVAL:
+            return
+        self._last_report = now
+        try:
+            self._on_progress(self.phase, done, total)
+        except:
+            pass
+
+    def _timed(self, phase, func, *args):
+        self._enter_phase(phase)
+        start = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            self.phase_times[phase] = self.phase_times.get(phase, 0.0) + time.monotonic() - start
+
+    # --- 各阶段 ---
+
+    def _connect(self):
+        self.backend.connect()
+        self._connected = True
+
+    def close(self):
+        if self._connected:
+            self._connected = False
+            try:
+                self.backend.close()
+            except:
+                pass
+
+    def _transfer_callback(self, direction):
+        """生成传输回调：记录字节数、限速、上报进度，并允许在传输途中取消"""
+        self.limiter.reset()
+
+        def _cb(done, total):
+            if direction == "down":
+                self.bytes_down = done
+            else:
+                self.bytes_up = done
+            if self.cancelled:
+                raise SyncCancelled("同步已取消")
+            self.limiter.throttle(done)
+            self._report(done, total)
+
+        return _cb
+
+    def _fetch(self):
+        """下载远端数据库，返回 (bytes, tmp_path)；远端不存在时返回 (None, None)"""
+        max_requests = SFTP_PREFETCH_REQUESTS
+        if self.limiter.bytes_per_sec:
+            # 限速时只预取约 1 秒的数据量，避免请求堆积后一次性涌入
+            max_requests = max(1, min(SFTP_PREFETCH_REQUESTS, self.limiter.bytes_per_sec // WRITE_CHUNK))
+
+        try:
+            return self.db._fetch_remote_db(self.backend, self.remote_file,
+                                            callback=self._transfer_callback("down"),
+                                            max_requests=max_requests)
+        except FileNotFoundError:
+            return None, None
+
+    def _merge(self, data, tmp_path):
+        if data:
+            self.db.merge_database_bytes(data)
+        elif tmp_path and os.path.exists(tmp_path):
+            self.db.merge_database(tmp_path)
+
+    def _snapshot_local(self):
+        """在锁内复制一份一致的数据库快照用于上传，同时计算其 MD5。
+        返回 (snapshot_path, md5_hash, size)"""
+        snapshot = self.db.db_path + ".upload"
+        md5 = hashlib.md5()
+        with self.db.lock:
+            self.db.consolidate_deltas_no_lock()
+            self.db.conn.commit()
+            with open(self.db.db_path, 'rb') as src, open(snapshot, 'wb') as dst:
+                for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                    md5.update(chunk)
+                    dst.write(chunk)
+        return snapshot, md5.hexdigest(), os.path.getsize(snapshot)
+
+    def _upload(self):
+        snapshot, md5_hash, size = self._snapshot_local()
+        try:
+            self._upload_snapshot(snapshot, md5_hash, size)
+        finally:
+            self._cleanup(snapshot)
+
+    def _upload_snapshot(self, snapshot, md5_hash, size):
+        """上传本地快照：优先块级增量上传；不可用时写入远端临时文件（可续传），完成后原子替换 safedraft.db"""
+        if not self._upload_delta(snapshot, size):
+            self._upload_resumable(snapshot, md5_hash, size)
+        self.uploaded_md5 = md5_hash
+
+    # --- 块级增量上传 ---
+
+    def _basis_signature(self):
+        """远端文件的块签名：本次已下载远端时在本地计算，否则由远端助手返回（有缓存）。
+        远端不存在时返回 None"""
+        data, tmp_path = self._basis
+        if data is None and tmp_path and os.path.exists(tmp_path):
+            with open(tmp_path, 'rb') as f:
+                data = f.read()
+        if data is not None:
+            return compute_signature(data, choose_block_size(len(data)))
+
+        try:
+            remote_size = self.backend.stat(self.remote_file)
+        except IOError:
+            return None
+        return fetch_signature(self.backend, self.remote_file, choose_block_size(remote_size))
+
+    def _upload_delta(self, local_path, size):
+        """尝试增量上传，成功返回 True；未启用、后端不支持或任何失败都返回 False 交由整文件上传"""
+        if not self.delta_enabled or not self.backend.supports_exec:
+            return False
+        try:
+            sig = self._basis_signature()
+            if sig is None:
+                return False
+            with open(local_path, 'rb') as f:
+                data = f.read()
+            delta, stats = compute_delta(data, sig)
+            if stats.delta_bytes > size * DELTA_MAX_RATIO:
+                return False
+
+            self.limiter.reset()
+            apply_remote(self.backend, delta, self.remote_file, self.remote_file + DELTA_TMP_SUFFIX,
+                         choose_block_size(size), callback=self._transfer_callback("up"))
+            self.delta_stats = stats
+            return True
+        except SyncCancelled:
+            raise
+        except Exception:
+            return False
+
+    # --- 断点续传 ---
+
+    def _state_path(self):
+        return os.path.join(self.db.base_path, UPLOAD_STATE_FILE)
+
+    def _load_upload_states(self):
+        """状态文件按目标记录各自的上传进度 {target_key: state}"""
+        try:
+            with open(self._state_path(), 'r', encoding='utf-8') as f:
+                states = json.load(f)
+        except:
+            return {}
+        if "remote_file" in states:  # 旧格式：只记录一个目标
+            states = {f"{states.get('server')}|{states.get('remote_file')}": states}
+        return states
+
+    def _write_upload_states(self, states):
+        try:
+            if states:
+                with open(self._state_path(), 'w', encoding='utf-8') as f:
+                    json.dump(states, f)
+            else:
+                self._cleanup(self._state_path())
+        except:
+            pass
+
+    def _load_upload_state(self):
+        with _UPLOAD_STATE_LOCK:
+            return self._load_upload_states().get(self.target_key, {})
+
+    def _save_upload_state(self, md5_hash, size, offset):
+        state = {
+            "server": self.server_ip,
+            "remote_file": self.remote_file,
+            "md5": md5_hash,
+            "size": size,
+            "offset": offset,
+        }
+        with _UPLOAD_STATE_LOCK:
+            states = self._load_upload_states()
+            states[self.target_key] = state
+            self._write_upload_states(states)
+
+    def _clear_upload_state(self):
+        with _UPLOAD_STATE_LOCK:
+            states = self._load_upload_states()
+            states.pop(self.target_key, None)
+            self._write_upload_states(states)
+
+    def _resume_offset(self, local_path, md5_hash, size, tmp_file):
+        """返回可续传的偏移量，无法续传时返回 0。
+        条件：上次记录的是同一份内容、远端临时文件存在，且其已写入的整个前缀与本地一致"""
+        state = self._load_upload_state()
+        if (state.get("server") != self.server_ip or state.get("remote_file") != self.remote_file
+                or state.get("md5") != md5_hash or state.get("size") != size):
+            return 0
+
+        try:
+            remote_size = self.backend.stat(tmp_file)
+        except IOError:
+            return 0
+        if not isinstance(remote_size, int):
+            return 0
+
+        offset = min(int(state.get("offset", 0)), remote_size, size)
+        if offset <= 0:
+            return 0
+
+        # 校验远端已写入的整个前缀：只比较末尾片段时，前面损坏的部分会被原样保留下来
+        try:
+            if self._remote_prefix_md5(tmp_file, offset) != _file_md5(local_path, offset):
+                return 0
+        except SyncCancelled:
+            raise
+        except Exception:
+            return 0
+        return offset
+
+    def _remote_prefix_md5(self, path, length):
+        """远端文件前 length 字节的 MD5（hex）：支持远程执行时由助手在远端计算，否则读回本地计算"""
+        if self.backend.supports_exec:
+            try:
+                return remote_md5(self.backend, path, length)
+            except Exception:
+                pass  # 远端没有 python3 等，改为读回
+        h = hashlib.md5()
+        with self.backend.open(path, 'rb') as f:
+            while length > 0:
+                data = f.read(min(VERIFY_READ_CHUNK, length))
+                if not data:
+                    raise IOError("远端文件比记录的进度短")
+                h.update(data)
+                length -= len(data)
+        return h.hexdigest()
+
+    def _upload_resumable(self, local_path, md5_hash, size):
+        tmp_file = self.remote_file + UPLOAD_TMP_SUFFIX
+        offset = self._resume_offset(local_path, md5_hash, size, tmp_file)
+
+        cb = self._transfer_callback("up")
+        self.limiter.reset(base=offset)
+        last_checkpoint = [offset]
+
+        def _cb(done, total):
+            cb(done, total)
+            if done - last_checkpoint[0] >= UPLOAD_CHECKPOINT_BYTES:
+                last_checkpoint[0] = done
+                self._save_upload_state(md5_hash, size, done)
+
+        self._save_upload_state(md5_hash, size, offset)
+        if offset:
+            self._append_from(local_path, tmp_file, offset, size, _cb)
+            # 续传得到的文件由多次写入拼成，替换 safedraft.db 之前整体校验，不一致时整文件重传
+            if self._remote_prefix_md5(tmp_file, size) != md5_hash:
+                self.limiter.reset()
+                last_checkpoint[0] = 0
+                self._save_upload_state(md5_hash, size, 0)
+                self.backend.put_file(local_path, tmp_file, callback=_cb)
+        else:
+            self.backend.put_file(local_path, tmp_file, callback=_cb)
+
+        self.backend.replace(tmp_file, self.remote_file)
+        self._clear_upload_state()
+
+    def _append_from(self, local_path, tmp_file, offset, size, callback):
+        """从 offset 处继续写入远端临时文件"""
+        with open(local_path, 'rb') as src, self.backend.open(tmp_file, 'r+b') as dst:
+            src.seek(offset)
+            dst.seek(offset)
+            done = offset
+            while True:
+                data = src.read(WRITE_CHUNK)
+                if not data:
+                    break
+                dst.write(data)
+                done += len(data)
+                callback(done, size)
+            dst.truncate(size)
+
+        remote_size = self.backend.stat(tmp_file)
+        if remote_size != size:
+            raise IOError(f"续传后远端文件大小不一致: {remote_size} != {size}")
+
+    def _publish(self):
+        """更新本地状态文件，并发布远端标记（hash 为实际上传内容的 hash）"""
+        md5_hash = self.db.update_md5_status(self.uploaded_md5)
+        self._publish_marker(md5_hash)
+        return md5_hash
+
+    def _publish_marker(self, md5_hash):
+        """删除远端旧的 safedraft_*.md5，上传新的空标记文件"""
+        for fname in self.backend.listdir(self.remote_base):
+            if fname.startswith("safedraft_") and fname.endswith(".md5"):
+                try:
+                    self.backend.remove(f"{self.remote_base}/{fname}")
+                except:
+                    pass
+        self.backend.put_stream(io.BytesIO(b""), f"{self.remote_base}/safedraft_{md5_hash}.md5", total=0)
+
+    # --- 远端合并代理 ---
+
+    def _collect_changes(self, since):
+        """在锁内收集 seq > since 的本地变更行（since 为 None 时为全部），返回 (rows, 当前最大 seq)"""
+        with self.db.lock:
+            self.db.conn.commit()
+            return remote_merge.collect(self.db.conn, since), remote_merge.max_seq(self.db.conn)
+
+    def _exchange(self):
+        """把本地变更发送给远端代理并取回远端变更，返回 (响应, 本次已发送到的本地 seq)。
+        远端要求重新全量同步（epoch 变化）时自动以全部行重试一次"""
+        with self.db.lock:
+            remote_merge.install_journal(self.db.conn)
+            self.db.conn.commit()
+        state = remote_merge.load_state(self.db.base_path).get("remote_merge", {}).get(self.target_key)
+        attempts = [state, None] if state else [None]
+        command = remote_merge.agent_command(self.remote_file)
+
+        for attempt in attempts:
+            rows, local_seq = self._collect_changes(attempt["local_seq"] if attempt else None)
+            payload = remote_merge.encode_request({
+                "epoch": attempt["epoch"] if attempt else None,
+                "since": attempt["remote_seq"] if attempt else None,
+                "rows": rows,
+            })
+            self.limiter.reset()
+            try:
+                status, out, err = self.backend.exec_command(command, stdin_data=payload,
+                                                             callback=self._transfer_callback("up"))
+            except SyncCancelled:
+                raise
+            except Exception as e:
+                raise RemoteMergeUnavailable(str(e))
+            if status != 0:
+                raise RemoteMergeUnavailable(err.decode('utf-8', 'replace').strip()[-200:])
+            try:
+                resp = remote_merge.decode_response(out)
+            except Exception:
+                raise RemoteMergeUnavailable("远端合并代理返回了无法识别的数据")
+            self.bytes_down = len(out)
+            if resp.get("missing"):
+                raise RemoteMergeUnavailable("服务器上暂无同步数据")
+            if not resp.get("resync"):
+                return resp, local_seq
+        raise RemoteMergeUnavailable("远端合并代理要求重新同步")
+
+    def _apply_remote_rows(self, rows):
+        self.db._merge_from_connection(remote_merge.rows_to_connection(rows))
+
+    def _publish_remote_merge(self, remote_md5):
+        """本地标记记录合并后的本地数据库，远端标记记录代理写入后的远端数据库"""
+        md5_hash = self.db.update_md5_status()
+        self._publish_marker(remote_md5)
+        return md5_hash
+
+    def _remote_exchange(self):
+        """交换变更并合并远端变更到本地，返回代理写入后的远端数据库 MD5"""
+        resp, local_seq = self._timed("upload", self._exchange)
+        self._timed("merge", self._apply_remote_rows, resp.get("rows") or {})
+
+        # 发送后才产生的本地修改 seq 更大，下次仍会发送；本次收到的远端行下次会回送一次，远端视为无变化
+        def _record(state):
+            state.setdefault("remote_merge", {})[self.target_key] = {
+                "epoch": resp["epoch"], "remote_seq": resp["seq"], "local_seq": local_seq,
+            }
+        remote_merge.update_state(self.db.base_path, _record)
+        self.remote_merged = True
+        return resp["md5"]
+
+    def _remote_merge(self):
+        """远端合并：交换变更 -> 合并远端变更到本地 -> 更新标记"""
+        remote_md5 = self._remote_exchange()
+        return self._timed("publish", self._publish_remote_merge, remote_md5)
+
+    def _backup_remote(self):
+        """将远端现有 safedraft.db 存入去重备份仓库（backups/），再按保留策略清理。
+        分块要读到全部内容，因此先下载整个远端库（O(数据库大小)，而不是远端的一次重命名）；
+        下载结果保存在 self._basis，随后的增量上传直接用它计算签名。远端不存在时跳过，返回备份清单或 None"""
+        data, tmp_path = self._basis = self._fetch()
+        if data is None and tmp_path is None:
+            return None
+        store = BackupStore(self.backend, self.remote_base)
+        with (io.BytesIO(data) if data is not None else open(tmp_path, 'rb')) as src:
+            manifest = store.create_backup(src)
+        try:
+            store.prune(*retention_from_settings(self.db))
+        except:
+            pass  # 清理失败不影响本次推送，下次推送时重试
+        return manifest
+
+    def read_remote_md5(self):
+        """读取远端 safedraft_*.md5 标记中的 hash，无则返回空字符串（需已连接）"""
+        for fname in self.backend.listdir(self.remote_base):
+            if fname.startswith("safedraft_") and fname.endswith(".md5"):
+                return fname[len("safedraft_"):-len(".md5")]
+        return ""
+
+    # --- 完整流程 ---
+
+    def _check_config(self):
+        if not is_config_complete(self.backend.name, self.server_ip, self.remote_path):
+            raise ValueError("配置不完整")
+
+    def connect(self):
+        """单独执行连接阶段（供 AutoSyncManager 先检查标记再决定是否同步）"""
+        self._check_config()
+        if not self._connected:
+            self._timed("connect", self._connect)
+
+    def upload_merge(self):
+        """智能上传：下载远端 -> 合并到本地 -> 上传合并结果 -> 发布标记。
+        启用远端合并且后端支持远程执行时，改为只与远端代理交换变化的行"""
+        self._check_config()
+        try:
+            self.connect()
+            if self.remote_merge_enabled and self.backend.supports_exec:
+                try:
+                    return self._remote_merge()
+                except RemoteMergeUnavailable:
+                    pass  # 回退为整文件流程
+            data, tmp_path = self._basis = self._timed("fetch", self._fetch)
+            self._timed("merge", self._merge, data, tmp_path)
+            self._timed("upload", self._upload)
+            return self._timed("publish", self._publish)
+        finally:
+            self._release_basis()
+            self.close()
+
+    def download_merge(self):
+        """智能下载：下载远端 -> 合并到本地 -> 更新本地标记"""
+        self._check_config()
+        tmp_path = None
+        try:
+            self.connect()
+            data, tmp_path = self._timed("fetch", self._fetch)
+            if data is None and tmp_path is None:
+                raise Exception("服务器上暂无同步数据")
+            self._timed("merge", self._merge, data, tmp_path)
+            return self.db.update_md5_status()
+        finally:
+            self._cleanup(tmp_path)
+            self.close()
+
+    def force_push(self):
+        """强制推送：备份远端 -> 上传本地覆盖 -> 发布标记"""
+        self._check_config()
+        try:
+            self.connect()
+            self._timed("backup", self._backup_remote)
+            self._timed("upload", self._upload)
+            return self._timed("publish", self._publish)
+        finally:
+            self._release_basis()
+            self.close()
+
+    def _release_basis(self):
+        self._cleanup(self._basis[1])
+        self._basis = (None, None)
+
+    def _cleanup(self, tmp_path):
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except:
+                pass
@@ -0,0 +1,226 @@
+"""
+多目标同步 - 同时同步到多个远端（如家里的服务器和工作虚拟机）
+主目标来自设置 ssh_ip / ssh_path / sync_backend；其它目标保存在 sync_config.json 的 "targets" 列表中：
+    {"name": "工作VM", "backend": "sftp", "server_ip": "me@10.0.0.5", "remote_path": "/data/safedraft",
+     "enabled": true, "interval_minutes": 30}
+interval_minutes 为空时使用自动同步的检查间隔。
+
+一次同步分两轮，各目标在线程池中并行：
+  1. 连接并下载（或经远端合并代理交换变更），下载完成的目标依次合并到本地
+  2. 把合并后的同一份本地快照上传到各目标并发布标记
+总耗时约等于最慢的目标，而不是各目标之和。每个目标上次成功同步的内容 hash 记录在
+sync_state.json 的 "targets" 中，自动同步据此按目标判断是否需要同步。
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import remote_merge
+from remote_merge import RemoteMergeUnavailable
+from sync_backends import BACKEND_LOCAL, create_backend, get_backend_name, is_config_complete
+from sync_engine import SyncEngine, SyncCancelled, SFTP_IO_TIMEOUT
+
+CONFIG_FILE = "sync_config.json"
+PRIMARY_TARGET_NAME = "默认"
+# 同时同步的目标数上限
+MAX_WORKERS = 4
+
+
+def _config_path(base_path):
+    return os.path.join(base_path, CONFIG_FILE)
+
+
+def _load_config(base_path):
+    try:
+        with open(_config_path(base_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except:
+        return {}
+
+
+def target_key(target):
+    """与 SyncEngine.target_key 一致"""
+    return f"{target['server_ip']}|{target['remote_path'].rstrip('/')}/safedraft.db"
+
+
+def load_extra_targets(base_path):
+    """sync_config.json 中配置的其它目标（原样返回，含已停用的）"""
+    targets = _load_config(base_path).get("targets") or []
+    return [t for t in targets if isinstance(t, dict)]
+
+
+def save_extra_targets(base_path, targets):
+    """写回 "targets" 列表，保留 sync_config.json 中的其它配置"""
+    config = _load_config(base_path)
+    config["targets"] = targets
+    with open(_config_path(base_path), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+
+
+def load_targets(db):
+    """返回全部已启用且配置完整的目标，主目标在前"""
+    targets = [{
+        "name": PRIMARY_TARGET_NAME,
+        "backend": get_backend_name(db),
+        "server_ip": db.get_setting("ssh_ip", ""),
+        "remote_path": db.get_setting("ssh_path", ""),
+        "interval_minutes": None,
+    }]
+    for t in load_extra_targets(db.base_path):
+        if not t.get("enabled", True):
+            continue
+        targets.append({
+            "name": t.get("name") or t.get("server_ip") or t.get("remote_path", ""),
+            "backend": t.get("backend") or (BACKEND_LOCAL if not t.get("server_ip") else "sftp"),
+            "server_ip": t.get("server_ip", ""),
+            "remote_path": t.get("remote_path", ""),
+            "interval_minutes": t.get("interval_minutes"),
+        })
+    return [t for t in targets if is_config_complete(t["backend"], t["server_ip"], t["remote_path"])]
+
+
+def load_sync_records(base_path):
+    """各目标的同步记录 {target_key: {"md5", "synced_at", "attempted_at"}}"""
+    return remote_merge.load_state(base_path).get("targets", {})
+
+
+def _record(base_path, key, **fields):
+    def _update(state):
+        state.setdefault("targets", {}).setdefault(key, {}).update(fields)
+    remote_merge.update_state(base_path, _update)
+
+
+class MultiTargetSync:
+    """多目标并行同步，接口与 SyncEngine 的 upload_merge / download_merge / cancel 一致"""
+
+    def __init__(self, db, targets, on_progress=None, max_workers=None):
+        self.db = db
+        self.targets = list(targets)
+        self._on_progress = on_progress
+        self.max_workers = max(1, min(len(self.targets), max_workers or MAX_WORKERS))
+        self._cancel_event = threading.Event()
+
+        # 带宽上限是总量，平均分给各目标
+        try:
+            total_kbps = int(db.get_setting("sync_bandwidth_kbps", "0") or 0)
+        except (TypeError, ValueError):
+            total_kbps = 0
+        per_target = max(1, total_kbps // len(self.targets)) if total_kbps > 0 and self.targets else 0
+
+        self.engines = []
+        for t in self.targets:
+            backend = create_backend(db, t["server_ip"], name=t["backend"], io_timeout=SFTP_IO_TIMEOUT)
+            self.engines.append(SyncEngine(db, t["server_ip"], t["remote_path"], on_progress=self._report,
+                                           bandwidth_kbps=per_target, backend=backend))
+        self.errors = {}  # 目标名 -> 错误信息
+
+    def cancel(self):
+        self._cancel_event.set()
+        for engine in self.engines:
+            engine.cancel()
+
+    def _report(self, phase, done, total):
+        if self._on_progress:
+            self._on_progress(phase, done, total)
+
+    def _name(self, engine):
+        return self.targets[self.engines.index(engine)]["name"]
+
+    def _run_all(self, func, engines, on_result=None):
+        """在线程池中对每个引擎执行 func，on_result 在当前线程依次处理结果；返回成功的引擎列表"""
+        ok = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(func, e): e for e in engines}
+            for fut in as_completed(futures):
+                engine = futures[fut]
+                try:
+                    result = fut.result()
+                    if on_result:
+                        on_result(engine, result)
+                    ok.append(engine)
+                except SyncCancelled:
+                    self.cancel()
+                except Exception as e:
+                    self.errors[self._name(engine)] = str(e)
+        if self._cancel_event.is_set():
+            raise SyncCancelled("同步已取消")
+        return ok
+
+    # --- 第一轮：拉取并合并 ---
+
+    def _pull(self, engine):
+        """连接并取回远端数据；远端合并代理可用时直接交换变更（代理返回的行已合并到本地）"""
+        engine.connect()
+        if engine.remote_merge_enabled and engine.backend.supports_exec:
+            try:
+                engine._remote_exchange()
+                return None, None
+            except RemoteMergeUnavailable:
+                pass
+        return engine._timed("fetch", engine._fetch)
+
+    def _merge_pulled(self, engine, result):
+        # 合并在调用线程中依次进行，本地数据库同一时间只有一个合并
+        data, tmp_path = engine._basis = result
+        engine._timed("merge", engine._merge, data, tmp_path)
+
+    # --- 第二轮：推送 ---
+
+    def _push(self, engine, snapshot, md5_hash, size):
+        if engine.remote_merged:
+            # 再交换一次，把从其它目标合并来的变更发送给该目标
+            remote_md5 = engine._remote_exchange()
+            engine._timed("publish", engine._publish_marker, remote_md5)
+        else:
+            engine._timed("upload", engine._upload_snapshot, snapshot, md5_hash, size)
+            engine._timed("publish", engine._publish_marker, md5_hash)
+
+    # --- 完整流程 ---
+
+    def upload_merge(self):
+        """从所有目标拉取并合并，再把收敛后的数据库推送到所有目标，返回上传内容的 hash。
+        有目标失败时在其余目标完成后抛出异常"""
+        snapshot = None
+        now = time.time()
+        try:
+            for t in self.targets:
+                _record(self.db.base_path, target_key(t), attempted_at=now)
+            pulled = self._run_all(self._pull, self.engines, self._merge_pulled)
+            if not pulled:
+                raise Exception(self._error_summary())
+
+            snapshot, md5_hash, size = self.engines[0]._snapshot_local()
+            pushed = self._run_all(lambda e: self._push(e, snapshot, md5_hash, size), pulled)
+            if pushed:
+                self.db.update_md5_status(md5_hash)
+            for engine in pushed:
+                _record(self.db.base_path, engine.target_key, md5=md5_hash, synced_at=time.time())
+            if self.errors:
+                raise Exception(self._error_summary())
+            return md5_hash
+        finally:
+            if snapshot:
+                self.engines[0]._cleanup(snapshot)
+            self._close()
+
+    def download_merge(self):
+        """从所有目标拉取并合并到本地"""
+        try:
+            pulled = self._run_all(self._pull, self.engines, self._merge_pulled)
+            if not pulled or self.errors:
+                raise Exception(self._error_summary())
+            return self.db.update_md5_status()
+        finally:
+            self._close()
+
+    def _error_summary(self):
+        lines = [f"{name}: {err}" for name, err in self.errors.items()]
+        return "部分目标同步失败:\n" + "\n".join(lines) if lines else "没有可同步的目标"
+
+    def _close(self):
+        for engine in self.engines:
+            engine._release_basis()
+            engine.close()
@@ -0,0 +1,78 @@
+"""自适应自动保存策略测试（假时钟 + 记录调度请求）。"""
+import autosave
+from autosave import AutoSaver
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _RecordingScheduler:
+    def __init__(self):
+        self.jobs = {}
+
+    def schedule(self, name, delay, func, slack=0):
+        self.jobs[name] = (delay, func)
+
+    def cancel(self, name):
+        self.jobs.pop(name, None)
+
+    def fire(self, name):
+        _, func = self.jobs.pop(name)
+        func()
+
+
+def _saver():
+    clock = _Clock()
+    sched = _RecordingScheduler()
+    saves = []
+    saver = AutoSaver(sched, "autosave", lambda: saves.append(clock.now), clock=clock)
+    return saver, sched, clock, saves
+
+
+class TestAutoSaver:
+    def test_continuous_typing_saved_within_max_staleness(self):
+        saver, sched, clock, saves = _saver()
+        start = clock.now
+        # 每 0.3 秒一次按键，持续 2 分钟
+        while clock.now - start < 120:
+            saver.touch(100)
+            delay, _ = sched.jobs["autosave"]
+            # 下一次按键前到期则先执行保存
+            if delay <= 0.3:
+                clock.now += delay
+                sched.fire("autosave")
+            clock.now += 0.3
+        assert len(saves) >= 3
+        gaps = [b - a for a, b in zip([start] + saves, saves)]
+        assert max(gaps) <= autosave.MAX_STALENESS + 0.3
+
+    def test_debounce_adapts_to_rate_and_size(self):
+        saver, sched, clock, _ = _saver()
+        saver.touch(100)
+        assert saver.debounce() == autosave.MIN_DEBOUNCE
+
+        # 慢速输入：停顿判定随平均间隔变长
+        for _ in range(20):
+            clock.now += 1.5
+            saver.touch(100)
+        slow = saver.debounce()
+        assert autosave.MIN_DEBOUNCE < slow <= autosave.MAX_DEBOUNCE
+
+        saver.touch(autosave.LARGE_DOC_CHARS * 10)
+        assert saver.debounce() == autosave.MAX_DEBOUNCE
+
+    def test_flush_saves_immediately_once(self):
+        saver, sched, clock, saves = _saver()
+        saver.flush()
+        assert saves == []
+
+        saver.touch(10)
+        saver.flush()
+        saver.flush()
+        assert len(saves) == 1
+        assert "autosave" not in sched.jobs
@@ -0,0 +1,132 @@
+"""自动同步调度测试。"""
+import json
+import os
+import threading
+import time
+
+from autosync import JOB_NAME, AutoSyncManager
+from scheduler import Scheduler
+
+
+def _write_config(tmp_db, **overrides):
+    config = {
+        "auto_sync_enabled": True,
+        "sync_interval_minutes": 10,
+        "sync_min_interval_minutes": 1,
+        "sync_quiet_seconds": 30,
+        "active_time_start": "",
+        "active_time_end": "",
+    }
+    config.update(overrides)
+    path = os.path.join(tmp_db.base_path, "sync_config.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    return path
+
+
+class TestAutoSyncSchedule:
+    def test_config_cached_until_file_changes(self, tmp_db):
+        path = _write_config(tmp_db, sync_quiet_seconds=30)
+        mgr = AutoSyncManager(tmp_db)
+        first = mgr._load_config()
+        assert mgr._load_config() is first
+
+        _write_config(tmp_db, sync_quiet_seconds=45)
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        assert mgr._load_config()["sync_quiet_seconds"] == 45
+
+    def test_quiet_period_min_and_max_interval(self, tmp_db):
+        _write_config(tmp_db)
+        mgr = AutoSyncManager(tmp_db)
+        config = mgr._load_config()
+        t0 = mgr._last_check = 1000.0
+
+        # 无修改：按最长间隔做一次检查
+        assert mgr._seconds_until_due(config, True, t0) == 600
+
+        # 修改后等待安静期
+        mgr._dirty_since = mgr._last_change = t0 + 5
+        assert mgr._seconds_until_due(config, True, t0 + 10) == 25
+
+        # 持续编辑时不超过最长间隔
+        mgr._last_change = t0 + 599
+        assert mgr._seconds_until_due(config, True, t0 + 599) == 6
+
+        # 距上次同步不足最短间隔时顺延
+        mgr._last_sync = t0 + 590
+        assert mgr._seconds_until_due(config, True, t0 + 599) == 51
+
+        assert mgr._seconds_until_due(config, False, t0) is None
+
+    def test_outside_active_window_waits_for_start(self, tmp_db):
+        _write_config(tmp_db)
+        mgr = AutoSyncManager(tmp_db)
+        now = time.localtime()
+        start = f"{(now.tm_hour + 2) % 24:02d}:00"
+        end = f"{(now.tm_hour + 3) % 24:02d}:00"
+        delay = mgr._seconds_until_active({"active_time_start": start, "active_time_end": end})
+        assert 3600 <= delay <= 2 * 3600
+
+    def test_local_change_triggers_sync_after_quiet_period(self, tmp_db, monkeypatch):
+        _write_config(tmp_db, sync_quiet_seconds=0.1, sync_min_interval_minutes=0)
+        tmp_db.set_setting("ssh_enabled", "1")
+        synced = threading.Event()
+        scheduler = Scheduler()
+        scheduler.start()
+        mgr = AutoSyncManager(tmp_db, scheduler=scheduler)
+        monkeypatch.setattr(mgr, "_check_and_sync", synced.set)
+
+        mgr.start()
+        try:
+            time.sleep(0.2)
+            assert not synced.is_set()
+            tmp_db.save_content_forced("edit")
+            assert synced.wait(2)
+            deadline = time.monotonic() + 2
+            while (mgr._syncing or mgr._dirty_since is not None) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert mgr._dirty_since is None
+            # 同步后按最长间隔排定下一次检查
+            assert scheduler.pending(JOB_NAME)
+        finally:
+            mgr.stop()
+            scheduler.stop()
+        assert not scheduler.pending(JOB_NAME)
+
+    def test_md5_recomputed_only_after_database_writes(self, tmp_db, monkeypatch):
+        mgr = AutoSyncManager(tmp_db)
+        calls = []
+        real = tmp_db.calculate_db_md5
+        monkeypatch.setattr(tmp_db, "calculate_db_md5", lambda: calls.append(1) or real())
+
+        draft_id = tmp_db.save_content("hello")
+        first = mgr._current_md5()
+        assert mgr._current_md5() == first
+        assert len(calls) == 1
+        # 增量自动保存只在确实要同步、修改标记变化时才被合并
+        assert tmp_db.save_delta(draft_id, [(5, 0, " world")], 5)
+        assert mgr._current_md5() != first
+        assert len(calls) == 2
+
+    def test_targets_without_interval_use_global_interval(self, tmp_db, monkeypatch):
+        import autosync
+        targets = [{"server_ip": "a", "remote_path": "/p", "interval_minutes": None},
+                   {"server_ip": "b", "remote_path": "/p", "interval_minutes": 1}]
+        attempted = time.time() - 120
+        monkeypatch.setattr(autosync, "load_sync_records", lambda base: {
+            autosync.target_key(t): {"attempted_at": attempted, "md5": "old"} for t in targets})
+        synced = []
+
+        class _Multi:
+            def __init__(self, db, due):
+                synced.append([t["server_ip"] for t in due])
+
+            def upload_merge(self):
+                pass
+
+        monkeypatch.setattr(autosync, "MultiTargetSync", _Multi)
+        mgr = AutoSyncManager(tmp_db)
+        # 主目标没有单独的间隔，按 sync_interval_minutes=10 计，两分钟前刚尝试过，不到期
+        mgr._sync_targets(targets, {"sync_interval_minutes": 10})
+        assert synced == [["b"]]
@@ -0,0 +1,136 @@
+"""去重备份仓库测试，远端用本地目录后端。"""
+import io
+import os
+import random
+import time
+
+import backup_store
+
+from backup_store import (BackupStore, iter_chunks, select_retained, CHUNK_MIN, CHUNK_MAX, CHUNKER_V1, CHUNKER_V2,
+                          GEAR, GEAR2)
+from sync_backends import LocalDirBackend
+
+
+def _data(n, seed=1):
+    return random.Random(seed).randbytes(n)
+
+
+class TestChunking:
+    def test_chunks_reassemble_and_respect_bounds(self):
+        data = _data(600 * 1024)
+        chunks = list(iter_chunks(io.BytesIO(data)))
+        assert b"".join(chunks) == data
+        assert all(CHUNK_MIN <= len(c) <= CHUNK_MAX for c in chunks[:-1])
+
+    def test_insert_only_changes_nearby_chunks(self):
+        data = _data(600 * 1024)
+        shifted = data[:300000] + b"inserted" + data[300000:]
+        before = set(iter_chunks(io.BytesIO(data)))
+        after = list(iter_chunks(io.BytesIO(shifted)))
+        assert sum(1 for c in after if c not in before) <= 2
+        # 奇数长度的插入使之后的内容错开一个字节，每两个字节判断一次时也要能重新对齐
+        shifted = data[:300000] + b"inserted!" + data[300000:]
+        after = list(iter_chunks(io.BytesIO(shifted)))
+        assert sum(1 for c in after if c not in before) <= 3
+
+    def test_pair_table_matches_bytewise_gear(self):
+        for b0, b1 in ((0, 0), (1, 2), (255, 7), (128, 255)):
+            pair = memoryview(bytes([b0, b1])).cast("H")[0]
+            assert GEAR2[pair] == ((GEAR[b0] << 1) + GEAR[b1]) & ((1 << 64) - 1)
+
+
+class TestBackupStore:
+    def test_second_backup_shares_chunks_and_restores(self, tmp_path):
+        store = BackupStore(LocalDirBackend(), str(tmp_path))
+        v1 = _data(500 * 1024)
+        v2 = v1[:200000] + b"edited" + v1[200006:]
+
+        m1 = store.create_backup(io.BytesIO(v1), "20260101_100000")
+        m2 = store.create_backup(io.BytesIO(v2), "20260102_100000")
+
+        assert m1["new_bytes"] == len(v1)
+        assert m2["new_bytes"] < len(v2) // 4
+        out = io.BytesIO()
+        store.restore("20260101_100000", out)
+        assert out.getvalue() == v1
+        out = io.BytesIO()
+        store.restore("20260102_100000", out)
+        assert out.getvalue() == v2
+
+    def test_prune_removes_unreferenced_chunks(self, tmp_path):
+        store = BackupStore(LocalDirBackend(), str(tmp_path))
+        store.create_backup(io.BytesIO(_data(200 * 1024, seed=1)), "20260101_100000")
+        store.create_backup(io.BytesIO(_data(200 * 1024, seed=2)), "20260101_110000")
+
+        removed, count, freed = store.prune(keep_last=1, keep_daily=0, keep_weekly=0)
+
+        assert removed == ["20260101_100000"]
+        assert count > 0 and freed > 0
+        assert store.list_backups() == ["20260101_110000"]
+        out = io.BytesIO()
+        store.restore("20260101_110000", out)
+        assert out.getvalue() == _data(200 * 1024, seed=2)
+
+    def test_existing_store_keeps_its_chunker(self, tmp_path, monkeypatch):
+        store = BackupStore(LocalDirBackend(), str(tmp_path))
+        v1 = _data(500 * 1024)
+        v2 = v1[:200000] + b"edited" + v1[200006:]
+        # 早期版本写下的仓库：逐字节分块
+        monkeypatch.setattr(backup_store, "CHUNKER_VERSION", CHUNKER_V1)
+        m1 = store.create_backup(io.BytesIO(v1), "20260101_100000")
+        monkeypatch.undo()
+
+        m2 = store.create_backup(io.BytesIO(v2), "20260102_100000")
+        assert m1["chunker"] == m2["chunker"] == CHUNKER_V1
+        assert m2["new_bytes"] < len(v2) // 4
+        other = BackupStore(LocalDirBackend(), str(tmp_path / "new"))
+        assert other.create_backup(io.BytesIO(v1), "20260101_100000")["chunker"] == CHUNKER_V2
+
+    def test_gc_skips_chunks_of_backup_in_progress(self, tmp_path):
+        store = BackupStore(LocalDirBackend(), str(tmp_path))
+        store.create_backup(io.BytesIO(_data(100 * 1024)), "20260101_100000")
+        assert not [n for n in os.listdir(store.manifests_dir) if n.endswith(".pending")]
+
+        # 另一台设备正在备份：已写入标记和一个块，清单还没写
+        pending = os.path.join(store.manifests_dir, "20260102_100000.pending")
+        open(pending, "wb").close()
+        chunk = os.path.join(store.chunks_dir, "f" * 64)
+        with open(chunk, "wb") as f:
+            f.write(b"new chunk")
+        stale = os.path.join(store.chunks_dir, "e" * 64)
+        with open(stale, "wb") as f:
+            f.write(b"unreferenced")
+        old = time.time() - 3600
+        os.utime(stale, (old, old))
+
+        assert store.gc() == (1, len(b"unreferenced"))
+        assert os.path.exists(chunk) and not os.path.exists(stale)
+
+        # 中断遗留的过期标记被删除，之后正常回收
+        expired = time.time() - backup_store.PENDING_EXPIRE_SECONDS - 60
+        os.utime(pending, (expired, expired))
+        assert store.gc() == (1, len(b"new chunk"))
+        assert not os.path.exists(pending)
+
+    def test_corrupted_chunk_detected(self, tmp_path):
+        store = BackupStore(LocalDirBackend(), str(tmp_path))
+        m = store.create_backup(io.BytesIO(_data(100 * 1024)), "20260101_100000")
+        with open(os.path.join(store.chunks_dir, m["chunks"][0][0]), 'r+b') as f:
+            f.write(b"XX")
+        try:
+            store.restore("20260101_100000", io.BytesIO())
+            assert False, "应抛 IOError"
+        except IOError:
+            pass
+
+
+class TestRetention:
+    def test_last_daily_weekly(self):
+        ids = ["20260105_090000", "20260105_180000",   # 周一
+               "20260104_120000",                       # 周日（上一周）
+               "20260103_120000",
+               "20251220_120000",
+               "20251201_120000"]
+        keep = select_retained(ids, keep_last=1, keep_daily=2, keep_weekly=3)
+        # 最近一份；最近两天各最新一份；最近三周各最新一份
+        assert keep == {"20260105_180000", "20260104_120000", "20251220_120000"}
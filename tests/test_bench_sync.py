@@ -0,0 +1,32 @@
+"""同步基准测试脚本冒烟测试：小数据量走一遍真实 SFTP 回环链路。"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+import bench_sync
+
+
+class TestBenchSync:
+    def test_small_run_reports_phases_and_bytes(self):
+        results = bench_sync.run(sizes=[50], latency_ms=1)
+
+        by_op = {r["op"]: r for r in results}
+        assert set(by_op) == set(bench_sync.OPERATIONS)
+        assert 0 < by_op["force_push"]["bytes_up"] <= by_op["force_push"]["db_bytes"]
+        # 远端与本地仅差少量草稿时走增量上传
+        assert by_op["incremental_upload"]["bytes_up"] < by_op["incremental_upload"]["db_bytes"] // 2
+        assert by_op["force_push"]["bytes_down"] > 0  # 推送前下载远端做备份
+        assert by_op["upload_merge"]["bytes_down"] > 0
+        assert by_op["upload_merge"]["bytes_up"] > 0
+        assert by_op["download_merge"]["bytes_up"] == 0
+        assert set(by_op["upload_merge"]["phases_s"]) == {"connect", "fetch", "merge", "upload", "publish"}
+        assert all(r["wire_up"] + r["wire_down"] > 0 for r in results)
+
+    def test_compare_flags_regressions(self):
+        baseline = [{"rows": 1000, "op": "force_push", "total_s": 1.0}]
+        assert bench_sync.compare([{"rows": 1000, "op": "force_push", "total_s": 1.1}], baseline, 0.2) == []
+        assert bench_sync.compare([{"rows": 1000, "op": "force_push", "total_s": 1.5}], baseline, 0.2)
+
+    def test_chunk_throughput(self):
+        assert bench_sync.chunk_throughput(size=256 * 1024) > 0
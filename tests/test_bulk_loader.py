@@ -0,0 +1,117 @@
+"""大文档分块加载测试：用假的 Text 控件记录调用（测试环境没有显示器）。"""
+import bulk_loader
+from bulk_loader import BulkLoader, iter_chunks, load_text
+
+
+class _FakeText:
+    """按字符串模拟 Text 内容，只支持 1.0 / end 与 bulk_load 标记"""
+
+    def __init__(self, **options):
+        self.options = {"wrap": "word", "undo": True, "state": "normal"}
+        self.options.update(options)
+        self.text = ""
+        self.marks = {}
+        self.idle = []
+        self.undo_resets = 0
+        self.paints = 0
+
+    def cget(self, opt):
+        return self.options[opt]
+
+    def config(self, **options):
+        self.options.update(options)
+
+    def delete(self, start, end):
+        if self.options["state"] != "disabled":
+            self.text = ""
+
+    def insert(self, index, chars):
+        if self.options["state"] == "disabled":
+            return
+        # 加载期间不应开启自动换行与撤销记录
+        assert self.options["wrap"] == "none" or len(chars) <= bulk_loader.LARGE_DOC_CHARS
+        pos = self.marks.get(index, 0 if index == "1.0" else len(self.text))
+        self.text = self.text[:pos] + chars + self.text[pos:]
+        if index in self.marks:
+            self.marks[index] = pos + len(chars)
+
+    def mark_set(self, name, index):
+        self.marks[name] = 0 if index == "1.0" else len(self.text)
+
+    def mark_gravity(self, name, gravity):
+        pass
+
+    def mark_unset(self, name):
+        del self.marks[name]
+
+    def see(self, index):
+        pass
+
+    def update_idletasks(self):
+        self.paints += 1
+
+    def after_idle(self, func):
+        self.idle.append(func)
+        return f"after#{len(self.idle)}"
+
+    def after_cancel(self, after_id):
+        self.idle.clear()
+
+    def edit_reset(self):
+        self.undo_resets += 1
+
+    def run_idle(self, limit=None):
+        steps = 0
+        while self.idle and (limit is None or steps < limit):
+            self.idle.pop(0)()
+            steps += 1
+        return steps
+
+
+def _large_text():
+    line = "草稿 SafeDraft line\n"
+    return line * (bulk_loader.LARGE_DOC_CHARS // len(line) * 3)
+
+
+class TestBulkLoader:
+    def test_chunks_split_on_newlines(self):
+        text = _large_text()
+        chunks = list(iter_chunks(text))
+        assert "".join(chunks) == text
+        assert len(chunks[0]) <= bulk_loader.FIRST_CHUNK_CHARS
+        assert all(c.endswith("\n") for c in chunks)
+        # 没有换行的超长单行按固定长度切分
+        assert [len(c) for c in iter_chunks("x" * 10, first=4, size=3)] == [4, 3, 3]
+
+    def test_loads_incrementally_and_restores_options(self):
+        widget = _FakeText(state="disabled")
+        widget.text = "old"
+        done = []
+        text = _large_text()
+        loader = load_text(widget, text, lambda: done.append(widget.text))
+
+        # 首屏已插入并刷新，其余等待空闲时加载
+        assert loader.active and widget.paints == 1
+        assert 0 < len(widget.text) <= bulk_loader.FIRST_CHUNK_CHARS
+        assert widget.options == {"wrap": "none", "undo": False, "state": "disabled"}
+        assert loader.stats["first_paint"] is not None
+
+        steps = widget.run_idle()
+        assert steps == loader.stats["chunks"] >= 3
+        assert done == [text]
+        assert widget.options == {"wrap": "word", "undo": True, "state": "disabled"}
+        assert widget.undo_resets == 1 and not widget.marks
+        assert not loader.active and loader.stats["total"] is not None
+
+    def test_cancel_and_small_text(self):
+        widget = _FakeText()
+        done = []
+        loader = BulkLoader(widget, _large_text(), on_done=lambda: done.append(1))
+        loader.start()
+        widget.run_idle(limit=1)
+        loader.cancel()
+        assert widget.run_idle() == 0
+        assert done == [] and widget.options["wrap"] == "word"
+
+        assert load_text(widget, "small", lambda: done.append(2)) is None
+        assert widget.text == "small" and done == [2]
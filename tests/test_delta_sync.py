@@ -0,0 +1,138 @@
+"""块级增量上传测试。远端助手在本机以子进程运行，远端目录用本地目录模拟。"""
+import hashlib
+import random
+import subprocess
+import sys
+import zlib
+
+import delta_sync
+from delta_sync import (compute_signature, compute_delta, choose_block_size, HELPER_SOURCE,
+                        DELTA_MAGIC)
+from sync_backends import LocalDirBackend
+
+
+class ExecLocalBackend(LocalDirBackend):
+    """本地目录后端 + 用当前解释器执行远端助手"""
+
+    supports_exec = True
+
+    def __init__(self):
+        self.exec_calls = []
+        self.sent = 0
+
+    def exec_command(self, command, stdin_data=None, callback=None):
+        import shlex
+        argv = shlex.split(command)
+        assert argv[0] == "python3"
+        argv[0] = sys.executable
+        self.exec_calls.append(argv[3])
+        self.sent += len(stdin_data or b"")
+        proc = subprocess.run(argv, input=stdin_data or b"", capture_output=True)
+        if callback and stdin_data:
+            callback(len(stdin_data), len(stdin_data))
+        return proc.returncode, proc.stdout, proc.stderr
+
+
+def _pages(n, seed=1):
+    return random.Random(seed).randbytes(n * 4096)
+
+
+def _run_helper(*args, stdin=b""):
+    return subprocess.run([sys.executable, "-c", HELPER_SOURCE] + [str(a) for a in args],
+                          input=stdin, capture_output=True)
+
+
+class TestDelta:
+    def test_rolling_adler_matches_zlib(self):
+        data = random.Random(3).randbytes(9000)
+        bs = 4096
+        sig = compute_signature(data[100:100 + bs], bs)
+        # 目标中该块错位 100 字节，只能靠滚动找到
+        delta, stats = compute_delta(data, sig)
+        assert stats.copied_blocks == 1
+        assert zlib.adler32(data[100:100 + bs]) == int.from_bytes(sig[delta_sync.SIG_HEADER.size:][:4], "big")
+
+    def test_page_change_sends_only_changed_page(self, tmp_path):
+        basis = _pages(64)
+        target = bytearray(basis)
+        target[10 * 4096 + 7] ^= 0xff
+        target = bytes(target) + b"tail"
+        bs = choose_block_size(len(basis))
+
+        delta, stats = compute_delta(target, compute_signature(basis, bs))
+
+        assert delta.startswith(DELTA_MAGIC)
+        assert stats.copied_blocks == 63
+        assert stats.literal_bytes == 4096 + 4
+        assert len(delta) < 2 * 4096
+
+        basis_path = tmp_path / "safedraft.db"
+        basis_path.write_bytes(basis)
+        proc = _run_helper("apply", basis_path, str(basis_path) + ".delta", basis_path, bs, stdin=delta)
+        assert proc.returncode == 0, proc.stderr
+        assert basis_path.read_bytes() == target
+        assert not (tmp_path / "safedraft.db.delta").exists()
+
+    def test_helper_signature_matches_client_and_is_cached(self, tmp_path):
+        data = _pages(8) + b"partial"
+        path = tmp_path / "safedraft.db"
+        path.write_bytes(data)
+        proc = _run_helper("sig", path, 4096)
+        assert proc.returncode == 0
+        header = delta_sync.SIG_HEADER.size
+        assert proc.stdout[header:] == compute_signature(data, 4096)[header:]
+        assert (tmp_path / "safedraft.db.sig").exists()
+
+    def test_helper_rejects_changed_basis(self, tmp_path):
+        basis = _pages(4)
+        path = tmp_path / "safedraft.db"
+        path.write_bytes(basis)
+        delta, _ = compute_delta(basis + b"x", compute_signature(_pages(4, seed=9), 4096))
+        proc = _run_helper("apply", path, str(path) + ".delta", path, 4096, stdin=delta)
+        assert proc.returncode != 0
+        assert path.read_bytes() == basis
+
+
+class TestEngineDelta:
+    def test_helper_md5_of_prefix(self, tmp_path):
+        path = tmp_path / "partial"
+        data = _pages(3)
+        path.write_bytes(data)
+        assert delta_sync.remote_md5(ExecLocalBackend(), str(path), 5000) == hashlib.md5(data[:5000]).hexdigest()
+        assert _run_helper("md5", path, len(data) + 1).returncode != 0
+
+    def test_second_push_uses_delta(self, tmp_db, tmp_path):
+        from sync_engine import SyncEngine
+        share = tmp_path / "share"
+        share.mkdir()
+        for i in range(300):
+            tmp_db.save_content_forced(f"draft {i} " + "x" * 400)
+
+        SyncEngine(tmp_db, "", str(share), backend=ExecLocalBackend()).force_push()
+
+        tmp_db.save_content_forced("one more draft")
+        backend = ExecLocalBackend()
+        engine = SyncEngine(tmp_db, "", str(share), backend=backend)
+        engine.upload_merge()
+
+        assert engine.delta_stats is not None
+        local = open(tmp_db.db_path, 'rb').read()
+        assert (share / "safedraft.db").read_bytes() == local
+        assert backend.sent < len(local) // 4
+        assert hashlib.md5(local).hexdigest() == engine.uploaded_md5
+
+    def test_falls_back_to_full_upload_when_helper_fails(self, tmp_db, tmp_path):
+        from sync_engine import SyncEngine
+        share = tmp_path / "share"
+        share.mkdir()
+        tmp_db.save_content_forced("data")
+        SyncEngine(tmp_db, "", str(share), backend=LocalDirBackend()).force_push()
+        tmp_db.save_content_forced("more")
+
+        backend = ExecLocalBackend()
+        backend.exec_command = lambda *a, **k: (127, b"", b"python3: not found")
+        engine = SyncEngine(tmp_db, "", str(share), backend=backend)
+        engine.upload_merge()
+
+        assert engine.delta_stats is None
+        assert (share / "safedraft.db").read_bytes() == open(tmp_db.db_path, 'rb').read()
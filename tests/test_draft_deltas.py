@@ -0,0 +1,63 @@
+"""草稿增量自动保存测试：读取看到最新内容、基准校验、合并回全文。"""
+import storage
+
+
+def _row_content(db, draft_id):
+    db.cursor.execute("SELECT content FROM drafts WHERE id = ?", (draft_id,))
+    return db.cursor.fetchone()[0]
+
+
+class TestDraftDeltas:
+    def test_reads_see_deltas_without_rewriting_row(self, tmp_db):
+        base = "hello world " * 1000
+        draft_id = tmp_db.save_content(base)
+        other_id = tmp_db.save_content("older draft")
+
+        assert tmp_db.save_delta(draft_id, [(0, 5, "HELLO"), (len(base), 0, "needle")], len(base))
+        latest = "HELLO" + base[5:] + "needle"
+        assert tmp_db.get_draft_content(draft_id) == latest
+        assert _row_content(tmp_db, draft_id) == base
+
+        history = tmp_db.get_history()
+        # 追加增量后该草稿排到最前
+        assert [r[0] for r in history] == [draft_id, other_id]
+        assert history[0][1] == latest
+        assert [r[0] for r in tmp_db.get_history("NEEDLE")] == [draft_id]
+        assert [r[0] for r in tmp_db.get_history("older")] == [other_id]
+
+    def test_stale_base_rejected(self, tmp_db):
+        draft_id = tmp_db.save_content("abc")
+        assert not tmp_db.save_delta(draft_id, [(3, 0, "d")], 10)
+        assert not tmp_db.save_delta(draft_id + 100, [(0, 0, "x")], 0)
+        assert tmp_db.save_delta(draft_id, [(3, 0, "d")], 3)
+        # 第二批的基准是上一批应用后的长度
+        assert not tmp_db.save_delta(draft_id, [(4, 0, "e")], 3)
+        assert tmp_db.save_delta(draft_id, [(4, 0, "e")], 4)
+        assert tmp_db.get_draft_content(draft_id) == "abcde"
+
+        # 全文保存覆盖增量
+        tmp_db.save_content("full", draft_id)
+        assert tmp_db.get_draft_content(draft_id) == "full"
+        tmp_db.delete_draft(draft_id)
+        tmp_db.cursor.execute("SELECT count(*) FROM draft_deltas")
+        assert tmp_db.cursor.fetchone()[0] == 0
+
+    def test_consolidation(self, tmp_db, monkeypatch):
+        monkeypatch.setattr(storage, "DELTA_CONSOLIDATE_COUNT", 5)
+        text = "x" * 1000
+        draft_id = tmp_db.save_content(text)
+        for i in range(4):
+            tmp_db.save_delta(draft_id, [(0, 0, str(i))], len(text))
+            text = str(i) + text
+        assert _row_content(tmp_db, draft_id) == "x" * 1000
+
+        # 第 5 条增量触发合并
+        tmp_db.save_delta(draft_id, [(0, 0, "y")], len(text))
+        text = "y" + text
+        assert _row_content(tmp_db, draft_id) == text
+
+        # 计算 MD5（同步前）时也会合并
+        tmp_db.save_delta(draft_id, [(len(text), 0, "z")], len(text))
+        tmp_db.calculate_db_md5()
+        assert _row_content(tmp_db, draft_id) == text + "z"
+        assert tmp_db.consolidate_deltas() == 0
@@ -3,8 +3,8 @@ from unittest.mock import patch, MagicMock
 
 
 class TestForcePushOverwrite:
-    def test_calls_rename_when_remote_exists(self, tmp_db):
-        """远程存在 DB 时，先备份再上传。"""
+    def test_backs_up_to_store_when_remote_exists(self, tmp_db):
+        """远程存在 DB 时，先写入备份仓库清单再上传。"""
         tmp_db.save_content_forced("local data")
 
         with patch.object(tmp_db, '_get_ssh_client') as mock_ssh_ctor:
@@ -13,12 +13,14 @@ class TestForcePushOverwrite:
             ssh.open_sftp.return_value = sftp
             mock_ssh_ctor.return_value = ssh
 
-            sftp.stat.return_value = MagicMock()
+            sftp.stat.return_value = MagicMock(st_size=0)
             sftp.listdir.return_value = []
 
             tmp_db.force_push_overwrite("user@host", "/remote/path")
 
-            assert sftp.rename.called, "应该调用 sftp.rename 备份远程 DB"
+            written = [call.args[1] for call in sftp.putfo.call_args_list]
+            assert any("/backups/manifests/" in p for p in written), "应该写入备份清单"
+            assert not sftp.rename.called, "不再重命名为 .bak 全量备份"
             assert sftp.put.called, "应该调用 sftp.put 上传 DB"
             ssh.open_sftp.assert_called_once()
 
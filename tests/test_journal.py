@@ -0,0 +1,114 @@
+"""编辑日志测试：差异记录、崩溃回放、尾部损坏与压缩。"""
+import os
+import random
+import time
+
+import pytest
+
+import journal
+from journal import EditJournal, diff, read_journal, recover_journals
+from scheduler import Scheduler
+
+
+@pytest.fixture
+def sched():
+    s = Scheduler(tick=0.01)
+    s.start()
+    yield s
+    s.stop()
+
+
+def _apply(old, op):
+    pos, deleted, text = op
+    return old[:pos] + text + old[pos + deleted:]
+
+
+class TestEditJournal:
+    def test_diff_roundtrip(self):
+        rng = random.Random(5)
+        text = "".join(rng.choice("ab中c\n") for _ in range(200))
+        for _ in range(300):
+            i = rng.randint(0, len(text))
+            j = rng.randint(i, min(len(text), i + 5))
+            new = text[:i] + "".join(rng.choice("abx文") for _ in range(rng.randint(0, 4))) + text[j:]
+            assert _apply(text, diff(text, new)) == new
+            text = new
+
+    def test_unsaved_typing_recovered_after_crash(self, tmp_db, sched, monkeypatch):
+        draft_id = tmp_db.save_content("hello")
+        j = EditJournal(tmp_db.base_path, scheduler=sched, draft_id=draft_id, content="hello")
+        for content in ("hello ", "hello w", "hello wo", "hello world"):
+            j.record(content, draft_id)
+        # 模拟崩溃：只等批量 fsync，不 close
+        time.sleep(journal.FSYNC_DELAY + 0.2)
+        assert read_journal(j.path) == (draft_id, "hello world", 4)
+
+        # 日志仍被持有（进程还在运行）时不回放
+        assert recover_journals(tmp_db) == 0
+        assert os.path.exists(j.path)
+        # 进程退出时系统释放日志锁
+        j._release_owner()
+        assert recover_journals(tmp_db) == 1
+        assert tmp_db.get_draft_content(draft_id) == "hello world"
+        assert not os.listdir(os.path.join(tmp_db.base_path, journal.JOURNAL_DIR))
+
+    def test_committed_journal_needs_no_replay_and_torn_tail_ignored(self, tmp_db, sched, monkeypatch):
+        j = EditJournal(tmp_db.base_path, scheduler=sched)
+        j.record("draft", None)
+        new_id = tmp_db.save_content("draft")
+        j.commit(new_id, "draft")
+        j.record("draft 2", new_id)
+        j.close()
+        with open(j.path, "ab") as f:
+            f.write(b"\x01\x02\x03")  # 写了一半的记录
+        assert read_journal(j.path) == (new_id, "draft 2", 1)
+
+        j2 = EditJournal(tmp_db.base_path, scheduler=sched)
+        j2.close(remove=True)
+        assert not os.path.exists(j2.path)
+
+        # 已关闭的日志不再持有锁，即使文件名中的 pid 是当前进程（或被其它进程复用）也回放
+        assert recover_journals(tmp_db) == 1
+        assert [r[1] for r in tmp_db.get_history()] == ["draft 2"]
+
+    def test_rotation_bounds_size(self, tmp_db, sched, monkeypatch):
+        monkeypatch.setattr(journal, "MAX_JOURNAL_BYTES", 2048)
+        j = EditJournal(tmp_db.base_path, scheduler=sched)
+        text = ""
+        for i in range(500):
+            text += "x"
+            j.record(text, None)
+        j.sync()
+        assert os.path.getsize(j.path) <= 2048 + 600
+        _, content, edits = read_journal(j.path)
+        # 压缩后的快照仍是未保存内容，崩溃后需要回放
+        assert content == text and edits > 0
+        j.close(remove=True)
+
+    def test_record_cost_is_small(self, tmp_db, sched):
+        j = EditJournal(tmp_db.base_path, scheduler=sched)
+        base = "草稿内容 " * 500
+        j.commit(None, base)
+        start = time.perf_counter()
+        text = base
+        for i in range(2000):
+            text = text[:1000] + "a" + text[1000:]
+            j.record(text, None)
+        per_edit = (time.perf_counter() - start) / 2000
+        j.close(remove=True)
+        assert per_edit < 200e-6
+
+    def test_saved_reference_replays_against_draft(self, tmp_db, sched, monkeypatch):
+        draft_id = tmp_db.save_content("saved text")
+        j = EditJournal(tmp_db.base_path, scheduler=sched)
+        j.mark_saved(draft_id, len("saved text"))
+        j.record_edit(10, 0, "!", draft_id, lambda: "saved text!")
+        j.close()
+        assert read_journal(j.path) is None
+        assert read_journal(j.path, tmp_db.get_draft_content) == (draft_id, "saved text!", 1)
+
+        # 草稿已被替换（长度不符）时不回放
+        tmp_db.save_content("replaced by sync", draft_id)
+        assert read_journal(j.path, tmp_db.get_draft_content) is None
+        assert recover_journals(tmp_db) == 0
+        assert not os.listdir(os.path.join(tmp_db.base_path, journal.JOURNAL_DIR))
@@ -0,0 +1,104 @@
+"""列表搜索测试：防抖、作废旧查询、在上次结果中收窄、分批读取。"""
+from list_search import ListSearcher
+from storage import like_contains
+
+
+class _RecordingScheduler:
+    def __init__(self):
+        self.jobs = {}
+
+    def schedule(self, name, delay, func, slack=0, blocking=False):
+        self.jobs[name] = (delay, func)
+
+    def cancel(self, name):
+        self.jobs.pop(name, None)
+
+    def fire(self, name):
+        _, func = self.jobs.pop(name)
+        func()
+
+
+def _searcher(rows):
+    sched = _RecordingScheduler()
+    fetched = []
+    batches = []
+
+    def fetch(keyword):
+        fetched.append(keyword)
+        found = [r for r in rows if like_contains(r, keyword)]
+        return [found[i:i + 2] for i in range(0, len(found), 2)]
+
+    searcher = ListSearcher(sched, "search", fetch, lambda row, kw: like_contains(row, kw),
+                            lambda rows, first, done: batches.append((rows, first, done)))
+    return searcher, sched, fetched, batches
+
+
+class TestListSearcher:
+    def test_debounce_and_stale_queries(self):
+        searcher, sched, fetched, batches = _searcher(["apple", "apricot", "banana"])
+        searcher.request("a")
+        stale = sched.jobs["search"][1]
+        searcher.request("ap")
+        assert sched.jobs["search"][0] > 0
+        # 已被取代的查询即使开始执行也不回传结果
+        stale()
+        assert batches == []
+        sched.fire("search")
+        assert fetched == ["ap"]
+        assert batches == [(["apple", "apricot"], True, False), ([], False, True)]
+
+        searcher.request("ap")
+        assert "search" not in sched.jobs
+
+    def test_extended_query_narrows_previous_results(self):
+        rows = [f"note {i} {'Alpha' if i % 2 else 'beta'}" for i in range(10)]
+        searcher, sched, fetched, batches = _searcher(rows)
+        searcher.request("al")
+        sched.fire("search")
+        searcher.request("alph")
+        sched.fire("search")
+        # 第二次在内存中收窄，没有再读取
+        assert fetched == ["al"]
+        assert [r for rows_, _, _ in batches[-2:] for r in rows_] == [r for r in rows if "Alpha" in r]
+
+        # 数据变化或关键词不是追加时重新读取
+        searcher.reset()
+        searcher.request("alpha", immediate=True)
+        assert sched.jobs["search"][0] == 0
+        sched.fire("search")
+        searcher.request("beta")
+        sched.fire("search")
+        assert fetched == ["al", "alpha", "beta"]
+        assert batches[-1] == ([], False, True)
+
+    def test_iter_history_streams_latest_content(self, tmp_db):
+        ids = [tmp_db.save_content(f"draft {i}") for i in range(5)]
+        tmp_db.save_delta(ids[0], [(0, 0, "edited ")], len("draft 0"))
+        batches = list(tmp_db.iter_history(batch_size=2))
+        assert [len(b) for b in batches] == [2, 2, 1]
+        rows = [r for b in batches for r in b]
+        assert rows == tmp_db.get_history()
+        assert rows[0][:2] == (ids[0], "edited draft 0")
+        assert [r[0] for b in tmp_db.iter_history("EDITED") for r in b] == [ids[0]]
+        assert [r[0] for r in tmp_db.get_notes()] == []
+
+    def test_wildcards_match_literally_in_sql_and_narrowing(self, tmp_db):
+        for content in ("a_b", "axb", "a%b", "50% off", "500 off", "c:\\dir"):
+            tmp_db.save_content(content)
+
+        def fresh(keyword):
+            return sorted(r[1] for b in tmp_db.iter_history(keyword) for r in b)
+
+        for keyword in ("a_b", "a%", "0%", "\\d"):
+            searcher = ListSearcher(_RecordingScheduler(), "search", tmp_db.iter_history,
+                                    lambda row, kw: like_contains(row[1], kw), lambda *a: None)
+            searcher.request(keyword[:-1], immediate=True)
+            searcher.scheduler.fire("search")
+            narrowed = []
+            searcher.on_batch = lambda rows, first, done: narrowed.extend(r[1] for r in rows)
+            searcher.request(keyword)
+            searcher.scheduler.fire("search")
+            assert sorted(narrowed) == fresh(keyword)
+        assert fresh("a_b") == ["a_b"]
+        assert fresh("0%") == ["50% off"]
+        assert [r[1] for r in tmp_db.get_notes(keyword="_")] == []
@@ -0,0 +1,91 @@
+"""内存反序列化合并测试。"""
+import os
+from types import SimpleNamespace
+
+import storage
+from storage import StorageManager
+from sync_backends import SftpBackend
+
+
+class FakeSFTP:
+    """只实现 stat/get/getfo 的最小 SFTP 替身，数据来自本地文件。"""
+
+    def __init__(self, src_path):
+        self.src_path = src_path
+        self.get_calls = 0
+        self.getfo_calls = 0
+
+    def stat(self, path):
+        if not os.path.exists(self.src_path):
+            raise FileNotFoundError(path)
+        return SimpleNamespace(st_size=os.path.getsize(self.src_path))
+
+    def get(self, remote, local, **kwargs):
+        self.get_calls += 1
+        with open(self.src_path, 'rb') as src, open(local, 'wb') as dst:
+            dst.write(src.read())
+
+    def getfo(self, remote, fl, **kwargs):
+        self.getfo_calls += 1
+        with open(self.src_path, 'rb') as src:
+            fl.write(src.read())
+
+
+def _backend(sftp):
+    backend = SftpBackend(None, "user@host")
+    backend.sftp = sftp
+    return backend
+
+
+def _make_remote(tmp_path, monkeypatch, contents):
+    remote_dir = tmp_path / "remote"
+    remote_dir.mkdir()
+    monkeypatch.setattr(StorageManager, "get_real_executable_path", lambda self: str(remote_dir))
+    remote = StorageManager()
+    for c in contents:
+        remote.save_content_forced(c)
+    remote.close()
+    return str(remote_dir / "safedraft.db")
+
+
+class TestMemoryMerge:
+    def test_merge_bytes(self, tmp_db, tmp_path, monkeypatch):
+        tmp_db.save_content_forced("local only")
+        remote_file = _make_remote(tmp_path, monkeypatch, ["remote only"])
+
+        with open(remote_file, 'rb') as f:
+            tmp_db.merge_database_bytes(f.read())
+
+        contents = sorted(r[1] for r in tmp_db.get_history())
+        assert contents == ["local only", "remote only"]
+
+    def test_fetch_small_stays_in_memory(self, tmp_db, tmp_path, monkeypatch):
+        remote_file = _make_remote(tmp_path, monkeypatch, ["remote"])
+        sftp = FakeSFTP(remote_file)
+
+        data, tmp_file = tmp_db._fetch_remote_db(_backend(sftp), "/r/safedraft.db")
+
+        assert tmp_file is None
+        assert data.startswith(b"SQLite format 3")
+        assert sftp.getfo_calls == 1 and sftp.get_calls == 0
+        assert not os.path.exists(tmp_db.db_path + ".remote_tmp")
+
+    def test_fetch_large_falls_back_to_disk(self, tmp_db, tmp_path, monkeypatch):
+        remote_file = _make_remote(tmp_path, monkeypatch, ["remote"])
+        sftp = FakeSFTP(remote_file)
+        monkeypatch.setattr(storage, "MEMORY_MERGE_MAX_BYTES", 1)
+
+        data, tmp_file = tmp_db._fetch_remote_db(_backend(sftp), "/r/safedraft.db")
+
+        assert data is None
+        assert os.path.exists(tmp_file)
+        assert sftp.get_calls == 1
+        os.remove(tmp_file)
+
+    def test_fetch_missing_raises(self, tmp_db, tmp_path):
+        sftp = FakeSFTP(str(tmp_path / "missing.db"))
+        try:
+            tmp_db._fetch_remote_db(_backend(sftp), "/r/safedraft.db")
+            assert False, "应抛 FileNotFoundError"
+        except FileNotFoundError:
+            pass
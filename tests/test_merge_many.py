@@ -0,0 +1,112 @@
+"""多数据库一次性合并测试。"""
+import random
+import sqlite3
+
+import merge_tool
+import storage
+from storage import StorageManager
+
+
+def _device(tmp_path, monkeypatch, name):
+    base = tmp_path / name
+    base.mkdir()
+    monkeypatch.setattr(StorageManager, "get_real_executable_path", lambda self: str(base))
+    return StorageManager()
+
+
+def _fill(db, rng, shared_uuids):
+    """写入带随机时间戳的各类数据，部分 uuid / 内容在设备间重复"""
+    cur = db.cursor
+    for u in shared_uuids:
+        ts = f"2024-01-{rng.randint(1, 28):02d} 10:00:00"
+        cur.execute("INSERT OR REPLACE INTO folders VALUES (?, ?, 0, ?)", (u, f"folder {ts}", ts))
+        cur.execute("INSERT OR REPLACE INTO notes VALUES (?, ?, ?, ?, 0, ?, NULL)",
+                    (u, u, f"title {ts}", f"body {ts}", ts))
+        cur.execute("INSERT OR REPLACE INTO stickynotes (uuid, title, content, created_at, updated_at) "
+                    "VALUES (?, '便签', ?, ?, ?)", (u, f"sticky {u} {ts}", ts, ts))
+    for i in range(30):
+        ts = f"2024-02-{rng.randint(1, 28):02d} 10:00:00"
+        cur.execute("INSERT INTO drafts (content, created_at, last_updated_at) VALUES (?, ?, ?)",
+                    (f"draft {rng.randint(0, 40)}", ts, ts))
+    cur.execute("INSERT OR IGNORE INTO triggers_v2 (rule_type, value, enabled) VALUES ('title', ?, 1)",
+                (f"kw{rng.randint(0, 3)}",))
+    db.conn.commit()
+
+
+def _snapshot(db):
+    cur = db.conn.cursor()
+    return {
+        "folders": sorted(cur.execute("SELECT * FROM folders").fetchall()),
+        "notes": sorted(cur.execute("SELECT * FROM notes").fetchall()),
+        "drafts": sorted(cur.execute("SELECT content, last_updated_at FROM drafts").fetchall()),
+        "triggers": sorted(cur.execute("SELECT rule_type, value FROM triggers_v2").fetchall()),
+        "sticky": sorted(cur.execute("SELECT uuid, content, updated_at FROM stickynotes").fetchall()),
+    }
+
+
+class TestMergeMany:
+    def test_matches_sequential_merge(self, tmp_path, monkeypatch):
+        rng = random.Random(7)
+        shared = [f"uuid-{i}" for i in range(10)]
+        sources = []
+        for n in range(4):
+            dev = _device(tmp_path, monkeypatch, f"dev{n}")
+            _fill(dev, rng, rng.sample(shared, 6))
+            sources.append(dev.db_path)
+            dev.close()
+
+        seq = _device(tmp_path, monkeypatch, "seq")
+        many = _device(tmp_path, monkeypatch, "many")
+        for db in (seq, many):
+            _fill(db, random.Random(99), shared[:3])
+
+        for p in sources:
+            seq.merge_database(p)
+        stats = many.merge_many(sources)
+
+        assert stats["sources"] == 4 and stats["changes"] > 0
+        assert _snapshot(many) == _snapshot(seq)
+        # 同一内容的草稿只剩一条
+        contents = [r[0] for r in _snapshot(many)["drafts"]]
+        assert len(contents) == len(set(contents))
+        seq.close()
+        many.close()
+
+    def test_batches_and_notifies_once(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(storage, "MERGE_ATTACH_BATCH", 2)
+        sources = []
+        for n in range(5):
+            dev = _device(tmp_path, monkeypatch, f"dev{n}")
+            dev.save_content_forced(f"from {n}")
+            dev.save_content_forced("common")
+            sources.append(dev.db_path)
+            dev.close()
+        target = _device(tmp_path, monkeypatch, "target")
+        calls = []
+        target.add_observer(lambda: calls.append(1))
+
+        target.merge_many(sources)
+
+        contents = sorted(r[1] for r in target.get_history())
+        assert contents == ["common"] + [f"from {n}" for n in range(5)]
+        assert len(calls) == 1
+        attached = target.conn.execute("PRAGMA database_list").fetchall()
+        assert [r[1] for r in attached if r[1] != "temp"] == ["main"]
+        target.close()
+
+    def test_cli_into_new_database(self, tmp_path, monkeypatch, capsys):
+        sources = []
+        for n in range(2):
+            dev = _device(tmp_path, monkeypatch, f"dev{n}")
+            dev.save_content_forced(f"cli {n}")
+            sources.append(dev.db_path)
+            dev.close()
+        out = tmp_path / "merged.db"
+
+        assert merge_tool.main(["--into", str(out)] + sources) == 0
+
+        conn = sqlite3.connect(str(out))
+        rows = sorted(r[0] for r in conn.execute("SELECT content FROM drafts"))
+        conn.close()
+        assert rows == ["cli 0", "cli 1"]
+        assert "已合并 2 个数据库" in capsys.readouterr().out
@@ -0,0 +1,135 @@
+"""远端合并代理测试。代理在本机以子进程运行，远端目录用本地目录模拟。"""
+import hashlib
+import shlex
+import sqlite3
+import subprocess
+import sys
+
+import remote_merge
+from storage import StorageManager
+from sync_backends import LocalDirBackend
+from sync_engine import SyncEngine
+
+
+class ExecLocalBackend(LocalDirBackend):
+    """本地目录后端 + 用当前解释器执行远端代理"""
+
+    supports_exec = True
+
+    def __init__(self):
+        self.sent = 0
+
+    def exec_command(self, command, stdin_data=None, callback=None):
+        argv = shlex.split(command)
+        assert argv[0] == "python3"
+        argv[0] = sys.executable
+        self.sent += len(stdin_data or b"")
+        proc = subprocess.run(argv, input=stdin_data or b"", capture_output=True)
+        if callback and stdin_data:
+            callback(len(stdin_data), len(stdin_data))
+        return proc.returncode, proc.stdout, proc.stderr
+
+
+def _client(tmp_path, monkeypatch, name):
+    base = tmp_path / name
+    base.mkdir()
+    monkeypatch.setattr(StorageManager, "get_real_executable_path", lambda self: str(base))
+    db = StorageManager()
+    db.set_setting("sync_remote_merge", "1")
+    return db
+
+
+def _drafts(db):
+    return sorted(r[1] for r in db.get_history())
+
+
+def _remote_drafts(share):
+    conn = sqlite3.connect(str(share / "safedraft.db"))
+    try:
+        return sorted(r[0] for r in conn.execute("SELECT content FROM drafts"))
+    finally:
+        conn.close()
+
+
+def _share(tmp_path, seed_db):
+    share = tmp_path / "share"
+    share.mkdir()
+    SyncEngine(seed_db, "", str(share), backend=LocalDirBackend()).force_push()
+    return share
+
+
+class TestRemoteMerge:
+    def test_two_clients_converge(self, tmp_db, tmp_path, monkeypatch):
+        tmp_db.set_setting("sync_remote_merge", "1")
+        tmp_db.save_content_forced("from a")
+        share = _share(tmp_path, tmp_db)
+        other = _client(tmp_path, monkeypatch, "b")
+        other.save_content_forced("from b")
+
+        engine = SyncEngine(other, "", str(share), backend=ExecLocalBackend())
+        engine.upload_merge()
+        assert engine.remote_merged
+        assert _drafts(other) == ["from a", "from b"]
+        assert _remote_drafts(share) == ["from a", "from b"]
+
+        tmp_db.save_content_forced("later a")
+        SyncEngine(tmp_db, "", str(share), backend=ExecLocalBackend()).upload_merge()
+        SyncEngine(other, "", str(share), backend=ExecLocalBackend()).upload_merge()
+
+        expected = ["from a", "from b", "later a"]
+        assert _drafts(tmp_db) == expected
+        assert _drafts(other) == expected
+        assert _remote_drafts(share) == expected
+        remote_md5 = hashlib.md5((share / "safedraft.db").read_bytes()).hexdigest()
+        assert (share / f"safedraft_{remote_md5}.md5").exists()
+        other.close()
+
+    def test_only_changes_are_sent(self, tmp_db, tmp_path):
+        tmp_db.set_setting("sync_remote_merge", "1")
+        for i in range(200):
+            tmp_db.save_content_forced(f"draft {i} " + "x" * 200)
+        share = _share(tmp_path, tmp_db)
+        SyncEngine(tmp_db, "", str(share), backend=ExecLocalBackend()).upload_merge()
+
+        tmp_db.save_content_forced("one more draft")
+        backend = ExecLocalBackend()
+        SyncEngine(tmp_db, "", str(share), backend=backend).upload_merge()
+
+        assert backend.sent < 1024
+        assert "one more draft" in _remote_drafts(share)
+        state = remote_merge.load_state(tmp_db.base_path)["remote_merge"]
+        assert len(state) == 1 and list(state.values())[0]["remote_seq"] > 0
+
+    def test_resyncs_after_remote_file_replaced(self, tmp_db, tmp_path, monkeypatch):
+        tmp_db.set_setting("sync_remote_merge", "1")
+        tmp_db.save_content_forced("a1")
+        share = _share(tmp_path, tmp_db)
+        SyncEngine(tmp_db, "", str(share), backend=ExecLocalBackend()).upload_merge()
+
+        # 另一客户端整文件强制推送，远端文件被替换
+        other = _client(tmp_path, monkeypatch, "b")
+        other.save_content_forced("b1")
+        SyncEngine(other, "", str(share), backend=LocalDirBackend()).force_push()
+        other.close()
+
+        tmp_db.save_content_forced("a2")
+        engine = SyncEngine(tmp_db, "", str(share), backend=ExecLocalBackend())
+        engine.upload_merge()
+
+        assert engine.remote_merged
+        assert _drafts(tmp_db) == ["a1", "a2", "b1"]
+        assert _remote_drafts(share) == ["a1", "a2", "b1"]
+
+    def test_falls_back_without_python(self, tmp_db, tmp_path):
+        tmp_db.set_setting("sync_remote_merge", "1")
+        tmp_db.save_content_forced("data")
+        share = _share(tmp_path, tmp_db)
+        tmp_db.save_content_forced("more")
+
+        backend = ExecLocalBackend()
+        backend.exec_command = lambda *a, **k: (127, b"", b"python3: not found")
+        engine = SyncEngine(tmp_db, "", str(share), backend=backend)
+        engine.upload_merge()
+
+        assert not engine.remote_merged
+        assert (share / "safedraft.db").read_bytes() == open(tmp_db.db_path, 'rb').read()
@@ -0,0 +1,53 @@
+"""触发规则编译匹配测试。"""
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+import bench_rules
+from rule_matcher import AhoCorasick, RuleMatcher, validate_rule
+
+
+class TestRuleMatcher:
+    def test_aho_corasick_returns_lowest_index(self):
+        ac = AhoCorasick(["she", "he", "hers", "his"])
+        assert ac.search("ushers") == 0
+        assert ac.search("ahis") == 3
+        assert ac.search("xyz") is None
+        assert AhoCorasick(["abc", ""]).search("zzz") == 1
+
+    def test_matches_sequential_rules(self):
+        rng = random.Random(3)
+        rules = bench_rules.make_rules(300, rng)
+        rules['regex'], rules['glob'] = [], []
+        matcher = RuleMatcher(rules)
+        windows = bench_rules.make_windows(300, rng)
+        # 混入必然命中的窗口
+        windows += [(f"x {t} y", "a.exe") for t in rules['title'][::7]]
+        windows += [("t", f"{p[:-4]}64.exe") for p in rules['process'][::7]]
+
+        for title, proc in windows:
+            expected = bench_rules.naive_match(rules, title, proc)
+            got = matcher.match(title, proc)
+            assert (got[:2] if got else None) == expected
+
+    def test_regex_and_glob_rules(self):
+        matcher = RuleMatcher({
+            'title': ["notion"],
+            'process': [],
+            'regex': [r"chat(gpt|bot)", r"Issue #\d+", "(?i)^mail"],
+            'glob': ["*code*.exe"],
+        })
+        assert matcher.match("vscode", "code - insiders.exe")[:2] == ("glob", "*code*.exe")
+        assert matcher.match("my chatbot", "chrome.exe") == ("regex", r"chat(gpt|bot)", r"regex:chat(gpt|bot)")
+        assert matcher.match("fix issue #42 - github", "chrome.exe")[1] == r"Issue #\d+"
+        assert matcher.match("mailbox", "outlook.exe")[1] == "(?i)^mail"
+        # 普通关键词优先于正则
+        assert matcher.match("notion chatgpt", "chrome.exe")[0] == "title"
+        assert matcher.match("issue #x", "chrome.exe") is None
+
+    def test_validate_rule(self):
+        assert validate_rule("regex", "a(") is not None
+        assert validate_rule("regex", r"a\d") is None
+        assert validate_rule("glob", "") is not None
@@ -0,0 +1,85 @@
+"""统一调度器测试。"""
+import threading
+import time
+
+import pytest
+
+from scheduler import Scheduler
+
+
+@pytest.fixture
+def sched():
+    s = Scheduler(tick=0.01)
+    s.start()
+    yield s
+    s.stop()
+
+
+def _wait(pred, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not pred() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return pred()
+
+
+class TestScheduler:
+    def test_named_job_replaced_and_cancelled(self, sched):
+        calls = []
+        sched.schedule("save", 0.05, lambda: calls.append("first"))
+        sched.schedule("save", 0.05, lambda: calls.append("second"))
+        sched.schedule("gone", 0.02, lambda: calls.append("gone"))
+        sched.cancel("gone")
+
+        assert _wait(lambda: calls)
+        time.sleep(0.1)
+        assert calls == ["second"]
+        assert not sched.pending("save")
+
+    def test_slack_coalesces_wakeups(self, sched):
+        ran = []
+        time.sleep(0.05)
+        before = sched.stats()["wakeups"]
+        jb = sched.schedule("b", 0.15, lambda: ran.append("b"))
+        ja = sched.schedule("a", 0.10, lambda: ran.append("a"), slack=0.1)
+        jc = sched.schedule("c", 0.12, lambda: ran.append("c"), slack=0.1)
+
+        # 三个任务落在同一个槽里，一次到期唤醒全部执行
+        assert ja.slot == jb.slot == jc.slot
+        assert _wait(lambda: len(ran) == 3)
+        assert sched.stats()["wakeups"] - before <= 2
+        assert sched.stats()["runs"] == 3
+
+    def test_zero_slack_jobs_share_existing_slot(self):
+        # 截止时间不在槽边界上的两个 slack=0 任务落入同一个槽，不能重复登记槽或清掉已有任务
+        s = Scheduler(tick=0.05, clock=lambda: 100.0)
+        ja = s.schedule("a", 1.23, lambda: None)
+        jb = s.schedule("b", 1.22, lambda: None)
+        assert ja.slot == jb.slot
+        assert s._ticks == [ja.slot]
+        assert set(s._slots[ja.slot]) == {"a", "b"}
+        assert {job.name for job in s._pop_due(102.0)} == {"a", "b"}
+        assert not s._ticks and not s._slots
+
+    def test_interval_job_repeats_until_cancelled(self, sched):
+        ticks = []
+        sched.schedule("poll", 0, lambda: ticks.append(1), interval=0.02)
+        assert _wait(lambda: len(ticks) >= 3)
+        sched.cancel("poll")
+        time.sleep(0.05)
+        count = len(ticks)
+        time.sleep(0.1)
+        assert len(ticks) == count
+
+    def test_blocking_job_does_not_delay_others(self, sched):
+        release = threading.Event()
+        quick = threading.Event()
+        sched.schedule("sync", 0, release.wait, blocking=True)
+        sched.schedule("autosave", 0.03, quick.set)
+        assert quick.wait(1)
+        release.set()
+
+    def test_idle_scheduler_does_not_wake(self, sched):
+        time.sleep(0.05)
+        before = sched.stats()["wakeups"]
+        time.sleep(0.3)
+        assert sched.stats()["wakeups"] == before
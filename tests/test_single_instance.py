@@ -0,0 +1,62 @@
+"""单实例测试：锁文件互斥、命令转发、口令校验与退出后释放。"""
+import socket
+import threading
+
+import pytest
+
+import single_instance
+from single_instance import InstanceGuard, acquire_or_forward, command_from_argv, send_command
+
+
+def _serving_guard(base_path):
+    guard = InstanceGuard(base_path)
+    assert guard.acquire()
+    received = []
+    event = threading.Event()
+    guard.serve(lambda command: (received.append(command), event.set()))
+    return guard, received, event
+
+
+class TestSingleInstance:
+    def test_second_launch_forwards_command_and_exits(self, tmp_path):
+        base = str(tmp_path)
+        guard, received, event = _serving_guard(base)
+        try:
+            assert not InstanceGuard(base).acquire()
+            with pytest.raises(SystemExit) as exc:
+                acquire_or_forward(["--notebook"], base_path=base)
+            assert exc.value.code == 0
+            assert event.wait(2) and received == ["notebook"]
+
+            # 口令不对的连接被拒绝，不执行命令
+            port = guard._server.getsockname()[1]
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as conn:
+                conn.sendall(b"wrong new\n")
+                assert conn.recv(16) == b"denied\n"
+            assert received == ["notebook"]
+        finally:
+            guard.close()
+
+        # 退出后锁释放，下一次启动成为唯一实例
+        assert not (tmp_path / single_instance.IPC_NAME).exists()
+        again = InstanceGuard(base)
+        assert again.acquire()
+        again.close()
+
+    def test_waits_for_starting_instance_then_gives_up(self, tmp_path):
+        base = str(tmp_path)
+        guard = InstanceGuard(base)
+        assert guard.acquire()
+        try:
+            # 已持有锁但尚未开始监听：重试到超时后失败
+            assert not send_command(base, "show", timeout=0.1)
+            received = []
+            guard.serve(received.append)
+            assert send_command(base, "new", timeout=1)
+        finally:
+            guard.close()
+
+    def test_command_from_argv(self):
+        assert command_from_argv([]) == "show"
+        assert command_from_argv(["--minimized", "--new"]) == "new"
+        assert command_from_argv(["--notebook", "--new"]) == "notebook"
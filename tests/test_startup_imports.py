@@ -0,0 +1,48 @@
+"""启动导入测试：用 -X importtime 检查导入 main 时不加载首屏不需要的模块，且总耗时在预算内。"""
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+pytest.importorskip("tkinter")
+
+# 首屏之前不应导入的模块（同步、托盘、热键、窗口监视、子窗口、图标）
+DEFERRED_MODULES = {
+    "paramiko", "PIL", "pynput", "psutil", "pystray",
+    "windows", "notebook", "sticky", "autosync", "watcher", "sync_targets", "icon_data",
+    "sync_engine", "backup_store", "delta_sync", "remote_merge",
+}
+# 导入 main 的累计耗时预算（微秒）；导入 paramiko 一项就约 200 毫秒
+STARTUP_IMPORT_BUDGET_US = 250_000
+# 取多次导入中最快的一次与预算比较，避免机器繁忙时偶发超时
+BUDGET_RUNS = 3
+
+
+def _import_times(module):
+    """返回 {模块名: 累计耗时微秒}"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=str(ROOT), capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestStartupImports:
+    def test_main_imports_only_what_first_paint_needs(self):
+        times = _import_times("main")
+        loaded = {name.split(".")[0] for name in times}
+        assert not loaded & DEFERRED_MODULES
+        best = times["main"]
+        for _ in range(BUDGET_RUNS - 1):
+            if best <= STARTUP_IMPORT_BUDGET_US:
+                break
+            best = min(best, _import_times("main")["main"])
+        assert best <= STARTUP_IMPORT_BUDGET_US
@@ -0,0 +1,76 @@
+"""启动计时测试：阶段记录、startup.log 轮换、Chrome trace 输出与环境变量开关。"""
+import json
+import time
+
+import startup_trace
+from startup_trace import StartupTimeline, append_log, format_entry, read_log, trace_seconds_from_env
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestStartupTrace:
+    def test_phases_and_log(self, tmp_path, monkeypatch):
+        clock = _Clock()
+        timeline = StartupTimeline(clock=clock)
+        clock.now += 0.05
+        timeline.add("imports", timeline.t0)
+        with timeline.phase("app_init"):
+            clock.now += 0.01
+            with timeline.phase("storage"):
+                clock.now += 0.02
+        timeline.mark("first_idle")
+        assert timeline.phases() == [("imports", 0.0, 50.0), ("app_init", 50.0, 30.0),
+                                     ("storage", 60.0, 20.0), ("first_idle", 80.0, None)]
+
+        monkeypatch.setattr(startup_trace, "LOG_KEEP", 2)
+        timeline.finish(str(tmp_path))
+        # 未开启追踪时写入记录后停止记录
+        assert not timeline.recording
+        with timeline.phase("late"):
+            pass
+        assert len(timeline.phases()) == 4
+
+        entry = read_log(str(tmp_path))[0]
+        assert entry["total_ms"] == 80.0 and entry["phases"][1] == ["app_init", 50.0, 30.0]
+        assert "storage" in format_entry(entry)
+
+        for i in range(3):
+            append_log(str(tmp_path), {"time": str(i), "phases": []}, keep=2)
+        assert [e["time"] for e in read_log(str(tmp_path))] == ["2", "1"]
+
+    def test_env_switch_and_chrome_trace(self, tmp_path):
+        assert trace_seconds_from_env({}) is None
+        assert trace_seconds_from_env({"SAFEDRAFT_TRACE": "0"}) is None
+        assert trace_seconds_from_env({"SAFEDRAFT_TRACE": "1"}) == 10
+        assert trace_seconds_from_env({"SAFEDRAFT_TRACE": "1", "SAFEDRAFT_TRACE_SECONDS": "2.5"}) == 2.5
+
+        timeline = StartupTimeline(trace_seconds=0.05)
+        with timeline.phase("setup_ui"):
+            pass
+        timeline.mark("first_idle")
+        timeline.finish(str(tmp_path))
+        # 追踪期间继续记录，到时写出 trace 文件
+        assert timeline.tracing
+        with timeline.phase("autosave", cat="scheduler"):
+            pass
+        trace = tmp_path / startup_trace.TRACE_NAME
+        deadline = time.monotonic() + 5
+        while not trace.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not timeline.tracing
+
+        events = json.loads(trace.read_text(encoding="utf-8"))["traceEvents"]
+        by_name = {e["name"]: e for e in events}
+        assert by_name["setup_ui"]["ph"] == "X" and by_name["setup_ui"]["dur"] >= 0
+        assert by_name["first_idle"]["ph"] == "i"
+        assert by_name["autosave"]["cat"] == "scheduler"
+        assert by_name["thread_name"]["ph"] == "M"
+        assert min(e.get("ts", 0) for e in events) >= 0
+        # 启动计时记录不包含调度器任务
+        assert all(p[0] != "autosave" for p in read_log(str(tmp_path))[0]["phases"])
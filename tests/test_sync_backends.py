@@ -0,0 +1,120 @@
+"""同步后端测试：本地目录后端走完整同步流程，不经过 SSH。"""
+import threading
+from unittest.mock import patch
+
+from storage import StorageManager
+from sync_backends import LocalDirBackend, SftpBackend, create_backend, is_config_complete
+
+
+def _other_db(tmp_path, monkeypatch, name):
+    d = tmp_path / name
+    d.mkdir()
+    monkeypatch.setattr(StorageManager, "get_real_executable_path", lambda self: str(d))
+    return StorageManager()
+
+
+class TestLocalDirBackend:
+    def test_round_trip_through_shared_dir(self, tmp_db, tmp_path, monkeypatch):
+        share = tmp_path / "share"
+        share.mkdir()
+        tmp_db.set_setting("sync_backend", "local")
+        tmp_db.save_content_forced("from A")
+
+        with patch.object(StorageManager, '_get_ssh_client') as mock_ssh:
+            tmp_db.sync_upload_merge("", str(share))
+            assert (share / "safedraft.db").exists()
+            assert any(p.name.startswith("safedraft_") for p in share.iterdir())
+
+            other = _other_db(tmp_path, monkeypatch, "b")
+            other.set_setting("sync_backend", "local")
+            other.save_content_forced("from B")
+            other.sync_upload_merge("", str(share))
+
+            tmp_db.sync_download_merge("", str(share))
+            assert not mock_ssh.called
+
+        contents = sorted(r[1] for r in tmp_db.get_history())
+        assert contents == ["from A", "from B"]
+        assert not (share / "safedraft.db.uploading").exists()
+        other.close()
+
+    def test_force_push_backs_up_existing(self, tmp_db, tmp_path):
+        share = tmp_path / "share"
+        share.mkdir()
+        (share / "safedraft.db").write_bytes(b"old")
+        tmp_db.set_setting("sync_backend", "local")
+        tmp_db.save_content_forced("local data")
+
+        tmp_db.force_push_overwrite("", str(share))
+
+        manifests = list((share / "backups" / "manifests").iterdir())
+        assert len(manifests) == 1
+        assert (share / "safedraft.db").read_bytes().startswith(b"SQLite format 3")
+
+
+class TestBackendSelection:
+    def test_create_backend_from_setting(self, tmp_db):
+        assert isinstance(create_backend(tmp_db, "user@host"), SftpBackend)
+        tmp_db.set_setting("sync_backend", "local")
+        assert isinstance(create_backend(tmp_db, ""), LocalDirBackend)
+
+    def test_config_complete(self):
+        assert not is_config_complete("sftp", "", "/data")
+        assert is_config_complete("local", "", "/data")
+        assert not is_config_complete("local", "", "")
+
+
+class _BlockingChannel:
+    """远端先把 stderr 写满窗口：stderr 没被读走之前 stdout 不会结束"""
+
+    def __init__(self):
+        self.stderr_read = threading.Event()
+        self.sent = b""
+
+    def settimeout(self, timeout):
+        pass
+
+    def exec_command(self, command):
+        pass
+
+    def sendall(self, data):
+        self.sent += bytes(data)
+
+    def shutdown_write(self):
+        pass
+
+    def makefile(self, mode):
+        channel = self
+
+        class _Out:
+            def read(self):
+                if not channel.stderr_read.wait(2):
+                    raise TimeoutError("stdout blocked behind unread stderr")
+                return b"out"
+        return _Out()
+
+    def makefile_stderr(self, mode):
+        channel = self
+
+        class _Err:
+            def read(self):
+                channel.stderr_read.set()
+                return b"e" * (4 << 20)
+        return _Err()
+
+    def recv_exit_status(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+class TestSftpExec:
+    def test_stdout_and_stderr_drained_together(self, tmp_db):
+        chan = _BlockingChannel()
+        backend = SftpBackend(tmp_db, "user@host")
+        backend.ssh = type("Ssh", (), {"get_transport": lambda self: type(
+            "T", (), {"open_session": lambda self: chan})()})()
+        status, out, err = backend.exec_command("python3 -c pass", stdin_data=b"payload")
+        assert (status, out, len(err)) == (0, b"out", 4 << 20)
+        assert chan.sent == b"payload"
@@ -0,0 +1,52 @@
+"""同步引擎阶段与取消测试。SFTP 用 mock 替代。"""
+from unittest.mock import patch, MagicMock
+
+from sync_engine import SyncEngine, SyncCancelled
+
+
+def _mock_ssh():
+    ssh = MagicMock()
+    sftp = MagicMock()
+    ssh.open_sftp.return_value = sftp
+    sftp.listdir.return_value = []
+    return ssh, sftp
+
+
+class TestSyncEngine:
+    def test_phases_reported_in_order(self, tmp_db):
+        tmp_db.save_content_forced("local data")
+        phases = []
+
+        with patch.object(tmp_db, '_get_ssh_client') as mock_ssh_ctor:
+            ssh, sftp = _mock_ssh()
+            mock_ssh_ctor.return_value = ssh
+            sftp.stat.side_effect = FileNotFoundError("not found")
+
+            engine = SyncEngine(tmp_db, "user@host", "/remote/path",
+                                on_progress=lambda phase, done, total: phases.append(phase))
+            engine.upload_merge()
+
+        seen = [p for i, p in enumerate(phases) if i == 0 or phases[i - 1] != p]
+        assert seen == ["connect", "fetch", "merge", "upload", "publish"]
+        assert set(engine.phase_times) == {"connect", "fetch", "merge", "upload", "publish"}
+        ssh.close.assert_called()
+
+    def test_cancel_between_phases(self, tmp_db):
+        """连接阶段完成后取消，不应继续上传。"""
+        tmp_db.save_content_forced("local data")
+
+        with patch.object(tmp_db, '_get_ssh_client') as mock_ssh_ctor:
+            ssh, sftp = _mock_ssh()
+            mock_ssh_ctor.return_value = ssh
+
+            engine = SyncEngine(tmp_db, "user@host", "/remote/path")
+            engine._on_progress = lambda phase, done, total: engine.cancel() if phase == "connect" else None
+
+            try:
+                engine.force_push()
+                assert False, "应抛 SyncCancelled"
+            except SyncCancelled:
+                pass
+
+            assert not sftp.put.called
+            ssh.close.assert_called()
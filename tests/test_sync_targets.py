@@ -0,0 +1,95 @@
+"""多目标并行同步测试。各目标用本地目录后端模拟。"""
+import shutil
+import sqlite3
+import time
+
+import sync_targets
+from sync_backends import LocalDirBackend, BACKEND_LOCAL
+from sync_targets import MultiTargetSync, load_targets, load_sync_records, save_extra_targets, target_key
+from sync_engine import SyncEngine
+
+
+def _setup(tmp_db, tmp_path, names=("home", "work")):
+    """主目标用设置中的 ssh_path，其余写入 sync_config.json"""
+    shares = []
+    for n in names:
+        share = tmp_path / n
+        share.mkdir()
+        shares.append(share)
+    tmp_db.set_setting("sync_backend", BACKEND_LOCAL)
+    tmp_db.set_setting("ssh_path", str(shares[0]))
+    save_extra_targets(tmp_db.base_path, [
+        {"name": n, "backend": BACKEND_LOCAL, "server_ip": "", "remote_path": str(s)}
+        for n, s in zip(names[1:], shares[1:])
+    ])
+    return shares
+
+
+def _remote_drafts(share):
+    conn = sqlite3.connect(str(share / "safedraft.db"))
+    try:
+        return sorted(r[0] for r in conn.execute("SELECT content FROM drafts"))
+    finally:
+        conn.close()
+
+
+def _seed(tmp_db, share, contents):
+    """把当前内容推送到远端后清空本地草稿，模拟只存在于该远端的数据"""
+    tmp_db.save_content_forced("__seed__")
+    for c in contents:
+        tmp_db.save_content_forced(c)
+    SyncEngine(tmp_db, "", str(share), backend=LocalDirBackend()).force_push()
+    with tmp_db.lock:
+        tmp_db.cursor.execute("DELETE FROM drafts")
+        tmp_db.conn.commit()
+    shutil.rmtree(share / "backups", ignore_errors=True)
+
+
+class TestSyncTargets:
+    def test_load_targets_primary_first(self, tmp_db, tmp_path):
+        shares = _setup(tmp_db, tmp_path)
+        targets = load_targets(tmp_db)
+        assert [t["name"] for t in targets] == [sync_targets.PRIMARY_TARGET_NAME, "work"]
+        assert targets[1]["remote_path"] == str(shares[1])
+
+    def test_fan_out_converges_all_remotes(self, tmp_db, tmp_path):
+        home, work = _setup(tmp_db, tmp_path)
+        _seed(tmp_db, home, ["only on home"])
+        _seed(tmp_db, work, ["only on work"])
+        tmp_db.save_content_forced("local")
+
+        md5 = MultiTargetSync(tmp_db, load_targets(tmp_db)).upload_merge()
+
+        expected = sorted(["__seed__", "only on home", "only on work", "local"])
+        assert sorted(r[1] for r in tmp_db.get_history()) == expected
+        assert _remote_drafts(home) == expected
+        assert _remote_drafts(work) == expected
+        assert (home / "safedraft.db").read_bytes() == (work / "safedraft.db").read_bytes()
+        assert (home / f"safedraft_{md5}.md5").exists() and (work / f"safedraft_{md5}.md5").exists()
+        records = load_sync_records(tmp_db.base_path)
+        assert all(records[target_key(t)]["md5"] == md5 for t in load_targets(tmp_db))
+
+    def test_targets_run_concurrently(self, tmp_db, tmp_path, monkeypatch):
+        _setup(tmp_db, tmp_path, names=("a", "b", "c"))
+        tmp_db.save_content_forced("x")
+        original = LocalDirBackend.connect
+        monkeypatch.setattr(LocalDirBackend, "connect", lambda self: (time.sleep(0.3), original(self)))
+
+        start = time.monotonic()
+        MultiTargetSync(tmp_db, load_targets(tmp_db)).upload_merge()
+        assert time.monotonic() - start < 0.8
+
+    def test_failed_target_does_not_block_others(self, tmp_db, tmp_path):
+        home, _ = _setup(tmp_db, tmp_path)
+        targets = load_targets(tmp_db)
+        targets[1]["remote_path"] = str(tmp_path / "missing" / "dir")
+        tmp_db.save_content_forced("x")
+
+        multi = MultiTargetSync(tmp_db, targets)
+        try:
+            multi.upload_merge()
+            assert False, "应抛出异常"
+        except Exception as e:
+            assert "work" in str(e)
+        assert _remote_drafts(home) == ["x"]
+        assert list(multi.errors) == ["work"]
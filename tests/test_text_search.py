@@ -0,0 +1,151 @@
+"""文档内搜索引擎测试：行索引换算、匹配模式、后台搜索与可见区域打标签。"""
+import time
+
+import text_search
+from text_search import LineIndex, SearchEngine, compile_query, find_matches
+
+
+class _FakeText:
+    """记录标签操作；可见区域固定为 top 行起的 rows 行"""
+
+    def __init__(self, text, top=1, rows=20):
+        self.text = text
+        self.top = top
+        self.rows = rows
+        self.tags = {}
+        self.queue = []
+        self.options = {"yscrollcommand": ""}
+        self.modified = False
+        self.bindings = {}
+
+    def get(self, start, end):
+        return self.text
+
+    def insert_text(self, pos, chars):
+        """模拟编辑：修改内容并置 modified 标志（<<Modified>> 事件稍后才处理）"""
+        self.text = self.text[:pos] + chars + self.text[pos:]
+        self.modified = True
+
+    def edit_modified(self, arg=None):
+        if arg is None:
+            return self.modified
+        self.modified = bool(arg)
+
+    def bind(self, sequence, func, add=None):
+        self.bindings[sequence] = func
+
+    def index(self, index):
+        line = self.top if index == "@0,0" else self.top + self.rows - 1
+        return f"{line}.0"
+
+    def winfo_height(self):
+        return self.rows * 10
+
+    def tag_add(self, tag, *indices):
+        self.tags.setdefault(tag, []).extend(zip(indices[::2], indices[1::2]))
+
+    def tag_remove(self, tag, start, end):
+        self.tags.pop(tag, None)
+
+    def see(self, index):
+        self.top = int(index.split(".")[0])
+
+    def register(self, func):
+        return "yscroll_cmd"
+
+    def cget(self, opt):
+        return self.options[opt]
+
+    def config(self, **options):
+        self.options.update(options)
+
+    def after(self, ms, func):
+        self.queue.append(func)
+        return f"after#{len(self.queue)}"
+
+    def after_cancel(self, after_id):
+        pass
+
+    def after_idle(self, func):
+        self.queue.append(func)
+
+
+class TestTextSearch:
+    def test_line_index_and_modes(self):
+        text = "ab\nc中d\n\nxyz"
+        lines = LineIndex(text)
+        assert [lines.to_index(i) for i in (0, 2, 3, 5, 7, 8, 10)] == \
+            ["1.0", "1.2", "2.0", "2.2", "3.0", "4.0", "4.2"]
+        assert lines.line_start(0) == 0 and lines.line_start(99) == 8
+
+        assert find_matches("aAa", compile_query("a")) == ([0, 2], [1, 3])
+        assert find_matches("aAa", compile_query("a", case=False))[0] == [0, 1, 2]
+        assert find_matches("a.b axb", compile_query(".")) == ([1], [2])
+        assert find_matches("a1 b22", compile_query(r"\d+", regex=True)) == ([1, 4], [2, 6])
+        # 空匹配被忽略
+        assert find_matches("abc", compile_query("x*", regex=True)) == ([], [])
+
+    def test_tags_only_near_viewport(self, monkeypatch):
+        monkeypatch.setattr(text_search, "VIEWPORT_MARGIN_LINES", 5)
+        widget = _FakeText("x hit\n" * 1000, top=500)
+        results = []
+        engine = SearchEngine(widget, lambda count, error: results.append((count, error)))
+        engine.search("hit")
+        assert results == [(1000, None)]
+        tagged = widget.tags["search_highlight"]
+        # 可见 20 行加前后各 5 行
+        assert len(tagged) == 30
+        assert tagged[0] == ("495.2", "495.5")
+
+        engine.goto(999)
+        assert widget.tags["search_current"] == [("1000.2", "1000.5")]
+        assert widget.tags["search_highlight"][-1] == ("1000.2", "1000.5")
+        assert widget.options["yscrollcommand"] == "yscroll_cmd"
+
+        engine.search("(", regex=True)
+        assert results[-1][0] == 0 and results[-1][1]
+        assert "search_highlight" not in widget.tags
+        assert widget.options["yscrollcommand"] == ""
+
+    def test_edit_invalidates_results_before_rescroll(self, monkeypatch):
+        monkeypatch.setattr(text_search, "VIEWPORT_MARGIN_LINES", 5)
+        widget = _FakeText("x hit\n" * 100, top=1)
+        results = []
+        engine = SearchEngine(widget, lambda count, error: results.append(count))
+        engine.search("hit")
+        assert results == [100] and not widget.modified
+
+        # 在文首插入一行后滚动：不再按旧偏移补打标签，也不跳到旧位置
+        widget.insert_text(0, "new line hit hit\n")
+        widget.top = 40
+        engine._on_yscroll("0.4", "0.6")
+        refresh = widget.queue.pop(0)
+        refresh()
+        assert "search_highlight" not in widget.tags
+        engine.goto(0)
+        assert "search_current" not in widget.tags
+
+        # 停顿后按原条件重新搜索，偏移对应新内容
+        assert len(widget.queue) == 1
+        widget.queue.pop(0)()
+        assert results == [100, 102]
+        assert widget.tags["search_highlight"][0] == ("35.2", "35.5")
+        engine.goto(0)
+        assert widget.tags["search_current"] == [("1.9", "1.12")]
+
+    def test_large_document_searched_in_background(self):
+        text = ("filler line\n" * 10000) + "needle\n"
+        assert len(text) > text_search.SYNC_SEARCH_CHARS
+        widget = _FakeText(text)
+        results = []
+        engine = SearchEngine(widget, lambda count, error: results.append(count))
+        engine.search("filler")
+        engine.search("needle")  # 取代上一次搜索
+        deadline = time.monotonic() + 5
+        while len(widget.queue) < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        for func in list(widget.queue):
+            func()
+        assert results == [1]
+        assert engine.lines.to_index(engine.starts[0]) == "10001.0"
@@ -0,0 +1,191 @@
+"""编辑器修改跟踪测试：用字符串模拟 Tk Text 的 Tcl 命令（测试环境没有显示器）。"""
+import random
+
+from journal import EditJournal, read_journal
+from scheduler import Scheduler
+from text_tracker import TextChangeTracker
+
+
+class _FakeTk:
+    """只实现跟踪器用到的 Text 子命令，文档末尾与 Tk 一样带一个不可删除的换行"""
+
+    def __init__(self):
+        self.text = ""
+        self.commands = {}
+        self.undo_text = None
+        self.state = "normal"
+        self.gets = 0
+        # count 子命令累计数过的字符数
+        self.counted = 0
+
+    def createcommand(self, name, func):
+        self.commands[name] = func
+
+    def deletecommand(self, name):
+        del self.commands[name]
+
+    def _index(self, index):
+        plus = 0
+        if index.endswith("+1c"):
+            index, plus = index[:-3], 1
+        if index == "end":
+            off = len(self.text) + 1
+        elif index == "end-1c":
+            off = len(self.text)
+        else:
+            line, col = (int(x) for x in index.split("."))
+            lines = (self.text + "\n").split("\n")
+            off = sum(len(l) + 1 for l in lines[:line - 1]) + min(col, len(lines[line - 1]))
+        return min(off + plus, len(self.text) + 1)
+
+    def call(self, *args):
+        if args[0] == "rename":
+            self.commands[args[2]] = self._widget
+            return ""
+        return self.commands[args[0]](*args[1:])
+
+    def _widget(self, cmd, *args):
+        if cmd == "count":
+            n = self._index(args[2]) - self._index(args[1])
+            self.counted += abs(n)
+            return n
+        if cmd == "index":
+            return _offset_to_index(self.text + "\n", self._index(args[0]))
+        if cmd == "cget":
+            return self.state
+        if cmd == "get":
+            self.gets += 1
+            return self.text[self._index(args[0]):self._index(args[1])]
+        if self.state == "disabled":
+            return ""
+        if cmd == "insert":
+            pos = min(self._index(args[0]), len(self.text))
+            self.undo_text = self.text
+            self.text = self.text[:pos] + "".join(args[1::2]) + self.text[pos:]
+        elif cmd == "delete":
+            s = min(self._index(args[0]), len(self.text))
+            e = min(self._index(args[1] if len(args) > 1 else args[0] + "+1c"), len(self.text))
+            if e > s:
+                self.undo_text = self.text
+                self.text = self.text[:s] + self.text[e:]
+        elif cmd == "edit" and args[0] == "undo":
+            self.text, self.undo_text = self.undo_text, self.text
+        return ""
+
+
+class _FakeText:
+    def __init__(self):
+        self.tk = _FakeTk()
+        self._w = ".text"
+        self._tclCommands = None
+
+    def __call__(self, *args):
+        return self.tk.call(self._w, *args)
+
+
+def _offset_to_index(text, off):
+    line = text.count("\n", 0, off) + 1
+    return f"{line}.{off - (text.rfind(chr(10), 0, off) + 1)}"
+
+
+class TestTextChangeTracker:
+    def test_ops_replay_to_widget_content(self):
+        widget = _FakeText()
+        ops = []
+        tracker = TextChangeTracker(widget, ops.append)
+        rng = random.Random(3)
+        model = ""
+        for _ in range(400):
+            text = widget.tk.text
+            if text and rng.random() < 0.4:
+                s = rng.randint(0, len(text))
+                e = rng.randint(s, min(len(text), s + 4))
+                widget("delete", _offset_to_index(text, s), _offset_to_index(text, e))
+            else:
+                where = rng.choice(["end", _offset_to_index(text, rng.randint(0, len(text)))])
+                widget("insert", where, rng.choice(["a", "中文", "x\ny", "\n"]), "tag")
+        for pos, deleted, text in ops:
+            model = model[:pos] + text + model[pos + deleted:]
+        assert model == widget.tk.text
+        assert tracker.length == len(model)
+        assert tracker.version == len(ops)
+        # 按键过程中从未读取全文
+        assert widget.tk.gets == 0
+
+    def test_typing_counts_from_last_edit_not_document_start(self):
+        widget = _FakeText()
+        ops = []
+        TextChangeTracker(widget, ops.append)
+        widget("insert", "end", "line of text\n" * 2000)
+        for i, ch in enumerate("typing here\nnext"):
+            line, col = (1500, 5 + i) if i < 12 else (1501, i - 12)
+            widget("insert", f"{line}.{col}", ch)
+            if not i:
+                widget.tk.counted = 0  # 第一次跳到 1500 行要数一遍
+        widget("delete", "1501.3")
+        # 每次按键只数锚点行首到光标之间的字符，与文档长度无关
+        assert widget.tk.counted < 40 * 20
+        base = 1499 * 13 + 5
+        assert ops[1:3] == [(base, 0, "t"), (base + 1, 0, "y")]
+        assert ops[-1] == (base + 15, 1, "")
+        # 跳回文档开头编辑后偏移仍然正确
+        widget("insert", "1.0", "A")
+        widget("insert", "1.1", "B")
+        assert ops[-2:] == [(0, 0, "A"), (1, 0, "B")]
+        assert widget.tk.text.startswith("ABline")
+
+    def test_dirty_ranges_shift_and_merge(self):
+        widget = _FakeText()
+        tracker = TextChangeTracker(widget)
+        widget("insert", "1.0", "0123456789")
+        assert tracker.take_dirty() == [(0, 10)]
+        widget("insert", "1.8", "ab")
+        widget("insert", "1.2", "xyz")
+        # 1.2 处插入 3 个字符后 (8, 10) 平移到 (11, 13)
+        assert tracker.take_dirty() == [(2, 5), (11, 13)]
+        widget("delete", "1.4", "1.12")
+        assert tracker.take_dirty() == [(4, 4)]
+        assert tracker.dirty == []
+
+    def test_undo_and_astral_report_unknown(self):
+        widget = _FakeText()
+        ops = []
+        tracker = TextChangeTracker(widget, ops.append)
+        widget("insert", "end", "hello")
+        widget("edit", "undo")
+        widget("insert", "end", "hi 😀")
+        widget("insert", "end", "!")
+        assert ops == [(0, 0, "hello"), None, None, None]
+        assert tracker.dirty == [(0, tracker.length)]
+
+        widget.tk.state = "disabled"
+        widget("insert", "end", "ignored")
+        assert len(ops) == 4
+
+        tracker.close()
+        widget("insert", "end", "x")
+        assert len(ops) == 4
+
+    def test_journal_records_tracker_ops(self, tmp_path):
+        sched = Scheduler(tick=0.01)
+        sched.start()
+        try:
+            widget = _FakeText()
+            j = EditJournal(str(tmp_path), scheduler=sched)
+
+            def on_change(op):
+                if op is None:
+                    j.snapshot(None, widget("get", "1.0", "end-1c"))
+                else:
+                    j.record_edit(*op, None, lambda: widget("get", "1.0", "end-1c"))
+
+            TextChangeTracker(widget, on_change)
+            for ch in "draft":
+                widget("insert", "end", ch)
+            widget("delete", "1.0")
+            widget("edit", "undo")
+            widget("insert", "end", " 2")
+            j.close()
+            assert read_journal(j.path) == (None, "draft 2", 8)
+        finally:
+            sched.stop()
@@ -0,0 +1,142 @@
+"""前台窗口监听测试：用脚本后端回放焦点事件。"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+import bench_watcher
+from watcher import WindowWatcher
+from watcher_backends import (SELF_INFO, ForegroundInfo, LRUCache, PollingBackend, ProcessNameCache,
+                              ScriptedBackend)
+
+
+def _info(title, proc="other.exe"):
+    return ForegroundInfo(title, proc, False)
+
+
+def _enable(db, rtype, value):
+    db.add_trigger(rtype, value)
+    db.conn.execute("UPDATE triggers_v2 SET enabled = 1 WHERE value = ?", (value,))
+    db.conn.commit()
+
+
+def _replay(tmp_db, script):
+    fired = []
+    backend = ScriptedBackend([(0, info) for info in script])
+    watcher = WindowWatcher(tmp_db, lambda rule_type, value: fired.append((rule_type, value)), backend=backend)
+    watcher.start()
+    assert backend.done.wait(2)
+    watcher.stop()
+    return fired
+
+
+class TestWindowWatcher:
+    def test_triggers_once_per_visit_and_ignores_self(self, tmp_db):
+        _enable(tmp_db, "title", "ChatGPT")
+        _enable(tmp_db, "process", "wechat.exe")
+
+        fired = _replay(tmp_db, [
+            _info("chatgpt - chrome"),
+            _info("chatgpt - chrome 新标签"),   # 同一目标内标题变化不重复触发
+            SELF_INFO,                          # 切到 SafeDraft 自己不重置状态
+            _info("chatgpt - chrome"),
+            _info("desktop"),                   # 无关窗口重置
+            _info("chatgpt - chrome"),
+            _info("聊天", "wechat.exe"),
+        ])
+
+        assert fired == [("title", "chatgpt"), ("title", "chatgpt"), ("process", "wechat")]
+
+    def test_event_backend_failure_falls_back_to_polling(self, tmp_db, monkeypatch):
+        _enable(tmp_db, "title", "ChatGPT")
+        polled = []
+
+        class _Broken(ScriptedBackend):
+            def run(self, on_change, stop_event):
+                raise OSError("hook failed")
+
+        def _polling():
+            return PollingBackend(interval=0.01, query=lambda: polled.append(1) or _info("chatgpt"))
+
+        monkeypatch.setattr("watcher.PollingBackend", _polling)
+        fired = []
+        watcher = WindowWatcher(tmp_db, lambda *a: fired.append(a), backend=_Broken([]))
+        watcher.start()
+        watcher._thread.join(1)
+        time.sleep(0.2)
+        watcher.stop()
+
+        assert isinstance(watcher.backend, PollingBackend)
+        assert fired == [("title", "chatgpt")] and len(polled) > 1
+
+    def test_replayed_trace_latency(self):
+        trace = bench_watcher.default_trace(switches=4, delay=0.02)
+        result = bench_watcher.replay(trace, "event")
+        assert result["triggers"] == 4
+        assert result["max_ms"] < 50
+
+    def test_unchanged_window_skips_rule_evaluation(self, tmp_db):
+        _enable(tmp_db, "title", "ChatGPT")
+        watcher = WindowWatcher(tmp_db, lambda *a: None)
+        calls = []
+        real_match = watcher.matcher.match
+        watcher.matcher.match = lambda *a: calls.append(a) or real_match(*a)
+        watcher.running = True
+
+        same = ForegroundInfo("chatgpt", "chrome.exe", False, 100)
+        for info in (same, same, SELF_INFO, same, ForegroundInfo("chatgpt", "chrome.exe", False, 200)):
+            watcher.handle_focus(info)
+        assert len(calls) == 2
+
+        watcher.reload_rules()
+        watcher.handle_focus(same)
+        assert watcher.last_triggered_key == "title:chatgpt"
+
+
+class _FakeProcess:
+    started = {}
+    lookups = []
+
+    def __init__(self, pid):
+        if pid not in self.started:
+            raise ProcessLookupError(pid)
+        self.pid = pid
+
+    def create_time(self):
+        return self.started[self.pid][0]
+
+    def name(self):
+        self.lookups.append(self.pid)
+        return self.started[self.pid][1]
+
+
+class TestMetadataCache:
+    def test_process_name_cache_keyed_by_start_time(self):
+        _FakeProcess.started = {7: (1.0, "Code.exe")}
+        _FakeProcess.lookups = []
+        cache = ProcessNameCache(process_factory=_FakeProcess)
+
+        assert cache.name(7) == "code.exe"
+        assert cache.name(7) == "code.exe"
+        assert _FakeProcess.lookups == [7]
+
+        # pid 被新进程复用
+        _FakeProcess.started[7] = (2.0, "WeChat.exe")
+        assert cache.name(7) == "wechat.exe"
+
+        # 进程退出后清掉该 pid
+        del _FakeProcess.started[7]
+        try:
+            cache.name(7)
+        except ProcessLookupError:
+            pass
+        assert len(cache._cache) == 0
+
+    def test_lru_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put(1, "a")
+        cache.put(2, "b")
+        cache.get(1)
+        cache.put(3, "c")
+        assert cache.get(2) is None and cache.get(1) == "a" and cache.get(3) == "c"
@@ -0,0 +1,244 @@
+"""
+文档内搜索引擎（TextSearchBar 与历史预览区共用）
+- 匹配在后台线程中完成（小文档直接在 Tk 线程完成），支持普通/正则、区分/忽略大小写；新的搜索使旧的结果作废
+- 字符偏移通过预先计算的行首偏移表二分换算为 "行.列" 索引，不再使用 "1.0+Nc"（Tk 每次从文首逐字计算）
+- 只给可见区域及前后 VIEWPORT_MARGIN_LINES 行内的匹配打高亮标签，滚动时通过 yscrollcommand 补打
+- 匹配偏移是搜索时的快照：搜索开始时清除控件的 modified 标志，之后内容一旦变化（<<Modified>>），
+  立即去掉高亮、不再按旧偏移补打或跳转，停顿 RESEARCH_DELAY_MS 后按原条件重新搜索
+"""
+
+import bisect
+import re
+import threading
+
+# 超过该长度的文档在后台线程中搜索
+SYNC_SEARCH_CHARS = 64 * 1024
+# 最多记录的匹配数，超过后计数显示为 "N+"
+MAX_MATCHES = 100000
+VIEWPORT_MARGIN_LINES = 100
+# 单次最多打的高亮标签数（超长单行文档中可见区域附近的匹配也可能很多）
+MAX_VIEW_TAGS = 2000
+# 后台线程每处理多少个匹配检查一次是否已被新搜索取代
+_CANCEL_CHECK = 4096
+# 内容变化后多久按原条件重新搜索（毫秒）
+RESEARCH_DELAY_MS = 300
+
+
+class LineIndex:
+    """行首偏移表：字符偏移 <-> Tk "行.列" 索引"""
+
+    def __init__(self, text):
+        starts = [0]
+        find = text.find
+        pos = find("\n")
+        while pos >= 0:
+            starts.append(pos + 1)
+            pos = find("\n", pos + 1)
+        self.starts = starts
+
+    def to_index(self, offset):
+        line = bisect.bisect_right(self.starts, offset) - 1
+        return f"{line + 1}.{offset - self.starts[line]}"
+
+    def line_start(self, line):
+        """第 line 行（从 1 开始）的行首偏移，超出范围时取首/末行"""
+        return self.starts[min(max(line, 1), len(self.starts)) - 1]
+
+
+def compile_query(keyword, regex=False, case=True):
+    """编译搜索条件；正则无效时抛出 re.error"""
+    pattern = keyword if regex else re.escape(keyword)
+    return re.compile(pattern, 0 if case else re.IGNORECASE)
+
+
+def find_matches(text, pattern, cancelled=None, limit=MAX_MATCHES):
+    """返回 (起点列表, 终点列表)，忽略空匹配；cancelled() 为真时返回 None"""
+    starts, ends = [], []
+    for i, m in enumerate(pattern.finditer(text)):
+        if cancelled and i % _CANCEL_CHECK == 0 and cancelled():
+            return None
+        s, e = m.span()
+        if s == e:
+            continue
+        starts.append(s)
+        ends.append(e)
+        if len(starts) >= limit:
+            break
+    return starts, ends
+
+
+class SearchEngine:
+    def __init__(self, widget, on_result, highlight_tag="search_highlight", current_tag="search_current"):
+        """
+        widget: 被搜索的 tk.Text（只读控件也可，标签操作不受 state 影响）
+        on_result(count, error): 每次搜索完成后在 Tk 线程调用；error 为正则错误信息或 None
+        """
+        self.widget = widget
+        self.on_result = on_result
+        self.highlight_tag = highlight_tag
+        self.current_tag = current_tag
+        self.starts = []
+        self.ends = []
+        self.lines = None
+        self._generation = 0
+        self._tagged = None          # 当前已打高亮的匹配区间 (i, j)
+        self._refresh_pending = False
+        self._orig_yscroll = None
+        self._yscroll_cmd = widget.register(self._on_yscroll)
+        self._query = None           # 当前搜索条件 (keyword, regex, case)，clear() 后为 None
+        self._research_job = None
+        widget.bind("<<Modified>>", self._on_modified, add="+")
+
+    @property
+    def count(self):
+        return len(self.starts)
+
+    @property
+    def truncated(self):
+        return len(self.starts) >= MAX_MATCHES
+
+    def search(self, keyword, regex=False, case=True):
+        """开始新的搜索，之前未完成的搜索结果作废"""
+        self.clear()
+        self._query = (keyword, regex, case)
+        gen = self._generation
+        try:
+            pattern = compile_query(keyword, regex, case)
+        except re.error as e:
+            self.on_result(0, str(e))
+            return
+        # 读取内容前清除 modified 标志，此后的修改都会使本次结果作废
+        self.widget.edit_modified(False)
+        text = self.widget.get("1.0", "end-1c")
+        if len(text) < SYNC_SEARCH_CHARS:
+            self._deliver(gen, find_matches(text, pattern), LineIndex(text))
+            return
+
+        def _worker():
+            found = find_matches(text, pattern, cancelled=lambda: gen != self._generation)
+            if found is None:
+                return
+            lines = LineIndex(text)
+            try:
+                self.widget.after(0, lambda: self._deliver(gen, found, lines))
+            except:
+                pass  # 窗口已关闭
+
+        threading.Thread(target=_worker, daemon=True).start()
+
+    def clear(self):
+        """清除结果与高亮，并作废进行中的搜索"""
+        self._query = None
+        self._cancel_research()
+        self._reset()
+
+    def _reset(self):
+        self._generation += 1
+        self.starts, self.ends, self.lines = [], [], None
+        self._tagged = None
+        self.widget.tag_remove(self.highlight_tag, "1.0", "end")
+        self.widget.tag_remove(self.current_tag, "1.0", "end")
+        self._detach_scroll()
+
+    def goto(self, i):
+        """高亮第 i 个匹配并滚动到该处"""
+        if not 0 <= i < self.count or self._stale():
+            return
+        start = self.lines.to_index(self.starts[i])
+        end = self.lines.to_index(self.ends[i])
+        self.widget.tag_remove(self.current_tag, "1.0", "end")
+        self.widget.tag_add(self.current_tag, start, end)
+        self.widget.see(start)
+        self.refresh_viewport()
+
+    def refresh_viewport(self):
+        """给可见区域附近的匹配打高亮标签"""
+        self._refresh_pending = False
+        if not self.starts or self._stale():
+            return
+        w = self.widget
+        top = int(w.index("@0,0").split(".")[0])
+        bottom = int(w.index(f"@0,{w.winfo_height()}").split(".")[0])
+        view = bisect.bisect_left(self.starts, self.lines.line_start(top))
+        i = bisect.bisect_left(self.starts, self.lines.line_start(top - VIEWPORT_MARGIN_LINES))
+        j = bisect.bisect_left(self.starts, self.lines.line_start(bottom + VIEWPORT_MARGIN_LINES + 1))
+        if bottom + VIEWPORT_MARGIN_LINES + 1 > len(self.lines.starts):
+            j = self.count
+        # 以可见区域顶部为中心截取
+        i = max(i, view - MAX_VIEW_TAGS // 2)
+        j = min(j, i + MAX_VIEW_TAGS)
+        if self._tagged == (i, j):
+            return
+
+        to_index = self.lines.to_index
+        if self._tagged:
+            pi, pj = self._tagged
+            if pi < pj:
+                w.tag_remove(self.highlight_tag, to_index(self.starts[pi]), to_index(self.ends[pj - 1]))
+        if i < j:
+            ranges = []
+            for k in range(i, j):
+                ranges.append(to_index(self.starts[k]))
+                ranges.append(to_index(self.ends[k]))
+            # 一次 Tcl 调用打完所有标签
+            w.tag_add(self.highlight_tag, *ranges)
+        self._tagged = (i, j)
+
+    def _deliver(self, gen, found, lines):
+        if gen != self._generation or self._stale():
+            return
+        self.starts, self.ends = found
+        self.lines = lines
+        self._attach_scroll()
+        self.refresh_viewport()
+        self.on_result(self.count, None)
+
+    # --- 内容变化 ---
+    def _stale(self):
+        """内容在搜索之后被修改过（<<Modified>> 可能尚未处理）时作废结果并返回 True"""
+        if not self.widget.edit_modified():
+            return False
+        self._on_modified()
+        return True
+
+    def _on_modified(self, event=None):
+        if self._query is None or not self.widget.edit_modified():
+            return
+        # 旧结果（包括进行中的后台搜索）的偏移已不对应当前内容：去掉高亮，停顿后按原条件重新搜索
+        self._reset()
+        if self._research_job is None:
+            self._research_job = self.widget.after(RESEARCH_DELAY_MS, self._research)
+
+    def _research(self):
+        self._research_job = None
+        if self._query is not None:
+            self.search(*self._query)
+
+    def _cancel_research(self):
+        if self._research_job is not None:
+            try:
+                self.widget.after_cancel(self._research_job)
+            except:
+                pass
+            self._research_job = None
+
+    # --- 滚动时补打标签 ---
+    def _attach_scroll(self):
+        if self._orig_yscroll is not None:
+            return
+        self._orig_yscroll = str(self.widget.cget("yscrollcommand"))
+        self.widget.config(yscrollcommand=self._yscroll_cmd)
+
+    def _detach_scroll(self):
+        if self._orig_yscroll is None:
+            return
+        self.widget.config(yscrollcommand=self._orig_yscroll)
+        self._orig_yscroll = None
+
+    def _on_yscroll(self, first, last):
+        if self._orig_yscroll:
+            # 原命令是命令前缀（如 "scrollbar set"），按 Tk 约定在末尾追加参数
+            self.widget.tk.call(*self.widget.tk.splitlist(self._orig_yscroll), first, last)
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.widget.after_idle(self.refresh_viewport)
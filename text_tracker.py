@@ -0,0 +1,133 @@
+"""
+编辑器修改跟踪
+把 Tk Text 控件的 Tcl 命令重命名，换成 Python 代理（与 idlelib 的 WidgetRedirector 相同的做法），
+键盘输入、粘贴、程序调用的 insert / delete / replace 都经过代理：
+- 每次修改得到一个编辑操作 (位置, 删除长度, 插入文本)，位置以字符偏移表示
+- version 每次修改加一，保存时与上次保存的 version 比较即可判断是否有未保存修改
+- dirty 记录自上次 take_dirty() 以来修改过的区间（当前文档坐标）
+整个过程不复制全文，只有撤销/重做等无法直接得到操作的修改才回调 None，由调用方自行读取全文。
+索引换算成偏移时从上次修改所在行的行首开始计数（而不是从 1.0 开始），
+连续输入时每次按键的计数量只与离上次修改的距离有关，与文档大小无关。
+"""
+
+# 修改文本的子命令
+_EDIT_COMMANDS = ("insert", "delete", "replace")
+
+
+class TextChangeTracker:
+    def __init__(self, widget, on_change=None):
+        self.widget = widget
+        self.tk = widget.tk
+        self.on_change = on_change
+        self.version = 0
+        self.length = 0
+        self.dirty = []
+        # 含 BMP 以外字符时 Tk 与 Python 的字符计数不一致，清空文档前只报告未知修改
+        self._astral = False
+        # (行号, 该行行首的字符偏移)：上次修改所在行，修改不影响它之前的文本，行首偏移保持有效
+        self._anchor = (1, 0)
+
+        self._w = widget._w
+        self._orig = self._w + "_orig"
+        self.tk.call("rename", self._w, self._orig)
+        self.tk.createcommand(self._w, self._proxy)
+        self.length = int(self._call("count", "-chars", "1.0", "end-1c") or 0)
+        # 控件销毁时由 tkinter 一并删除代理命令
+        widget._tclCommands = (widget._tclCommands or []) + [self._w]
+
+    def close(self):
+        """还原控件原本的命令"""
+        self.tk.deletecommand(self._w)
+        if self._w in (self.widget._tclCommands or []):
+            self.widget._tclCommands.remove(self._w)
+        self.tk.call("rename", self._orig, self._w)
+
+    def take_dirty(self):
+        """取出并清空修改区间列表 [(start, end), ...]"""
+        dirty, self.dirty = self.dirty, []
+        return dirty
+
+    def _call(self, *args):
+        return self.tk.call(self._orig, *args)
+
+    def _offset(self, index):
+        """
+        Tk 索引 -> (字符偏移, 所在行的锚点)，偏移限定在文档末尾之前；
+        索引在文档末尾之后时锚点为 None。index 子命令只查 B 树，count 只数锚点行首到索引之间的字符
+        """
+        line, col = (int(x) for x in str(self._call("index", index)).split("."))
+        anchor_line, anchor_offset = self._anchor
+        # 索引在锚点之前时 count 返回负数
+        offset = anchor_offset + int(self._call("count", "-chars", f"{anchor_line}.0", f"{line}.{col}") or 0)
+        if offset > self.length:
+            return self.length, None
+        return offset, (line, offset - col)
+
+    def _proxy(self, cmd, *args):
+        if cmd not in _EDIT_COMMANDS and not (cmd == "edit" and args and args[0] in ("undo", "redo")):
+            return self._call(cmd, *args)
+        if cmd == "edit":
+            result = self._call(cmd, *args)
+            self._changed(None)
+            return result
+
+        if str(self._call("cget", "-state")) == "disabled":
+            return self._call(cmd, *args)  # 只读状态下 Tk 忽略修改
+
+        op = anchor = None
+        if cmd == "insert" and args:
+            pos, anchor = self._offset(args[0])
+            op = (pos, 0, "".join(args[1::2]))
+        elif cmd == "delete" and 1 <= len(args) <= 2:
+            start, anchor = self._offset(args[0])
+            end, _ = self._offset(args[1] if len(args) == 2 else f"{args[0]}+1c")
+            op = (start, max(0, end - start), "")
+        elif cmd == "replace" and len(args) >= 3:
+            start, anchor = self._offset(args[0])
+            end, _ = self._offset(args[1])
+            op = (start, max(0, end - start), "".join(args[2::2]))
+
+        result = self._call(cmd, *args)
+        if anchor is not None:
+            self._anchor = anchor
+        if op is not None and not op[1] and not op[2]:
+            return result  # 没有实际修改
+        if op is not None and any(ch > "\uffff" for ch in op[2]):
+            self._astral = True
+        self._changed(None if self._astral else op)
+        return result
+
+    def _changed(self, op):
+        self.version += 1
+        if op is None:
+            self._anchor = (1, 0)
+            self.length = int(self._call("count", "-chars", "1.0", "end-1c") or 0)
+            if self._astral and not self.length:
+                self._astral = False
+            self.dirty = [(0, self.length)]
+        else:
+            pos, deleted, text = op
+            self.length += len(text) - deleted
+            self._mark(pos, deleted, len(text))
+        if self.on_change:
+            self.on_change(op)
+
+    def _mark(self, pos, deleted, inserted):
+        """更新修改区间：本次修改之后的区间平移，与本次修改重叠或相邻的区间合并"""
+        shift = inserted - deleted
+        ranges = [(pos, pos + inserted)]
+        for s, e in self.dirty:
+            if e <= pos:
+                ranges.append((s, e))
+            elif s >= pos + deleted:
+                ranges.append((s + shift, e + shift))
+            else:
+                ranges.append((min(s, pos), max(pos + inserted, e + shift)))
+        ranges.sort()
+        merged = [ranges[0]]
+        for s, e in ranges[1:]:
+            if s <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+            else:
+                merged.append((s, e))
+        self.dirty = merged
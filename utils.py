@@ -1,15 +1,16 @@
 import sys
 import os
-import winreg
 import base64
 import io
 import tkinter as tk
-from PIL import Image
 
-try:
-    from icon_data import ICON_BASE64
-except ImportError:
-    ICON_BASE64 = None
+from text_search import SearchEngine
+
+if sys.platform == "win32":
+    import winreg
+
+# PIL 与图标数据在第一次需要图标时才导入（不在启动的关键路径上），解码结果缓存复用
+_icon_image = None
 
 # --- 新增：默认字体大小 ---
 DEFAULT_FONT_SIZE = 12
@@ -45,13 +46,29 @@ class ThemeManager:
         return THEMES.get(theme_name, THEMES["Deep"])
 
 def get_icon_image():
-    """将 Base64 转换为 PIL Image"""
-    if ICON_BASE64:
+    """将 Base64 转换为 PIL Image（只解码一次）"""
+    global _icon_image
+    if _icon_image is None:
+        from PIL import Image
         try:
+            from icon_data import ICON_BASE64
             image_data = base64.b64decode(ICON_BASE64)
-            return Image.open(io.BytesIO(image_data))
-        except: pass
-    return Image.new('RGB', (64, 64), color=(74, 144, 226))
+            image = Image.open(io.BytesIO(image_data))
+            image.load()
+            _icon_image = image
+        except:
+            _icon_image = Image.new('RGB', (64, 64), color=(74, 144, 226))
+    return _icon_image
+
+def get_icon_photo(widget):
+    """窗口图标的 PhotoImage，同一个 Tk 解释器中的窗口共用一份"""
+    root = widget._root()
+    photo = getattr(root, "_safedraft_icon", None)
+    if photo is None:
+        from PIL import ImageTk
+        photo = ImageTk.PhotoImage(get_icon_image(), master=root)
+        root._safedraft_icon = photo
+    return photo
 
 class StartupManager:
     WIN_KEY_PATH = r"Software\Microsoft\Windows\CurrentVersion\Run"
@@ -97,7 +114,7 @@ class StartupManager:
 
 
 class TextSearchBar:
-    """可复用的文本搜索组件，支持 Ctrl+F 搜索、高亮、上下翻页"""
+    """可复用的文本搜索组件，支持 Ctrl+F 搜索、高亮、上下翻页、正则与大小写切换"""
 
     def __init__(self, parent_frame, text_widget, colors, read_only=False, pack_before=None):
         """
@@ -110,10 +127,11 @@ class TextSearchBar:
         self.text_widget = text_widget
         self.colors = colors
         self.read_only = read_only
-        self._matches = []
         self._match_index = -1
+        self._goto_first = False
         self._trace_cbname = None
         self._pack_before = pack_before
+        self.engine = SearchEngine(text_widget, self._on_result)
 
         # 创建搜索栏 Frame (默认隐藏)
         self.frame = tk.Frame(parent_frame, bg=colors["bg"])
@@ -129,6 +147,15 @@ class TextSearchBar:
         self.search_entry.bind("<Shift-Return>", self.search_prev)
         self.search_entry.bind("<Escape>", self.close)
 
+        # 区分大小写（默认开启）/ 正则
+        self.case_var = tk.BooleanVar(value=True)
+        self.regex_var = tk.BooleanVar(value=False)
+        for text, var in (("Aa", self.case_var), (".*", self.regex_var)):
+            tk.Checkbutton(self.frame, text=text, variable=var, indicatoron=False, relief="flat",
+                           padx=3, bg=colors["bg"], fg=colors.get("fg", "#d4d4d4"),
+                           selectcolor=colors.get("accent", "#3c3c3c"), font=("Arial", 8),
+                           command=self._on_input).pack(side="left")
+
         self.count_label = tk.Label(self.frame, text="", bg=colors["bg"],
                                     fg="#888888", font=("Arial", 9))
         self.count_label.pack(side="left", padx=5)
@@ -144,10 +171,6 @@ class TextSearchBar:
         text_widget.tag_configure("search_highlight", background="#f39c12", foreground="white")
         text_widget.tag_configure("search_current", background="#e74c3c", foreground="white")
 
-    def _set_state(self, state):
-        if self.read_only:
-            self.text_widget.config(state=state)
-
     def open(self, event=None):
         if self._pack_before:
             self.frame.pack(fill="x", pady=(2, 0), before=self._pack_before)
@@ -156,12 +179,8 @@ class TextSearchBar:
         self.search_entry.delete(0, "end")
         self.search_entry.focus_set()
         self.count_label.config(text="")
-        self._matches = []
         self._match_index = -1
-        self._set_state("normal")
-        self.text_widget.tag_remove("search_highlight", "1.0", "end")
-        self.text_widget.tag_remove("search_current", "1.0", "end")
-        self._set_state("disabled")
+        self.engine.clear()
         if self._trace_cbname:
             try:
                 self.search_var.trace_remove("write", self._trace_cbname)
@@ -178,84 +197,57 @@ class TextSearchBar:
                 pass
             self._trace_cbname = None
         self.frame.pack_forget()
-        self._set_state("normal")
-        self.text_widget.tag_remove("search_highlight", "1.0", "end")
-        self.text_widget.tag_remove("search_current", "1.0", "end")
-        self._set_state("disabled")
-        self._matches = []
+        self.engine.clear()
         self._match_index = -1
         return "break"
 
     def _on_input(self, *args):
+        self._goto_first = True
         self._do_search()
-        if self._matches:
-            self._match_index = 0
-            self._highlight_current()
 
     def _do_search(self):
         keyword = self.search_var.get()
-        self._set_state("normal")
-        self.text_widget.tag_remove("search_highlight", "1.0", "end")
-        self.text_widget.tag_remove("search_current", "1.0", "end")
-        self._set_state("disabled")
-        self._matches = []
         self._match_index = -1
-
         if not keyword:
+            self.engine.clear()
             self.count_label.config(text="")
             return
+        self.count_label.config(text="搜索中...")
+        self.engine.search(keyword, regex=self.regex_var.get(), case=self.case_var.get())
 
-        content = self.text_widget.get("1.0", "end-1c")
-        start = 0
-        while True:
-            idx = content.find(keyword, start)
-            if idx == -1:
-                break
-            self._matches.append(idx)
-            start = idx + 1
-
-        self._set_state("normal")
-        for pos in self._matches:
-            start_idx = f"1.0+{pos}c"
-            end_idx = f"1.0+{pos + len(keyword)}c"
-            self.text_widget.tag_add("search_highlight", start_idx, end_idx)
-        self._set_state("disabled")
-
-        count = len(self._matches)
-        self.count_label.config(text=f"{count} 个结果" if count > 0 else "无结果")
+    def _on_result(self, count, error):
+        if error:
+            self._goto_first = False
+            self.count_label.config(text="正则有误")
+            return
+        plus = "+" if self.engine.truncated else ""
+        self.count_label.config(text=f"{count}{plus} 个结果" if count > 0 else "无结果")
+        if self._goto_first and count:
+            self._match_index = 0
+            self._highlight_current()
+        self._goto_first = False
 
     def search_next(self, event=None):
-        if not self._matches:
+        if not self.engine.count:
             if self.search_var.get():
-                self._do_search()
+                self._on_input()
             return "break"
-        self._match_index = (self._match_index + 1) % len(self._matches)
+        self._match_index = (self._match_index + 1) % self.engine.count
         self._highlight_current()
         return "break"
 
     def search_prev(self, event=None):
-        if not self._matches:
+        if not self.engine.count:
             if self.search_var.get():
-                self._do_search()
+                self._on_input()
             return "break"
-        self._match_index = (self._match_index - 1) % len(self._matches)
+        self._match_index = (self._match_index - 1) % self.engine.count
         self._highlight_current()
         return "break"
 
     def _highlight_current(self):
-        if self._match_index < 0 or self._match_index >= len(self._matches):
-            return
-        keyword = self.search_var.get()
-        if not keyword:
+        if self._match_index < 0 or self._match_index >= self.engine.count:
             return
-
-        self._set_state("normal")
-        self.text_widget.tag_remove("search_current", "1.0", "end")
-        pos = self._matches[self._match_index]
-        start_idx = f"1.0+{pos}c"
-        end_idx = f"1.0+{pos + len(keyword)}c"
-        self.text_widget.tag_add("search_current", start_idx, end_idx)
-        self.text_widget.see(start_idx)
-        self._set_state("disabled")
-
-        self.count_label.config(text=f"{self._match_index + 1}/{len(self._matches)}")
\ No newline at end of file
+        self.engine.goto(self._match_index)
+        plus = "+" if self.engine.truncated else ""
+        self.count_label.config(text=f"{self._match_index + 1}/{self.engine.count}{plus}")
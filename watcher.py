@@ -1,133 +1,109 @@
-import time
 import threading
-import sys
-import os
-import psutil
 
-# 根据平台导入特定库
-if sys.platform == "win32":
-    import win32gui
-    import win32process
-elif sys.platform == "darwin":
-    from Cocoa import NSWorkspace
+from rule_matcher import RuleMatcher
+from scheduler import get_scheduler
+from watcher_backends import BACKEND_AUTO, PollingBackend, create_backend
 
 
 class WindowWatcher:
-    def __init__(self, db_manager, callback):
+    """前台窗口监听：由后端推送前台窗口变化，命中规则时回调 callback(rule_type, value)。
+    默认使用系统焦点事件（Windows SetWinEventHook / macOS NSWorkspace 通知），
+    事件后端不可用时回退到每秒轮询；设置项 watcher_backend 设为 polling 可强制轮询"""
+
+    def __init__(self, db_manager, callback, backend=None, scheduler=None):
         self.db_manager = db_manager
         self.callback = callback
         self.running = False
+        self.backend = backend
+        self.scheduler = scheduler or get_scheduler()
 
         # 记录上一次触发的规则 key
         self.last_triggered_key = None
+        # 上一次参与规则匹配的前台窗口 (title, proc_name, handle)，未变化时跳过匹配
+        self._last_info = None
 
-        # 获取自身进程 ID，用于过滤自己
-        self.my_pid = os.getpid()
+        self._stop_event = threading.Event()
+        self._thread = None
 
         self.lock = threading.Lock()
         self.reload_rules()
 
     def start(self):
+        if self.backend is None:
+            self.backend = create_backend(self.db_manager.get_setting("watcher_backend", BACKEND_AUTO))
         self.running = True
-        threading.Thread(target=self._loop, daemon=True).start()
+        self._stop_event.clear()
+        if not self.backend.event_driven:
+            self.backend.start(self.scheduler, self.handle_focus)
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
 
     def stop(self):
         self.running = False
+        self._stop_event.set()
+        if self.backend:
+            try:
+                self.backend.stop()
+            except:
+                pass
 
     def reload_rules(self):
+        rules = self.db_manager.get_enabled_rules()
+        # 规则在此一次性编译，前台窗口变化时只做一次自动机扫描
+        matcher = RuleMatcher(rules)
         with self.lock:
-            rules = self.db_manager.get_enabled_rules()
-            self.title_keywords = rules['title']
-            self.process_names = rules['process']
-
-    def _get_active_window_info_win(self):
-        """Windows 获取前台窗口信息"""
-        try:
-            hwnd = win32gui.GetForegroundWindow()
-            title = win32gui.GetWindowText(hwnd).lower()
-            _, pid = win32process.GetWindowThreadProcessId(hwnd)
-
-            # --- 核心修复：如果是自己，返回特殊标记 ---
-            if pid == self.my_pid:
-                return None, None, True  # is_self = True
-
-            proc_name = psutil.Process(pid).name().lower() if pid > 0 else ""
-            return title, proc_name, False
-        except:
-            return "", "", False
+            self.matcher = matcher
+            self._last_info = None
 
-    def _get_active_window_info_mac(self):
-        """Mac 获取前台窗口信息"""
+    def _run(self):
         try:
-            active_app = NSWorkspace.sharedWorkspace().frontmostApplication()
-            if not active_app: return "", "", False
-
-            pid = active_app.processIdentifier()
-            if pid == self.my_pid:
-                return None, None, True
-
-            proc_name = active_app.localizedName().lower()
-            title = proc_name
-            return title, proc_name + ".app", False
+            self.backend.run(self.handle_focus, self._stop_event)
         except:
-            return "", "", False
+            # 事件钩子注册失败等情况，回退到轮询
+            if not self._stop_event.is_set():
+                self.backend = PollingBackend()
+                self.backend.start(self.scheduler, self.handle_focus)
 
-    def _loop(self):
-        while self.running:
-            try:
-                is_self = False
-                if sys.platform == "win32":
-                    title, proc_name, is_self = self._get_active_window_info_win()
-                elif sys.platform == "darwin":
-                    title, proc_name, is_self = self._get_active_window_info_mac()
-                else:
-                    time.sleep(1)
-                    continue
-
-                # -----------------------------------------------------------
-                # 核心修复逻辑：
-                # 如果当前活动窗口是 SafeDraft 自己（比如用户正在点取消置顶，或在打字），
-                # 我们【绝对不要】重置 last_triggered_key。
-                # 我们假装什么都没发生，保持“在这个应用之前”的状态。
-                # 这样当用户切回原来的应用时，系统会认为他“从未离开过”。
-                # -----------------------------------------------------------
-                if is_self:
-                    time.sleep(1)
-                    continue
-
-                current_match_key = None
-
-                with self.lock:
-                    # 1. 检查进程名
-                    for p_rule in self.process_names:
-                        clean_rule = p_rule.replace(".exe", "")
-                        if clean_rule in proc_name:
-                            current_match_key = f"proc:{clean_rule}"
-                            break
-
-                    # 2. 检查标题
-                    if not current_match_key:
-                        for t_rule in self.title_keywords:
-                            if t_rule in title:
-                                current_match_key = f"title:{t_rule}"
-                                break
-
-                # --- 状态机 ---
-                if current_match_key:
-                    # 检测到监控目标
-                    if current_match_key != self.last_triggered_key:
-                        # 是一个新的目标（或者从无关应用切回来的）-> 触发！
-                        self.callback()
-                        self.last_triggered_key = current_match_key
-                    else:
-                        # 和上次一样 -> 保持安静，不打扰
-                        pass
-                else:
-                    # 检测到无关应用（比如桌面、网易云）
-                    # 只有这时才重置锁
-                    self.last_triggered_key = None
-
-            except Exception as e:
-                pass
+    def _match(self, title, proc_name):
+        """返回命中规则的 (rule_type, value, key)，未命中返回 None"""
+        with self.lock:
+            matcher = self.matcher
+        return matcher.match(title, proc_name)
 
-            time.sleep(1)
\ No newline at end of file
+    def handle_focus(self, info):
+        """处理一次前台窗口变化（由后端线程调用）"""
+        try:
+            # -----------------------------------------------------------
+            # 如果当前活动窗口是 SafeDraft 自己（比如用户正在点取消置顶，或在打字），
+            # 我们【绝对不要】重置 last_triggered_key。
+            # 我们假装什么都没发生，保持“在这个应用之前”的状态。
+            # 这样当用户切回原来的应用时，系统会认为他“从未离开过”。
+            # -----------------------------------------------------------
+            if not self.running or info.is_self:
+                return
+
+            # 同一窗口、同一标题：结果必然与上次相同，不必再匹配
+            with self.lock:
+                if info == self._last_info:
+                    return
+                self._last_info = info
+
+            match = self._match(info.title or "", info.proc_name or "")
+
+            # --- 状态机 ---
+            if match:
+                rule_type, value, current_match_key = match
+                # 检测到监控目标
+                if current_match_key != self.last_triggered_key:
+                    # 是一个新的目标（或者从无关应用切回来的）-> 触发！
+                    self.last_triggered_key = current_match_key
+                    self.callback(rule_type, value)
+                # 和上次一样 -> 保持安静，不打扰
+            else:
+                # 检测到无关应用（比如桌面、网易云）
+                # 只有这时才重置锁
+                self.last_triggered_key = None
+
+        except Exception as e:
+            pass
@@ -0,0 +1,341 @@
+"""
+前台窗口监听后端
+WindowWatcher 通过后端获取“前台窗口可能变化了”的通知，后端在自己的线程中运行 run()：
+- WinEventBackend: Windows SetWinEventHook，切换窗口（全局 EVENT_SYSTEM_FOREGROUND）
+  或前台窗口标题变化（EVENT_OBJECT_NAMECHANGE，只挂在前台窗口所在的线程上，切换窗口时重新挂）时由系统回调，
+  其它程序的控件名称变化与空闲时都不唤醒
+- MacWorkspaceBackend: macOS NSWorkspaceDidActivateApplicationNotification
+- PollingBackend: 在共用调度器上每秒查询一次，事件后端不可用时的回退
+- ScriptedBackend: 按脚本回放焦点事件，供无桌面环境的测试与延迟测量使用
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+if sys.platform == "win32":
+    import ctypes
+    from ctypes import wintypes
+    import psutil
+    import win32gui
+    import win32process
+elif sys.platform == "darwin":
+    from Cocoa import NSWorkspace
+
+BACKEND_AUTO = "auto"
+BACKEND_POLLING = "polling"
+BACKEND_SCRIPTED = "scripted"
+
+# 轮询后端的查询间隔（秒）
+POLL_INTERVAL = 1.0
+
+# 元数据缓存上限
+PROCESS_CACHE_SIZE = 256
+TITLE_CACHE_SIZE = 64
+
+# title / proc_name 均为小写；is_self 表示前台是 SafeDraft 自己；
+# handle 为窗口句柄（Mac 为 pid），与 title / proc_name 一起判断前台是否真的变化
+ForegroundInfo = namedtuple("ForegroundInfo", ["title", "proc_name", "is_self", "handle"], defaults=[None])
+
+SELF_INFO = ForegroundInfo(None, None, True)
+EMPTY_INFO = ForegroundInfo("", "", False)
+
+_MY_PID = os.getpid()
+
+
+# --- 元数据缓存 ---
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_if(self, predicate):
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ProcessNameCache:
+    """进程名缓存，键为 (pid, 进程启动时间)，pid 被复用时启动时间不同，不会取到旧名字；
+    进程已退出时清掉该 pid 的所有条目"""
+
+    def __init__(self, maxsize=PROCESS_CACHE_SIZE, process_factory=None):
+        self._cache = LRUCache(maxsize)
+        self._process_factory = process_factory
+
+    def name(self, pid):
+        factory = self._process_factory or psutil.Process
+        try:
+            # psutil.Process 构造时已读取启动时间用于身份校验，create_time() 不再额外查询
+            proc = factory(pid)
+            key = (pid, proc.create_time())
+            name = self._cache.get(key)
+            if name is None:
+                name = proc.name().lower()
+                self._cache.put(key, name)
+            return name
+        except Exception:
+            self.invalidate(pid)
+            raise
+
+    def invalidate(self, pid):
+        self._cache.discard_if(lambda key: key[0] == pid)
+
+
+_PROCESS_NAMES = ProcessNameCache()
+
+
+# --- 前台窗口查询 ---
+
+def query_window_win(hwnd=None, titles=None):
+    """Windows 查询窗口信息（默认为当前前台窗口）；titles 为按 hwnd 缓存标题的 LRUCache，
+    只在能收到标题变化事件时传入"""
+    try:
+        if hwnd is None:
+            hwnd = win32gui.GetForegroundWindow()
+        _, pid = win32process.GetWindowThreadProcessId(hwnd)
+        if pid == _MY_PID:
+            return SELF_INFO
+        title = titles.get(hwnd) if titles is not None else None
+        if title is None:
+            title = win32gui.GetWindowText(hwnd).lower()
+            if titles is not None:
+                titles.put(hwnd, title)
+        proc_name = _PROCESS_NAMES.name(pid) if pid > 0 else ""
+        return ForegroundInfo(title, proc_name, False, hwnd)
+    except:
+        return EMPTY_INFO
+
+
+def query_app_mac(app=None):
+    """Mac 查询应用信息（默认为当前前台应用），标题取应用名"""
+    try:
+        if app is None:
+            app = NSWorkspace.sharedWorkspace().frontmostApplication()
+        if not app:
+            return EMPTY_INFO
+        if app.processIdentifier() == _MY_PID:
+            return SELF_INFO
+        proc_name = app.localizedName().lower()
+        return ForegroundInfo(proc_name, proc_name + ".app", False, app.processIdentifier())
+    except:
+        return EMPTY_INFO
+
+
+def query_foreground():
+    if sys.platform == "win32":
+        return query_window_win()
+    if sys.platform == "darwin":
+        return query_app_mac()
+    return None
+
+
+# --- 后端 ---
+
+class WatcherBackend:
+    """事件后端在 WindowWatcher 的线程中运行 run()；非事件后端（轮询）改用 start()/stop()"""
+    name = ""
+    event_driven = False
+
+    def run(self, on_change, stop_event):
+        """阻塞运行直到 stop_event 被设置；前台窗口变化时调用 on_change(ForegroundInfo)"""
+        raise NotImplementedError
+
+    def stop(self):
+        """唤醒 run()（stop_event 已由调用方设置）"""
+        pass
+
+
+class PollingBackend(WatcherBackend):
+    """按固定间隔查询前台窗口；不占用独立线程，作为周期任务挂在共用调度器上"""
+    name = BACKEND_POLLING
+
+    JOB_NAME = "watcher.poll"
+
+    def __init__(self, interval=POLL_INTERVAL, query=query_foreground):
+        self.interval = interval
+        self.query = query
+        self._scheduler = None
+        self._last = None
+
+    def start(self, scheduler, on_change):
+        self._scheduler = scheduler
+        self._last = None
+
+        def _poll():
+            info = self.query()
+            # 只在变化时通知，标题不变时不重复匹配规则
+            if info is not None and info != self._last:
+                self._last = info
+                on_change(info)
+
+        scheduler.schedule(self.JOB_NAME, 0, _poll, slack=self.interval / 4, interval=self.interval)
+
+    def stop(self):
+        if self._scheduler:
+            self._scheduler.cancel(self.JOB_NAME)
+
+
+class WinEventBackend(WatcherBackend):
+    name = "winevent"
+    event_driven = True
+
+    EVENT_SYSTEM_FOREGROUND = 0x0003
+    EVENT_OBJECT_NAMECHANGE = 0x800C
+    WINEVENT_OUTOFCONTEXT = 0x0000
+    WINEVENT_SKIPOWNPROCESS = 0x0002
+    OBJID_WINDOW = 0
+    WM_QUIT = 0x0012
+
+    def __init__(self):
+        self._thread_id = None
+        self._proc = None
+        self._name_hook = None
+        # 按 hwnd 缓存标题：窗口在前台期间的标题变化会收到 NAMECHANGE 事件；
+        # 不在前台时没有事件，因此窗口切到前台时先丢弃它的缓存
+        self.titles = LRUCache(TITLE_CACHE_SIZE)
+
+    def run(self, on_change, stop_event):
+        user32 = ctypes.windll.user32
+        kernel32 = ctypes.windll.kernel32
+        proc_type = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                       wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+        user32.SetWinEventHook.restype = wintypes.HANDLE
+        user32.GetForegroundWindow.restype = wintypes.HWND
+        flags = self.WINEVENT_OUTOFCONTEXT | self.WINEVENT_SKIPOWNPROCESS
+        namechange = self.EVENT_OBJECT_NAMECHANGE
+
+        def _watch_title(hwnd):
+            """把 NAMECHANGE 钩子移到 hwnd 所在的进程/线程上；全局挂钩会让所有程序的控件名称变化都唤醒本线程"""
+            if self._name_hook:
+                user32.UnhookWinEvent(self._name_hook)
+                self._name_hook = None
+            if not hwnd:
+                return
+            pid = wintypes.DWORD()
+            tid = user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+            if tid and pid.value != os.getpid():
+                self._name_hook = user32.SetWinEventHook(namechange, namechange, 0, self._proc,
+                                                         pid.value, tid, flags)
+
+        def _callback(hook, event, hwnd, id_object, id_child, thread_id, time_ms):
+            if event == namechange:
+                if id_object != self.OBJID_WINDOW:
+                    return
+                self.titles.pop(hwnd)
+                # 只关心前台窗口本身的标题变化（如浏览器切换标签页），同一线程的其它窗口忽略
+                if hwnd != user32.GetForegroundWindow():
+                    return
+            else:
+                self.titles.pop(hwnd)
+                _watch_title(hwnd)
+            try:
+                on_change(query_window_win(hwnd, self.titles))
+            except:
+                pass
+
+        self._proc = proc_type(_callback)  # 保持引用，避免回调被回收
+        hook = user32.SetWinEventHook(self.EVENT_SYSTEM_FOREGROUND, self.EVENT_SYSTEM_FOREGROUND, 0,
+                                      self._proc, 0, 0, flags)
+        if not hook:
+            raise OSError("SetWinEventHook 失败")
+
+        self._thread_id = kernel32.GetCurrentThreadId()
+        try:
+            _watch_title(user32.GetForegroundWindow())
+            on_change(query_window_win(titles=self.titles))
+            msg = wintypes.MSG()
+            # 回调在本线程的消息循环中派发；stop() 投递 WM_QUIT 结束循环
+            while not stop_event.is_set() and user32.GetMessageW(ctypes.byref(msg), 0, 0, 0) > 0:
+                user32.TranslateMessage(ctypes.byref(msg))
+                user32.DispatchMessageW(ctypes.byref(msg))
+        finally:
+            user32.UnhookWinEvent(hook)
+            _watch_title(None)
+            self._thread_id = None
+
+    def stop(self):
+        if self._thread_id:
+            ctypes.windll.user32.PostThreadMessageW(self._thread_id, self.WM_QUIT, 0, 0)
+
+
+class MacWorkspaceBackend(WatcherBackend):
+    name = "nsworkspace"
+    event_driven = True
+
+    def run(self, on_change, stop_event):
+        from AppKit import NSWorkspaceDidActivateApplicationNotification, NSWorkspaceApplicationKey
+
+        def _activated(note):
+            try:
+                on_change(query_app_mac(note.userInfo()[NSWorkspaceApplicationKey]))
+            except:
+                pass
+
+        # 通知在主线程（Tk 的 Cocoa 主循环）中投递，本线程只需等待停止
+        center = NSWorkspace.sharedWorkspace().notificationCenter()
+        observer = center.addObserverForName_object_queue_usingBlock_(
+            NSWorkspaceDidActivateApplicationNotification, None, None, _activated)
+        try:
+            on_change(query_app_mac())
+            stop_event.wait()
+        finally:
+            center.removeObserver_(observer)
+
+
+class ScriptedBackend(WatcherBackend):
+    """按脚本回放焦点事件。script 为 [(延迟秒数, ForegroundInfo), ...]，
+    每个事件的实际发出时间（time.perf_counter()）记录在 emitted 中，用于计算触发延迟"""
+    name = BACKEND_SCRIPTED
+    event_driven = True
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.emitted = []
+        self.done = threading.Event()
+
+    def run(self, on_change, stop_event):
+        try:
+            for delay, info in self.script:
+                if stop_event.wait(delay):
+                    return
+                self.emitted.append((time.perf_counter(), info))
+                on_change(info)
+        finally:
+            self.done.set()
+
+
+def create_backend(name=BACKEND_AUTO):
+    """按名称创建后端；auto 时优先使用当前平台的事件后端"""
+    if name == BACKEND_POLLING:
+        return PollingBackend()
+    if sys.platform == "win32":
+        return WinEventBackend()
+    if sys.platform == "darwin":
+        return MacWorkspaceBackend()
+    return PollingBackend()
@@ -1,13 +1,22 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
 from datetime import datetime
-from PIL import ImageTk
 import os
 import threading
 import json
 
 # 导入工具模块
-from utils import get_icon_image, StartupManager, DEFAULT_FONT_SIZE, DEFAULT_STICKY_TITLE_SIZE, DEFAULT_STICKY_CONTENT_SIZE
+from utils import get_icon_photo, StartupManager, DEFAULT_FONT_SIZE, DEFAULT_STICKY_TITLE_SIZE, DEFAULT_STICKY_CONTENT_SIZE
+from sync_engine import PHASES, PHASE_LABELS
+from sync_backends import BACKEND_LABELS, BACKEND_LOCAL, BACKEND_SFTP, get_backend_name, is_config_complete
+from sync_targets import load_extra_targets, save_extra_targets
+from rule_matcher import validate_rule
+from bulk_loader import load_text
+from text_search import SearchEngine
+from list_search import ListSearcher
+from scheduler import get_scheduler
+from storage import like_contains
+from startup_trace import read_log, format_entry, TRACE_ENV, TRACE_SECONDS_ENV
 
 
 class HistoryWindow(tk.Toplevel):
@@ -22,6 +31,11 @@ class HistoryWindow(tk.Toplevel):
         self.restore_callback = restore_callback
         self.colors = theme
         self.history_data = []  # 缓存历史数据
+        self._preview_loader = None  # 进行中的大文本预览分块加载
+        self.searcher = ListSearcher(get_scheduler(), ("history.search", id(self)),
+                                     fetch=self.db.iter_history, match=self._history_match,
+                                     on_batch=self._on_history_batch,
+                                     dispatch=lambda f: self.after(0, f))
 
         val = self.db.get_setting("quick_restore", "0")
         self.quick_restore_var = tk.BooleanVar(value=(val == "1"))
@@ -45,58 +59,42 @@ class HistoryWindow(tk.Toplevel):
         self.search_entry.delete(0, "end")
         self.search_entry.focus_set()
         self.search_count_label.config(text="")
-        self._search_matches = []
         self._search_index = -1
         # 清除之前的搜索高亮
-        self.preview_text.config(state="normal")
-        self.preview_text.tag_remove("search_highlight", "1.0", "end")
-        self.preview_text.config(state="disabled")
+        self.search_engine.clear()
         self._search_trace_cbname = self.search_var_preview.trace_add("write", self._on_search_input)
         return "break"
 
     def _on_search_input(self, *args):
-        """搜索输入变化时重新搜索"""
+        """搜索输入变化时重新搜索，结果返回后跳转到第一个匹配"""
+        self._search_goto_first = True
         self._do_search()
-        self._goto_first_match()
 
     def _do_search(self):
-        """执行搜索，记录所有匹配位置"""
+        """开始搜索（大文本在后台线程中进行），结果由 _on_search_result 处理"""
         keyword = self.search_var_preview.get()
-        self.preview_text.config(state="normal")
-        self.preview_text.tag_remove("search_highlight", "1.0", "end")
-        self.preview_text.config(state="disabled")
-
-        self._search_matches = []
         self._search_index = -1
-
         if not keyword:
+            self.search_engine.clear()
             self.search_count_label.config(text="")
             return
+        self.search_count_label.config(text="搜索中...")
+        self.search_engine.search(keyword, regex=self.search_regex_var.get(), case=self.search_case_var.get())
 
-        content = self.preview_text.get("1.0", "end-1c")
-        start = 0
-        while True:
-            idx = content.find(keyword, start)
-            if idx == -1:
-                break
-            self._search_matches.append(idx)
-            start = idx + 1
-
-        # 应用高亮
-        self.preview_text.config(state="normal")
-        self.preview_text.tag_configure("search_highlight", background="#f39c12", foreground="white")
-        for pos in self._search_matches:
-            start_idx = f"1.0+{pos}c"
-            end_idx = f"1.0+{pos + len(keyword)}c"
-            self.preview_text.tag_add("search_highlight", start_idx, end_idx)
-        self.preview_text.config(state="disabled")
-
-        count = len(self._search_matches)
-        self.search_count_label.config(text=f"{count} 个结果" if count > 0 else "无结果")
+    def _on_search_result(self, count, error):
+        if error:
+            self._search_goto_first = False
+            self.search_count_label.config(text="正则有误")
+            return
+        plus = "+" if self.search_engine.truncated else ""
+        self.search_count_label.config(text=f"{count}{plus} 个结果" if count > 0 else "无结果")
+        if self._search_goto_first:
+            self._goto_first_match()
+        self._search_goto_first = False
 
     def _goto_first_match(self):
         """跳转到第一个匹配"""
-        if self._search_matches:
+        if self.search_engine.count:
             self._search_index = 0
             self._highlight_current_match()
         else:
@@ -104,47 +102,32 @@ class HistoryWindow(tk.Toplevel):
 
     def _search_next(self, event=None):
         """下一个匹配"""
-        if not self._search_matches:
+        if not self.search_engine.count:
             if self.search_var_preview.get():
-                self._do_search()
+                self._on_search_input()
             return "break"
-        if self._search_matches:
-            self._search_index = (self._search_index + 1) % len(self._search_matches)
-            self._highlight_current_match()
+        self._search_index = (self._search_index + 1) % self.search_engine.count
+        self._highlight_current_match()
         return "break"
 
     def _search_prev(self, event=None):
         """上一个匹配"""
-        if not self._search_matches:
+        if not self.search_engine.count:
             if self.search_var_preview.get():
-                self._do_search()
+                self._on_search_input()
             return "break"
-        if self._search_matches:
-            self._search_index = (self._search_index - 1) % len(self._search_matches)
-            self._highlight_current_match()
+        self._search_index = (self._search_index - 1) % self.search_engine.count
+        self._highlight_current_match()
         return "break"
 
     def _highlight_current_match(self):
         """高亮当前匹配项并滚动到可见位置"""
-        if self._search_index < 0 or self._search_index >= len(self._search_matches):
-            return
-        keyword = self.search_var_preview.get()
-        if not keyword:
+        if self._search_index < 0 or self._search_index >= self.search_engine.count:
             return
-
-        self.preview_text.config(state="normal")
-        self.preview_text.tag_remove("search_current", "1.0", "end")
-        self.preview_text.tag_configure("search_current", background="#e74c3c", foreground="white")
-
-        pos = self._search_matches[self._search_index]
-        start_idx = f"1.0+{pos}c"
-        end_idx = f"1.0+{pos + len(keyword)}c"
-        self.preview_text.tag_add("search_current", start_idx, end_idx)
-        self.preview_text.see(start_idx)
-        self.preview_text.config(state="disabled")
-
+        self.search_engine.goto(self._search_index)
+        plus = "+" if self.search_engine.truncated else ""
         self.search_count_label.config(
-            text=f"{self._search_index + 1}/{len(self._search_matches)}")
+            text=f"{self._search_index + 1}/{self.search_engine.count}{plus}")
 
     def _close_search(self, event=None):
         """关闭搜索栏"""
@@ -155,22 +138,20 @@ class HistoryWindow(tk.Toplevel):
                 pass
             self._search_trace_cbname = None
         self.search_bar.pack_forget()
-        self.preview_text.config(state="normal")
-        self.preview_text.tag_remove("search_highlight", "1.0", "end")
-        self.preview_text.tag_remove("search_current", "1.0", "end")
-        self.preview_text.config(state="disabled")
-        self._search_matches = []
+        self.search_engine.clear()
         self._search_index = -1
         return "break"
 
     def on_close(self):
         self.db.remove_observer(self.refresh_data)
+        self.searcher.cancel()
+        if self._preview_loader is not None:
+            self._preview_loader.cancel()
         self.destroy()
 
     def load_icon(self):
         try:
-            pil_img = get_icon_image()
-            self.tk_icon = ImageTk.PhotoImage(pil_img)
+            self.tk_icon = get_icon_photo(self)
             self.iconphoto(True, self.tk_icon)
         except:
             pass
@@ -243,6 +224,15 @@ class HistoryWindow(tk.Toplevel):
         self.search_entry.bind("<Shift-Return>", self._search_prev)
         self.search_entry.bind("<Escape>", self._close_search)
 
+        # 区分大小写（默认开启）/ 正则
+        self.search_case_var = tk.BooleanVar(value=True)
+        self.search_regex_var = tk.BooleanVar(value=False)
+        for text, var in (("Aa", self.search_case_var), (".*", self.search_regex_var)):
+            tk.Checkbutton(self.search_bar, text=text, variable=var, indicatoron=False, relief="flat",
+                           padx=3, bg=self.colors["bg"], fg=self.colors["fg"],
+                           selectcolor=self.colors["accent"], font=("Arial", 8),
+                           command=self._on_search_input).pack(side="left")
+
         self.search_count_label = tk.Label(self.search_bar, text="", bg=self.colors["bg"],
                                            fg="#888888", font=("Arial", 9))
         self.search_count_label.pack(side="left", padx=5)
@@ -255,7 +245,10 @@ class HistoryWindow(tk.Toplevel):
                   bg=self.colors["bg"], fg="#ff5555", font=("Arial", 10)).pack(side="left")
 
         # 搜索状态
-        self._search_matches = []
+        self.preview_text.tag_configure("search_highlight", background="#f39c12", foreground="white")
+        self.preview_text.tag_configure("search_current", background="#e74c3c", foreground="white")
+        self.search_engine = SearchEngine(self.preview_text, self._on_search_result)
+        self._search_goto_first = False
         self._search_index = -1
 
         # Ctrl+F 绑定
@@ -310,10 +303,17 @@ class HistoryWindow(tk.Toplevel):
 
     def show_preview(self, content):
         """在预览区显示内容"""
-        self.preview_text.config(state="normal")
-        self.preview_text.delete("1.0", "end")
-        self.preview_text.insert("1.0", content)
-        self.preview_text.config(state="disabled")
+        if self._preview_loader is not None:
+            self._preview_loader.cancel()
+        # 旧的匹配位置已失效
+        self.search_engine.clear()
+        self._preview_loader = load_text(self.preview_text, content, self._on_preview_loaded)
+
+    def _on_preview_loaded(self):
+        self._preview_loader = None
+        # 搜索栏打开时在新内容中重新搜索
+        if self.search_bar.winfo_ismapped() and self.search_var_preview.get():
+            self._do_search()
 
     def on_restore_clicked(self):
         """点击恢复按钮"""
@@ -479,29 +479,45 @@ class HistoryWindow(tk.Toplevel):
         self.db.set_setting("quick_restore", val)
 
     def on_search_change(self, *args):
-        self.refresh_data()
+        # 防抖后在后台查询，结果分批送回 _on_history_batch
+        self.searcher.request(self.search_var.get().strip())
 
     def refresh_data(self):
         self.after(0, self._do_refresh)
 
     def _do_refresh(self):
         if not self.winfo_exists(): return
-        keyword = self.search_var.get().strip()
-        self.listbox.delete(0, "end")
-        self.history_data = self.db.get_history(keyword)
-        if not self.history_data:
-            display_text = "未找到相关记录" if keyword else "暂无历史记录"
-            self.listbox.insert("end", display_text)
+        # 数据已变化，不能在旧结果中收窄
+        self.searcher.reset()
+        self.searcher.request(self.search_var.get().strip(), immediate=True)
+
+    @staticmethod
+    def _history_match(row, keyword):
+        return all(like_contains(row[1], kw) for kw in keyword.split())
+
+    def _on_history_batch(self, rows, first, done):
+        if not self.winfo_exists(): return
+        if first:
+            self.listbox.delete(0, "end")
+            self.history_data = []
+        if done:
+            if not self.history_data:
+                display_text = "未找到相关记录" if self.search_var.get().strip() else "暂无历史记录"
+                self.listbox.insert("end", display_text)
             return
-        for row in self.history_data:
+        items = []
+        for row in rows:
             try:
                 dt = datetime.fromisoformat(row[3])
                 time_str = dt.strftime("%Y/%m/%d %H:%M")
                 content = row[1].strip().replace("\n", " ")
                 if len(content) > 30: content = content[:30] + "..."
-                self.listbox.insert("end", f"[{time_str}] {content}")
+                items.append(f"[{time_str}] {content}")
+                self.history_data.append(row)
             except:
                 pass
+        if items:
+            self.listbox.insert("end", *items)
 
     def on_double_click(self, event):
         selection = self.listbox.curselection()
@@ -524,11 +540,88 @@ class HistoryWindow(tk.Toplevel):
             self.db.delete_draft(self.history_data[index][0])
 
 
+class SyncProgressWindow(tk.Toplevel):
+    """同步进度窗口：显示当前阶段和传输字节数，可在阶段之间取消"""
+
+    def __init__(self, parent, theme, title, on_cancel):
+        super().__init__(parent)
+        self.title(title)
+        self.geometry("360x150")
+        self.resizable(False, False)
+        self.colors = theme
+        self.on_cancel = on_cancel
+        self.configure(bg=self.colors["bg"])
+        self.load_icon()
+
+        # 相对于父窗口居中
+        parent.update_idletasks()
+        x = parent.winfo_rootx() + (parent.winfo_width() - 360) // 2
+        y = parent.winfo_rooty() + (parent.winfo_height() - 150) // 2
+        self.geometry(f"+{x}+{y}")
+
+        f = tk.Frame(self, bg=self.colors["bg"], padx=20, pady=15)
+        f.pack(fill="both", expand=True)
+
+        self.lbl_phase = tk.Label(f, text="准备中...", bg=self.colors["bg"], fg=self.colors["fg"],
+                                  font=("Arial", 10, "bold"), anchor="w")
+        self.lbl_phase.pack(fill="x")
+
+        self.progress = ttk.Progressbar(f, orient="horizontal", mode="determinate", maximum=100)
+        self.progress.pack(fill="x", pady=8)
+
+        self.lbl_bytes = tk.Label(f, text="", bg=self.colors["bg"], fg="#888888",
+                                  font=("Arial", 9), anchor="w")
+        self.lbl_bytes.pack(fill="x")
+
+        self.btn_cancel = tk.Button(f, text="取消", command=self._on_cancel_clicked,
+                                    bg=self.colors["accent"], fg=self.colors["fg"], relief="flat", width=8)
+        self.btn_cancel.pack(side="right", pady=(5, 0))
+
+        self.protocol("WM_DELETE_WINDOW", self._on_cancel_clicked)
+
+    def load_icon(self):
+        try:
+            self.tk_icon = get_icon_photo(self)
+            self.iconphoto(True, self.tk_icon)
+        except:
+            pass
+
+    def _on_cancel_clicked(self):
+        self.btn_cancel.config(state="disabled", text="取消中...")
+        self.lbl_phase.config(text="正在取消，将在当前阶段结束后停止...")
+        if self.on_cancel:
+            self.on_cancel()
+
+    def update_progress(self, phase, done, total):
+        """phase: 当前阶段；done/total: 当前阶段传输字节数"""
+        if not self.winfo_exists():
+            return
+        step = PHASES.index(phase) if phase in PHASES else 0
+        label = PHASE_LABELS.get(phase, phase)
+        if self.btn_cancel["state"] != "disabled":
+            self.lbl_phase.config(text=f"[{step + 1}/{len(PHASES)}] {label}")
+
+        # 整体进度：已完成阶段 + 当前阶段内的字节比例
+        fraction = (done / total) if total else 0
+        self.progress["value"] = (step + fraction) * 100 / len(PHASES)
+
+        if total:
+            self.lbl_bytes.config(text=f"{done / 1024:.0f} KB / {total / 1024:.0f} KB")
+        else:
+            self.lbl_bytes.config(text="")
+
+    def close(self):
+        try:
+            self.destroy()
+        except:
+            pass
+
+
 class SettingsDialog(tk.Toplevel):
     def __init__(self, parent, db, watcher, app):
         super().__init__(parent)
         self.title("设置")
-        self.geometry("480x760")
+        self.geometry("480x1000")
         self.db = db
         self.watcher = watcher
         self.app = app
@@ -561,8 +654,7 @@ class SettingsDialog(tk.Toplevel):
 
     def load_icon(self):
         try:
-            pil_img = get_icon_image()
-            self.tk_icon = ImageTk.PhotoImage(pil_img)
+            self.tk_icon = get_icon_photo(self)
             self.iconphoto(True, self.tk_icon)
         except:
             pass
@@ -603,9 +695,57 @@ class SettingsDialog(tk.Toplevel):
         # 绑定保存
         self.entry_ssh_path.bind("<FocusOut>", lambda e: self.db.set_setting("ssh_path", self.entry_ssh_path.get().strip()))
 
+        # 3. 带宽上限
+        tk.Label(grid_frame, text="带宽上限 (KB/s):", bg=self.colors["bg"], fg=self.colors["fg"]).grid(row=2, column=0, sticky="w", pady=5)
+        self.entry_bandwidth = tk.Entry(grid_frame, bg=self.colors["list_bg"], fg=self.colors["list_fg"], insertbackground=self.colors["fg"])
+        self.entry_bandwidth.grid(row=2, column=1, sticky="ew", padx=10, pady=5)
+        self.entry_bandwidth.insert(0, self.db.get_setting("sync_bandwidth_kbps", "0"))
+        self.entry_bandwidth.bind("<FocusOut>", self._save_bandwidth)
+
+        # 4. 同步方式（SFTP / 本地或挂载目录）
+        tk.Label(grid_frame, text="同步方式:", bg=self.colors["bg"], fg=self.colors["fg"]).grid(row=3, column=0, sticky="w", pady=5)
+        self._backend_names = list(BACKEND_LABELS)
+        self.combo_backend = ttk.Combobox(grid_frame, values=[BACKEND_LABELS[n] for n in self._backend_names],
+                                          state="readonly", width=16)
+        self.combo_backend.grid(row=3, column=1, sticky="w", padx=10, pady=5)
+        self.combo_backend.set(BACKEND_LABELS[get_backend_name(self.db)])
+        self.combo_backend.bind("<<ComboboxSelected>>", self._save_backend)
+
         grid_frame.columnconfigure(1, weight=1)
 
-        tk.Label(f, text="* 请确保本地已配置 SSH 公钥免密登录到服务器。\n* 启用后，主界面将显示上传/下载按钮。",
+        # 增量上传
+        self.var_delta_upload = tk.BooleanVar(value=self.db.get_setting("sync_delta_upload", "1") == "1")
+        tk.Checkbutton(f, text="增量上传（仅发送变化的数据块，需服务器有 python3）", variable=self.var_delta_upload,
+                       bg=self.colors["bg"], fg=self.colors["fg"], selectcolor=self.colors["accent"],
+                       activebackground=self.colors["bg"], activeforeground=self.colors["fg"],
+                       command=lambda: self.db.set_setting("sync_delta_upload",
+                                                           "1" if self.var_delta_upload.get() else "0")
+                       ).pack(anchor="w", pady=(5, 0))
+
+        # 远端合并
+        self.var_remote_merge = tk.BooleanVar(value=self.db.get_setting("sync_remote_merge", "0") == "1")
+        tk.Checkbutton(f, text="远端合并（智能上传只交换变化的记录，需服务器有 python3）", variable=self.var_remote_merge,
+                       bg=self.colors["bg"], fg=self.colors["fg"], selectcolor=self.colors["accent"],
+                       activebackground=self.colors["bg"], activeforeground=self.colors["fg"],
+                       command=lambda: self.db.set_setting("sync_remote_merge",
+                                                           "1" if self.var_remote_merge.get() else "0")
+                       ).pack(anchor="w")
+
+        # 其它同步目标
+        tk.Label(f, text="其它同步目标（与上方服务器并行同步）:", bg=self.colors["bg"],
+                 fg=self.colors["fg"]).pack(anchor="w", pady=(10, 2))
+        targets_frame = tk.Frame(f, bg=self.colors["bg"])
+        targets_frame.pack(fill="x")
+        self.list_targets = tk.Listbox(targets_frame, height=3, bg=self.colors["list_bg"],
+                                       fg=self.colors["list_fg"], relief="flat")
+        self.list_targets.pack(side="left", fill="x", expand=True)
+        btn_targets = tk.Frame(targets_frame, bg=self.colors["bg"])
+        btn_targets.pack(side="left", padx=5)
+        tk.Button(btn_targets, text="添加", command=self._add_target, width=6).pack(pady=1)
+        tk.Button(btn_targets, text="删除", command=self._remove_target, width=6).pack(pady=1)
+        self._refresh_targets()
+
+        tk.Label(f, text="* 请确保本地已配置 SSH 公钥免密登录到服务器。\n* 启用后，主界面将显示上传/下载按钮。\n* 带宽上限对手动和自动同步均生效，0 表示不限速。\n* 选择“本地/挂载目录”时无需填写 IP，远程目录填写本机可访问的路径（如 NAS 共享）。",
                  bg=self.colors["bg"], fg="#888888", justify="left").pack(anchor="w", pady=20)
 
         # --- 自动同步设置 ---
@@ -653,7 +793,7 @@ class SettingsDialog(tk.Toplevel):
         interval_frame = tk.Frame(f, bg=self.colors["bg"])
         interval_frame.pack(fill="x", pady=5)
 
-        tk.Label(interval_frame, text="检查间隔(分钟):", bg=self.colors["bg"],
+        tk.Label(interval_frame, text="最长间隔(分钟):", bg=self.colors["bg"],
                  fg=self.colors["fg"]).pack(side="left")
         self.spin_interval = tk.Spinbox(interval_frame, from_=5, to=60, increment=5, width=5,
                                         bg=self.colors["list_bg"], fg=self.colors["list_fg"])
@@ -661,11 +801,30 @@ class SettingsDialog(tk.Toplevel):
         self.spin_interval.insert(0, str(config.get("sync_interval_minutes", 10)))
         self.spin_interval.pack(side="left", padx=10)
 
+        tk.Label(interval_frame, text="最短(分钟):", bg=self.colors["bg"],
+                 fg=self.colors["fg"]).pack(side="left")
+        self.spin_min_interval = tk.Spinbox(interval_frame, from_=1, to=60, width=4,
+                                            bg=self.colors["list_bg"], fg=self.colors["list_fg"])
+        self.spin_min_interval.delete(0, "end")
+        self.spin_min_interval.insert(0, str(config.get("sync_min_interval_minutes", 1)))
+        self.spin_min_interval.pack(side="left", padx=10)
+
+        quiet_frame = tk.Frame(f, bg=self.colors["bg"])
+        quiet_frame.pack(fill="x", pady=5)
+        tk.Label(quiet_frame, text="停止编辑后等待(秒):", bg=self.colors["bg"],
+                 fg=self.colors["fg"]).pack(side="left")
+        self.spin_quiet = tk.Spinbox(quiet_frame, from_=5, to=600, increment=5, width=5,
+                                     bg=self.colors["list_bg"], fg=self.colors["list_fg"])
+        self.spin_quiet.delete(0, "end")
+        self.spin_quiet.insert(0, str(config.get("sync_quiet_seconds", 30)))
+        self.spin_quiet.pack(side="left", padx=10)
+
         # 保存按钮
         tk.Button(f, text="保存自动同步配置", command=self._save_sync_config,
                   bg="#4a90e2", fg="white", relief="flat", padx=10).pack(anchor="w", pady=15)
 
         tk.Label(f, text="* 自动同步需要先启用SSH同步并正确配置服务器信息。\n"
+                         "* 编辑停止后等待片刻即同步；持续编辑时最迟按最长间隔同步。\n"
                          "* 活跃时间段格式: HH:MM (24小时制)，留空表示全天候。",
                  bg=self.colors["bg"], fg="#888888", justify="left").pack(anchor="w")
 
@@ -684,7 +843,8 @@ class SettingsDialog(tk.Toplevel):
                   font=("Arial", 10, "bold")).pack(anchor="w", pady=5)
 
         tk.Label(f, text="* 此操作会用本地数据库完全覆盖远程。\n"
-                         "* 推送前会自动备份远程现有数据为 safedraft.db.bak.YYYYMMDD_HHMMSS。\n"
+                         "* 推送前会自动备份远程现有数据到远程目录的 backups/（去重存储，按保留策略清理）。\n"
+                         "* 恢复备份: python backup_store.py list / restore <备份ID>。\n"
                          "* 不会合并任何数据。",
                  bg=self.colors["bg"], fg="#888888", justify="left").pack(anchor="w")
 
@@ -694,18 +854,18 @@ class SettingsDialog(tk.Toplevel):
             return
         ip = self.db.get_setting("ssh_ip", "")
         path = self.db.get_setting("ssh_path", "")
-        if not ip or not path:
+        if not is_config_complete(get_backend_name(self.db), ip, path):
             messagebox.showerror("配置不完整", "请先填写服务器 IP 和远程目录路径")
             return
         if not messagebox.askyesno(
             "危险操作确认",
             "此操作会用本地数据库完全覆盖远程数据。\n\n"
-            "远程现有数据将被备份为 safedraft.db.bak.YYYYMMDD_HHMMSS。\n"
+            "远程现有数据将先备份到远程 backups/ 目录。\n"
             "此操作不可撤销。确定继续？"
         ):
             return
         self.app._run_async_sync(
-            self.db.force_push_overwrite, ip, path,
+            "force_push", ip, path,
             "强制推送成功（远程已覆盖并备份）"
         )
 
@@ -749,21 +909,96 @@ class SettingsDialog(tk.Toplevel):
             if not (1 <= interval <= 120):
                 raise ValueError
         except ValueError:
-            messagebox.showerror("格式错误", "检查间隔应为 1-120 之间的整数")
+            messagebox.showerror("格式错误", "最长间隔应为 1-120 之间的整数")
+            return
+        try:
+            min_interval = int(self.spin_min_interval.get())
+            quiet = int(self.spin_quiet.get())
+            if not (1 <= min_interval <= interval) or not (1 <= quiet <= 3600):
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("格式错误", "最短间隔应为 1 到最长间隔之间的整数，等待时间应为 1-3600 秒")
             return
 
-        config = {
+        # 保留同一文件中的其它配置（如同步目标列表）
+        config = self._load_sync_config()
+        config.update({
             "auto_sync_enabled": self.var_auto_sync.get(),
             "sync_interval_minutes": interval,
+            "sync_min_interval_minutes": min_interval,
+            "sync_quiet_seconds": quiet,
             "active_time_start": start_str,
             "active_time_end": end_str
-        }
+        })
 
         config_path = os.path.join(self.db.base_path, "sync_config.json")
         with open(config_path, 'w', encoding='utf-8') as f:
             json.dump(config, f, indent=2, ensure_ascii=False)
+        auto_sync = getattr(self.app, "auto_sync", None)
+        if auto_sync:
+            auto_sync.wake()
         messagebox.showinfo("成功", "自动同步配置已保存")
 
+    def _save_bandwidth(self, event=None):
+        """保存带宽上限，非法输入恢复为已保存的值"""
+        val = self.entry_bandwidth.get().strip() or "0"
+        try:
+            if int(val) < 0:
+                raise ValueError
+        except ValueError:
+            self.entry_bandwidth.delete(0, "end")
+            self.entry_bandwidth.insert(0, self.db.get_setting("sync_bandwidth_kbps", "0"))
+            return
+        self.db.set_setting("sync_bandwidth_kbps", str(int(val)))
+
+    def _refresh_targets(self):
+        self.list_targets.delete(0, "end")
+        for t in load_extra_targets(self.db.base_path):
+            where = f"{t['server_ip']}:{t['remote_path']}" if t.get("server_ip") else t.get("remote_path", "")
+            interval = f"  每 {t['interval_minutes']} 分钟" if t.get("interval_minutes") else ""
+            self.list_targets.insert("end", f"{t.get('name', '')}  {where}{interval}")
+
+    def _add_target(self):
+        name = simpledialog.askstring("添加同步目标", "名称:", parent=self)
+        if not name:
+            return
+        server_ip = simpledialog.askstring("添加同步目标", "服务器 (user@ip)，留空表示本地/挂载目录:", parent=self)
+        if server_ip is None:
+            return
+        remote_path = simpledialog.askstring("添加同步目标", "远程目录:", parent=self)
+        if not remote_path:
+            return
+        interval = simpledialog.askinteger("添加同步目标", "自动同步间隔(分钟)，留空使用检查间隔:",
+                                           parent=self, minvalue=1, maxvalue=1440)
+        server_ip = server_ip.strip()
+        target = {
+            "name": name.strip(),
+            "backend": BACKEND_SFTP if server_ip else BACKEND_LOCAL,
+            "server_ip": server_ip,
+            "remote_path": remote_path.strip(),
+            "enabled": True,
+            "interval_minutes": interval,
+        }
+        targets = load_extra_targets(self.db.base_path)
+        targets.append(target)
+        save_extra_targets(self.db.base_path, targets)
+        self._refresh_targets()
+
+    def _remove_target(self):
+        sel = self.list_targets.curselection()
+        if not sel:
+            return
+        targets = load_extra_targets(self.db.base_path)
+        if sel[0] < len(targets) and messagebox.askyesno("确认", f"删除同步目标“{targets[sel[0]].get('name', '')}”？"):
+            del targets[sel[0]]
+            save_extra_targets(self.db.base_path, targets)
+            self._refresh_targets()
+
+    def _save_backend(self, event=None):
+        idx = self.combo_backend.current()
+        if 0 <= idx < len(self._backend_names):
+            self.db.set_setting("sync_backend", self._backend_names[idx])
+
     def toggle_ssh_enabled(self):
         val = "1" if self.var_ssh_enabled.get() else "0"
         self.db.set_setting("ssh_enabled", val)
@@ -836,6 +1071,32 @@ class SettingsDialog(tk.Toplevel):
         self.combo_exit.pack(side="left", padx=10)
         self.combo_exit.bind("<<ComboboxSelected>>", self.change_exit_pref)
 
+        # 启动耗时
+        frame_startup = tk.Frame(self.page_general, bg=self.colors["bg"], pady=10)
+        frame_startup.pack(fill="x", padx=20)
+        tk.Label(frame_startup, text="启动耗时:", bg=self.colors["bg"], fg=self.colors["fg"]).pack(side="left")
+        tk.Button(frame_startup, text="查看各阶段耗时", command=self.show_startup_log).pack(side="left", padx=10)
+
+    def show_startup_log(self):
+        """显示最近几次启动的各阶段耗时（startup.log）"""
+        entries = read_log(self.db.base_path)[:10]
+        win = tk.Toplevel(self)
+        win.title("启动耗时")
+        win.geometry("560x480")
+        win.configure(bg=self.colors["bg"])
+        tk.Label(win, text=f"设置环境变量 {TRACE_ENV}=1 启动时，会在程序目录写出 Chrome 追踪文件 startup_trace.json"
+                           f"（记录时长由 {TRACE_SECONDS_ENV} 指定，默认 10 秒）",
+                 bg=self.colors["bg"], fg="#888888", font=("Arial", 9), wraplength=520, justify="left").pack(
+            anchor="w", padx=10, pady=(10, 0))
+        text = tk.Text(win, font=("Consolas", 10), wrap="none", bg=self.colors["text_bg"], fg=self.colors["text_fg"],
+                       relief="flat", padx=10, pady=10)
+        text.pack(fill="both", expand=True, padx=10, pady=10)
+        if entries:
+            text.insert("1.0", "\n\n".join(format_entry(e) for e in entries))
+        else:
+            text.insert("1.0", "暂无启动记录")
+        text.config(state="disabled")
+
     def toggle_boot(self):
         try:
             StartupManager.set_autostart(self.var_boot.get())
@@ -884,6 +1145,8 @@ class SettingsDialog(tk.Toplevel):
                   padx=10).pack(side="left", padx=5)
         tk.Button(btn_frame, text="➕ 添加网址/标题", command=self.add_title_keyword, bg=self.colors["accent"],
                   fg=self.colors["fg"], relief="flat", padx=10).pack(side="left", padx=5)
+        tk.Button(btn_frame, text="➕ 正则/通配", command=self.add_pattern_rule, bg=self.colors["accent"],
+                  fg=self.colors["fg"], relief="flat", padx=10).pack(side="left", padx=5)
 
         # 3. 列表
         list_frame = tk.Frame(self.page_rules, bg=self.colors["bg"])
@@ -913,8 +1176,8 @@ class SettingsDialog(tk.Toplevel):
                                 activebackground=self.colors["bg"],
                                 command=lambda i=rid, v=var: self.toggle_rule(i, v.get()))
             cb.pack(side="left")
-            type_color = "#d35400" if rtype == 'process' else "#2980b9"
-            type_text = "[应用]" if rtype == 'process' else "[标题]"
+            type_color = "#d35400" if rtype in ('process', 'glob') else "#2980b9"
+            type_text = {'process': "[应用]", 'glob': "[通配]", 'regex': "[正则]"}.get(rtype, "[标题]")
             tk.Label(row, text=type_text, fg=type_color, bg=self.colors["bg"], width=6, anchor="w").pack(side="left")
             tk.Label(row, text=val, fg=self.colors["fg"], bg=self.colors["bg"]).pack(side="left")
             del_btn = tk.Label(row, text="×", fg="#ff5555", bg=self.colors["bg"], cursor="hand2", font=("Arial", 12))
@@ -930,6 +1193,25 @@ class SettingsDialog(tk.Toplevel):
         kw = simpledialog.askstring("添加关键词", "请输入标题关键词")
         if kw and kw.strip(): self.db.add_trigger('title', kw.strip()); self.watcher.reload_rules(); self.load_rules()
 
+    def add_pattern_rule(self):
+        text = simpledialog.askstring("添加正则/通配规则",
+                                      "re:正则  匹配窗口标题，例如 re:chat(gpt|bot)\n"
+                                      "glob:通配  匹配应用名，例如 glob:*code*.exe")
+        if not text or not text.strip(): return
+        text = text.strip()
+        rtype, _, value = text.partition(":")
+        rtype = {"re": 'regex', "glob": 'glob'}.get(rtype.strip().lower())
+        value = value.strip()
+        if not rtype:
+            messagebox.showerror("错误", "请以 re: 或 glob: 开头")
+            return
+        if rtype == 'glob': value = value.lower()
+        error = validate_rule(rtype, value)
+        if error:
+            messagebox.showerror("错误", error)
+            return
+        self.db.add_trigger(rtype, value); self.watcher.reload_rules(); self.load_rules()
+
     def toggle_rule(self, rid, enabled):
         self.db.toggle_trigger(rid, enabled);
         self.watcher.reload_rules()